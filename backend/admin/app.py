@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 import logging
@@ -12,9 +13,11 @@ from pydantic import BaseModel, validator
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.config.database import get_db
+from shared.config.database import get_db, SessionLocal
 from shared.models.booking import Booking
 from shared.models.user import User
+from shared.services.pagination import paginate
+from shared.services.streaming_export import export_response, stream_query
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -284,7 +287,8 @@ async def list_users(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
     """Listar usuários para seleção em eventos"""
     try:
@@ -297,7 +301,9 @@ async def list_users(
             )
         
         # Buscar usuários no banco
-        users = db.query(User).offset(offset).limit(limit).all()
+        users, next_cursor = paginate(
+            db.query(User), [User.created_at, User.id], cursor=cursor, limit=limit, skip=offset
+        )
         
         user_list = []
         for user in users:
@@ -314,7 +320,8 @@ async def list_users(
             "users": user_list,
             "total": len(user_list),
             "limit": limit,
-            "offset": offset
+            "offset": offset,
+            "next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -331,7 +338,8 @@ async def list_bookings(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
     """Listar reservas para seleção em eventos"""
     try:
@@ -344,7 +352,9 @@ async def list_bookings(
             )
         
         # Buscar reservas no banco
-        bookings = db.query(Booking).offset(offset).limit(limit).all()
+        bookings, next_cursor = paginate(
+            db.query(Booking), [Booking.created_at, Booking.id], cursor=cursor, limit=limit, skip=offset
+        )
         
         booking_list = []
         for booking in bookings:
@@ -364,7 +374,8 @@ async def list_bookings(
             "bookings": booking_list,
             "total": len(booking_list),
             "limit": limit,
-            "offset": offset
+            "offset": offset,
+            "next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -376,6 +387,53 @@ async def list_bookings(
             detail="Erro interno do servidor"
         )
 
+# Colunas das exportações em massa (o restante das tabelas não sai do serviço)
+USER_EXPORT_COLUMNS = [User.id, User.email, User.full_name, User.is_active, User.created_at]
+BOOKING_EXPORT_COLUMNS = [
+    Booking.id, Booking.property_id, Booking.customer_id, Booking.checkin_date,
+    Booking.checkout_date, Booking.total_price, Booking.status, Booking.created_at
+]
+
+async def _require_admin(token: str):
+    current_user = await get_current_user(token)
+    if not current_user or "admin" not in current_user.get("permissions", []):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permissões insuficientes"
+        )
+
+@app.get("/api/admin/users/export")
+async def export_users(
+    token: str = Depends(oauth2_scheme),
+    formato: str = "ndjson",
+    is_active: Optional[bool] = None
+):
+    """Exportar todos os usuários em streaming (NDJSON ou CSV)"""
+    await _require_admin(token)
+    statement = select(*USER_EXPORT_COLUMNS).order_by(User.id)
+    if is_active is not None:
+        statement = statement.where(User.is_active == is_active)
+    return export_response(
+        stream_query(SessionLocal, statement), formato, "users",
+        fields=[column.key for column in USER_EXPORT_COLUMNS]
+    )
+
+@app.get("/api/admin/bookings/export")
+async def export_bookings(
+    token: str = Depends(oauth2_scheme),
+    formato: str = "ndjson",
+    booking_status: Optional[str] = None
+):
+    """Exportar todas as reservas em streaming (NDJSON ou CSV)"""
+    await _require_admin(token)
+    statement = select(*BOOKING_EXPORT_COLUMNS).order_by(Booking.id)
+    if booking_status:
+        statement = statement.where(Booking.status == booking_status)
+    return export_response(
+        stream_query(SessionLocal, statement), formato, "bookings",
+        fields=[column.key for column in BOOKING_EXPORT_COLUMNS]
+    )
+
 @app.post("/api/admin/notifications/send")
 async def send_admin_notification(
     notification: EventNotification,
@@ -0,0 +1,231 @@
+"""
+Auditoria de índices: EXPLAIN das consultas de cada endpoint em um banco populado
+
+Uso:
+    python benchmarks/index_audit.py
+    python benchmarks/index_audit.py --without-indexes   # linha de base, sem os índices declarados
+    python benchmarks/index_audit.py --database-url postgresql://... --rows 200000
+
+Popula as tabelas consultadas pelos serviços, roda ANALYZE e imprime o plano de
+cada consulta, marcando as que fazem varredura sequencial da tabela (SQLite:
+"SCAN <tabela>" sem índice; PostgreSQL: "Seq Scan"). Sai com código 1 se alguma
+consulta for marcada, para poder ser usado no CI.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import MetaData, create_engine, func, insert, select, text
+
+from shared.config.index_migrations import all_metadatas
+from shared.models.booking import Booking
+from shared.models.chatbots import ChatbotIntent
+from shared.models.loyalty import LoyaltyTransaction
+from shared.models.maps import MapLocation
+from shared.models.photos import Photo, PhotoLike
+from shared.models.videos import Video, VideoLike, VideoView
+from shared.services.pagination import _after
+
+CITIES = ["Caldas Novas", "Rio Quente", "Goiânia", "Brasília", "São Paulo", "Rio de Janeiro"]
+LOCATION_TYPES = ["hotel", "restaurant", "attraction", "park", "shop"]
+CATEGORIES = ["tour", "hotel", "park", "food", "event"]
+UPLOAD_STATUSES = ["completed"] * 8 + ["processing", "failed"]
+BOOKING_STATUSES = ["confirmed"] * 6 + ["active", "cancelled", "completed"]
+PAGE = 101  # limit + 1 da paginação
+
+
+def _page_after(model):
+    """Condição de keyset de uma página intermediária"""
+    return _after([model.created_at, model.id], [datetime(2024, 6, 1), 10**9], descending=True)
+
+
+def _newest_first(model):
+    return (model.created_at.desc(), model.id.desc())
+
+
+# (endpoint, consulta) no mesmo formato que os serviços geram
+QUERIES = [
+    ("GET /photos/", select(Photo).where(Photo.upload_status.notin_(("failed", "deleted")))
+        .order_by(*_newest_first(Photo)).limit(PAGE)),
+    ("GET /photos/?cursor", select(Photo).where(Photo.upload_status.notin_(("failed", "deleted")), _page_after(Photo))
+        .order_by(*_newest_first(Photo)).limit(PAGE)),
+    ("GET /photos/?uploaded_by", select(Photo).where(Photo.upload_status.notin_(("failed", "deleted")), Photo.user_id == 7)
+        .order_by(*_newest_first(Photo)).limit(PAGE)),
+    ("GET /photos/?album_id", select(Photo).where(Photo.upload_status.notin_(("failed", "deleted")), Photo.album_id == 3)
+        .order_by(*_newest_first(Photo)).limit(PAGE)),
+    ("GET /stats (fotos populares)", select(Photo.id, Photo.title, Photo.view_count)
+        .where(Photo.is_public == True).order_by(Photo.view_count.desc()).limit(5)),
+    ("POST /photos/{id}/like", select(PhotoLike).where(PhotoLike.photo_id == 11, PhotoLike.user_id == 7).limit(1)),
+
+    ("GET /videos/", select(Video).where(Video.upload_status.notin_(("failed", "deleted")))
+        .order_by(*_newest_first(Video)).limit(PAGE)),
+    ("GET /videos/?category", select(Video).where(Video.upload_status.notin_(("failed", "deleted")), Video.category == "tour")
+        .order_by(*_newest_first(Video)).limit(PAGE)),
+    ("GET /videos/?uploaded_by", select(Video).where(Video.upload_status.notin_(("failed", "deleted")), Video.user_id == 7)
+        .order_by(*_newest_first(Video)).limit(PAGE)),
+    ("GET /stats (vídeos populares)", select(Video.id, Video.title, Video.view_count)
+        .where(Video.upload_status == "completed").order_by(Video.view_count.desc()).limit(5)),
+    ("GET /videos/{id}/views", select(func.count(), func.count(func.distinct(VideoView.user_id)))
+        .where(VideoView.video_id == 11)),
+    ("POST /videos/{id}/like", select(VideoLike).where(VideoLike.video_id == 11, VideoLike.user_id == 7).limit(1)),
+
+    ("GET /locations/", select(MapLocation).where(MapLocation.is_active == True)
+        .order_by(*_newest_first(MapLocation)).limit(PAGE)),
+    ("GET /locations/?location_type", select(MapLocation)
+        .where(MapLocation.is_active == True, MapLocation.location_type == "hotel")
+        .order_by(*_newest_first(MapLocation)).limit(PAGE)),
+    ("GET /locations/?city", select(MapLocation)
+        .where(MapLocation.is_active == True, MapLocation.city == "Caldas Novas")
+        .order_by(*_newest_first(MapLocation)).limit(PAGE)),
+    ("GET /stats (por tipo)", select(MapLocation.location_type, func.count(MapLocation.id))
+        .where(MapLocation.is_active == True).group_by(MapLocation.location_type)),
+
+    ("GET /admin/bookings", select(Booking.__table__).order_by(*_newest_first(Booking)).limit(PAGE)),
+    ("GET /admin/stats (reservas ativas)", select(func.count()).select_from(Booking.__table__)
+        .where(Booking.status == "active")),
+    ("chatbot: reservas do cliente", select(Booking.__table__)
+        .where(Booking.customer_id == 7, Booking.status.in_(["confirmed", "active"]))),
+    ("chatbot: histórico do cliente", select(Booking.__table__).where(Booking.customer_id == 7)
+        .order_by(Booking.created_at.desc()).limit(5)),
+
+    ("chatbots: detecção de intenção", select(ChatbotIntent)
+        .where(ChatbotIntent.chatbot_id == 3, ChatbotIntent.is_active == True)),
+    ("loyalty: extrato do usuário", select(LoyaltyTransaction).where(LoyaltyTransaction.user_id == 7)
+        .order_by(LoyaltyTransaction.created_at.desc()).limit(50)),
+]
+
+SEQ_SCAN = {
+    # SCAN sem USING INDEX/COVERING INDEX é leitura da tabela inteira
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+def _created_at(rng):
+    return datetime(2023, 1, 1) + timedelta(seconds=rng.randint(0, 2 * 365 * 86400))
+
+
+def seed(engine, rows: int, batch_size: int = 20000):
+    rng = random.Random(42)
+    users = max(rows // 50, 10)
+    generators = {
+        Photo: lambda: {
+            "title": "foto", "photo_url": "/p.jpg", "user_id": rng.randint(1, users),
+            "album_id": rng.randint(1, rows // 100 + 1), "view_count": rng.randint(0, 10000),
+            "is_public": rng.random() > 0.2, "is_featured": rng.random() > 0.95,
+            "upload_status": rng.choice(UPLOAD_STATUSES), "created_at": _created_at(rng),
+        },
+        PhotoLike: lambda: {"photo_id": rng.randint(1, rows), "user_id": rng.randint(1, users)},
+        Video: lambda: {
+            "title": "vídeo", "video_url": "/v.mp4", "user_id": rng.randint(1, users),
+            "category": rng.choice(CATEGORIES), "view_count": rng.randint(0, 10000),
+            "is_public": rng.random() > 0.2, "upload_status": rng.choice(UPLOAD_STATUSES),
+            "created_at": _created_at(rng),
+        },
+        VideoView: lambda: {"video_id": rng.randint(1, rows), "user_id": rng.randint(1, users)},
+        VideoLike: lambda: {
+            "video_id": rng.randint(1, rows), "user_id": rng.randint(1, users), "is_like": rng.random() > 0.1
+        },
+        MapLocation: lambda: {
+            "name": "local", "latitude": -17.7, "longitude": -48.6,
+            "location_type": rng.choice(LOCATION_TYPES), "city": rng.choice(CITIES),
+            "is_active": rng.random() > 0.1, "created_at": _created_at(rng),
+        },
+        Booking: lambda: {
+            "property_id": rng.randint(1, 500), "customer_id": rng.randint(1, users),
+            "checkin_date": datetime(2024, 1, 1), "checkout_date": datetime(2024, 1, 3),
+            "total_price": 500.0, "status": rng.choice(BOOKING_STATUSES), "created_at": _created_at(rng),
+        },
+        ChatbotIntent: lambda: {
+            "chatbot_id": rng.randint(1, 200), "intent_name": "intent", "is_active": rng.random() > 0.2
+        },
+        LoyaltyTransaction: lambda: {
+            "user_id": rng.randint(1, users), "transaction_type": "earned",
+            "points": rng.randint(1, 500), "created_at": _created_at(rng),
+        },
+    }
+
+    start = time.perf_counter()
+    for model, generate in generators.items():
+        for offset in range(0, rows, batch_size):
+            batch = [generate() for _ in range(min(batch_size, rows - offset))]
+            with engine.begin() as conn:
+                conn.execute(insert(model.__table__), batch)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"População: {rows} linhas por tabela em {time.perf_counter() - start:.1f}s\n")
+
+
+def create_schema(engine, with_indexes: bool):
+    # chatbots e loyalty têm Base própria, sem a tabela users das FKs; o esquema
+    # da auditoria junta todos os modelos em um MetaData único
+    metadata = MetaData()
+    for source in all_metadatas():
+        for table in source.tables.values():
+            if table.name not in metadata.tables:
+                table.to_metadata(metadata)
+    tables = [metadata.tables[model.__tablename__] for model in (
+        Photo, PhotoLike, Video, VideoView, VideoLike, MapLocation, Booking, ChatbotIntent, LoyaltyTransaction
+    )]
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    if not with_indexes:
+        with engine.begin() as conn:
+            for table in tables:
+                for index in table.indexes:
+                    # Mantém apenas a chave primária e os índices das colunas id
+                    if list(index.columns) != [table.c.id]:
+                        index.drop(bind=conn)
+
+
+def explain(conn, statement):
+    dialect = conn.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "sqlite":
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    return [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+
+
+def audit(engine) -> int:
+    pattern = SEQ_SCAN.get(engine.dialect.name)
+    if pattern is None:
+        raise SystemExit(f"Dialeto não suportado: {engine.dialect.name}")
+
+    flagged = 0
+    with engine.connect() as conn:
+        for endpoint, statement in QUERIES:
+            plan = explain(conn, statement)
+            scans = sorted({match for line in plan for match in pattern.findall(line)})
+            status = "SEQ SCAN " + ", ".join(scans) if scans else "ok"
+            flagged += bool(scans)
+            print(f"{endpoint:<38} {status}")
+            for line in plan:
+                print(f"    {line}")
+    print(f"\n{flagged} de {len(QUERIES)} consultas com varredura sequencial")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark_index_audit.db")
+    parser.add_argument("--rows", type=int, default=50_000, help="linhas por tabela")
+    parser.add_argument("--without-indexes", action="store_true", help="remove os índices declarados")
+    parser.add_argument("--reuse", action="store_true", help="reaproveita os dados já populados")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.reuse:
+        create_schema(engine, with_indexes=not args.without_indexes)
+        seed(engine, args.rows)
+    sys.exit(1 if audit(engine) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark de requisições/s das listagens /photos/ e /locations/ (páginas de 100 linhas)
+
+Uso:
+    python benchmarks/json_responses.py
+    python benchmarks/json_responses.py --rows 5000 --requests 2000 --limit 100
+
+Monta, sobre o mesmo banco populado, as duas versões de cada endpoint:
+  - antes: response_model=List[Schema] com as linhas ORM (validação pydantic
+    linha a linha + JSONResponse da stdlib)
+  - depois: RowSerializer + FastJSONResponse (orjson), como nos serviços
+e mede requisições/s em processo com o TestClient (sem rede, um cliente).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from shared.config.database import Base
+from shared.config.index_migrations import all_metadatas
+from shared.models.maps import MapLocation as MapLocationModel
+from shared.models.photos import Photo as PhotoModel
+from shared.schemas import MapLocation, Photo
+from shared.services.fast_json import FastJSONResponse, RowSerializer, orjson
+
+
+def populate(engine, rows: int):
+    all_metadatas()  # registra a tabela users (FK de photos.user_id)
+    tables = [PhotoModel.__table__, MapLocationModel.__table__]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    rng = random.Random(42)
+    now = datetime(2024, 6, 1)
+
+    def moment():
+        return now - timedelta(seconds=rng.randint(0, 365 * 86400))
+
+    with engine.begin() as conn:
+        conn.execute(insert(PhotoModel.__table__), [
+            {
+                "title": f"Foto {i}", "description": "Parque aquático em Caldas Novas",
+                "photo_url": f"/uploads/{i}.jpg", "thumbnail_url": f"/thumbnails/{i}.webp",
+                "file_size_mb": rng.random() * 8, "width": 4000, "height": 3000, "format": "jpg",
+                "user_id": rng.randint(1, 500), "view_count": rng.randint(0, 10000),
+                "tags": '["piscina", "hotel"]', "upload_status": "completed",
+                "created_at": moment(), "updated_at": moment(),
+            }
+            for i in range(rows)
+        ])
+        conn.execute(insert(MapLocationModel.__table__), [
+            {
+                "name": f"Local {i}", "description": "Hotel com parque aquático",
+                "latitude": -17.74 + rng.random(), "longitude": -48.62 + rng.random(),
+                "location_type": "hotel", "category": "resort", "address": "Av. Principal, 100",
+                "city": "Caldas Novas", "country": "Brasil", "rating": rng.random() * 5,
+                "price_range": "$$", "is_active": True, "created_at": moment(), "updated_at": moment(),
+            }
+            for i in range(rows)
+        ])
+
+
+def build_app(Session_, limit: int) -> FastAPI:
+    app = FastAPI()
+    photo_serializer = RowSerializer(Photo)
+    location_serializer = RowSerializer(MapLocation)
+
+    def get_db():
+        with Session_() as db:
+            yield db
+
+    def photos_page(db):
+        return db.query(PhotoModel).order_by(PhotoModel.created_at.desc(), PhotoModel.id.desc()).limit(limit).all()
+
+    def locations_page(db):
+        return db.query(MapLocationModel).filter(MapLocationModel.is_active == True).order_by(
+            MapLocationModel.created_at.desc(), MapLocationModel.id.desc()
+        ).limit(limit).all()
+
+    @app.get("/before/photos/", response_model=List[Photo])
+    def photos_before(db: Session = Depends(get_db)):
+        return photos_page(db)
+
+    @app.get("/after/photos/", response_model=List[Photo], response_class=FastJSONResponse)
+    def photos_after(db: Session = Depends(get_db)):
+        return photo_serializer.response(photos_page(db))
+
+    @app.get("/before/locations/", response_model=List[MapLocation])
+    def locations_before(db: Session = Depends(get_db)):
+        return locations_page(db)
+
+    @app.get("/after/locations/", response_model=List[MapLocation], response_class=FastJSONResponse)
+    def locations_after(db: Session = Depends(get_db)):
+        return location_serializer.response(locations_page(db))
+
+    return app
+
+
+def measure(client: TestClient, path: str, requests: int) -> float:
+    for _ in range(min(50, requests)):  # aquecimento
+        client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark_json_responses.db")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--reuse", action="store_true", help="reaproveita os dados já populados")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.reuse:
+        populate(engine, args.rows)
+    client = TestClient(build_app(sessionmaker(bind=engine), args.limit))
+
+    print(f"orjson: {'sim' if orjson is not None else 'não (json da stdlib)'}; {args.limit} linhas por página")
+    for resource in ("photos", "locations"):
+        before = client.get(f"/before/{resource}/").json()
+        after = client.get(f"/after/{resource}/").json()
+        assert [row["id"] for row in before] == [row["id"] for row in after]
+
+        rps_before = measure(client, f"/before/{resource}/", args.requests)
+        rps_after = measure(client, f"/after/{resource}/", args.requests)
+        print(f"/{resource + '/':<12} antes {rps_before:>8.1f} req/s   depois {rps_after:>8.1f} req/s   "
+              f"({rps_after / rps_before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
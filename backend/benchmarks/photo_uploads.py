@@ -0,0 +1,112 @@
+"""
+Benchmark de throughput de uploads concorrentes no Photos Service
+
+Uso:
+    python benchmarks/photo_uploads.py --url http://localhost:8024 --uploads 200 --concurrency 20
+
+Mede uploads/s e latência da resposta (p50/p95/p99) e, em seguida, o tempo até
+todos os derivados (thumbnail/medium/large) ficarem prontos.
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import statistics
+import time
+
+import httpx
+from PIL import Image
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    """Gera um JPEG com ruído (não comprime trivialmente)"""
+    img = Image.effect_noise((width, height), random.randint(32, 96)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def upload_one(client: httpx.AsyncClient, payload: bytes, index: int):
+    start = time.perf_counter()
+    response = await client.post(
+        "/photos/upload/",
+        params={
+            "title": f"benchmark {index}",
+            "photo_type": "benchmark",
+            "uploaded_by": 1
+        },
+        files={"file": (f"bench_{index}.jpg", payload, "image/jpeg")}
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()["id"]
+
+
+async def wait_for_derivatives(client: httpx.AsyncClient, photo_ids, timeout: float):
+    pending = set(photo_ids)
+    failed = 0
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        for photo_id in list(pending):
+            response = await client.get(f"/photos/{photo_id}/derivatives")
+            status = response.json().get("status")
+            if status in ("completed", "failed"):
+                pending.discard(photo_id)
+                failed += status == "failed"
+        if pending:
+            await asyncio.sleep(0.2)
+    return len(pending), failed
+
+
+async def run(args):
+    payloads = [make_jpeg(args.width, args.height) for _ in range(min(args.uploads, 8))]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        async def bounded(index: int):
+            async with semaphore:
+                return await upload_one(client, payloads[index % len(payloads)], index)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(args.uploads)))
+        upload_elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, _ in results]
+        photo_ids = [photo_id for _, photo_id in results]
+
+        timed_out, failed = await wait_for_derivatives(client, photo_ids, args.timeout)
+        pipeline_elapsed = time.perf_counter() - start
+
+    size_mb = sum(len(p) for p in payloads) / len(payloads) / (1024 * 1024)
+    print(f"Uploads: {args.uploads} x {size_mb:.2f} MB ({args.width}x{args.height}), concorrência {args.concurrency}")
+    print(f"Throughput de upload: {args.uploads / upload_elapsed:.1f} uploads/s ({upload_elapsed:.2f}s)")
+    print(
+        f"Latência: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms"
+    )
+    print(
+        f"Derivados prontos: {args.uploads / pipeline_elapsed:.1f} fotos/s ({pipeline_elapsed:.2f}s), "
+        f"falhas {failed}, pendentes {timed_out}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8024")
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark dos exportadores de relatório: tempo e pico de RSS por 100 mil linhas
+
+Uso:
+    python benchmarks/report_exports.py
+    python benchmarks/report_exports.py --rows 500000 --formats xlsx pdf
+
+Cada medição roda em um subprocesso próprio (o pico de RSS do processo só cresce)
+e compara duas formas de gerar o mesmo arquivo:
+  - em memória: linhas carregadas numa lista e o arquivo montado inteiro em
+    bytes antes de gravar (como os exportadores antigos)
+  - streaming: linhas vindas de um gerador e blocos gravados à medida que saem
+    de iter_xlsx / iter_pdf / iter_csv
+"""
+
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.services.report_writers import iter_pdf, iter_xlsx
+from shared.services.streaming_export import iter_csv
+
+COLUMNS = ["id", "propriedade", "cliente", "check-in", "valor", "status", "criado_em"]
+STATUSES = ["confirmed", "cancelled", "completed", "active"]
+
+
+def generate_rows(count: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    for index in range(1, count + 1):
+        yield [
+            index, f"Hotel Termas {rng.randint(1, 500)}", f"cliente{rng.randint(1, 50000)}@email.com",
+            start + timedelta(days=rng.randint(0, 365)), round(rng.random() * 3000, 2),
+            rng.choice(STATUSES), start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+        ]
+
+
+def exporter(fmt: str, rows):
+    if fmt == "xlsx":
+        return iter_xlsx([("table", "reservas", COLUMNS, rows)])
+    if fmt == "pdf":
+        return iter_pdf("RESERVAS", [("table", "reservas", COLUMNS, rows)])
+    return iter_csv((dict(zip(COLUMNS, row)) for row in rows), COLUMNS)
+
+
+def run_one(fmt: str, mode: str, rows: int, path: str):
+    """Executado no subprocesso: gera o arquivo e imprime tempo, pico de RSS e tamanho"""
+    start = time.perf_counter()
+    if mode == "memoria":
+        content = b"".join(exporter(fmt, list(generate_rows(rows))))
+        with open(path, "wb") as f:
+            f.write(content)
+    else:
+        with open(path, "wb") as f:
+            for chunk in exporter(fmt, generate_rows(rows)):
+                f.write(chunk)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB no Linux
+    print(f"{elapsed} {peak_kb} {os.path.getsize(path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "pdf", "csv"], choices=["xlsx", "pdf", "csv"])
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--run", nargs=2, metavar=("FORMATO", "MODO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        fmt, mode = args.run
+        run_one(fmt, mode, args.rows, os.path.join(args.output_dir, f"benchmark_report_export.{fmt}"))
+        return
+
+    # Linha de base: o interpretador com os módulos importados, sem gerar nada
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    per = 100_000 / args.rows
+    print(f"{args.rows} linhas; RSS do interpretador com os módulos: {baseline / 1024:.1f} MB\n")
+    print(f"{'formato':<8} {'modo':<10} {'s/100k linhas':>14} {'pico RSS (MB)':>14} {'arquivo (MB)':>13}")
+    for fmt in args.formats:
+        for mode in ("memoria", "streaming"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--rows", str(args.rows),
+                 "--output-dir", args.output_dir, "--run", fmt, mode],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            elapsed, peak_kb, size = float(output[0]), int(output[1]), int(output[2])
+            print(f"{fmt:<8} {mode:<10} {elapsed * per:>14.2f} {peak_kb / 1024:>14.1f} {size / 2**20:>13.1f}")
+        os.remove(os.path.join(args.output_dir, f"benchmark_report_export.{fmt}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark das métricas de visualização de um vídeo com 1M de views
+
+Uso:
+    python benchmarks/video_views.py --views 1000000
+    python benchmarks/video_views.py --database-url postgresql://... --redis-url redis://localhost:6379/15
+
+Compara o cálculo antigo (carregar todas as linhas com .all() e contar em Python)
+com a consulta de agregação única e, se --redis-url for informado, com a estimativa
+de espectadores distintos via HyperLogLog (PFADD/PFCOUNT).
+
+A carga HLL medida aqui é a mesma do backfill do serviço (POST
+/unique-viewers/backfill), necessário para as visualizações gravadas antes de
+UNIQUE_COUNTER_REDIS_URL ser configurado: sem ele a estimativa só conta os
+espectadores registrados depois.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from shared.config.database import Base
+from shared.config.index_migrations import all_metadatas
+from shared.models.videos import Video, VideoView
+from shared.services.stats_aggregator import count_where
+
+COMPLETION_THRESHOLD = 90.0
+VIDEO_ID = 1
+
+
+def populate(engine, views: int, viewers: int, batch_size: int = 50000):
+    all_metadatas()  # registra a tabela users (FK de videos.user_id)
+    Base.metadata.drop_all(engine, tables=[VideoView.__table__, Video.__table__])
+    Base.metadata.create_all(engine, tables=[Video.__table__, VideoView.__table__])
+    rng = random.Random(42)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Video.__table__).values(
+            id=VIDEO_ID, title="benchmark", video_url="/benchmark.mp4", user_id=1
+        ))
+
+    start = time.perf_counter()
+    for offset in range(0, views, batch_size):
+        rows = [
+            {
+                "video_id": VIDEO_ID,
+                # ~20% anônimos, como no tráfego real
+                "user_id": rng.randint(1, viewers) if rng.random() > 0.2 else None,
+                "completion_percentage": rng.random() * 100,
+                "watch_duration_seconds": rng.randint(0, 600)
+            }
+            for _ in range(min(batch_size, views - offset))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(VideoView.__table__), rows)
+    print(f"População: {views} views em {time.perf_counter() - start:.1f}s")
+
+
+def measure(label: str, fn, repeat: int):
+    tracemalloc.start()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {min(timings) * 1000:>10.1f} ms   pico {peak / (1024 * 1024):>8.1f} MB   {result}")
+
+
+def orm_all(Session):
+    """Implementação anterior: todas as linhas viram objetos ORM"""
+    with Session() as db:
+        views = db.query(VideoView).filter(VideoView.video_id == VIDEO_ID).all()
+        total = len(views)
+        completed = len([v for v in views if v.completion_percentage >= COMPLETION_THRESHOLD])
+        unique = len(set(v.user_id for v in views if v.user_id))
+        return total, completed, unique
+
+
+def sql_aggregate(Session, distinct: bool = True):
+    with Session() as db:
+        columns = [
+            func.count(),
+            count_where(VideoView.completion_percentage >= COMPLETION_THRESHOLD)
+        ]
+        if distinct:
+            columns.append(func.count(func.distinct(VideoView.user_id)))
+        return tuple(db.execute(select(*columns).where(VideoView.video_id == VIDEO_ID)).one())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark_video_views.db")
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--views", type=int, default=1_000_000)
+    parser.add_argument("--viewers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-orm", action="store_true", help="não executa a versão com .all()")
+    parser.add_argument("--reuse", action="store_true", help="reaproveita os dados já populados")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine)
+    if not args.reuse:
+        populate(engine, args.views, args.viewers)
+
+    if not args.skip_orm:
+        measure("ORM .all() + Python", lambda: orm_all(Session), 1)
+    measure("SQL agregado (exato)", lambda: sql_aggregate(Session), args.repeat)
+    measure("SQL agregado sem DISTINCT", lambda: sql_aggregate(Session, distinct=False), args.repeat)
+
+    if args.redis_url:
+        from shared.services.unique_counter import HyperLogLogCounter
+
+        # Backfill: o HLL começa vazio e é carregado a partir de video_views
+
+        counter = HyperLogLogCounter(args.redis_url, "benchmark_video_viewers")
+        counter.reset(VIDEO_ID)
+        with engine.connect() as conn:
+            user_ids = conn.execute(
+                select(VideoView.user_id).where(VideoView.video_id == VIDEO_ID, VideoView.user_id.isnot(None))
+            ).scalars()
+            start = time.perf_counter()
+            counter.add_many(VIDEO_ID, user_ids)
+        print(f"Carga HLL (PFADD em lote): {time.perf_counter() - start:.1f}s")
+        measure("HyperLogLog PFCOUNT", lambda: counter.count(VIDEO_ID), args.repeat)
+        memory = counter.client.memory_usage(counter._key(VIDEO_ID))
+        print(f"Memória da chave HLL no Redis: {memory} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark das operações em lote de vouchers (vouchers/batch.py)
+
+Uso:
+    python benchmarks/voucher_batch.py
+    python benchmarks/voucher_batch.py --vouchers 100000 --baseline 5000
+
+Cria um banco SQLite temporário com vouchers sintéticos e mede:
+  - antigo: o laço de /vouchers/batch/status antes dos lotes, um
+    repository.update (sessão, SELECT e commit) por id, sobre uma amostra;
+  - lote: o mesmo pedido com --vouchers ids (com repetidos e inexistentes)
+    em blocos transacionais, com o resultado de cada item;
+  - exportação em lote (NDJSON) dos mesmos ids;
+  - retomada: um lote interrompido no meio (réplica derrubada) continua do
+    primeiro bloco não confirmado.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "vouchers"))
+
+WORK_DIR = tempfile.mkdtemp(prefix="voucher-batch-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/vouchers.db"
+os.environ.setdefault("VOUCHER_BATCH_DIR", os.path.join(WORK_DIR, "batches"))
+
+from sqlalchemy import insert, update
+
+from shared.config.database import Base, SessionLocal, engine
+from shared.models.voucher import Voucher, VoucherBatch, VoucherBatchItem
+
+import batch
+from store import VoucherRepository
+
+TIPOS = ["hotel", "voo", "pacote", "atracao", "transporte", "servico"]
+
+
+def populate(count: int):
+    Base.metadata.create_all(
+        bind=engine, tables=[Voucher.__table__, VoucherBatch.__table__, VoucherBatchItem.__table__]
+    )
+    rng = random.Random(7)
+    start = date(2025, 1, 1)
+    created = datetime(2025, 1, 1)
+    with SessionLocal() as db:
+        for first in range(0, count, 10000):
+            rows = []
+            for index in range(first, min(first + 10000, count)):
+                begin = start + timedelta(days=rng.randint(0, 730))
+                rows.append({
+                    "id": f"v{index}", "codigo": f"VCH-2025-{index:08d}", "cliente": f"Cliente {index}",
+                    "tipo": rng.choice(TIPOS), "destino": f"Destino {index % 500}", "data_inicio": begin,
+                    "data_fim": begin + timedelta(days=3), "valor": round(rng.random() * 5000, 2),
+                    "agencia": f"Agência {index % 50}", "agente": f"Agente {index % 400}",
+                    "validade": begin + timedelta(days=180), "status": "ativo", "beneficios": [],
+                    "documentos": [], "criado_em": created + timedelta(seconds=index)
+                })
+            db.execute(insert(Voucher), rows)
+        db.commit()
+
+
+def request_ids(count: int):
+    """Pedido realista: ids existentes, alguns repetidos e alguns inexistentes"""
+    rng = random.Random(11)
+    ids = [f"v{index}" for index in rng.sample(range(count), count - count // 50)]
+    ids += [f"inexistente-{index}" for index in range(count // 100)]
+    ids += rng.sample(ids, count // 100)
+    return ids[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vouchers", type=int, default=batch.MAX_ITEMS, help="itens por lote")
+    parser.add_argument("--baseline", type=int, default=2000, help="ids da amostra do laço antigo")
+    args = parser.parse_args()
+
+    populate(args.vouchers)
+    repository = VoucherRepository(sync_interval=0)
+    repository.load()
+    fields = [column.name for column in Voucher.__table__.columns]
+
+    def serialize(voucher):
+        return {field: getattr(voucher, field) for field in fields}
+
+    ids = request_ids(args.vouchers)
+    print(f"{args.vouchers} vouchers em {WORK_DIR}; lotes de {batch.CHUNK_SIZE} itens\n")
+
+    sample = ids[:args.baseline]
+    start = time.perf_counter()
+    for voucher_id in sample:
+        repository.update(voucher_id, {"status": "expirado"})
+    per_item = (time.perf_counter() - start) / len(sample)
+    print(f"antigo (um commit por id): {per_item * 1e6:.0f} µs/item -> "
+          f"{per_item * len(ids):.1f} s estimados para {len(ids)} itens")
+
+    for operacao, parametros in (("status", {"novo_status": "cancelado"}), ("export", {"formato": "ndjson"})):
+        with SessionLocal() as db:
+            batch_id = batch.create_batch(db, operacao, ids, parametros)
+        start = time.perf_counter()
+        result = batch.run_batch(batch_id, repository, serialize, fields)
+        elapsed = time.perf_counter() - start
+        summary = batch.load_summary(batch_id)
+        print(f"lote {operacao:<6}: {elapsed:.2f} s ({len(ids) / elapsed:,.0f} itens/s), {result}, "
+              f"{summary['contagem']}")
+    print(f"índice após o lote: {repository.stats()['cancelados']} cancelados")
+
+    # Réplica derrubada após metade dos blocos: o lote é retomado de onde parou
+    with SessionLocal() as db:
+        batch_id = batch.create_batch(db, "status", ids, {"novo_status": "ativo"})
+    stop = StopAfter(len(ids) // batch.CHUNK_SIZE // 2)
+    batch.run_batch(batch_id, repository, serialize, fields, stop=stop)
+    with SessionLocal() as db:
+        db.execute(update(VoucherBatch).where(VoucherBatch.id == batch_id).values(
+            status="running", claimed_by="replica-derrubada", atualizado_em=datetime.utcnow() - batch.STALE_AFTER * 2
+        ))
+        db.commit()
+    halfway = batch.load_summary(batch_id)["processados"]
+    start = time.perf_counter()
+    result = batch.run_batch(batch_id, repository, serialize, fields)
+    summary = batch.load_summary(batch_id)
+    print(f"retomada: {halfway} itens já confirmados, restante em {time.perf_counter() - start:.2f} s, "
+          f"{result}, {summary['processados']}/{summary['total']}, {summary['contagem']}")
+
+
+class StopAfter:
+    """Evento de parada que dispara depois de n consultas (um bloco por consulta)"""
+
+    def __init__(self, chunks: int):
+        self.chunks = chunks
+
+    def is_set(self) -> bool:
+        self.chunks -= 1
+        return self.chunks < 0
+
+
+if __name__ == "__main__":
+    main()
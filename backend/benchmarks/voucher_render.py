@@ -0,0 +1,129 @@
+"""
+Benchmark da renderização de vouchers (shared/services/voucher_render.py)
+
+Uso:
+    python benchmarks/voucher_render.py
+    python benchmarks/voucher_render.py --vouchers 5000 --workers 1 2 4 8
+
+Usa o template premium do voucher-editor e mede:
+  - compilação (validação, fontes e medidas): versão nova x versão já
+    compilada, que custa só o hash do conteúdo;
+  - um voucher por vez: template preparado (camadas estáticas prontas) x
+    preparado a cada voucher, como seria sem o cache por versão;
+  - cache: a mesma exportação pedida de novo;
+  - lote em PDF: vouchers por segundo com cada tamanho de pool de processos.
+O pool só escala até o número de CPUs da máquina.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from shared.services import voucher_render
+
+TEMPLATE = {
+    "id": "premium-001", "name": "Template Premium", "logo": "", "backgroundColor": "#1e293b",
+    "textColor": "#f8fafc", "borderColor": "#f59e0b", "fontFamily": "Playfair Display, serif",
+    "fontSize": "18px", "layout": "premium",
+    "elements": [
+        {"id": "title", "type": "text", "content": "VOUCHER EXCLUSIVO", "x": 220, "y": 80, "width": 280,
+         "height": 40, "fontSize": 28, "fontColor": "#f59e0b"},
+        *[
+            {"id": f"{field}-label", "type": "text", "content": label, "x": 60, "y": y, "width": 100, "height": 25,
+             "fontSize": 16, "fontColor": "#cbd5e1"}
+            for field, label, y in (("code", "Código:", 150), ("client", "Cliente:", 185),
+                                    ("destination", "Destino:", 220), ("value", "Valor:", 255))
+        ],
+        {"id": "watermark", "type": "watermark", "content": "ONION RSV 360", "x": 200, "y": 360, "width": 150,
+         "height": 20, "fontSize": 10, "fontColor": "#cbd5e1"},
+        *[
+            {"id": f"{field}-value", "type": "text", "content": f"{{{{{field}}}}}", "x": 170, "y": y, "width": 220,
+             "height": 25, "fontSize": 16}
+            for field, y in (("code", 150), ("clientName", 185), ("destination", 220), ("value", 255))
+        ],
+        {"id": "qr", "type": "qr-code", "content": "{{code}}", "x": 400, "y": 150, "width": 100, "height": 100},
+        {"id": "barcode", "type": "barcode", "content": "{{code}}", "x": 60, "y": 290, "width": 250, "height": 60},
+        {"id": "stamp", "type": "stamp", "content": "PREMIUM", "x": 350, "y": 290, "width": 120, "height": 50,
+         "fontSize": 14, "fontColor": "#f59e0b", "rotation": -12},
+    ]
+}
+
+
+def voucher(index: int, batch: str = "") -> dict:
+    return {
+        "code": f"VCH-2025-{batch}{index:06d}", "clientName": f"Cliente {index}",
+        "destination": "Resort Gramado", "value": f"R$ {1000 + index},00"
+    }
+
+
+def compilation(count: int):
+    start = time.perf_counter()
+    for _ in range(count):
+        voucher_render._compile(TEMPLATE, voucher_render.template_version(TEMPLATE))
+    cold = (time.perf_counter() - start) / count
+    voucher_render.compile_template(TEMPLATE)
+    start = time.perf_counter()
+    for _ in range(count):
+        voucher_render.compile_template(TEMPLATE)
+    warm = (time.perf_counter() - start) / count
+    print(f"compilação do template: versão nova {cold * 1000:.2f} ms, já compilada {warm * 1000:.3f} ms")
+
+
+def per_voucher(count: int):
+    rows = [voucher(index) for index in range(count)]
+    voucher_render.prepare(TEMPLATE)
+    start = time.perf_counter()
+    for row in rows:
+        voucher_render.encode_page(voucher_render.prepare(TEMPLATE).render(row))
+    prepared = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for row in rows:
+        voucher_render.encode_page(voucher_render.PreparedTemplate(TEMPLATE).render(row))
+    unprepared = (time.perf_counter() - start) / count
+    print(f"por voucher (PDF): preparado {prepared * 1000:.1f} ms, sem preparo {unprepared * 1000:.1f} ms")
+
+
+async def batches(count: int, workers_list, cache_dir: str):
+    renderer = voucher_render.VoucherRenderer(cache_dir)
+    start = time.perf_counter()
+    renderer.render(TEMPLATE, voucher(0), "pdf")
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    renderer.render(TEMPLATE, voucher(0), "pdf")
+    print(f"exportação: {first * 1000:.1f} ms; repetida (cache) {(time.perf_counter() - start) * 1000:.2f} ms\n")
+
+    print(f"{'processos':>9} {'vouchers':>9} {'segundos':>9} {'vouchers/s':>11} {'MB':>7}")
+    for workers in workers_list:
+        renderer = voucher_render.VoucherRenderer(cache_dir, max_workers=workers)
+        # Aquecimento: sobe os processos e prepara o template em cada um
+        await renderer.render_batch(TEMPLATE, [voucher(index, "w") for index in range(
+            voucher_render.BATCH_CHUNK * workers * 2)], "pdf")
+        rows = [voucher(index, f"{workers}-") for index in range(count)]
+        start = time.perf_counter()
+        path, _ = await renderer.render_batch(TEMPLATE, rows, "pdf")
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>9} {count:>9} {elapsed:>9.2f} {count / elapsed:>11.0f} "
+              f"{path.stat().st_size / 1024 / 1024:>7.1f}")
+        renderer.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vouchers", type=int, default=2000, help="vouchers por lote")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    compilation(200)
+    per_voucher(50)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        asyncio.run(batches(args.vouchers, sorted(set(args.workers)), cache_dir))
+
+
+if __name__ == "__main__":
+    main()
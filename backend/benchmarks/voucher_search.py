@@ -0,0 +1,163 @@
+"""
+Benchmark da busca de vouchers: varredura linear (antiga) x VoucherIndex
+
+Uso:
+    python benchmarks/voucher_search.py
+    python benchmarks/voucher_search.py --vouchers 200000 --repeat 5
+
+Gera vouchers sintéticos (códigos únicos; clientes, destinos, agências e
+agentes com repetição, como em produção), monta o índice em memória de
+vouchers/store.py e mede, para as mesmas consultas:
+  - linear: os filtros de /vouchers/search antes do índice, um passe por filtro
+    sobre todos os vouchers, com .lower() por voucher no termo;
+  - índice: VoucherIndex.search (filtro mais seletivo primeiro).
+Também compara as estatísticas (quatro passes x contadores). Sem banco: só a
+parte em memória é medida.
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "vouchers"))
+
+from store import VoucherIndex
+
+Row = namedtuple("Row", "id codigo cliente tipo destino data_inicio data_fim valor agencia agente status")
+
+FIRST_NAMES = ["Ana", "João", "Maria", "Pedro", "Lucia", "Carlos", "Fernanda", "Ricardo", "Claudia", "Roberto",
+               "Juliana", "Marcos", "Patricia", "Rafael", "Beatriz", "Gustavo", "Camila", "Eduardo", "Larissa", "Thiago"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Costa", "Pereira", "Almeida", "Ferreira", "Rodrigues",
+              "Gomes", "Martins", "Araujo", "Barbosa", "Ribeiro", "Carvalho", "Mendes", "Rocha", "Dias", "Teixeira"]
+CITIES = ["Rio de Janeiro", "São Paulo", "Salvador", "Recife", "Fortaleza", "Natal", "Gramado", "Foz do Iguaçu",
+          "Florianópolis", "Porto Seguro", "Maceió", "Bonito", "Caldas Novas", "Olímpia", "Búzios", "Paraty"]
+PLACES = ["Hotel", "Resort", "Pousada", "Parque", "Aluguel de Carro -", "Passeio", "Ingresso"]
+TIPOS = ["hotel", "voo", "pacote", "atracao", "transporte", "servico"]
+STATUSES = ["ativo"] * 6 + ["usado"] * 2 + ["expirado", "cancelado", "pendente"]
+
+
+def generate(count: int):
+    rng = random.Random(7)
+    agencias = [f"Agência {rng.choice(LAST_NAMES)} {index} Viagens" for index in range(300)]
+    agentes = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}" for index in range(3000)]
+    destinos = [f"{rng.choice(PLACES)} {rng.choice(CITIES)} {index}" for index in range(2000)]
+    start = date(2025, 1, 1)
+    for index in range(count):
+        begin = start + timedelta(days=rng.randint(0, 730))
+        yield Row(
+            id=f"v{index}", codigo=f"VCH-{2025 + index % 3}-{index:08X}",
+            cliente=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+            tipo=rng.choice(TIPOS), destino=rng.choice(destinos),
+            data_inicio=begin, data_fim=begin + timedelta(days=rng.randint(0, 14)),
+            valor=round(rng.random() * 5000, 2), agencia=rng.choice(agencias), agente=rng.choice(agentes),
+            status=rng.choice(STATUSES)
+        )
+
+
+def linear_search(vouchers, termo=None, status=None, tipo=None, data_inicio=None, data_fim=None,
+                  agencia=None, agente=None):
+    """Os passes de /vouchers/search antes do índice"""
+    vouchers = list(vouchers)
+    if termo:
+        termo_lower = termo.lower()
+        vouchers = [
+            v for v in vouchers
+            if (termo_lower in v.codigo.lower() or termo_lower in v.cliente.lower() or
+                termo_lower in v.destino.lower() or termo_lower in v.agencia.lower() or
+                termo_lower in v.agente.lower())
+        ]
+    if status:
+        vouchers = [v for v in vouchers if v.status == status]
+    if tipo:
+        vouchers = [v for v in vouchers if v.tipo == tipo]
+    if data_inicio:
+        vouchers = [v for v in vouchers if v.data_inicio >= data_inicio]
+    if data_fim:
+        vouchers = [v for v in vouchers if v.data_fim <= data_fim]
+    if agencia:
+        vouchers = [v for v in vouchers if agencia.lower() in v.agencia.lower()]
+    if agente:
+        vouchers = [v for v in vouchers if agente.lower() in v.agente.lower()]
+    return [v.id for v in vouchers]
+
+
+def linear_stats(vouchers):
+    total = len(vouchers)
+    ativos = len([v for v in vouchers if v.status == "ativo"])
+    usados = len([v for v in vouchers if v.status == "usado"])
+    expirados = len([v for v in vouchers if v.status == "expirado"])
+    cancelados = len([v for v in vouchers if v.status == "cancelado"])
+    valor_total = sum(v.valor for v in vouchers)
+    return total, ativos, usados, expirados, cancelados, valor_total
+
+
+QUERIES = [
+    ("código exato", {"termo": "VCH-2025-00003039"}),
+    ("nome de cliente", {"termo": "claudia ribeiro"}),
+    ("termo curto (2 letras)", {"termo": "ju"}),
+    ("termo pouco seletivo", {"termo": "silva"}),
+    ("agência + status", {"agencia": "12 viagens", "status": "ativo"}),
+    ("agente", {"agente": "rafael dias"}),
+    ("período de 1 semana", {"data_inicio": date(2025, 7, 1), "data_fim": date(2025, 7, 7)}),
+    ("status cancelado + tipo", {"status": "cancelado", "tipo": "voo"}),
+    ("destino + período", {"termo": "gramado", "data_inicio": date(2026, 6, 1), "data_fim": date(2026, 8, 31)}),
+]
+
+
+def timed(function, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vouchers", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vouchers = list(generate(args.vouchers))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    index = VoucherIndex()
+    index.bulk_load(iter(vouchers))
+    build = time.perf_counter() - start
+    grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+    print(f"{args.vouchers} vouchers; índice montado em {build:.1f}s, +{grown:.0f} MB de RSS\n")
+
+    print(f"{'consulta':<26} {'resultados':>10} {'linear (ms)':>12} {'índice (ms)':>12} {'ganho':>8}")
+    for name, criteria in QUERIES:
+        linear_time, expected = timed(lambda: linear_search(vouchers, **criteria), args.repeat)
+        index_time, slots = timed(lambda: index.search(**criteria), args.repeat)
+        found = [index.ids[slot] for slot in slots]
+        if found != expected:
+            raise SystemExit(f"Resultado divergente em '{name}': {len(found)} x {len(expected)}")
+        print(f"{name:<26} {len(found):>10} {linear_time * 1000:>12.1f} {index_time * 1000:>12.2f} "
+              f"{linear_time / max(index_time, 1e-9):>7.0f}x")
+
+    linear_time, _ = timed(lambda: linear_stats(vouchers), args.repeat)
+    index_time, _ = timed(index.stats, args.repeat)
+    print(f"{'estatísticas':<26} {'':>10} {linear_time * 1000:>12.1f} {index_time * 1000:>12.3f} "
+          f"{linear_time / max(index_time, 1e-9):>7.0f}x")
+
+    # Escrita: custo de manter índices e contadores atualizados
+    sample = vouchers[:: max(1, len(vouchers) // 1000)][:1000]
+    start = time.perf_counter()
+    for row in sample:
+        index.upsert(row.id, row._replace(status="usado", destino=row.destino + " II"))
+    update = (time.perf_counter() - start) / len(sample)
+    print(f"\natualização de um voucher no índice: {update * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark do broadcast de WebSocket (core/websocket.py) com conexões simuladas
+
+Uso:
+    python benchmarks/websocket_broadcast.py
+    python benchmarks/websocket_broadcast.py --connections 10000 --slow 100 --messages 20
+
+Sem rede: cada conexão é um WebSocket falso cujo send_text cede o loop (como
+um envio real com buffer livre); as lentas levam --slow-delay por envio.
+Para o mesmo fluxo de mensagens compara:
+  - antigo: o broadcast anterior, um json.dumps e um await send_text por
+    conexão, em sequência;
+  - filas: ConnectionManager com fila por conexão e task escritora.
+Mede quanto o emissor fica preso em broadcast(), quando as conexões rápidas
+recebem tudo, e o que acontece com as lentas (política de contrapressão).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from core.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+
+def message(index: int) -> dict:
+    return {
+        "type": "system_notification",
+        "notification": {
+            "id": f"sys_{index}", "type": "info", "title": "Manutenção programada",
+            "message": "O sistema ficará indisponível das 2h às 3h.", "timestamp": "2025-07-01T12:00:00",
+            "read": False, "action_url": None, "metadata": {"janela": "02:00-03:00", "servicos": ["core", "vouchers"]}
+        }
+    }
+
+
+async def legacy_broadcast(sockets, payload: dict):
+    """O broadcast antes das filas"""
+    for websocket in sockets:
+        await websocket.send_text(json.dumps(payload))
+
+
+async def run_legacy(args, sockets):
+    fast = [websocket for websocket in sockets if not websocket.delay]
+    start = time.perf_counter()
+    blocked = 0.0
+    for index in range(args.messages):
+        began = time.perf_counter()
+        await legacy_broadcast(sockets, message(index))
+        blocked = max(blocked, time.perf_counter() - began)
+    delivered = time.perf_counter() - start
+    print(f"{'antigo':<14} {blocked * 1000:>12.1f} {delivered * 1000:>14.0f} "
+          f"{sum(w.received for w in fast) / len(fast):>10.1f} {'-':>12}")
+
+
+async def run_queued(args, sockets, policy: str):
+    manager = ConnectionManager(queue_size=args.queue_size, policy=policy)
+    for index, websocket in enumerate(sockets):
+        await manager.connect(websocket, f"c{index}")
+    await asyncio.sleep(0.05)
+    for websocket in sockets:
+        websocket.received = 0
+    fast = [websocket for websocket in sockets if not websocket.delay]
+    start = time.perf_counter()
+    blocked = 0.0
+    for index in range(args.messages):
+        began = time.perf_counter()
+        await manager.broadcast(message(index))
+        blocked = max(blocked, time.perf_counter() - began)
+        # O emissor cede o loop entre mensagens, como um handler real
+        await asyncio.sleep(0)
+    while any(websocket.received < args.messages for websocket in fast):
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - start
+    stats = manager.get_stats()
+    slow = f"{stats['slow_disconnects']} desc." if policy == "disconnect" else f"{stats['dropped_messages']} desc. msg"
+    print(f"{'filas ' + policy:<14} {blocked * 1000:>12.1f} {delivered * 1000:>14.0f} "
+          f"{sum(w.received for w in fast) / len(fast):>10.1f} {slow:>12}")
+    await manager.shutdown()
+
+
+def sockets_for(args):
+    return [FakeWebSocket(args.slow_delay if index % (args.connections // max(args.slow, 1)) == 0 and args.slow
+                          else 0.0) for index in range(args.connections)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--slow", type=int, default=10, help="conexões lentas entre elas")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="segundos por envio nas lentas")
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--queue-size", type=int, default=8)
+    args = parser.parse_args()
+    logging.getLogger("core.websocket").setLevel(logging.ERROR)
+
+    print(f"{args.connections} conexões ({args.slow} lentas, {args.slow_delay * 1000:.0f} ms por envio), "
+          f"{args.messages} mensagens, fila de {args.queue_size}\n")
+    print(f"{'':<14} {'emissor (ms)':>12} {'entrega (ms)':>14} {'msgs/rápida':>10} {'lentas':>12}")
+    asyncio.run(run_legacy(args, sockets_for(args)))
+    for policy in ("disconnect", "drop_oldest"):
+        asyncio.run(run_queued(args, sockets_for(args), policy))
+
+
+if __name__ == "__main__":
+    main()
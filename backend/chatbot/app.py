@@ -79,13 +79,13 @@ class ChatbotService:
             
             # Buscar reservas ativas
             active_bookings = db.query(Booking).filter(
-                Booking.user_id == user_id,
+                Booking.customer_id == user_id,
                 Booking.status.in_(['confirmed', 'active'])
             ).all()
             
             # Buscar histórico de reservas
             booking_history = db.query(Booking).filter(
-                Booking.user_id == user_id
+                Booking.customer_id == user_id
             ).order_by(Booking.created_at.desc()).limit(5).all()
             
             return {
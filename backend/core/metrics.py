@@ -114,6 +114,25 @@ cache_requests_total = Counter(
     ['cache_type']
 )
 
+# Métricas de transcodificação de vídeo
+video_transcode_queue_depth = Gauge(
+    'video_transcode_queue_depth',
+    'Jobs de transcodificação aguardando ou em execução',
+    ['state']
+)
+
+video_transcode_jobs_total = Counter(
+    'video_transcode_jobs_total',
+    'Total de jobs de transcodificação finalizados',
+    ['status']
+)
+
+video_transcode_realtime_factor = Histogram(
+    'video_transcode_realtime_factor',
+    'Segundos de vídeo transcodificados por segundo de relógio',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0]
+)
+
 # Métricas de sistema
 system_cpu_usage_percent = Gauge(
     'system_cpu_usage_percent',
@@ -337,6 +356,17 @@ def record_cache_operation(cache_type: str, hit: bool):
     else:
         cache_misses_total.labels(cache_type=cache_type).inc()
 
+def record_video_transcode(status: str, realtime_factor: float = None):
+    """Registrar job de transcodificação finalizado"""
+    video_transcode_jobs_total.labels(status=status).inc()
+    if realtime_factor is not None:
+        video_transcode_realtime_factor.observe(realtime_factor)
+
+def set_video_transcode_queue_depth(queued: int, running: int):
+    """Atualizar profundidade da fila de transcodificação"""
+    video_transcode_queue_depth.labels(state="queued").set(queued)
+    video_transcode_queue_depth.labels(state="running").set(running)
+
 def record_gift_card_created():
     """Registrar gift card criado"""
     gift_cards_created_total.inc()
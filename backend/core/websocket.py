@@ -5,24 +5,74 @@ Onion RSV 360 - Core Service
 
 import json
 import asyncio
-from typing import Dict, Set, Optional
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Mensagens pendentes por conexão; acima disso vale a política para clientes lentos
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# disconnect: fecha a conexão do cliente lento (ele reconecta e recarrega o estado);
+# drop_oldest: descarta as mensagens mais antigas da fila e avisa quantas perdeu
+SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect")
+SLOW_CONSUMER_POLICIES = ("disconnect", "drop_oldest")
+# Código de fechamento para cliente lento ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Connection:
+    """Conexão com fila de envio própria, esvaziada por uma task escritora
+
+    Cada item da fila é [chave, texto]: mensagens com chave (estado que só
+    vale o último, ex.: contador de não lidas) substituem a pendente de mesma
+    chave em vez de ocupar outra posição.
+    """
+
+    __slots__ = ("connection_id", "user_id", "websocket", "queue", "keyed", "ready", "writer", "dropped")
+
+    def __init__(self, connection_id: str, user_id: Optional[str], websocket: WebSocket):
+        self.connection_id = connection_id
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: Deque[list] = deque()
+        self.keyed: Dict[str, list] = {}
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0  # mensagens descartadas ainda não avisadas ao cliente
+
+
 class ConnectionManager:
-    """Gerenciador de conexões WebSocket"""
+    """Gerenciador de conexões WebSocket
+
+    Envios não esperam o cliente: a mensagem é serializada uma vez e posta na
+    fila de cada destinatário (limitada a queue_size); a task escritora de cada
+    conexão a envia. Um cliente lento só atrasa a própria fila e, quando ela
+    enche, a política (disconnect ou drop_oldest) decide o que perder.
+    """
     
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(self, queue_size: int = SEND_QUEUE_SIZE, policy: str = SLOW_CONSUMER_POLICY):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Política inválida: {policy} (use {', '.join(SLOW_CONSUMER_POLICIES)})")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.active_connections: Dict[str, Connection] = {}
         self.user_connections: Dict[str, Set[str]] = {}  # user_id -> set of connection_ids
+        self._closing: Set[asyncio.Task] = set()
+        self.stats = {"sent": 0, "coalesced": 0, "dropped_messages": 0, "slow_disconnects": 0, "send_errors": 0}
         
     async def connect(self, websocket: WebSocket, connection_id: str, user_id: Optional[str] = None):
         """Conecta um novo cliente WebSocket"""
         await websocket.accept()
-        self.active_connections[connection_id] = websocket
+        if connection_id in self.active_connections:
+            # Reconexão com o mesmo id: a conexão anterior é encerrada
+            self._close(self.active_connections[connection_id], 1000)
+        connection = Connection(connection_id, user_id, websocket)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.active_connections[connection_id] = connection
         
         if user_id:
             if user_id not in self.user_connections:
@@ -38,10 +88,19 @@ class ConnectionManager:
             "timestamp": datetime.utcnow().isoformat()
         }, connection_id)
     
-    def disconnect(self, connection_id: str, user_id: Optional[str] = None):
-        """Desconecta um cliente WebSocket"""
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
+    def disconnect(self, connection_id: str, user_id: Optional[str] = None, websocket: Optional[WebSocket] = None):
+        """Desconecta um cliente WebSocket (a fila pendente é descartada)
+
+        Com websocket, só remove se a conexão registrada ainda for desse socket: após
+        uma reconexão com o mesmo id, o handler antigo não derruba a conexão nova.
+        """
+        connection = self.active_connections.get(connection_id)
+        if connection is None or (websocket is not None and connection.websocket is not websocket):
+            return
+        del self.active_connections[connection_id]
+        user_id = user_id or connection.user_id
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
         
         if user_id and user_id in self.user_connections:
             self.user_connections[user_id].discard(connection_id)
@@ -50,34 +109,94 @@ class ConnectionManager:
         
         logger.info(f"🔌 WebSocket desconectado: {connection_id} (user: {user_id})")
     
-    async def send_personal_message(self, message: dict, connection_id: str):
+    def _close(self, connection: Connection, code: int):
+        """Remove a conexão e fecha o socket em segundo plano"""
+        self.disconnect(connection.connection_id, websocket=connection.websocket)
+        task = asyncio.ensure_future(self._close_socket(connection.websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass  # o cliente já foi embora
+
+    async def _writer(self, connection: Connection):
+        """Envia a fila da conexão em ordem; erro de envio encerra a conexão"""
+        queue, ready, websocket = connection.queue, connection.ready, connection.websocket
+        try:
+            while True:
+                if not queue:
+                    ready.clear()
+                    await ready.wait()
+                    continue
+                if connection.dropped:
+                    dropped, connection.dropped = connection.dropped, 0
+                    await websocket.send_text(json.dumps({"type": "messages_dropped", "count": dropped}))
+                entry = queue.popleft()
+                if entry[0] is not None:
+                    del connection.keyed[entry[0]]
+                await websocket.send_text(entry[1])
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["send_errors"] += 1
+            logger.error(f"Erro ao enviar mensagem para {connection.connection_id}: {e}")
+            self.disconnect(connection.connection_id, websocket=connection.websocket)
+
+    def _enqueue(self, connection: Connection, text: str, key: Optional[str] = None) -> bool:
+        """Põe a mensagem na fila da conexão; False se a conexão foi encerrada por lentidão"""
+        if key is not None:
+            pending = connection.keyed.get(key)
+            if pending is not None:
+                pending[1] = text
+                self.stats["coalesced"] += 1
+                return True
+        queue = connection.queue
+        if len(queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                self.stats["slow_disconnects"] += 1
+                logger.warning(f"🐢 Cliente lento desconectado: {connection.connection_id} ({len(queue)} pendentes)")
+                self._close(connection, SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            oldest = queue.popleft()
+            if oldest[0] is not None:
+                del connection.keyed[oldest[0]]
+            connection.dropped += 1
+            self.stats["dropped_messages"] += 1
+        entry = [key, text]
+        queue.append(entry)
+        if key is not None:
+            connection.keyed[key] = entry
+        connection.ready.set()
+        return True
+
+    def _fan_out(self, text: str, connection_ids, key: Optional[str] = None) -> int:
+        connections = self.active_connections
+        targets = [connections[connection_id] for connection_id in connection_ids if connection_id in connections]
+        return sum(self._enqueue(connection, text, key) for connection in targets)
+    
+    async def send_personal_message(self, message: dict, connection_id: str, coalesce_key: Optional[str] = None):
         """Envia mensagem para uma conexão específica"""
-        if connection_id in self.active_connections:
-            try:
-                await self.active_connections[connection_id].send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Erro ao enviar mensagem para {connection_id}: {e}")
-                self.disconnect(connection_id)
+        connection = self.active_connections.get(connection_id)
+        if connection is not None:
+            self._enqueue(connection, json.dumps(message), coalesce_key)
     
-    async def send_to_user(self, message: dict, user_id: str):
+    async def send_to_user(self, message: dict, user_id: str, coalesce_key: Optional[str] = None):
         """Envia mensagem para todas as conexões de um usuário"""
         if user_id in self.user_connections:
-            for connection_id in self.user_connections[user_id].copy():
-                await self.send_personal_message(message, connection_id)
+            self._fan_out(json.dumps(message), list(self.user_connections[user_id]), coalesce_key)
     
-    async def broadcast(self, message: dict):
-        """Envia mensagem para todas as conexões ativas"""
-        disconnected = []
-        for connection_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Erro ao enviar broadcast para {connection_id}: {e}")
-                disconnected.append(connection_id)
-        
-        # Remove conexões desconectadas
-        for connection_id in disconnected:
-            self.disconnect(connection_id)
+    async def broadcast(self, message: dict, coalesce_key: Optional[str] = None) -> int:
+        """Envia mensagem para todas as conexões ativas; devolve quantas a receberam na fila
+
+        A mensagem é serializada uma vez; a chamada não espera os envios.
+        coalesce_key: uma mensagem pendente com a mesma chave é substituída por esta.
+        """
+        return self._fan_out(json.dumps(message), list(self.active_connections), coalesce_key)
     
     def get_connection_count(self) -> int:
         """Retorna o número de conexões ativas"""
@@ -87,6 +206,25 @@ class ConnectionManager:
         """Retorna o número de conexões de um usuário específico"""
         return len(self.user_connections.get(user_id, set()))
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Envios, mensagens agrupadas/descartadas e clientes lentos desconectados"""
+        queued: List[int] = [len(connection.queue) for connection in self.active_connections.values()]
+        return {
+            **self.stats,
+            "connections": len(queued),
+            "queued": sum(queued),
+            "max_queue": max(queued, default=0),
+            "queue_size": self.queue_size,
+            "policy": self.policy
+        }
+
+    async def shutdown(self):
+        """Encerra todas as conexões (desligamento do serviço)"""
+        for connection in list(self.active_connections.values()):
+            self._close(connection, 1001)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
 # Instância global do gerenciador de conexões
 manager = ConnectionManager()
 
@@ -253,7 +391,7 @@ async def websocket_endpoint(websocket: WebSocket, connection_id: str, user_id:
                     }, connection_id)
     
     except WebSocketDisconnect:
-        manager.disconnect(connection_id, user_id)
+        manager.disconnect(connection_id, user_id, websocket=websocket)
     except Exception as e:
         logger.error(f"Erro no WebSocket {connection_id}: {e}")
-        manager.disconnect(connection_id, user_id) 
\ No newline at end of file
+        manager.disconnect(connection_id, user_id, websocket=websocket) 
\ No newline at end of file
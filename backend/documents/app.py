@@ -1,20 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
 import os
-import shutil
 from datetime import datetime
-import uuid
 
-from backend.shared.config.database import get_db
+from backend.shared.config.database import get_db, engine
 from backend.shared.models.documents import Document as DocumentModel, DocumentVersion as DocumentVersionModel, DocumentAccess as DocumentAccessModel, DocumentTemplate as DocumentTemplateModel, DocumentSignature as DocumentSignatureModel
 from backend.shared.schemas import DocumentCreate, Document, DocumentVersionCreate, DocumentVersion, DocumentAccessCreate, DocumentAccess, DocumentTemplateCreate, DocumentTemplate, DocumentSignatureCreate, DocumentSignature
+from backend.shared.services.media_store import MediaStore
+from backend.shared.services.file_streaming import RangeFileResponse
+from backend.shared.services.stats_aggregator import StatsCache, aggregate, count_where
+from backend.shared.services.pagination import NEXT_CURSOR_HEADER, paginate
 
 app = FastAPI(title="Documents Service", version="1.0.0")
 
-# Create upload directory if it doesn't exist
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are stored in the shared content-addressed media store
+media_store = MediaStore(engine)
+
+# Short-lived cache for the aggregate stats endpoint
+stats_cache = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "30")))
 
 # Document endpoints
 @app.post("/documents/upload/", response_model=Document)
@@ -35,17 +40,11 @@ async def upload_document(
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    file_extension = os.path.splitext(file.filename)[1]
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
+    file_size = blob.size
     
     # Create document record
     document_data = {
@@ -67,21 +66,28 @@ async def upload_document(
     
     db_document = DocumentModel(**document_data)
     db.add(db_document)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        media_store.release(blob.sha256)
+        raise
     db.refresh(db_document)
     
     return db_document
 
 @app.get("/documents/", response_model=List[Document])
 def get_documents(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = None,
     document_type: str = None,
     uploaded_by: int = None,
     related_user_id: int = None,
     db: Session = Depends(get_db)
 ):
-    """Get documents with optional filters"""
+    """Get documents with optional filters (next page cursor in X-Next-Cursor)"""
     query = db.query(DocumentModel).filter(DocumentModel.status == "active")
     
     if document_type:
@@ -91,7 +97,11 @@ def get_documents(
     if related_user_id:
         query = query.filter(DocumentModel.related_user_id == related_user_id)
     
-    documents = query.offset(skip).limit(limit).all()
+    documents, next_cursor = paginate(
+        query, [DocumentModel.created_at, DocumentModel.id], cursor=cursor, limit=limit, skip=skip
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return documents
 
 @app.get("/documents/{document_id}", response_model=Document)
@@ -102,6 +112,23 @@ def get_document(document_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
+@app.get("/documents/{document_id}/download")
+def download_document(document_id: int, db: Session = Depends(get_db)):
+    """Download a document (supports Range and conditional requests)"""
+    document = db.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+    if not document or document.status == "deleted":
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Content-addressed blobs are named by their SHA-256, which doubles as a strong ETag
+    blob_name = os.path.basename(document.file_path)
+    return RangeFileResponse(
+        media_store.local_path(document.file_path),
+        media_type=document.mime_type,
+        filename=document.file_name,
+        etag=blob_name if len(blob_name) == 64 else None,
+        content_disposition_type="attachment"
+    )
+
 @app.put("/documents/{document_id}", response_model=Document)
 def update_document(document_id: int, document: DocumentCreate, db: Session = Depends(get_db)):
     """Update a document"""
@@ -109,8 +136,10 @@ def update_document(document_id: int, document: DocumentCreate, db: Session = De
     if not db_document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    # The file only changes through a new version
     for key, value in document.dict().items():
-        setattr(db_document, key, value)
+        if key not in ["file_path", "file_size"]:
+            setattr(db_document, key, value)
     
     db_document.updated_at = datetime.utcnow()
     db.commit()
@@ -121,13 +150,19 @@ def update_document(document_id: int, document: DocumentCreate, db: Session = De
 def delete_document(document_id: int, db: Session = Depends(get_db)):
     """Delete a document"""
     document = db.query(DocumentModel).filter(DocumentModel.id == document_id).first()
-    if not document:
+    if not document or document.status == "deleted":
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Soft delete
+    # Soft delete, then drop the references to the file and its versions
     document.status = "deleted"
     document.updated_at = datetime.utcnow()
     db.commit()
+    file_paths = [document.file_path] + [
+        version.file_path for version in
+        db.query(DocumentVersionModel.file_path).filter(DocumentVersionModel.document_id == document_id)
+    ]
+    for file_path in file_paths:
+        media_store.release_path(file_path)
     
     return {"message": "Document deleted successfully"}
 
@@ -153,17 +188,10 @@ async def create_document_version(
     
     version_number = (current_version.version_number + 1) if current_version else 1
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
+    file_size = blob.size
     
     # Create version record
     version_data = {
@@ -178,7 +206,12 @@ async def create_document_version(
     
     db_version = DocumentVersionModel(**version_data)
     db.add(db_version)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        media_store.release(blob.sha256)
+        raise
     db.refresh(db_version)
     
     return db_version
@@ -256,14 +289,9 @@ async def create_template(
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"template_{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
     
     template_data = {
         "name": name or file.filename,
@@ -276,7 +304,12 @@ async def create_template(
     
     db_template = DocumentTemplateModel(**template_data)
     db.add(db_template)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        media_store.release(blob.sha256)
+        raise
     db.refresh(db_template)
     return db_template
 
@@ -336,23 +369,33 @@ def get_document_signatures(document_id: int, db: Session = Depends(get_db)):
 @app.get("/stats/")
 def get_documents_stats(db: Session = Depends(get_db)):
     """Get documents system statistics"""
-    total_documents = db.query(DocumentModel).count()
-    active_documents = db.query(DocumentModel).filter(DocumentModel.status == "active").count()
-    total_templates = db.query(DocumentTemplateModel).count()
-    active_templates = db.query(DocumentTemplateModel).filter(DocumentTemplateModel.is_active == True).count()
-    total_signatures = db.query(DocumentSignatureModel).filter(DocumentSignatureModel.is_valid == True).count()
-    
-    # Calculate total storage used
-    total_storage = db.query(DocumentModel).with_entities(
-        db.func.sum(DocumentModel.file_size)
-    ).scalar() or 0
+    return stats_cache.get_or_compute("stats", lambda: _compute_documents_stats(db))
+
+def _compute_documents_stats(db: Session) -> dict:
+    # One conditional-aggregation query per table
+    documents = aggregate(
+        db, DocumentModel,
+        total_documents=func.count(),
+        active_documents=count_where(DocumentModel.status == "active"),
+        total_storage=func.coalesce(func.sum(DocumentModel.file_size), 0)
+    )
+    templates = aggregate(
+        db, DocumentTemplateModel,
+        total_templates=func.count(),
+        active_templates=count_where(DocumentTemplateModel.is_active == True)
+    )
+    signatures = aggregate(
+        db, DocumentSignatureModel,
+        total_signatures=count_where(DocumentSignatureModel.is_valid == True)
+    )
+    total_storage = documents["total_storage"]
     
     return {
-        "total_documents": total_documents,
-        "active_documents": active_documents,
-        "total_templates": total_templates,
-        "active_templates": active_templates,
-        "total_signatures": total_signatures,
+        "total_documents": documents["total_documents"],
+        "active_documents": documents["active_documents"],
+        "total_templates": templates["total_templates"],
+        "active_templates": templates["active_templates"],
+        "total_signatures": signatures["total_signatures"],
         "total_storage_bytes": total_storage,
         "total_storage_mb": round(total_storage / (1024 * 1024), 2)
     }
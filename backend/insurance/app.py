@@ -1,22 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
 import os
-import shutil
 from datetime import datetime, date
-import uuid
 import random
 import string
 
-from backend.shared.config.database import get_db
+from backend.shared.config.database import get_db, engine
 from backend.shared.models.insurance import InsuranceType as InsuranceTypeModel, InsurancePolicy as InsurancePolicyModel, InsuranceClaim as InsuranceClaimModel, InsurancePayment as InsurancePaymentModel, InsuranceDocument as InsuranceDocumentModel
 from backend.shared.schemas import InsuranceTypeCreate, InsuranceType, InsurancePolicyCreate, InsurancePolicy, InsuranceClaimCreate, InsuranceClaim, InsurancePaymentCreate, InsurancePayment, InsuranceDocumentCreate, InsuranceDocument
+from backend.shared.services.media_store import MediaStore
+from backend.shared.services.stats_aggregator import StatsCache, aggregate, count_where, sum_where
+from backend.shared.services.pagination import NEXT_CURSOR_HEADER, paginate
 
 app = FastAPI(title="Insurance Service", version="1.0.0")
 
-# Create upload directory if it doesn't exist
-UPLOAD_DIR = "insurance_documents"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are stored in the shared content-addressed media store
+media_store = MediaStore(engine)
+
+# Short-lived cache for the aggregate stats endpoint
+stats_cache = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "30")))
 
 def generate_policy_number():
     """Generate a unique policy number"""
@@ -104,13 +108,15 @@ def create_insurance_policy(policy: InsurancePolicyCreate, db: Session = Depends
 
 @app.get("/policies/", response_model=List[InsurancePolicy])
 def get_insurance_policies(
+    response: Response,
     user_id: int = None,
     status: str = None,
+    cursor: str = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db)
 ):
-    """Get insurance policies with optional filters"""
+    """Get insurance policies with optional filters (next page cursor in X-Next-Cursor)"""
     query = db.query(InsurancePolicyModel)
     
     if user_id:
@@ -118,7 +124,11 @@ def get_insurance_policies(
     if status:
         query = query.filter(InsurancePolicyModel.status == status)
     
-    policies = query.offset(skip).limit(limit).all()
+    policies, next_cursor = paginate(
+        query, [InsurancePolicyModel.created_at, InsurancePolicyModel.id], cursor=cursor, limit=limit, skip=skip
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return policies
 
 @app.get("/policies/{policy_id}", response_model=InsurancePolicy)
@@ -306,17 +316,10 @@ async def upload_insurance_document(
         if not claim:
             raise HTTPException(status_code=404, detail="Insurance claim not found")
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
+    file_size = blob.size
     
     document_data = {
         "policy_id": policy_id,
@@ -329,7 +332,12 @@ async def upload_insurance_document(
     
     db_document = InsuranceDocumentModel(**document_data)
     db.add(db_document)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        media_store.release(blob.sha256)
+        raise
     db.refresh(db_document)
     return db_document
 
@@ -348,31 +356,43 @@ def get_claim_documents(claim_id: int, db: Session = Depends(get_db)):
 @app.get("/stats/")
 def get_insurance_stats(db: Session = Depends(get_db)):
     """Get insurance system statistics"""
-    total_policies = db.query(InsurancePolicyModel).count()
-    active_policies = db.query(InsurancePolicyModel).filter(InsurancePolicyModel.status == "active").count()
-    total_claims = db.query(InsuranceClaimModel).count()
-    pending_claims = db.query(InsuranceClaimModel).filter(InsuranceClaimModel.status == "submitted").count()
-    approved_claims = db.query(InsuranceClaimModel).filter(InsuranceClaimModel.status == "approved").count()
-    paid_claims = db.query(InsuranceClaimModel).filter(InsuranceClaimModel.status == "paid").count()
-    
-    total_premiums = db.query(InsurancePaymentModel).filter(
-        InsurancePaymentModel.payment_type == "premium",
-        InsurancePaymentModel.payment_status == "completed"
-    ).with_entities(db.func.sum(InsurancePaymentModel.amount)).scalar() or 0
-    
-    total_claim_payments = db.query(InsuranceClaimModel).filter(
-        InsuranceClaimModel.status == "paid"
-    ).with_entities(db.func.sum(InsuranceClaimModel.approved_amount)).scalar() or 0
+    return stats_cache.get_or_compute("stats", lambda: _compute_insurance_stats(db))
+
+def _compute_insurance_stats(db: Session) -> dict:
+    # One conditional-aggregation query per table
+    policies = aggregate(
+        db, InsurancePolicyModel,
+        total_policies=func.count(),
+        active_policies=count_where(InsurancePolicyModel.status == "active")
+    )
+    claims = aggregate(
+        db, InsuranceClaimModel,
+        total_claims=func.count(),
+        pending_claims=count_where(InsuranceClaimModel.status == "submitted"),
+        approved_claims=count_where(InsuranceClaimModel.status == "approved"),
+        paid_claims=count_where(InsuranceClaimModel.status == "paid"),
+        total_claim_payments=sum_where(
+            InsuranceClaimModel.approved_amount, InsuranceClaimModel.status == "paid"
+        )
+    )
+    payments = aggregate(
+        db, InsurancePaymentModel,
+        total_premiums=sum_where(
+            InsurancePaymentModel.amount,
+            (InsurancePaymentModel.payment_type == "premium")
+            & (InsurancePaymentModel.payment_status == "completed")
+        )
+    )
     
     return {
-        "total_policies": total_policies,
-        "active_policies": active_policies,
-        "total_claims": total_claims,
-        "pending_claims": pending_claims,
-        "approved_claims": approved_claims,
-        "paid_claims": paid_claims,
-        "total_premiums": total_premiums,
-        "total_claim_payments": total_claim_payments
+        "total_policies": policies["total_policies"],
+        "active_policies": policies["active_policies"],
+        "total_claims": claims["total_claims"],
+        "pending_claims": claims["pending_claims"],
+        "approved_claims": claims["approved_claims"],
+        "paid_claims": claims["paid_claims"],
+        "total_premiums": payments["total_premiums"],
+        "total_claim_payments": claims["total_claim_payments"]
     }
 
 @app.get("/health/")
@@ -9,13 +9,19 @@ from shared.config.database import get_db, init_db
 from shared.models.maps import (
     MapLocation, MapRoute, MapArea, MapSearch, MapFavorite, MapReview
 )
+from shared.models.maps import MapLocation as MapLocationModel
+from shared.services.pagination import NEXT_CURSOR_HEADER, paginate
+from shared.services.fast_json import FastJSONResponse, RowSerializer
 from shared.schemas import (
     MapLocationCreate, MapLocation, MapRouteCreate, MapRoute,
     MapAreaCreate, MapArea, MapSearchCreate, MapSearch,
     MapFavoriteCreate, MapFavorite, MapReviewCreate, MapReview
 )
 
-app = FastAPI(title="Maps Service", version="1.0.0")
+app = FastAPI(title="Maps Service", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Listagens serializadas direto das linhas ORM, sem revalidar pelo response_model
+location_serializer = RowSerializer(MapLocation)
 
 # Inicializar banco de dados
 init_db()
@@ -61,26 +67,31 @@ def get_locations(
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: Optional[float] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db)
 ):
-    query = db.query(MapLocation).filter(MapLocation.is_active == True)
+    query = db.query(MapLocationModel).filter(MapLocationModel.is_active == True)
     
     if location_type:
-        query = query.filter(MapLocation.location_type == location_type)
+        query = query.filter(MapLocationModel.location_type == location_type)
     if category:
-        query = query.filter(MapLocation.category == category)
+        query = query.filter(MapLocationModel.category == category)
     if city:
-        query = query.filter(MapLocation.city == city)
+        query = query.filter(MapLocationModel.city == city)
     if country:
-        query = query.filter(MapLocation.country == country)
+        query = query.filter(MapLocationModel.country == country)
     if min_rating:
-        query = query.filter(MapLocation.rating >= min_rating)
+        query = query.filter(MapLocationModel.rating >= min_rating)
     if price_range:
-        query = query.filter(MapLocation.price_range == price_range)
+        query = query.filter(MapLocationModel.price_range == price_range)
     
-    locations = query.offset(skip).limit(limit).all()
+    # O cursor aponta para a última linha lida, antes do filtro por distância
+    locations, next_cursor = paginate(
+        query, [MapLocationModel.created_at, MapLocationModel.id], cursor=cursor, limit=limit, skip=skip
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     
     # Filtrar por distância se coordenadas fornecidas
     if latitude and longitude and radius_km:
@@ -91,7 +102,7 @@ def get_locations(
                 filtered_locations.append(location)
         locations = filtered_locations
     
-    return locations
+    return location_serializer.response(locations, headers=headers)
 
 @app.get("/locations/{location_id}", response_model=MapLocation)
 def get_location(location_id: int, db: Session = Depends(get_db)):
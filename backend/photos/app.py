@@ -1,25 +1,69 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 import json
+import logging
 import os
-import shutil
-from PIL import Image
 
-from shared.config.database import get_db, init_db
+from shared.config.database import get_db, init_db, SessionLocal, engine
 from shared.models.photos import (
-    Photo, PhotoAlbum, PhotoAlbumItem, PhotoView, 
-    PhotoLike, PhotoComment, PhotoDownload, PhotoShare
+    Photo as PhotoModel, PhotoView as PhotoViewModel, PhotoLike as PhotoLikeModel,
+    PhotoDownload as PhotoDownloadModel, PhotoAlbum as PhotoAlbumModel,
+    PhotoAlbumItem as PhotoAlbumItemModel, PhotoComment as PhotoCommentModel,
+    PhotoShare as PhotoShareModel
 )
+from shared.services.image_pipeline import (
+    DERIVATIVE_SIZES, MIME_TYPES, DerivativeWorkerPool, negotiate_format, read_image_info
+)
+from shared.services.media_store import MediaStore
+from shared.services.file_streaming import RangeFileResponse
+from shared.services.counter_buffer import CounterBuffer
+from shared.services.stats_aggregator import IncrementalRollup, StatsCache, aggregate, count_where
+from shared.services.pagination import NEXT_CURSOR_HEADER, paginate
+from shared.services.fast_json import FastJSONResponse, RowSerializer
+from shared.services.streaming_export import export_response, stream_query
 from shared.schemas import (
     PhotoCreate, Photo, PhotoAlbumCreate, PhotoAlbum,
-    PhotoAlbumItemCreate, PhotoAlbumItem, PhotoViewCreate, PhotoView,
-    PhotoLikeCreate, PhotoLike, PhotoCommentCreate, PhotoComment,
-    PhotoDownloadCreate, PhotoDownload, PhotoShareCreate, PhotoShare
+    PhotoViewCreate, PhotoCommentCreate, PhotoComment,
+    PhotoDownloadCreate, PhotoShareCreate, PhotoShare
+)
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Photos Service", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Originais endereçados por conteúdo (deduplicados entre serviços)
+media_store = MediaStore(engine)
+
+# Visualizações/likes/downloads: contadores write-behind, eventos em lote
+counter_buffer = CounterBuffer(
+    engine,
+    models=[PhotoModel, PhotoViewModel, PhotoDownloadModel],
+    namespace="photos:counters",
+    flush_interval=float(os.getenv("COUNTER_FLUSH_INTERVAL", "2.0"))
+)
+
+# Derivados (thumbnail/medium/large) são gerados fora do event loop, em processos
+derivative_pool = DerivativeWorkerPool(
+    max_workers=int(os.getenv("PHOTO_DERIVATIVE_WORKERS", "0")) or None
 )
 
-app = FastAPI(title="Photos Service", version="1.0.0")
+# Estatísticas: cache curto e rollups incrementais das tabelas de eventos
+stats_cache = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "30")))
+views_rollup = IncrementalRollup(engine, "photo_views", PhotoViewModel)
+downloads_rollup = IncrementalRollup(engine, "photo_downloads", PhotoDownloadModel)
+shares_rollup = IncrementalRollup(engine, "photo_shares", PhotoShareModel)
+
+# Derivados têm o hash do conteúdo no nome: podem ser cacheados para sempre
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+NEGOTIATED_CACHE_CONTROL = "public, max-age=86400"
+MEDIA_DIRECTORIES = {directory for _, _, directory in DERIVATIVE_SIZES.values()}
+
+# Listagens serializadas direto das linhas ORM, sem revalidar pelo response_model
+photo_serializer = RowSerializer(Photo)
 
 # Inicializar banco de dados
 init_db()
@@ -32,52 +76,76 @@ async def startup_event():
     os.makedirs("thumbnails", exist_ok=True)
     os.makedirs("medium", exist_ok=True)
     os.makedirs("large", exist_ok=True)
+    counter_buffer.start()
+    media_store.start_collector(
+        interval=float(os.getenv("MEDIA_GC_INTERVAL", "3600")),
+        grace_seconds=int(os.getenv("MEDIA_GC_GRACE_SECONDS", "3600"))
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    derivative_pool.shutdown()
+    counter_buffer.stop()
+    media_store.stop_collector()
+
+# Status que não aparecem nas listagens (upload com erro ou foto deletada)
+HIDDEN_STATUSES = ("failed", "deleted")
 
-# Helper function para criar thumbnails
-def create_thumbnails(file_path: str, filename: str):
+def _photo_exists(db: Session, photo_id: int) -> bool:
+    return db.query(PhotoModel.id).filter(PhotoModel.id == photo_id).first() is not None
+
+def _set_derivative_status(photo_id: int, status: str, derivatives: Optional[Dict[str, Dict[str, str]]]):
+    """Atualiza o status e o manifesto de derivados no registro da foto"""
+    db = SessionLocal()
+    try:
+        photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
+        if photo is None or photo.upload_status == "deleted":
+            return
+        photo.upload_status = status
+        if derivatives:
+            photo.derivatives = json.dumps(derivatives)
+            thumbnail = derivatives.get("thumbnail", {})
+            photo.thumbnail_url = media_url(next(
+                (path for fmt, path in thumbnail.items() if fmt not in ("avif", "webp")),
+                None
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+def media_url(file_path: Optional[str]) -> Optional[str]:
+    return f"/media/{file_path}" if file_path else None
+
+def _load_manifest(photo) -> Dict[str, Dict[str, str]]:
+    """Manifesto {tamanho: {formato: caminho}} dos derivados já gerados"""
+    if photo.upload_status != "completed" or not photo.derivatives:
+        return {}
+    return json.loads(photo.derivatives)
+
+# Helper para criar thumbnails em background
+async def create_thumbnails(photo_id: int, file_path: str, filename: str):
     """Criar versões em diferentes tamanhos da imagem"""
     try:
-        with Image.open(file_path) as img:
-            # Thumbnail (150x150)
-            thumb = img.copy()
-            thumb.thumbnail((150, 150))
-            thumb_path = f"thumbnails/{filename}"
-            thumb.save(thumb_path, quality=85)
-            
-            # Medium (800x800)
-            medium = img.copy()
-            medium.thumbnail((800, 800))
-            medium_path = f"medium/{filename}"
-            medium.save(medium_path, quality=90)
-            
-            # Large (1920x1920)
-            large = img.copy()
-            large.thumbnail((1920, 1920))
-            large_path = f"large/{filename}"
-            large.save(large_path, quality=95)
-            
-            return {
-                "thumbnail": thumb_path,
-                "medium": medium_path,
-                "large": large_path
-            }
+        derivatives = await derivative_pool.generate(file_path, filename)
+        status = "completed"
     except Exception as e:
-        print(f"Erro ao criar thumbnails: {e}")
-        return None
+        logger.error(f"Erro ao criar thumbnails da foto {photo_id}: {e}")
+        derivatives = None
+        status = "failed"
+    
+    await run_in_threadpool(_set_derivative_status, photo_id, status, derivatives)
 
 # Endpoints para Fotos
 @app.post("/photos/upload/")
 async def upload_photo(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Query(...),
     description: Optional[str] = Query(None),
-    photo_type: str = Query(...),
-    category: Optional[str] = Query(None),
     tags: Optional[str] = Query(None),
     is_public: bool = Query(True),
     uploaded_by: int = Query(...),
-    related_location_id: Optional[int] = Query(None),
-    related_booking_id: Optional[int] = Query(None),
+    album_id: Optional[int] = Query(None),
     db: Session = Depends(get_db)
 ):
     # Validar tipo de arquivo
@@ -86,102 +154,205 @@ async def upload_photo(
     if file_extension not in allowed_formats:
         raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
     
-    # Salvar arquivo original
-    file_path = f"uploads/{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Salvar arquivo original (em blocos, endereçado pelo SHA-256)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
+    local_path = await run_in_threadpool(media_store.local_path, file_path)
     
-    # Obter informações da imagem
+    # Obter informações da imagem (somente cabeçalho)
     try:
-        with Image.open(file_path) as img:
-            width, height = img.size
-            format = img.format.lower()
-    except Exception as e:
+        width, height, format = await run_in_threadpool(read_image_info, local_path)
+    except Exception:
+        await run_in_threadpool(media_store.release, blob.sha256)
         raise HTTPException(status_code=400, detail="Arquivo de imagem inválido")
     
-    # Obter tamanho do arquivo
-    file_size = os.path.getsize(file_path)
-    
-    # Criar thumbnails
-    thumbnails = create_thumbnails(file_path, os.path.basename(file_path))
-    
-    # Criar registro no banco
+    # Criar registro no banco; photo_url guarda a chave do original no media store
     photo_data = {
         "title": title,
         "description": description,
-        "file_name": file.filename,
-        "file_path": file_path,
-        "file_size": file_size,
+        "photo_url": file_path,
+        "original_filename": file.filename,
+        "file_size_mb": round(blob.size / (1024 * 1024), 3),
         "width": width,
         "height": height,
         "format": format,
-        "photo_type": photo_type,
-        "category": category,
         "tags": tags,
         "is_public": is_public,
-        "uploaded_by": uploaded_by,
-        "related_location_id": related_location_id,
-        "related_booking_id": related_booking_id
+        "user_id": uploaded_by,
+        "album_id": album_id,
+        "upload_status": "processing"
     }
     
-    db_photo = Photo(**photo_data)
+    # Conteúdo já enviado antes: reaproveita os derivados existentes
+    existing = None
+    if blob.deduplicated:
+        existing = db.query(PhotoModel).filter(
+            PhotoModel.photo_url == file_path,
+            PhotoModel.upload_status == "completed",
+            PhotoModel.derivatives.isnot(None)
+        ).first()
+    if existing is not None:
+        photo_data["upload_status"] = "completed"
+        photo_data["derivatives"] = existing.derivatives
+        photo_data["thumbnail_url"] = existing.thumbnail_url
+    
+    db_photo = PhotoModel(**photo_data)
     db.add(db_photo)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        await run_in_threadpool(media_store.release, blob.sha256)
+        raise
     db.refresh(db_photo)
     
+    # Criar thumbnails após a resposta, no pool de processos
+    if existing is None:
+        background_tasks.add_task(create_thumbnails, db_photo.id, local_path, blob.sha256)
+    
     return {
         "id": db_photo.id,
         "title": db_photo.title,
-        "file_path": db_photo.file_path,
-        "thumbnails": thumbnails,
+        "photo_url": db_photo.photo_url,
+        "sha256": blob.sha256,
+        "deduplicated": blob.deduplicated,
+        "derivatives_url": f"/photos/{db_photo.id}/derivatives",
+        "derivatives_status": db_photo.upload_status,
         "message": "Foto enviada com sucesso"
     }
 
 @app.get("/photos/", response_model=List[Photo])
 def get_photos(
-    photo_type: Optional[str] = None,
-    category: Optional[str] = None,
     is_public: Optional[bool] = None,
     is_featured: Optional[bool] = None,
     uploaded_by: Optional[int] = None,
-    related_location_id: Optional[int] = None,
+    album_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Photo).filter(Photo.is_approved == True)
+    """Lista fotos; use o cursor do header X-Next-Cursor para a próxima página"""
+    query = db.query(PhotoModel).filter(PhotoModel.upload_status.notin_(HIDDEN_STATUSES))
     
-    if photo_type:
-        query = query.filter(Photo.photo_type == photo_type)
-    if category:
-        query = query.filter(Photo.category == category)
     if is_public is not None:
-        query = query.filter(Photo.is_public == is_public)
+        query = query.filter(PhotoModel.is_public == is_public)
     if is_featured is not None:
-        query = query.filter(Photo.is_featured == is_featured)
+        query = query.filter(PhotoModel.is_featured == is_featured)
     if uploaded_by:
-        query = query.filter(Photo.uploaded_by == uploaded_by)
-    if related_location_id:
-        query = query.filter(Photo.related_location_id == related_location_id)
+        query = query.filter(PhotoModel.user_id == uploaded_by)
+    if album_id:
+        query = query.filter(PhotoModel.album_id == album_id)
     
-    photos = query.order_by(Photo.created_at.desc()).offset(skip).limit(limit).all()
-    return photos
+    photos, next_cursor = paginate(
+        query, [PhotoModel.created_at, PhotoModel.id], cursor=cursor, limit=limit, skip=skip
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return photo_serializer.response(photos, headers=headers)
+
+@app.get("/photos/export")
+def export_photos(
+    formato: str = Query("ndjson", description="ndjson ou csv"),
+    is_public: Optional[bool] = None,
+    uploaded_by: Optional[int] = None
+):
+    """Exporta todas as fotos em streaming (cursor no servidor, memória limitada)"""
+    columns = [getattr(PhotoModel, field) for field in photo_serializer.fields]
+    statement = select(*columns).where(PhotoModel.upload_status.notin_(HIDDEN_STATUSES)).order_by(PhotoModel.id)
+    if is_public is not None:
+        statement = statement.where(PhotoModel.is_public == is_public)
+    if uploaded_by:
+        statement = statement.where(PhotoModel.user_id == uploaded_by)
+    return export_response(
+        stream_query(SessionLocal, statement), formato, "photos", fields=photo_serializer.fields
+    )
 
 @app.get("/photos/{photo_id}", response_model=Photo)
 def get_photo(photo_id: int, db: Session = Depends(get_db)):
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     return photo
 
+@app.get("/photos/{photo_id}/derivatives")
+def get_photo_derivatives(photo_id: int, db: Session = Depends(get_db)):
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    
+    manifest = _load_manifest(photo)
+    return {
+        "photo_id": photo_id,
+        "status": photo.upload_status,
+        "derivatives": {
+            size: {fmt: media_url(path) for fmt, path in variants.items()}
+            for size, variants in manifest.items()
+        },
+        "queue": derivative_pool.get_stats()
+    }
+
+@app.get("/photos/{photo_id}/image/{size}")
+def get_photo_image(photo_id: int, size: str, request: Request, db: Session = Depends(get_db)):
+    """Serve o derivado no melhor formato aceito pelo cliente (AVIF/WebP/base)"""
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    
+    variants = _load_manifest(photo).get(size)
+    if not variants:
+        raise HTTPException(status_code=404, detail="Derivado não disponível")
+    
+    fmt = negotiate_format(request.headers.get("accept"), list(variants))
+    return RangeFileResponse(
+        variants[fmt],
+        media_type=MIME_TYPES[fmt],
+        etag=os.path.basename(variants[fmt]).split(".")[-2],
+        headers={"Cache-Control": NEGOTIATED_CACHE_CONTROL, "Vary": "Accept"}
+    )
+
+@app.get("/media/{file_path:path}")
+def get_media(file_path: str):
+    """Serve derivados endereçados por conteúdo com cache imutável"""
+    directory, _, name = file_path.partition("/")
+    if directory not in MEDIA_DIRECTORIES or not name or "/" in name or name.startswith("."):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    
+    extension = name.rsplit(".", 1)[-1]
+    fmt = "jpeg" if extension == "jpg" else extension
+    return RangeFileResponse(
+        file_path,
+        media_type=MIME_TYPES.get(fmt, "application/octet-stream"),
+        etag=name.split(".")[-2] if name.count(".") >= 2 else None,
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    )
+
+@app.get("/photos/{photo_id}/original")
+def get_photo_original(photo_id: int, db: Session = Depends(get_db)):
+    """Download do arquivo original (com suporte a Range)"""
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
+    if photo is None or photo.upload_status == "deleted":
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    
+    # Originais endereçados por conteúdo: o SHA-256 é o nome do blob e serve de ETag
+    blob_name = os.path.basename(photo.photo_url)
+    return RangeFileResponse(
+        media_store.local_path(photo.photo_url),
+        filename=photo.original_filename or f"photo-{photo.id}.{photo.format or 'jpg'}",
+        etag=blob_name if len(blob_name) == 64 else None,
+        content_disposition_type="attachment"
+    )
+
 @app.put("/photos/{photo_id}", response_model=Photo)
 def update_photo(photo_id: int, photo: PhotoCreate, db: Session = Depends(get_db)):
-    db_photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    db_photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if db_photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
+    # Arquivo e derivados só mudam por upload
     for key, value in photo.dict().items():
-        if key not in ["file_name", "file_path", "file_size", "width", "height", "format"]:
+        if key not in ["photo_url", "thumbnail_url", "original_filename", "file_size_mb", "width", "height", "format"]:
             setattr(db_photo, key, value)
     
     db_photo.updated_at = datetime.utcnow()
@@ -191,20 +362,21 @@ def update_photo(photo_id: int, photo: PhotoCreate, db: Session = Depends(get_db
 
 @app.delete("/photos/{photo_id}")
 def delete_photo(photo_id: int, db: Session = Depends(get_db)):
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo is None:
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
+    if photo is None or photo.upload_status == "deleted":
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
-    # Marcar como não aprovada (soft delete)
-    photo.is_approved = False
+    # Marcar como deletada (soft delete) e liberar a referência ao original
+    photo.upload_status = "deleted"
     photo.updated_at = datetime.utcnow()
     db.commit()
+    media_store.release_path(photo.photo_url)
     
     return {"message": "Foto deletada com sucesso"}
 
 @app.put("/photos/{photo_id}/feature")
 def toggle_featured(photo_id: int, db: Session = Depends(get_db)):
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
@@ -217,7 +389,7 @@ def toggle_featured(photo_id: int, db: Session = Depends(get_db)):
 # Endpoints para Álbuns
 @app.post("/albums/", response_model=PhotoAlbum)
 def create_album(album: PhotoAlbumCreate, db: Session = Depends(get_db)):
-    db_album = PhotoAlbum(**album.dict())
+    db_album = PhotoAlbumModel(**album.dict())
     db.add(db_album)
     db.commit()
     db.refresh(db_album)
@@ -225,7 +397,6 @@ def create_album(album: PhotoAlbumCreate, db: Session = Depends(get_db)):
 
 @app.get("/albums/", response_model=List[PhotoAlbum])
 def get_albums(
-    album_type: Optional[str] = None,
     is_public: Optional[bool] = None,
     is_featured: Optional[bool] = None,
     created_by: Optional[int] = None,
@@ -233,23 +404,21 @@ def get_albums(
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    query = db.query(PhotoAlbum)
+    query = db.query(PhotoAlbumModel)
     
-    if album_type:
-        query = query.filter(PhotoAlbum.album_type == album_type)
     if is_public is not None:
-        query = query.filter(PhotoAlbum.is_public == is_public)
+        query = query.filter(PhotoAlbumModel.is_public == is_public)
     if is_featured is not None:
-        query = query.filter(PhotoAlbum.is_featured == is_featured)
+        query = query.filter(PhotoAlbumModel.is_featured == is_featured)
     if created_by:
-        query = query.filter(PhotoAlbum.created_by == created_by)
+        query = query.filter(PhotoAlbumModel.user_id == created_by)
     
-    albums = query.order_by(PhotoAlbum.created_at.desc()).offset(skip).limit(limit).all()
+    albums = query.order_by(PhotoAlbumModel.created_at.desc()).offset(skip).limit(limit).all()
     return albums
 
 @app.get("/albums/{album_id}", response_model=PhotoAlbum)
 def get_album(album_id: int, db: Session = Depends(get_db)):
-    album = db.query(PhotoAlbum).filter(PhotoAlbum.id == album_id).first()
+    album = db.query(PhotoAlbumModel).filter(PhotoAlbumModel.id == album_id).first()
     if album is None:
         raise HTTPException(status_code=404, detail="Álbum não encontrado")
     return album
@@ -259,40 +428,38 @@ def add_photo_to_album(
     album_id: int,
     photo_id: int,
     position: Optional[int] = None,
-    added_by: int = Query(...),
     db: Session = Depends(get_db)
 ):
     # Verificar se álbum existe
-    album = db.query(PhotoAlbum).filter(PhotoAlbum.id == album_id).first()
+    album = db.query(PhotoAlbumModel).filter(PhotoAlbumModel.id == album_id).first()
     if album is None:
         raise HTTPException(status_code=404, detail="Álbum não encontrado")
     
     # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     # Se posição não especificada, adicionar no final
     if position is None:
-        last_item = db.query(PhotoAlbumItem).filter(
-            PhotoAlbumItem.album_id == album_id
-        ).order_by(PhotoAlbumItem.position.desc()).first()
+        last_item = db.query(PhotoAlbumItemModel).filter(
+            PhotoAlbumItemModel.album_id == album_id
+        ).order_by(PhotoAlbumItemModel.position.desc()).first()
         position = (last_item.position + 1) if last_item else 1
     
     # Verificar se foto já está no álbum
-    existing_item = db.query(PhotoAlbumItem).filter(
-        PhotoAlbumItem.album_id == album_id,
-        PhotoAlbumItem.photo_id == photo_id
+    existing_item = db.query(PhotoAlbumItemModel).filter(
+        PhotoAlbumItemModel.album_id == album_id,
+        PhotoAlbumItemModel.photo_id == photo_id
     ).first()
     
     if existing_item:
         raise HTTPException(status_code=400, detail="Foto já está no álbum")
     
-    album_item = PhotoAlbumItem(
+    album_item = PhotoAlbumItemModel(
         album_id=album_id,
         photo_id=photo_id,
-        position=position,
-        added_by=added_by
+        position=position
     )
     db.add(album_item)
     db.commit()
@@ -301,23 +468,23 @@ def add_photo_to_album(
 
 @app.get("/albums/{album_id}/photos")
 def get_album_photos(album_id: int, db: Session = Depends(get_db)):
-    album = db.query(PhotoAlbum).filter(PhotoAlbum.id == album_id).first()
+    album = db.query(PhotoAlbumModel).filter(PhotoAlbumModel.id == album_id).first()
     if album is None:
         raise HTTPException(status_code=404, detail="Álbum não encontrado")
     
-    album_items = db.query(PhotoAlbumItem).filter(
-        PhotoAlbumItem.album_id == album_id
-    ).order_by(PhotoAlbumItem.position).all()
+    album_items = db.query(PhotoAlbumItemModel).filter(
+        PhotoAlbumItemModel.album_id == album_id
+    ).order_by(PhotoAlbumItemModel.position).all()
     
     photos = []
     for item in album_items:
-        photo = db.query(Photo).filter(Photo.id == item.photo_id).first()
-        if photo and photo.is_approved:
+        photo = db.query(PhotoModel).filter(PhotoModel.id == item.photo_id).first()
+        if photo:
             photos.append({
                 "id": photo.id,
                 "title": photo.title,
                 "description": photo.description,
-                "file_path": photo.file_path,
+                "photo_url": photo.photo_url,
                 "width": photo.width,
                 "height": photo.height,
                 "view_count": photo.view_count,
@@ -339,22 +506,17 @@ def record_photo_view(
     view: PhotoViewCreate,
     db: Session = Depends(get_db)
 ):
-    # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo is None:
+    # Verificar se foto existe (somente a chave primária, sem bloquear a linha)
+    if not _photo_exists(db, photo_id):
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
-    # Criar registro de visualização
+    # Registro de visualização e contador são persistidos em lote pelo flush
     view_data = view.dict()
     view_data["photo_id"] = photo_id
+    view_data["viewed_at"] = datetime.utcnow()
     
-    db_view = PhotoView(**view_data)
-    db.add(db_view)
-    
-    # Incrementar contador de visualizações
-    photo.view_count += 1
-    
-    db.commit()
+    counter_buffer.add_event(PhotoViewModel, view_data)
+    counter_buffer.incr(PhotoModel, photo_id, "view_count")
     
     return {"message": "Visualização registrada com sucesso"}
 
@@ -366,33 +528,35 @@ def like_photo(
     db: Session = Depends(get_db)
 ):
     # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo is None:
+    if not _photo_exists(db, photo_id):
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     # Verificar se já existe like do usuário
-    existing_like = db.query(PhotoLike).filter(
-        PhotoLike.photo_id == photo_id,
-        PhotoLike.user_id == user_id
+    existing_like = db.query(PhotoLikeModel).filter(
+        PhotoLikeModel.photo_id == photo_id,
+        PhotoLikeModel.user_id == user_id
     ).first()
     
     if existing_like:
         # Remover like
         db.delete(existing_like)
-        photo.like_count -= 1
+        delta = -1
         message = "Like removido"
     else:
         # Adicionar like
-        new_like = PhotoLike(
+        new_like = PhotoLikeModel(
             photo_id=photo_id,
             user_id=user_id
         )
         db.add(new_like)
-        photo.like_count += 1
+        delta = 1
         message = "Like adicionado"
     
     db.commit()
     
+    # A linha da foto só é atualizada no flush em lote
+    counter_buffer.incr(PhotoModel, photo_id, "like_count", delta)
+    
     return {"message": message}
 
 # Endpoints para Comentários
@@ -403,14 +567,14 @@ def create_comment(
     db: Session = Depends(get_db)
 ):
     # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     comment_data = comment.dict()
     comment_data["photo_id"] = photo_id
     
-    db_comment = PhotoComment(**comment_data)
+    db_comment = PhotoCommentModel(**comment_data)
     db.add(db_comment)
     db.commit()
     db.refresh(db_comment)
@@ -423,11 +587,10 @@ def get_photo_comments(
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    comments = db.query(PhotoComment).filter(
-        PhotoComment.photo_id == photo_id,
-        PhotoComment.is_approved == True,
-        PhotoComment.parent_comment_id == None
-    ).order_by(PhotoComment.created_at.desc()).offset(skip).limit(limit).all()
+    comments = db.query(PhotoCommentModel).filter(
+        PhotoCommentModel.photo_id == photo_id,
+        PhotoCommentModel.parent_comment_id == None
+    ).order_by(PhotoCommentModel.created_at.desc()).offset(skip).limit(limit).all()
     return comments
 
 # Endpoints para Downloads
@@ -438,47 +601,63 @@ def record_photo_download(
     db: Session = Depends(get_db)
 ):
     # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo is None:
+    if not _photo_exists(db, photo_id):
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     download_data = download.dict()
     download_data["photo_id"] = photo_id
+    download_data["downloaded_at"] = datetime.utcnow()
     
-    db_download = PhotoDownload(**download_data)
-    db.add(db_download)
-    
-    # Incrementar contador de downloads
-    photo.download_count += 1
-    
-    db.commit()
+    # Registro de download e contador são persistidos em lote pelo flush
+    counter_buffer.add_event(PhotoDownloadModel, download_data)
+    counter_buffer.incr(PhotoModel, photo_id, "download_count")
     
     return {"message": "Download registrado com sucesso"}
 
 @app.get("/photos/{photo_id}/download/{size}")
-def get_photo_download_url(photo_id: int, size: str, db: Session = Depends(get_db)):
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+def get_photo_download_url(
+    photo_id: int,
+    size: str,
+    request: Request,
+    format: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    photo = db.query(PhotoModel).filter(PhotoModel.id == photo_id).first()
     if photo is None:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
+    # Derivados endereçados por conteúdo: formato explícito ou negociado pelo Accept
+    variants = _load_manifest(photo).get(size)
+    if variants:
+        if format not in variants:
+            format = negotiate_format(request.headers.get("accept"), list(variants))
+        return {
+            "photo_id": photo_id,
+            "size": size,
+            "format": format,
+            "file_path": variants[format],
+            "download_url": media_url(variants[format]),
+            "variants": {fmt: media_url(path) for fmt, path in variants.items()}
+        }
+    
     # Determinar caminho baseado no tamanho solicitado
     if size == "thumbnail":
-        file_path = f"thumbnails/{os.path.basename(photo.file_path)}"
+        file_path = f"thumbnails/{os.path.basename(photo.photo_url)}"
     elif size == "medium":
-        file_path = f"medium/{os.path.basename(photo.file_path)}"
+        file_path = f"medium/{os.path.basename(photo.photo_url)}"
     elif size == "large":
-        file_path = f"large/{os.path.basename(photo.file_path)}"
+        file_path = f"large/{os.path.basename(photo.photo_url)}"
     else:
-        file_path = photo.file_path  # Original
+        file_path = photo.photo_url  # Original
     
     if not os.path.exists(file_path):
-        file_path = photo.file_path  # Fallback para original
+        file_path = photo.photo_url  # Fallback para original
     
     return {
         "photo_id": photo_id,
         "size": size,
         "file_path": file_path,
-        "download_url": f"/download/{file_path}"
+        "download_url": f"/photos/{photo_id}/original" if file_path == photo.photo_url else media_url(file_path)
     }
 
 # Endpoints para Compartilhamentos
@@ -489,43 +668,58 @@ def share_photo(
     db: Session = Depends(get_db)
 ):
     # Verificar se foto existe
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo is None:
+    if not _photo_exists(db, photo_id):
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     share_data = share.dict()
     share_data["photo_id"] = photo_id
     
-    db_share = PhotoShare(**share_data)
+    db_share = PhotoShareModel(**share_data)
     db.add(db_share)
     db.commit()
     db.refresh(db_share)
+    
+    counter_buffer.incr(PhotoModel, photo_id, "share_count")
     return db_share
 
 # Endpoints de Estatísticas
+@app.get("/counters/stats")
+def get_counter_stats():
+    """Estatísticas do flush de contadores write-behind"""
+    return counter_buffer.get_stats()
+
 @app.get("/stats/")
 def get_stats(db: Session = Depends(get_db)):
-    total_photos = db.query(Photo).filter(Photo.is_approved == True).count()
-    total_albums = db.query(PhotoAlbum).count()
-    total_views = db.query(PhotoView).count()
-    total_likes = db.query(PhotoLike).count()
-    total_comments = db.query(PhotoComment).filter(PhotoComment.is_approved == True).count()
-    total_downloads = db.query(PhotoDownload).count()
-    total_shares = db.query(PhotoShare).count()
+    return stats_cache.get_or_compute("stats", lambda: _compute_stats(db))
+
+def _compute_stats(db: Session) -> dict:
+    # Uma consulta de agregação condicional por tabela; eventos via rollup incremental
+    photos = aggregate(
+        db, PhotoModel,
+        total_photos=func.count(),
+        public_photos=count_where(PhotoModel.is_public == True),
+        featured_photos=count_where(PhotoModel.is_featured == True),
+        completed_photos=count_where(PhotoModel.upload_status == "completed")
+    )
+    total_albums = db.query(func.count(PhotoAlbumModel.id)).scalar()
+    total_likes = db.query(func.count(PhotoLikeModel.id)).scalar()
+    total_comments = db.query(func.count(PhotoCommentModel.id)).scalar()
     
     # Fotos mais populares
-    popular_photos = db.query(Photo).filter(
-        Photo.is_approved == True
-    ).order_by(Photo.view_count.desc()).limit(5).all()
+    popular_photos = db.query(
+        PhotoModel.id, PhotoModel.title, PhotoModel.view_count, PhotoModel.like_count
+    ).filter(
+        PhotoModel.is_public == True
+    ).order_by(PhotoModel.view_count.desc()).limit(5).all()
     
     return {
-        "total_photos": total_photos,
+        **photos,
         "total_albums": total_albums,
-        "total_views": total_views,
+        "total_views": views_rollup.get().get("total", 0),
         "total_likes": total_likes,
         "total_comments": total_comments,
-        "total_downloads": total_downloads,
-        "total_shares": total_shares,
+        "total_downloads": downloads_rollup.get().get("total", 0),
+        "total_shares": shares_rollup.get().get("total", 0),
         "popular_photos": [
             {
                 "id": photo.id,
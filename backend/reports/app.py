@@ -1,288 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-import json
-import csv
-import io
 import os
 from datetime import datetime, timedelta
-import asyncio
-from pathlib import Path
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.config.database import get_db
-from shared.models.reports import Report, ReportTemplate, ReportSchedule
+from shared.config.database import get_db, init_db, SessionLocal
+from shared.models.reports import Report, ReportExecution, ReportTemplate, ReportSchedule
+from shared.services.stats_aggregator import StatsCache, aggregate, count_where
+from shared.services.pagination import NEXT_CURSOR_HEADER, paginate
+from shared.services.report_writers import PDF_MEDIA_TYPE, XLSX_MEDIA_TYPE, iter_pdf, iter_xlsx
+from shared.services.streaming_export import EXPORT_MEDIA_TYPES, export_response, stream_query
 from shared.schemas import (
     ReportCreate, ReportResponse, ReportTemplateCreate, 
-    ReportScheduleCreate, ReportFilter, ReportExport
+    ReportScheduleCreate, ReportScheduleResponse, ReportExecutionResponse, ReportFilter, ReportExport
 )
 
+# A geração roda no worker (worker.py); a API só enfileira
+from generation import DEFAULT_TEMPLATES, REPORT_FILES, link_file, report_file
+from jobs import queue_metrics, schedule_cron
+import cache
+
 app = FastAPI(title="Reports Service", version="1.0.0")
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "reports", "version": "1.0.0"}
 
-# Configuração de diretórios
-REPORTS_DIR = Path("reports")
-REPORTS_DIR.mkdir(exist_ok=True)
+REPORT_CATEGORIES = ["financial", "marketing", "sales", "analytics", "operational"]
 
-# Templates de relatórios disponíveis
-DEFAULT_TEMPLATES = [
-    {
-        "id": "financial-summary",
-        "name": "Relatório Financeiro Mensal",
-        "category": "financial",
-        "description": "Resumo completo das finanças do mês",
-        "format": "pdf",
-        "parameters": ["start_date", "end_date", "include_charts"]
-    },
-    {
-        "id": "sales-performance",
-        "name": "Performance de Vendas",
-        "category": "sales",
-        "description": "Análise detalhada do desempenho de vendas",
-        "format": "excel",
-        "parameters": ["period", "region", "product_category"]
-    },
-    {
-        "id": "marketing-campaigns",
-        "name": "Relatório de Campanhas",
-        "category": "marketing",
-        "description": "Resultados das campanhas de marketing",
-        "format": "pdf",
-        "parameters": ["campaign_id", "date_range", "metrics"]
-    },
-    {
-        "id": "user-analytics",
-        "name": "Analytics de Usuários",
-        "category": "analytics",
-        "description": "Comportamento e métricas dos usuários",
-        "format": "csv",
-        "parameters": ["user_segment", "time_period", "events"]
-    },
-    {
-        "id": "operational-kpis",
-        "name": "KPIs Operacionais",
-        "category": "operational",
-        "description": "Indicadores de performance operacional",
-        "format": "excel",
-        "parameters": ["department", "metrics", "comparison_period"]
-    }
-]
+# Cache curto para as métricas agregadas
+stats_cache = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "30")))
 
-class ReportGenerator:
-    """Classe para geração de relatórios"""
-    
-    @staticmethod
-    async def generate_financial_report(params: Dict[str, Any]) -> Dict[str, Any]:
-        """Gera relatório financeiro"""
-        # Simular dados financeiros
-        return {
-            "total_revenue": 1250000.50,
-            "monthly_revenue": 85000.75,
-            "growth_rate": 12.5,
-            "transactions": 15420,
-            "average_ticket": 81.15,
-            "payment_methods": {
-                "credit_card": 45,
-                "debit_card": 25,
-                "pix": 20,
-                "bank_transfer": 8,
-                "gift_card": 2
-            },
-            "top_products": [
-                {"name": "Pacote Disney", "revenue": 250000, "quantity": 1250},
-                {"name": "Ingressos Universal", "revenue": 180000, "quantity": 900},
-                {"name": "City Tour Miami", "revenue": 120000, "quantity": 800}
-            ],
-            "revenue_by_month": [
-                {"month": "Jan", "revenue": 75000, "transactions": 920},
-                {"month": "Fev", "revenue": 82000, "transactions": 1010},
-                {"month": "Mar", "revenue": 78000, "transactions": 950}
-            ]
-        }
-    
-    @staticmethod
-    async def generate_sales_report(params: Dict[str, Any]) -> Dict[str, Any]:
-        """Gera relatório de vendas"""
-        return {
-            "total_sales": 1850000.75,
-            "monthly_sales": 125000.50,
-            "growth": 18.5,
-            "orders": 2340,
-            "average_order": 790.60,
-            "conversion_rate": 15.2,
-            "sales_funnel": {
-                "leads": 5000,
-                "prospects": 2500,
-                "opportunities": 1200,
-                "closed": 2340,
-                "lost": 800
-            },
-            "top_products": [
-                {"name": "Pacote Disney Completo", "sales": 450, "revenue": 225000},
-                {"name": "Ingressos Universal Studios", "sales": 380, "revenue": 152000},
-                {"name": "Hotel Premium Miami Beach", "sales": 320, "revenue": 128000}
-            ],
-            "sales_by_region": [
-                {"region": "Sudeste", "sales": 925000, "percentage": 50},
-                {"region": "Sul", "sales": 555000, "percentage": 30},
-                {"region": "Nordeste", "sales": 277500, "percentage": 15}
-            ]
-        }
-    
-    @staticmethod
-    async def generate_marketing_report(params: Dict[str, Any]) -> Dict[str, Any]:
-        """Gera relatório de marketing"""
-        return {
-            "total_campaigns": 24,
-            "active_campaigns": 8,
-            "total_reach": 1250000,
-            "total_impressions": 3500000,
-            "total_clicks": 87500,
-            "conversion_rate": 3.2,
-            "ctr": 2.5,
-            "cpc": 1.85,
-            "roi": 4.2,
-            "campaigns": [
-                {
-                    "name": "Black Friday Disney",
-                    "reach": 250000,
-                    "conversions": 600,
-                    "spent": 34687.50,
-                    "revenue": 180000
-                },
-                {
-                    "name": "Verão Universal",
-                    "reach": 180000,
-                    "conversions": 432,
-                    "spent": 24975,
-                    "revenue": 129600
-                }
-            ],
-            "channels": {
-                "google_ads": 30,
-                "email": 25,
-                "social_media": 15,
-                "facebook_ads": 20,
-                "influencer": 8,
-                "affiliate": 2
-            }
-        }
-    
-    @staticmethod
-    async def generate_analytics_report(params: Dict[str, Any]) -> Dict[str, Any]:
-        """Gera relatório de analytics"""
-        return {
-            "total_users": 125000,
-            "active_users": 8500,
-            "new_users": 1250,
-            "user_growth": 15.8,
-            "page_views": 450000,
-            "unique_visitors": 25000,
-            "bounce_rate": 42.5,
-            "average_session_duration": 185,
-            "traffic_sources": {
-                "organic": 45,
-                "direct": 25,
-                "social": 15,
-                "email": 8,
-                "referral": 5,
-                "paid": 2
-            },
-            "device_usage": {
-                "desktop": 55,
-                "mobile": 40,
-                "tablet": 5
-            },
-            "top_pages": [
-                {"url": "/", "title": "Página Inicial", "views": 85000, "bounce_rate": 35},
-                {"url": "/disney", "title": "Pacotes Disney", "views": 65000, "bounce_rate": 28},
-                {"url": "/universal", "title": "Universal Studios", "views": 45000, "bounce_rate": 32}
-            ]
-        }
-
-class ReportExporter:
-    """Classe para exportação de relatórios"""
-    
-    @staticmethod
-    def export_to_pdf(data: Dict[str, Any], template_id: str) -> bytes:
-        """Exporta relatório para PDF"""
-        # Simular geração de PDF
-        pdf_content = f"""
-        RELATÓRIO: {template_id.upper()}
-        Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-        
-        DADOS:
-        {json.dumps(data, indent=2, ensure_ascii=False)}
-        """
-        return pdf_content.encode('utf-8')
-    
-    @staticmethod
-    def export_to_excel(data: Dict[str, Any], template_id: str) -> bytes:
-        """Exporta relatório para Excel (CSV)"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Cabeçalho
-        writer.writerow([f"RELATÓRIO: {template_id.upper()}"])
-        writer.writerow([f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}"])
-        writer.writerow([])
-        
-        # Dados principais
-        for key, value in data.items():
-            if isinstance(value, dict):
-                writer.writerow([key.upper()])
-                for sub_key, sub_value in value.items():
-                    writer.writerow([f"  {sub_key}", sub_value])
-                writer.writerow([])
-            elif isinstance(value, list):
-                writer.writerow([key.upper()])
-                if value and isinstance(value[0], dict):
-                    writer.writerow(list(value[0].keys()))
-                    for item in value:
-                        writer.writerow(list(item.values()))
-                else:
-                    for item in value:
-                        writer.writerow([item])
-                writer.writerow([])
-            else:
-                writer.writerow([key, value])
-        
-        return output.getvalue().encode('utf-8')
-    
-    @staticmethod
-    def export_to_csv(data: Dict[str, Any], template_id: str) -> bytes:
-        """Exporta relatório para CSV"""
-        return ReportExporter.export_to_excel(data, template_id)
-    
-    @staticmethod
-    def export_to_json(data: Dict[str, Any], template_id: str) -> bytes:
-        """Exporta relatório para JSON"""
-        report_data = {
-            "template_id": template_id,
-            "generated_at": datetime.now().isoformat(),
-            "data": data
-        }
-        return json.dumps(report_data, indent=2, ensure_ascii=False).encode('utf-8')
+@app.on_event("startup")
+async def startup_event():
+    init_db()
 
 # Endpoints
 
 @app.get("/reports/", response_model=List[ReportResponse])
 def get_reports(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = None,
     format: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Lista todos os relatórios com filtros"""
+    """Lista todos os relatórios com filtros (cursor da próxima página em X-Next-Cursor)"""
     query = db.query(Report)
     
     if category:
@@ -292,9 +64,41 @@ def get_reports(
     if format:
         query = query.filter(Report.format == format)
     
-    reports = query.offset(skip).limit(limit).all()
+    reports, next_cursor = paginate(
+        query, [Report.created_at, Report.id], cursor=cursor, limit=limit, skip=skip
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return reports
 
+@app.get("/reports/export")
+def export_reports(
+    formato: str = Query("ndjson", description="ndjson, csv, xlsx ou pdf"),
+    category: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Exporta os registros de relatórios em streaming (cursor no servidor, memória limitada)"""
+    columns = list(Report.__table__.columns)
+    fields = [column.name for column in columns]
+    statement = select(*columns).order_by(Report.id)
+    if category:
+        statement = statement.where(Report.category == category)
+    if status:
+        statement = statement.where(Report.status == status)
+    rows = stream_query(SessionLocal, statement)
+    
+    if formato in ("xlsx", "pdf"):
+        table = [("table", "reports", fields, ([row[field] for field in fields] for row in rows))]
+        body = iter_xlsx(table) if formato == "xlsx" else iter_pdf("RELATÓRIOS", table)
+        return StreamingResponse(
+            body,
+            media_type=XLSX_MEDIA_TYPE if formato == "xlsx" else PDF_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="reports.{formato}"'}
+        )
+    if formato not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formato inválido; use ndjson, csv, xlsx ou pdf")
+    return export_response(rows, formato, "reports", fields=fields)
+
 @app.get("/reports/{report_id}", response_model=ReportResponse)
 def get_report(report_id: int, db: Session = Depends(get_db)):
     """Obtém um relatório específico"""
@@ -304,30 +108,59 @@ def get_report(report_id: int, db: Session = Depends(get_db)):
     return report
 
 @app.post("/reports/", response_model=ReportResponse)
-async def create_report(
-    report: ReportCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
-):
-    """Cria um novo relatório"""
-    # Criar registro do relatório
+def create_report(report: ReportCreate, db: Session = Depends(get_db)):
+    """Cria um novo relatório: entregue do cache se os dados não mudaram, senão vai para a fila do worker"""
     db_report = Report(
         name=report.name,
         template_id=report.template_id,
         category=report.category,
         format=report.format,
         parameters=report.parameters,
-        status="processing"
+        status="queued"
     )
     db.add(db_report)
+    db.flush()
+
+    artifact = cache.fresh_artifact(db, report.template_id, report.parameters, report.format)
+    if artifact is not None:
+        file_path = report_file(db_report.id, db_report.format)
+        try:
+            link_file(artifact, file_path)
+        except FileNotFoundError:
+            pass  # substituído por um recálculo neste instante: segue para a fila
+        else:
+            db_report.status = "completed"
+            db_report.progress = 100
+            db_report.file_path = str(file_path)
+            db_report.file_size = file_path.stat().st_size
+            db_report.completed_at = datetime.utcnow()
     db.commit()
     db.refresh(db_report)
     
-    # Adicionar tarefa de geração em background
-    background_tasks.add_task(generate_report_background, db_report.id, report.parameters)
-    
     return db_report
 
+@app.get("/reports/{report_id}/progress")
+def get_report_progress(report_id: int, db: Session = Depends(get_db)):
+    """Status e progresso (0-100) da geração"""
+    report = db.query(Report).filter(Report.id == report_id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return {
+        "id": report.id,
+        "status": report.status,
+        "progress": report.progress or 0,
+        "attempts": report.attempts or 0,
+        "next_attempt_at": report.next_attempt_at,
+        "error_message": report.error_message
+    }
+
+@app.get("/reports/{report_id}/executions", response_model=List[ReportExecutionResponse])
+def get_report_executions(report_id: int, db: Session = Depends(get_db)):
+    """Tentativas de geração do relatório"""
+    return db.query(ReportExecution).filter(
+        ReportExecution.report_id == report_id
+    ).order_by(ReportExecution.id).all()
+
 @app.get("/reports/{report_id}/download")
 def download_report(report_id: int, db: Session = Depends(get_db)):
     """Download de um relatório"""
@@ -338,14 +171,14 @@ def download_report(report_id: int, db: Session = Depends(get_db)):
     if report.status != "completed":
         raise HTTPException(status_code=400, detail="Relatório ainda não foi gerado")
     
-    file_path = REPORTS_DIR / f"{report.id}.{report.format}"
+    file_path = report_file(report.id, report.format)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     
     return FileResponse(
         path=str(file_path),
-        filename=f"{report.name}.{report.format}",
-        media_type="application/octet-stream"
+        filename=f"{report.name}{file_path.suffix}",
+        media_type=REPORT_FILES.get(report.format, REPORT_FILES["pdf"])[1]
     )
 
 @app.get("/templates/", response_model=List[Dict[str, Any]])
@@ -366,34 +199,84 @@ def schedule_report(
     schedule: ReportScheduleCreate,
     db: Session = Depends(get_db)
 ):
-    """Agenda um relatório para execução periódica"""
+    """Agenda um relatório para execução periódica (executado pelo worker)"""
+    try:
+        cron = schedule_cron(schedule.frequency, schedule.cron_expression)
+        next_run = schedule.next_run or cron.next_after(datetime.utcnow())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     db_schedule = ReportSchedule(
         template_id=schedule.template_id,
         name=schedule.name,
         frequency=schedule.frequency,
+        cron_expression=schedule.cron_expression,
+        format=schedule.format,
         parameters=schedule.parameters,
         recipients=schedule.recipients,
-        next_run=schedule.next_run
+        is_active=schedule.is_active,
+        next_run=next_run
     )
     db.add(db_schedule)
     db.commit()
     db.refresh(db_schedule)
     
-    return {"message": "Relatório agendado com sucesso", "schedule_id": db_schedule.id}
+    return {
+        "message": "Relatório agendado com sucesso",
+        "schedule_id": db_schedule.id,
+        "next_run": db_schedule.next_run
+    }
+
+@app.get("/reports/schedules/", response_model=List[ReportScheduleResponse])
+def get_schedules(active: Optional[bool] = None, db: Session = Depends(get_db)):
+    """Lista os agendamentos"""
+    query = db.query(ReportSchedule)
+    if active is not None:
+        query = query.filter(ReportSchedule.is_active == active)
+    return query.order_by(ReportSchedule.next_run).all()
+
+@app.get("/reports/schedules/{schedule_id}/executions", response_model=List[ReportExecutionResponse])
+def get_schedule_executions(
+    schedule_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Histórico de execuções de um agendamento (mais recentes primeiro)"""
+    return db.query(ReportExecution).filter(
+        ReportExecution.schedule_id == schedule_id
+    ).order_by(ReportExecution.started_at.desc(), ReportExecution.id.desc()).limit(limit).all()
+
+@app.get("/reports/queue/metrics")
+def get_queue_metrics(db: Session = Depends(get_db)):
+    """Profundidade e atraso da fila de geração e dos agendamentos"""
+    return queue_metrics(db)
 
 @app.get("/reports/metrics/")
 def get_report_metrics(db: Session = Depends(get_db)):
     """Obtém métricas dos relatórios"""
-    total_reports = db.query(Report).count()
-    completed_reports = db.query(Report).filter(Report.status == "completed").count()
-    failed_reports = db.query(Report).filter(Report.status == "failed").count()
-    scheduled_reports = db.query(ReportSchedule).count()
+    return stats_cache.get_or_compute("report_metrics", lambda: _compute_report_metrics(db))
+
+def _compute_report_metrics(db: Session) -> Dict[str, Any]:
+    # Totais e contagem por categoria em uma única consulta de agregação condicional
+    reports = aggregate(
+        db, Report,
+        total_reports=func.count(),
+        completed_reports=count_where(Report.status == "completed"),
+        failed_reports=count_where(Report.status == "failed"),
+        **{
+            f"category_{category}": count_where(Report.category == category)
+            for category in REPORT_CATEGORIES
+        }
+    )
+    total_reports = reports["total_reports"]
+    completed_reports = reports["completed_reports"]
+    failed_reports = reports["failed_reports"]
+    scheduled_reports = db.query(func.count(ReportSchedule.id)).scalar()
     
     # Relatórios por categoria
-    reports_by_category = {}
-    for category in ["financial", "marketing", "sales", "analytics", "operational"]:
-        count = db.query(Report).filter(Report.category == category).count()
-        reports_by_category[category] = count
+    reports_by_category = {
+        category: reports[f"category_{category}"] for category in REPORT_CATEGORIES
+    }
     
     return {
         "total_reports": total_reports,
@@ -412,63 +295,28 @@ def delete_report(report_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Relatório não encontrado")
     
     # Remover arquivo se existir
-    file_path = REPORTS_DIR / f"{report.id}.{report.format}"
+    file_path = report_file(report.id, report.format)
     if file_path.exists():
         file_path.unlink()
     
+    # O histórico de execuções é mantido, sem o vínculo com o relatório
+    db.query(ReportExecution).filter(ReportExecution.report_id == report_id).update({"report_id": None})
     db.delete(report)
     db.commit()
     
     return {"message": "Relatório deletado com sucesso"}
 
-# Funções auxiliares
+@app.get("/reports/cache/", response_model=List[Dict[str, Any]])
+def get_report_cache(db: Session = Depends(get_db)):
+    """Entradas do cache de resultados, com acertos e recálculos (completos e incrementais)"""
+    return cache.list_entries(db)
 
-async def generate_report_background(report_id: int, parameters: Dict[str, Any]):
-    """Gera relatório em background"""
-    try:
-        # Simular tempo de processamento
-        await asyncio.sleep(2)
-        
-        # Determinar template e gerar dados
-        template_id = parameters.get("template_id", "financial-summary")
-        
-        if template_id == "financial-summary":
-            data = await ReportGenerator.generate_financial_report(parameters)
-        elif template_id == "sales-performance":
-            data = await ReportGenerator.generate_sales_report(parameters)
-        elif template_id == "marketing-campaigns":
-            data = await ReportGenerator.generate_marketing_report(parameters)
-        elif template_id == "user-analytics":
-            data = await ReportGenerator.generate_analytics_report(parameters)
-        else:
-            data = await ReportGenerator.generate_financial_report(parameters)
-        
-        # Exportar para o formato desejado
-        format_type = parameters.get("format", "pdf")
-        
-        if format_type == "pdf":
-            content = ReportExporter.export_to_pdf(data, template_id)
-        elif format_type == "excel":
-            content = ReportExporter.export_to_excel(data, template_id)
-        elif format_type == "csv":
-            content = ReportExporter.export_to_csv(data, template_id)
-        elif format_type == "json":
-            content = ReportExporter.export_to_json(data, template_id)
-        else:
-            content = ReportExporter.export_to_pdf(data, template_id)
-        
-        # Salvar arquivo
-        file_path = REPORTS_DIR / f"{report_id}.{format_type}"
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Atualizar status no banco
-        # Nota: Em produção, você precisaria de uma sessão de banco separada
-        print(f"Relatório {report_id} gerado com sucesso: {file_path}")
-        
-    except Exception as e:
-        print(f"Erro ao gerar relatório {report_id}: {str(e)}")
-        # Atualizar status para failed no banco
+@app.delete("/reports/cache/{entry_id}")
+def invalidate_report_cache(entry_id: int, db: Session = Depends(get_db)):
+    """Descarta uma entrada do cache (ex.: dados corrigidos direto no banco)"""
+    if not cache.invalidate(db, entry_id):
+        raise HTTPException(status_code=404, detail="Entrada de cache não encontrada")
+    return {"message": "Entrada de cache removida"}
 
 @app.get("/health/")
 def health_check():
@@ -0,0 +1,153 @@
+"""
+Cache de resultados de relatórios (tabela report_cache)
+
+Relatórios gerados pelo ReportEngine são identificados pelo template e pelos
+parâmetros normalizados (parameters_hash). Cada entrada guarda a marca d'água
+das tabelas de origem, os agregados parciais e o arquivo de cada formato já
+gerado com esses dados:
+  - a API entrega o arquivo em cache quando a marca d'água não mudou, sem
+    passar pela fila;
+  - o worker passa a entrada ao motor, que lê só as linhas novas e as soma aos
+    parciais quando as antigas não mudaram (run_report).
+
+As gravações são condicionais à versão lida, como em jobs.py: se dois workers
+recalcularem a mesma entrada, vale a primeira gravação.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from shared.models.reports import ReportCache
+from shared.services.report_engine import normalize_parameters, parameters_hash, source_watermark
+
+from generation import CACHE_DIR, engine_template, link_file
+from jobs import Job
+
+
+def _entry(db: Session, template_id: str, parameters: Optional[Dict[str, Any]]) -> Optional[ReportCache]:
+    return db.query(ReportCache).filter(
+        ReportCache.template_id == template_id,
+        ReportCache.parameters_hash == parameters_hash(parameters)
+    ).first()
+
+
+def load_entry(db: Session, template_id: str, parameters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Entrada do cache para o worker (dicionário simples, enviado ao processo do motor)"""
+    source = engine_template(template_id)
+    entry = _entry(db, source, parameters) if source else None
+    if entry is None:
+        return None
+    return {
+        "id": entry.id,
+        "version": entry.version,
+        "watermark": entry.watermark,
+        "partials": entry.partials,
+        "artifacts": entry.artifacts or {}
+    }
+
+
+def fresh_artifact(db: Session, template_id: str, parameters: Optional[Dict[str, Any]],
+                   format_type: str) -> Optional[Path]:
+    """Arquivo em cache do formato, se as tabelas de origem não mudaram desde que foi gerado"""
+    source = engine_template(template_id)
+    entry = _entry(db, source, parameters) if source else None
+    artifact = (entry.artifacts or {}).get(format_type) if entry else None
+    if not artifact or not Path(artifact["path"]).exists():
+        return None
+    if source_watermark(db.connection(), source) != entry.watermark:
+        return None
+    db.execute(
+        update(ReportCache).where(ReportCache.id == entry.id).values(hits=ReportCache.hits + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return Path(artifact["path"])
+
+
+def store_result(db: Session, cached: Optional[Dict[str, Any]], job: Job, result: Dict[str, Any],
+                 file_path: Path) -> bool:
+    """Grava os parciais e a marca d'água novos e o arquivo gerado pelo job
+
+    Com os dados inalterados, só acrescenta o arquivo de mais um formato. Devolve
+    False se outro worker atualizou a entrada antes.
+    """
+    source = engine_template(job.template_id)
+    unchanged = cached is not None and result["mode"] == "unchanged"
+    if unchanged and job.format in cached["artifacts"]:
+        return True
+
+    key = parameters_hash(job.parameters)
+    # Nome único por relatório: duas gravações concorrentes nunca disputam o mesmo arquivo
+    artifact = CACHE_DIR / f"{source}-{key}-{job.report_id}{file_path.suffix}"
+    link_file(file_path, artifact)
+    entry_artifact = {"path": str(artifact), "size": artifact.stat().st_size}
+
+    if cached is None:
+        db.add(ReportCache(
+            template_id=source, parameters_hash=key, parameters=normalize_parameters(job.parameters),
+            watermark=result["watermark"], partials=result["partials"],
+            artifacts={job.format: entry_artifact}, version=1, full_refreshes=1
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            artifact.unlink(missing_ok=True)
+            return False
+        return True
+
+    if unchanged:
+        values = {"artifacts": {**cached["artifacts"], job.format: entry_artifact}}
+        replaced = []
+    else:
+        counter = ReportCache.incremental_refreshes if result["mode"] == "incremental" else ReportCache.full_refreshes
+        values = {
+            "watermark": result["watermark"], "partials": result["partials"],
+            "artifacts": {job.format: entry_artifact}, counter.key: counter + 1
+        }
+        replaced = [previous["path"] for previous in cached["artifacts"].values()]
+    stored = db.execute(
+        update(ReportCache)
+        .where(ReportCache.id == cached["id"], ReportCache.version == cached["version"])
+        .values(version=cached["version"] + 1, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    db.commit()
+
+    # Arquivos da versão anterior: os relatórios que os usam têm o próprio link
+    for path in (replaced if stored else [str(artifact)]):
+        Path(path).unlink(missing_ok=True)
+    return stored
+
+
+def list_entries(db: Session) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": entry.id,
+            "template_id": entry.template_id,
+            "parameters": entry.parameters,
+            "version": entry.version,
+            "formats": sorted(entry.artifacts or {}),
+            "watermark": entry.watermark,
+            "hits": entry.hits,
+            "full_refreshes": entry.full_refreshes,
+            "incremental_refreshes": entry.incremental_refreshes,
+            "updated_at": entry.updated_at
+        }
+        for entry in db.query(ReportCache).order_by(ReportCache.updated_at.desc())
+    ]
+
+
+def invalidate(db: Session, entry_id: int) -> bool:
+    """Remove a entrada e seus arquivos; o próximo relatório recalcula tudo"""
+    entry = db.query(ReportCache).filter(ReportCache.id == entry_id).first()
+    if entry is None:
+        return False
+    for artifact in (entry.artifacts or {}).values():
+        Path(artifact["path"]).unlink(missing_ok=True)
+    db.delete(entry)
+    db.commit()
+    return True
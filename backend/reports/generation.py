@@ -0,0 +1,276 @@
+"""
+Geração de relatórios: templates, exportadores e a execução de um relatório
+
+Usado pela API (templates e download) e pelo worker (worker.py), que é quem
+gera os relatórios enfileirados.
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from shared.services.report_engine import ReportEngine
+from shared.services.report_writers import (
+    PDF_MEDIA_TYPE, XLSX_MEDIA_TYPE, iter_pdf, iter_xlsx, sections_from_data
+)
+
+# Configuração de diretórios (compartilhado entre API e worker)
+REPORTS_DIR = Path(os.getenv("REPORTS_DIR", "reports"))
+REPORTS_DIR.mkdir(exist_ok=True)
+# Arquivos reaproveitáveis do cache de resultados (cache.py)
+CACHE_DIR = REPORTS_DIR / "cache"
+CACHE_DIR.mkdir(exist_ok=True)
+
+# Extensão e tipo do arquivo gerado para cada formato de relatório
+REPORT_FILES = {
+    "pdf": ("pdf", PDF_MEDIA_TYPE),
+    "excel": ("xlsx", XLSX_MEDIA_TYPE),
+    "csv": ("csv", "text/csv"),  # FileResponse acrescenta o charset
+    "json": ("json", "application/json"),
+}
+
+def report_file(report_id: int, format_type: str) -> Path:
+    extension = REPORT_FILES.get(format_type, REPORT_FILES["pdf"])[0]
+    return REPORTS_DIR / f"{report_id}.{extension}"
+
+def link_file(source: Path, target: Path):
+    """Hard link de source em target, sem copiar o conteúdo; cópia se o sistema de arquivos não suportar"""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+# Agregações dos templates rodam em processos, fora do event loop
+report_engine = ReportEngine(
+    max_workers=int(os.getenv("REPORT_WORKERS", "0")) or None
+)
+
+# Templates de relatórios disponíveis
+DEFAULT_TEMPLATES = [
+    {
+        "id": "financial-summary",
+        "name": "Relatório Financeiro Mensal",
+        "category": "financial",
+        "description": "Resumo completo das finanças do mês",
+        "format": "pdf",
+        "parameters": ["start_date", "end_date", "include_charts"]
+    },
+    {
+        "id": "sales-performance",
+        "name": "Performance de Vendas",
+        "category": "sales",
+        "description": "Análise detalhada do desempenho de vendas",
+        "format": "excel",
+        "parameters": ["period", "region", "product_category"]
+    },
+    {
+        "id": "marketing-campaigns",
+        "name": "Relatório de Campanhas",
+        "category": "marketing",
+        "description": "Resultados das campanhas de marketing",
+        "format": "pdf",
+        "parameters": ["campaign_id", "date_range", "metrics"]
+    },
+    {
+        "id": "user-analytics",
+        "name": "Analytics de Usuários",
+        "category": "analytics",
+        "description": "Comportamento e métricas dos usuários",
+        "format": "csv",
+        "parameters": ["user_segment", "time_period", "events"]
+    },
+    {
+        "id": "operational-kpis",
+        "name": "KPIs Operacionais",
+        "category": "operational",
+        "description": "Indicadores de performance operacional",
+        "format": "excel",
+        "parameters": ["department", "metrics", "comparison_period"]
+    }
+]
+
+class ReportGenerator:
+    """Templates sem fonte de dados no banco (financeiro, vendas e analytics usam o ReportEngine)"""
+    
+    @staticmethod
+    async def generate_marketing_report(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Gera relatório de marketing"""
+        return {
+            "total_campaigns": 24,
+            "active_campaigns": 8,
+            "total_reach": 1250000,
+            "total_impressions": 3500000,
+            "total_clicks": 87500,
+            "conversion_rate": 3.2,
+            "ctr": 2.5,
+            "cpc": 1.85,
+            "roi": 4.2,
+            "campaigns": [
+                {
+                    "name": "Black Friday Disney",
+                    "reach": 250000,
+                    "conversions": 600,
+                    "spent": 34687.50,
+                    "revenue": 180000
+                },
+                {
+                    "name": "Verão Universal",
+                    "reach": 180000,
+                    "conversions": 432,
+                    "spent": 24975,
+                    "revenue": 129600
+                }
+            ],
+            "channels": {
+                "google_ads": 30,
+                "email": 25,
+                "social_media": 15,
+                "facebook_ads": 20,
+                "influencer": 8,
+                "affiliate": 2
+            }
+        }
+
+class ReportExporter:
+    """Classe para exportação de relatórios
+
+    Cada exportador devolve um iterador de blocos de bytes, gravados no arquivo
+    à medida que são produzidos, sem montar o conteúdo inteiro em memória.
+    """
+    
+    CHUNK_SIZE = 64 * 1024
+    
+    @staticmethod
+    def _buffered(parts: Iterable[str]) -> Iterator[bytes]:
+        """Agrupa fragmentos de texto em blocos de ~CHUNK_SIZE"""
+        buffer, size = [], 0
+        for part in parts:
+            buffer.append(part)
+            size += len(part)
+            if size >= ReportExporter.CHUNK_SIZE:
+                yield "".join(buffer).encode('utf-8')
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer).encode('utf-8')
+    
+    @staticmethod
+    def _title(template_id: str) -> str:
+        return f"RELATÓRIO: {template_id.upper()} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+    
+    @staticmethod
+    def export_to_pdf(data: Dict[str, Any], template_id: str) -> Iterator[bytes]:
+        """Exporta relatório para PDF (A4, escrito página a página)"""
+        return iter_pdf(ReportExporter._title(template_id), sections_from_data(data))
+    
+    @staticmethod
+    def _iter_csv_rows(data: Dict[str, Any], template_id: str) -> Iterator[List[Any]]:
+        # Cabeçalho
+        yield [f"RELATÓRIO: {template_id.upper()}"]
+        yield [f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}"]
+        yield []
+        
+        # Dados principais
+        for key, value in data.items():
+            if isinstance(value, dict):
+                yield [key.upper()]
+                for sub_key, sub_value in value.items():
+                    yield [f"  {sub_key}", sub_value]
+                yield []
+            elif isinstance(value, list):
+                yield [key.upper()]
+                if value and isinstance(value[0], dict):
+                    yield list(value[0].keys())
+                    for item in value:
+                        yield list(item.values())
+                else:
+                    for item in value:
+                        yield [item]
+                yield []
+            else:
+                yield [key, value]
+    
+    @staticmethod
+    def export_to_excel(data: Dict[str, Any], template_id: str) -> Iterator[bytes]:
+        """Exporta relatório para Excel (XLSX: resumo e uma planilha por tabela)"""
+        return iter_xlsx(sections_from_data(data))
+    
+    @staticmethod
+    def export_to_csv(data: Dict[str, Any], template_id: str) -> Iterator[bytes]:
+        """Exporta relatório para CSV"""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row in ReportExporter._iter_csv_rows(data, template_id):
+            writer.writerow(row)
+            if output.tell() >= ReportExporter.CHUNK_SIZE:
+                yield output.getvalue().encode('utf-8')
+                output.seek(0)
+                output.truncate()
+        if output.tell():
+            yield output.getvalue().encode('utf-8')
+    
+    @staticmethod
+    def export_to_json(data: Dict[str, Any], template_id: str) -> Iterator[bytes]:
+        """Exporta relatório para JSON"""
+        report_data = {
+            "template_id": template_id,
+            "generated_at": datetime.now().isoformat(),
+            "data": data
+        }
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+        return ReportExporter._buffered(encoder.iterencode(report_data))
+
+def engine_template(template_id: str) -> Optional[str]:
+    """Template do ReportEngine que gera o relatório (None para os que não vêm do banco)"""
+    if template_id == "marketing-campaigns":
+        return None
+    return template_id if ReportEngine.supports(template_id) else "financial-summary"
+
+async def generate_report(report_id: int, template_id: str, format_type: str, parameters: Dict[str, Any],
+                          cached: Optional[Dict[str, Any]] = None) -> Tuple[Path, Optional[Dict[str, Any]]]:
+    """Calcula os dados do template e grava o arquivo; erros sobem para o worker decidir a nova tentativa
+
+    cached é a entrada do cache de resultados (cache.load_entry): o motor só
+    lê o que mudou desde ela e, se nada mudou, o arquivo do formato já gerado é
+    reaproveitado. Devolve o arquivo e o resultado do motor (None fora dele).
+    """
+    file_path = report_file(report_id, format_type)
+    source = engine_template(template_id)
+    result = None
+    # Determinar template e gerar dados
+    if source is None:
+        data = await ReportGenerator.generate_marketing_report(parameters)
+    else:
+        template_id = source
+        result = await report_engine.generate(template_id, parameters, report_id=report_id, base=cached)
+        artifact = (cached.get("artifacts") or {}).get(format_type) if result["mode"] == "unchanged" else None
+        if artifact:
+            try:
+                link_file(Path(artifact["path"]), file_path)
+                return file_path, result
+            except FileNotFoundError:
+                pass  # substituído por outro worker: exporta de novo
+        data = result["data"]
+    
+    # Exportar para o formato desejado
+    if format_type == "pdf":
+        content = ReportExporter.export_to_pdf(data, template_id)
+    elif format_type == "excel":
+        content = ReportExporter.export_to_excel(data, template_id)
+    elif format_type == "csv":
+        content = ReportExporter.export_to_csv(data, template_id)
+    elif format_type == "json":
+        content = ReportExporter.export_to_json(data, template_id)
+    else:
+        content = ReportExporter.export_to_pdf(data, template_id)
+    
+    # Salvar arquivo bloco a bloco (mesmo nome usado no download)
+    with open(file_path, "wb") as f:
+        for chunk in content:
+            f.write(chunk)
+    return file_path, result
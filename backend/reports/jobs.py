@@ -0,0 +1,251 @@
+"""
+Fila de geração de relatórios e agendamentos (usada pelo worker e pela API)
+
+Relatórios pedidos pela API e os criados pelos agendamentos entram na tabela
+reports com status "queued". A cada ciclo, cada worker:
+  1. reivindica os agendamentos vencidos, cria o relatório enfileirado e avança
+     next_run para a próxima ocorrência da expressão cron;
+  2. reivindica relatórios enfileirados até o seu limite de concorrência.
+
+As linhas são lidas com FOR UPDATE SKIP LOCKED (workers concorrentes pulam as
+já travadas) e a reivindicação é um UPDATE condicional ao valor lido, então
+duas réplicas nunca pegam a mesma linha, inclusive no SQLite, que ignora o
+FOR UPDATE.
+"""
+
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from shared.models.reports import Report, ReportExecution, ReportSchedule
+from shared.services.cron import CronExpression
+from shared.services.stats_aggregator import aggregate, count_where
+
+from generation import DEFAULT_TEMPLATES
+
+logger = logging.getLogger(__name__)
+
+# Expressão cron de cada frequência pré-definida (horários em UTC)
+FREQUENCY_CRON = {
+    "hourly": "@hourly",
+    "daily": "@daily",
+    "weekly": "@weekly",
+    "monthly": "@monthly",
+}
+
+MAX_ATTEMPTS = int(os.getenv("REPORT_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("REPORT_RETRY_BACKOFF", "30"))
+# Relatório em "processing" há mais tempo que isso volta para a fila (worker morto)
+JOB_TIMEOUT = timedelta(seconds=float(os.getenv("REPORT_JOB_TIMEOUT", "1800")))
+
+TEMPLATE_CATEGORIES = {template["id"]: template["category"] for template in DEFAULT_TEMPLATES}
+
+
+@dataclass
+class Job:
+    """Relatório reivindicado por um worker (uma tentativa)"""
+    report_id: int
+    execution_id: int
+    attempt: int
+    template_id: str
+    format: str
+    parameters: Dict[str, Any]
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def schedule_cron(frequency: str, cron_expression: Optional[str]) -> CronExpression:
+    """Expressão do agendamento: cron_expression explícita ou a da frequência"""
+    expression = cron_expression or FREQUENCY_CRON.get(frequency)
+    if not expression:
+        raise ValueError(f"Frequência '{frequency}' exige cron_expression")
+    return CronExpression(expression)
+
+
+def claim_due_schedules(db: Session, now: datetime, limit: int = 50) -> List[int]:
+    """Enfileira um relatório por agendamento vencido e avança o next_run
+
+    Execuções perdidas enquanto nenhum worker rodava viram uma só: o próximo
+    next_run é calculado a partir de agora.
+    """
+    schedules = db.execute(
+        select(ReportSchedule)
+        .where(ReportSchedule.is_active == True, ReportSchedule.next_run <= now)
+        .order_by(ReportSchedule.next_run)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    reports = []
+    for schedule in schedules:
+        try:
+            next_run = schedule_cron(schedule.frequency, schedule.cron_expression).next_after(now)
+        except ValueError as e:
+            # Expressão inválida gravada antes da validação: desativa em vez de travar a fila
+            schedule.is_active = False
+            logger.warning(f"Agendamento {schedule.id} desativado: {e}")
+            continue
+        claimed = db.execute(
+            update(ReportSchedule)
+            .where(ReportSchedule.id == schedule.id, ReportSchedule.next_run == schedule.next_run)
+            .values(next_run=next_run, last_run=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            continue
+        report = Report(
+            name=f"{schedule.name} - {now.strftime('%d/%m/%Y %H:%M')}",
+            template_id=schedule.template_id,
+            category=TEMPLATE_CATEGORIES.get(schedule.template_id, "operational"),
+            format=schedule.format or "pdf",
+            parameters=schedule.parameters,
+            status="queued",
+            schedule_id=schedule.id,
+            created_by=schedule.created_by
+        )
+        db.add(report)
+        reports.append(report)
+    db.commit()
+    return [report.id for report in reports]
+
+
+def claim_jobs(db: Session, worker: str, limit: int, now: datetime) -> List[Job]:
+    """Reivindica até limit relatórios prontos (enfileirados ou com tentativa expirada)"""
+    ready = or_(
+        and_(Report.status == "queued", or_(Report.next_attempt_at.is_(None), Report.next_attempt_at <= now)),
+        and_(Report.status == "processing", Report.started_at < now - JOB_TIMEOUT)
+    )
+    candidates = db.execute(
+        select(Report).where(ready).order_by(Report.created_at).limit(limit).with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    jobs = []
+    for report in candidates:
+        attempts = report.attempts or 0
+        expired = report.status == "processing"
+        if expired:
+            # O worker da tentativa anterior parou sem concluir
+            _finish_executions(db, report.id, "failed", now, "Tempo limite excedido (worker interrompido)")
+            if attempts >= MAX_ATTEMPTS:
+                _set_report(db, report.id, attempts, status="failed", completed_at=now,
+                            error_message="Tempo limite excedido após todas as tentativas")
+                continue
+        claimed = _set_report(
+            db, report.id, attempts, status="processing", attempts=attempts + 1, started_at=now,
+            claimed_by=worker, progress=0, next_attempt_at=None
+        )
+        if not claimed:
+            continue
+        execution = ReportExecution(
+            schedule_id=report.schedule_id, report_id=report.id, attempt=attempts + 1,
+            worker_id=worker, status="running", started_at=now
+        )
+        db.add(execution)
+        db.flush()
+        jobs.append(Job(
+            report_id=report.id, execution_id=execution.id, attempt=attempts + 1,
+            template_id=report.template_id, format=report.format, parameters=report.parameters or {}
+        ))
+    db.commit()
+    return jobs
+
+
+def _set_report(db: Session, report_id: int, expected_attempts: int, **values) -> bool:
+    """UPDATE condicional: só vale se ninguém reivindicou o relatório desde a leitura"""
+    return db.execute(
+        update(Report)
+        .where(Report.id == report_id, func.coalesce(Report.attempts, 0) == expected_attempts)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _finish_executions(db: Session, report_id: int, status: str, now: datetime, error: Optional[str] = None):
+    db.execute(
+        update(ReportExecution)
+        .where(ReportExecution.report_id == report_id, ReportExecution.status == "running")
+        .values(status=status, completed_at=now, error_message=error)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def complete_job(db: Session, job: Job, file_path: Path, now: datetime) -> bool:
+    """Marca a tentativa como concluída (ignorada se o relatório foi reivindicado de novo)"""
+    done = _set_report(
+        db, job.report_id, job.attempt, status="completed", progress=100, file_path=str(file_path),
+        file_size=file_path.stat().st_size, completed_at=now, error_message=None, claimed_by=None
+    )
+    db.execute(
+        update(ReportExecution)
+        .where(ReportExecution.id == job.execution_id)
+        .values(status="completed", completed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return done
+
+
+def fail_job(db: Session, job: Job, error: str, now: datetime) -> bool:
+    """Registra a falha; devolve True se o relatório voltou para a fila (backoff exponencial)"""
+    retry = job.attempt < MAX_ATTEMPTS
+    if retry:
+        values = dict(
+            status="queued", claimed_by=None,
+            next_attempt_at=now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempt - 1))
+        )
+    else:
+        values = dict(status="failed", claimed_by=None, completed_at=now)
+    _set_report(db, job.report_id, job.attempt, error_message=error, **values)
+    db.execute(
+        update(ReportExecution)
+        .where(ReportExecution.id == job.execution_id)
+        .values(status="failed", completed_at=now, error_message=error)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return retry
+
+
+def queue_metrics(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Profundidade e atraso da fila e dos agendamentos"""
+    now = now or datetime.utcnow()
+    ready = and_(
+        Report.status == "queued", or_(Report.next_attempt_at.is_(None), Report.next_attempt_at <= now)
+    )
+    reports = aggregate(
+        db, Report,
+        queued=count_where(Report.status == "queued"),
+        ready=count_where(ready),
+        processing=count_where(Report.status == "processing"),
+    )
+    # Espera do relatório pronto mais antigo: desde a criação ou do fim do backoff
+    oldest_ready = db.query(func.min(func.coalesce(Report.next_attempt_at, Report.created_at))).filter(ready).scalar()
+    schedules = db.query(
+        func.count(ReportSchedule.id), func.min(ReportSchedule.next_run)
+    ).filter(ReportSchedule.is_active == True, ReportSchedule.next_run <= now).one()
+    last_hour = now - timedelta(hours=1)
+    executions = aggregate(
+        db, ReportExecution,
+        completed=count_where(and_(ReportExecution.status == "completed", ReportExecution.completed_at >= last_hour)),
+        failed=count_where(and_(ReportExecution.status == "failed", ReportExecution.completed_at >= last_hour)),
+    )
+    return {
+        "queue_depth": reports["queued"],
+        "ready": reports["ready"],
+        "retrying": reports["queued"] - reports["ready"],
+        "processing": reports["processing"],
+        "queue_lag_seconds": (now - oldest_ready).total_seconds() if oldest_ready else 0.0,
+        "due_schedules": schedules[0],
+        "schedule_lag_seconds": (now - schedules[1]).total_seconds() if schedules[1] else 0.0,
+        "executions_last_hour": executions,
+        "measured_at": now.isoformat()
+    }
@@ -0,0 +1,165 @@
+"""
+Worker de relatórios: dispara os agendamentos (cron) e gera os relatórios enfileirados
+
+Uso:
+    python worker.py            # roda até SIGTERM/SIGINT, terminando os relatórios em andamento
+    python worker.py --once     # um único ciclo, aguardando as gerações iniciadas
+
+Variáveis de ambiente:
+    REPORT_WORKER_CONCURRENCY   relatórios gerados ao mesmo tempo por worker (padrão 2)
+    REPORT_POLL_INTERVAL        segundos entre ciclos (padrão 5)
+    REPORT_METRICS_INTERVAL     segundos entre logs de métricas da fila (padrão 60)
+    REPORT_MAX_ATTEMPTS, REPORT_RETRY_BACKOFF, REPORT_JOB_TIMEOUT   ver jobs.py
+
+Várias réplicas podem rodar em paralelo contra o mesmo banco; cada uma só
+pega linhas que conseguiu reivindicar (jobs.py).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Set
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.config.database import SessionLocal, init_db
+
+import cache
+import jobs
+from generation import generate_report, report_engine
+
+logger = logging.getLogger("reports.worker")
+
+
+class ReportWorker:
+    """Laço de polling com concorrência limitada; as chamadas ao banco rodam em threads"""
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 5.0, metrics_interval: float = 60.0,
+                 session_factory=SessionLocal):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.session_factory = session_factory
+        self.worker_id = jobs.worker_id()
+        self.running: Set[asyncio.Task] = set()
+        self.stats = {
+            "schedules_fired": 0,
+            "claimed": 0,
+            "completed": 0,
+            "retried": 0,
+            "failed": 0
+        }
+        self._stop = asyncio.Event()
+        self._last_metrics = 0.0
+
+    def _with_session(self, function: Callable, *args) -> Any:
+        with self.session_factory() as db:
+            return function(db, *args)
+
+    async def _db(self, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, self._with_session, function, *args)
+
+    async def tick(self):
+        """Um ciclo: agendamentos vencidos e, se houver vaga, novos relatórios da fila"""
+        fired = await self._db(jobs.claim_due_schedules, datetime.utcnow())
+        self.stats["schedules_fired"] += len(fired)
+
+        free = self.concurrency - len(self.running)
+        if free <= 0:
+            return
+        claimed = await self._db(jobs.claim_jobs, self.worker_id, free, datetime.utcnow())
+        self.stats["claimed"] += len(claimed)
+        for job in claimed:
+            task = asyncio.create_task(self._run(job))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, job: jobs.Job):
+        try:
+            await self._execute(job)
+        except Exception:
+            # Resultado não registrado: o relatório volta para a fila após JOB_TIMEOUT
+            logger.exception("Falha ao registrar o resultado do relatório %s", job.report_id)
+
+    async def _execute(self, job: jobs.Job):
+        try:
+            cached = await self._db(cache.load_entry, job.template_id, job.parameters)
+            file_path, result = await generate_report(
+                job.report_id, job.template_id, job.format, job.parameters, cached
+            )
+        except Exception as e:
+            logger.exception("Relatório %s falhou (tentativa %s)", job.report_id, job.attempt)
+            retry = await self._db(jobs.fail_job, job, str(e), datetime.utcnow())
+            self.stats["retried" if retry else "failed"] += 1
+            return
+        await self._db(jobs.complete_job, job, file_path, datetime.utcnow())
+        self.stats["completed"] += 1
+        if result is not None:
+            try:
+                await self._db(cache.store_result, cached, job, result, file_path)
+            except Exception:
+                # O relatório já está pronto; só o próximo deixa de aproveitar este resultado
+                logger.exception("Resultado do relatório %s não gravado no cache", job.report_id)
+
+    async def _log_metrics(self):
+        if time.monotonic() - self._last_metrics < self.metrics_interval:
+            return
+        self._last_metrics = time.monotonic()
+        metrics = await self._db(jobs.queue_metrics)
+        logger.info("fila=%s worker=%s em_andamento=%s engine=%s",
+                    metrics, self.stats, len(self.running), report_engine.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "worker_id": self.worker_id, "in_flight": len(self.running)}
+
+    def stop(self):
+        self._stop.set()
+
+    async def run(self, once: bool = False):
+        logger.info("Worker %s iniciado (concorrência %s)", self.worker_id, self.concurrency)
+        while not self._stop.is_set():
+            try:
+                await self.tick()
+                await self._log_metrics()
+            except Exception:
+                # Banco indisponível etc.: tenta de novo no próximo ciclo
+                logger.exception("Falha no ciclo do worker")
+            if once:
+                break
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        if self.running:
+            logger.info("Aguardando %s relatório(s) em andamento", len(self.running))
+            await asyncio.gather(*self.running, return_exceptions=True)
+        report_engine.shutdown()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="executa um único ciclo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    init_db()
+    worker = ReportWorker(
+        concurrency=int(os.getenv("REPORT_WORKER_CONCURRENCY", "2")),
+        poll_interval=float(os.getenv("REPORT_POLL_INTERVAL", "5")),
+        metrics_interval=float(os.getenv("REPORT_METRICS_INTERVAL", "60"))
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run(once=args.once)
+    logger.info("Worker encerrado: %s", worker.get_stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Migração aditiva das colunas declaradas nos modelos
+
+Base.metadata.create_all não altera tabelas que já existem: colunas adicionadas
+depois aos modelos (ex.: progress/attempts/claimed_by em reports, attempt/worker_id
+em report_executions) não aparecem em bancos antigos e toda consulta ORM à tabela
+falha. Este módulo adiciona as colunas que faltam com ALTER TABLE ... ADD COLUMN
+e registra cada uma em column_migrations.
+
+Só adiciona: nunca remove, renomeia ou altera o tipo de colunas existentes.
+Colunas com default escalar no modelo recebem o mesmo valor como DEFAULT do
+banco, preenchendo as linhas existentes; as demais entram como NULL.
+
+Uso:
+    python -m shared.config.column_migrations            # aplica
+    python -m shared.config.column_migrations --dry-run  # só lista o que falta
+"""
+
+import argparse
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, insert, literal
+from sqlalchemy.exc import IntegrityError
+
+from shared.config.index_migrations import all_metadatas, migration_lock
+
+logger = logging.getLogger(__name__)
+
+migrations_metadata = MetaData()
+
+# Colunas adicionadas por esta migração e quando
+column_migrations = Table(
+    "column_migrations",
+    migrations_metadata,
+    Column("table_name", String(128), primary_key=True),
+    Column("column_name", String(128), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def pending_columns(engine, metadatas: Iterable[MetaData]):
+    """Colunas declaradas em tabelas existentes que ainda não estão no banco"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for metadata in metadatas:
+        for table in metadata.tables.values():
+            if table.name not in existing_tables:
+                # Tabela nova: create_all cria com todas as colunas
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            pending.extend(column for column in table.columns if column.name not in existing)
+    return pending
+
+
+def _server_default(engine, column) -> Optional[str]:
+    if column.server_default is not None and hasattr(column.server_default, "arg"):
+        arg = column.server_default.arg
+        return arg if isinstance(arg, str) else str(arg.compile(dialect=engine.dialect))
+    if column.default is not None and column.default.is_scalar:
+        return str(literal(column.default.arg, column.type).compile(
+            dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+        ))
+    return None
+
+
+def add_column_ddl(engine, column) -> str:
+    """ALTER TABLE ... ADD COLUMN para uma coluna do modelo (sem constraints de FK)"""
+    preparer = engine.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN "
+        f"{'IF NOT EXISTS ' if engine.dialect.name == 'postgresql' else ''}"
+        f"{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+    )
+    default = _server_default(engine, column)
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+        # NOT NULL só é seguro quando as linhas existentes recebem o DEFAULT
+        if not column.nullable:
+            ddl += " NOT NULL"
+    elif not column.nullable:
+        logger.warning("Coluna %s.%s adicionada como NULL: sem default para as linhas existentes",
+                       column.table.name, column.name)
+    return ddl
+
+
+def migrate_columns(engine, metadatas: Optional[Iterable[MetaData]] = None, dry_run: bool = False) -> List[str]:
+    """Adiciona as colunas pendentes e devolve seus nomes (tabela.coluna)"""
+    metadatas = all_metadatas() if metadatas is None else list(metadatas)
+    if dry_run:
+        return [f"{column.table.name}.{column.name}" for column in pending_columns(engine, metadatas)]
+
+    with migration_lock(engine):
+        # Recalculado sob o lock: outro serviço pode ter acabado de adicionar as colunas
+        pending = pending_columns(engine, metadatas)
+        if not pending:
+            return []
+        migrations_metadata.create_all(bind=engine, tables=[column_migrations])
+        applied = []
+        for column in pending:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(add_column_ddl(engine, column))
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(column_migrations).values(
+                        table_name=column.table.name, column_name=column.name, applied_at=datetime.utcnow()
+                    ))
+            except IntegrityError:
+                pass  # Coluna removida à mão e adicionada de novo: o registro já existe
+            logger.info("Coluna %s.%s adicionada", column.table.name, column.name)
+            applied.append(f"{column.table.name}.{column.name}")
+        return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adiciona as colunas declaradas nos modelos que faltam no banco")
+    parser.add_argument("--dry-run", action="store_true", help="apenas lista as colunas pendentes")
+    args = parser.parse_args()
+
+    from shared.config.database import engine
+
+    names = migrate_columns(engine, dry_run=args.dry_run)
+    verb = "Pendentes" if args.dry_run else "Adicionadas"
+    print(f"{verb}: {len(names)}")
+    for name in names:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,8 +23,22 @@ def init_db():
     try:
         from shared.models import user, booking, property, product, ticket, park, attraction, inventory_item, sale, marketing_campaign, analytics, seo, translation, subscription, giftcard, coupon, reward
         Base.metadata.create_all(bind=engine)
+        migrate_schema()
         print("✅ Banco de dados inicializado com sucesso!")
     except ImportError as e:
         print(f"⚠️ Aviso: Alguns modelos não puderam ser importados: {e}")
         # Criar apenas as tabelas básicas
-        Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+        Base.metadata.create_all(bind=engine)
+        migrate_schema()
+
+def migrate_schema():
+    """create_all não adiciona colunas nem índices novos a tabelas que já existem"""
+    from shared.config.column_migrations import migrate_columns
+    from shared.config.index_migrations import migrate_indexes
+    # Colunas primeiro: índices novos podem usar colunas novas
+    migrate_columns(engine, [Base.metadata])
+    try:
+        migrate_indexes(engine, [Base.metadata])
+    except Exception as e:
+        # Índices são otimização: o serviço sobe e a migração roda de novo no próximo start
+        print(f"⚠️ Aviso: migração de índices não concluída: {e}")
@@ -0,0 +1,162 @@
+"""
+Migração dos índices declarados nos modelos
+
+Base.metadata.create_all só cria índices junto com tabelas novas; em bancos já
+existentes os índices adicionados depois em __table_args__ nunca apareceriam.
+Este módulo compara os índices declarados com os existentes, cria os que faltam
+e registra cada criação em index_migrations.
+
+Vários serviços chamam a migração ao subir contra o mesmo banco: no PostgreSQL
+ela roda sob um advisory lock (um serviço por vez; os demais encontram nada
+pendente) e índices deixados INVALID por um CREATE INDEX CONCURRENTLY que falhou
+são removidos e recriados.
+
+Uso:
+    python -m shared.config.index_migrations            # aplica
+    python -m shared.config.index_migrations --dry-run  # só lista o que falta
+"""
+
+import argparse
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, insert, text, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+migrations_metadata = MetaData()
+
+# Chave do advisory lock das migrações de schema (qualquer bigint fixo serve)
+MIGRATION_LOCK_KEY = 360_039
+
+# Índices criados por esta migração e quando
+index_migrations = Table(
+    "index_migrations",
+    migrations_metadata,
+    Column("name", String(128), primary_key=True),
+    Column("table_name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def all_metadatas() -> List[MetaData]:
+    """Metadados dos modelos com índices declarados; vários módulos usam Base própria"""
+    from shared.config.database import Base
+    from shared.models import (  # noqa: F401  - registra as tabelas
+        booking, chatbots, documents, insurance, loyalty, maps, payment, photos, property, reports, user, videos,
+        voucher
+    )
+    return [
+        Base.metadata, chatbots.Base.metadata, documents.Base.metadata,
+        insurance.Base.metadata
+    ]
+
+
+@contextmanager
+def migration_lock(engine):
+    """Serializa as migrações entre processos (advisory lock no PostgreSQL)"""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Lock de sessão: espera o serviço que estiver migrando terminar
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def invalid_indexes(engine) -> Set[str]:
+    """Índices INVALID (CREATE INDEX CONCURRENTLY interrompido) do schema atual"""
+    if engine.dialect.name != "postgresql":
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(text(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE NOT i.indisvalid AND n.nspname = current_schema()"
+        )).scalars())
+
+
+def pending_indexes(engine, metadatas: Iterable[MetaData]):
+    """Índices declarados cujas tabelas existem mas que faltam ou estão INVALID"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    invalid = invalid_indexes(engine)
+    pending = []
+    for metadata in metadatas:
+        for table in metadata.tables.values():
+            if table.name not in existing_tables:
+                # Tabela nova: create_all cria os índices junto
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)} - invalid
+            pending.extend(index for index in sorted(table.indexes, key=lambda i: i.name) if index.name not in existing)
+    return pending
+
+
+def migrate_indexes(engine, metadatas: Optional[Iterable[MetaData]] = None, dry_run: bool = False) -> List[str]:
+    """Cria os índices pendentes e devolve seus nomes
+
+    No PostgreSQL a criação usa CREATE INDEX CONCURRENTLY (fora de transação)
+    para não bloquear escritas em tabelas grandes.
+    """
+    metadatas = all_metadatas() if metadatas is None else list(metadatas)
+    if dry_run:
+        return [index.name for index in pending_indexes(engine, metadatas)]
+
+    with migration_lock(engine):
+        # Recalculado sob o lock: outro serviço pode ter acabado de criar os índices
+        pending = pending_indexes(engine, metadatas)
+        if not pending:
+            return []
+        migrations_metadata.create_all(bind=engine, tables=[index_migrations])
+        invalid = invalid_indexes(engine)
+        return [_create_index(engine, index, index.name in invalid) for index in pending]
+
+
+def _create_index(engine, index, rebuild: bool) -> str:
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if rebuild:
+                # Sobra de uma criação concorrente que falhou: não é usada nem atualizada
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                logger.warning("Índice %s estava INVALID; recriando", index.name)
+            index.dialect_options["postgresql"]["concurrently"] = True
+            index.create(bind=conn, checkfirst=True)
+    else:
+        with engine.begin() as conn:
+            index.create(bind=conn, checkfirst=True)
+
+    values = {"table_name": index.table.name, "applied_at": datetime.utcnow()}
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(index_migrations).values(name=index.name, **values))
+    except IntegrityError:
+        # Índice recriado: atualiza o registro existente
+        with engine.begin() as conn:
+            conn.execute(update(index_migrations).where(index_migrations.c.name == index.name).values(**values))
+    logger.info("Índice %s criado em %s", index.name, index.table.name)
+    return index.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cria os índices declarados nos modelos que faltam no banco")
+    parser.add_argument("--dry-run", action="store_true", help="apenas lista os índices pendentes")
+    args = parser.parse_args()
+
+    from shared.config.database import engine
+
+    names = migrate_indexes(engine, dry_run=args.dry_run)
+    verb = "Pendentes" if args.dry_run else "Criados"
+    print(f"{verb}: {len(names)}")
+    for name in names:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    main()
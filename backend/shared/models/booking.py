@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from shared.config.database import Base
 from datetime import datetime
@@ -14,6 +14,14 @@ class Booking(Base):
     total_price = Column(Float, nullable=False)
     status = Column(String, default="confirmed")
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     property = relationship("Property")
-    customer = relationship("User") 
\ No newline at end of file
+    customer = relationship("User")
+
+    # Paginação por cursor (created_at, id), reservas por cliente e contagem por status
+    __table_args__ = (
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_customer_id_created_at", "customer_id", "created_at"),
+        Index("ix_bookings_status", "status"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -48,7 +48,7 @@ class ChatbotMessage(Base):
     intent_detected = Column(String(100), nullable=True)
     confidence_score = Column(Float, nullable=True)
     response_time_ms = Column(Integer, nullable=True)
-    metadata = Column(JSON, nullable=True)
+    message_metadata = Column("metadata", JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class ChatbotIntent(Base):
@@ -65,6 +65,11 @@ class ChatbotIntent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Detecção de intenção carrega as intenções ativas do chatbot
+    __table_args__ = (
+        Index("ix_chatbot_intents_chatbot_id_active", "chatbot_id", "is_active"),
+    )
+
 class ChatbotResponse(Base):
     __tablename__ = "chatbot_responses"
     id = Column(Integer, primary_key=True, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -23,10 +23,15 @@ class Document(Base):
     related_booking_id = Column(Integer, nullable=True)
     related_order_id = Column(Integer, nullable=True)
     tags = Column(Text, nullable=True)  # JSON array of tags
-    metadata = Column(Text, nullable=True)  # JSON object for additional metadata
+    extra_metadata = Column("metadata", Text, nullable=True)  # JSON object for additional metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Keyset pagination of active documents on (created_at, id)
+    __table_args__ = (
+        Index("ix_documents_status_created_at_id", "status", "created_at", "id"),
+    )
+
 class DocumentVersion(Base):
     __tablename__ = "document_versions"
     
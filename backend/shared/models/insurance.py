@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -43,6 +43,12 @@ class InsurancePolicy(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Keyset pagination on (created_at, id), globally and per user
+    __table_args__ = (
+        Index("ix_insurance_policies_created_at_id", "created_at", "id"),
+        Index("ix_insurance_policies_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 class InsuranceClaim(Base):
     __tablename__ = "insurance_claims"
     
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Index
 from datetime import datetime
 
-Base = declarative_base()
+# Base compartilhada: init_db cria as tabelas junto com as demais (users é FK)
+from shared.config.database import Base
 
 class LoyaltyTier(Base):
     __tablename__ = "loyalty_tiers"
@@ -46,6 +46,11 @@ class LoyaltyTransaction(Base):
     campaign_id = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Extrato do usuário em ordem cronológica
+    __table_args__ = (
+        Index("ix_loyalty_transactions_user_id_created_at", "user_id", "created_at"),
+    )
+
 class LoyaltyCampaign(Base):
     __tablename__ = "loyalty_campaigns"
     
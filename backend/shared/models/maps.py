@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from shared.config.database import Base
 
@@ -21,6 +21,13 @@ class MapLocation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Paginação por cursor (created_at, id) das localizações ativas, com e sem filtro
+    __table_args__ = (
+        Index("ix_map_locations_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_map_locations_active_type_created_at_id", "is_active", "location_type", "created_at", "id"),
+        Index("ix_map_locations_active_city_created_at_id", "is_active", "city", "created_at", "id"),
+    )
+
 class MapRoute(Base):
     __tablename__ = "map_routes"
 
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from shared.config.database import Base
+
+class Payment(Base):
+    """Pagamentos (mesma tabela da migração knex 003_create_payments_table)"""
+    __tablename__ = "payments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    transaction_id = Column(String, nullable=False, unique=True)
+    type = Column(String, default="payment")  # payment, refund, fee, discount, adjustment
+    method = Column(String, nullable=False)  # credit_card, debit_card, bank_transfer, pix, cash, voucher
+    status = Column(String, default="pending")  # pending, processing, completed, failed, cancelled, refunded
+    amount = Column(Numeric(10, 2), nullable=False)
+    currency = Column(String(3), default="BRL")
+    fee_amount = Column(Numeric(10, 2), default=0)
+    net_amount = Column(Numeric(10, 2), nullable=False)
+    description = Column(Text)
+    processed_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relatórios financeiros varrem um período de criação
+    __table_args__ = (
+        Index("ix_payments_created_at", "created_at"),
+    )
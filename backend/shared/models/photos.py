@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index
+from sqlalchemy.sql import func, text
 from shared.config.database import Base
 
 class Photo(Base):
@@ -32,9 +32,22 @@ class Photo(Base):
     tags = Column(Text)  # JSON array of tags
     color_palette = Column(Text)  # JSON with dominant colors
     upload_status = Column(String, default="processing")  # processing, completed, failed
+    derivatives = Column(Text)  # JSON {tamanho: {formato: caminho}} dos derivados
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Paginação por cursor (created_at, id) e filtros da listagem /photos/
+    __table_args__ = (
+        Index("ix_photos_created_at_id", "created_at", "id"),
+        Index("ix_photos_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_photos_album_id_created_at_id", "album_id", "created_at", "id"),
+        # Fotos mais populares (is_public = true ORDER BY view_count DESC)
+        Index(
+            "ix_photos_public_view_count", "view_count",
+            postgresql_where=text("is_public"), sqlite_where=text("is_public = 1")
+        ),
+    )
+
 class PhotoAlbum(Base):
     __tablename__ = "photo_albums"
 
@@ -80,6 +93,11 @@ class PhotoLike(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Like/unlike procura (photo_id, user_id)
+    __table_args__ = (
+        Index("ix_photo_likes_photo_id_user_id", "photo_id", "user_id"),
+    )
+
 class PhotoComment(Base):
     __tablename__ = "photo_comments"
 
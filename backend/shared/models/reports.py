@@ -1,9 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
-
-Base = declarative_base()
+from shared.config.database import Base
 
 class Report(Base):
     """Modelo para relatórios gerados"""
@@ -14,7 +12,9 @@ class Report(Base):
     template_id = Column(String(100), nullable=False)
     category = Column(String(50), nullable=False)
     format = Column(String(10), nullable=False)  # pdf, excel, csv, json
-    status = Column(String(20), default="processing")  # processing, completed, failed
+    status = Column(String(20), default="queued")  # queued, processing, completed, failed
+    progress = Column(Integer, default=0)  # 0-100, atualizado pelo motor de geração
+    error_message = Column(Text, nullable=True)
     parameters = Column(JSON, nullable=True)
     file_path = Column(String(500), nullable=True)
     file_size = Column(Integer, nullable=True)
@@ -22,8 +22,22 @@ class Report(Base):
     completed_at = Column(DateTime, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     
+    # Fila de geração (worker de relatórios)
+    schedule_id = Column(Integer, ForeignKey("report_schedules.id"), nullable=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)  # backoff entre tentativas
+    started_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String(100), nullable=True)  # worker que está gerando
+    
     # Relacionamentos
-    creator = relationship("User", back_populates="reports")
+    creator = relationship("User")
+    schedule = relationship("ReportSchedule")
+
+    # Paginação por cursor (created_at, id) e varredura da fila pelo worker
+    __table_args__ = (
+        Index("ix_reports_created_at_id", "created_at", "id"),
+        Index("ix_reports_status_next_attempt_at", "status", "next_attempt_at"),
+    )
 
 class ReportTemplate(Base):
     """Modelo para templates de relatórios"""
@@ -47,7 +61,9 @@ class ReportSchedule(Base):
     id = Column(Integer, primary_key=True, index=True)
     template_id = Column(String(100), nullable=False)
     name = Column(String(255), nullable=False)
-    frequency = Column(String(20), nullable=False)  # daily, weekly, monthly, custom
+    frequency = Column(String(20), nullable=False)  # hourly, daily, weekly, monthly, custom
+    cron_expression = Column(String(100), nullable=True)  # obrigatório em frequency="custom"
+    format = Column(String(10), default="pdf")
     parameters = Column(JSON, nullable=True)
     recipients = Column(JSON, nullable=True)  # Lista de emails
     next_run = Column(DateTime, nullable=False)
@@ -57,15 +73,22 @@ class ReportSchedule(Base):
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     # Relacionamentos
-    creator = relationship("User", back_populates="report_schedules")
+    creator = relationship("User")
+
+    # Agendamentos vencidos, buscados pelo worker a cada ciclo
+    __table_args__ = (
+        Index("ix_report_schedules_active_next_run", "is_active", "next_run"),
+    )
 
 class ReportExecution(Base):
-    """Modelo para execuções de relatórios agendados"""
+    """Histórico de execuções: uma linha por tentativa de geração de um relatório"""
     __tablename__ = "report_executions"
     
     id = Column(Integer, primary_key=True, index=True)
-    schedule_id = Column(Integer, ForeignKey("report_schedules.id"), nullable=False)
+    schedule_id = Column(Integer, ForeignKey("report_schedules.id"), nullable=True)  # vazio em relatórios avulsos
     report_id = Column(Integer, ForeignKey("reports.id"), nullable=True)
+    attempt = Column(Integer, default=1)
+    worker_id = Column(String(100), nullable=True)
     status = Column(String(20), default="pending")  # pending, running, completed, failed
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
@@ -75,6 +98,38 @@ class ReportExecution(Base):
     schedule = relationship("ReportSchedule")
     report = relationship("Report")
 
+    # Histórico por agendamento e por relatório
+    __table_args__ = (
+        Index("ix_report_executions_schedule_id_started_at", "schedule_id", "started_at"),
+        Index("ix_report_executions_report_id", "report_id"),
+    )
+
+class ReportCache(Base):
+    """Resultado reutilizável de um template: agregados parciais, marca d'água e arquivos gerados
+
+    Uma linha por (template, parâmetros normalizados). version muda a cada
+    recálculo; artifacts guarda, por formato, o arquivo gerado na versão atual.
+    """
+    __tablename__ = "report_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(String(100), nullable=False)
+    parameters_hash = Column(String(32), nullable=False)
+    parameters = Column(JSON, nullable=True)  # parâmetros normalizados, para consulta
+    watermark = Column(JSON, nullable=False)  # linhas, maior id e último updated_at de cada tabela de origem
+    partials = Column(JSON, nullable=False)  # agregados parciais que recebem o delta
+    artifacts = Column(JSON, nullable=True)  # formato -> {"path", "size"}
+    version = Column(Integer, default=1)
+    hits = Column(Integer, default=0)
+    full_refreshes = Column(Integer, default=0)
+    incremental_refreshes = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_report_cache_template_id_parameters_hash", "template_id", "parameters_hash", unique=True),
+    )
+
 class ReportAccess(Base):
     """Modelo para controle de acesso aos relatórios"""
     __tablename__ = "report_access"
@@ -124,9 +179,4 @@ class ReportNotification(Base):
     
     # Relacionamentos
     report = relationship("Report")
-    user = relationship("User")
-
-# Adicionar relacionamentos ao modelo User (se existir)
-# class User(Base):
-#     reports = relationship("Report", back_populates="creator")
-#     report_schedules = relationship("ReportSchedule", back_populates="creator") 
\ No newline at end of file
+    user = relationship("User") 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index
+from sqlalchemy.sql import func, text
 from shared.config.database import Base
 
 class Video(Base):
@@ -30,6 +30,19 @@ class Video(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Paginação por cursor (created_at, id) e filtros da listagem /videos/
+    __table_args__ = (
+        Index("ix_videos_created_at_id", "created_at", "id"),
+        Index("ix_videos_category_created_at_id", "category", "created_at", "id"),
+        Index("ix_videos_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Vídeos mais populares (upload_status = 'completed' ORDER BY view_count DESC)
+        Index(
+            "ix_videos_completed_view_count", "view_count",
+            postgresql_where=text("upload_status = 'completed'"),
+            sqlite_where=text("upload_status = 'completed'")
+        ),
+    )
+
 class VideoPlaylist(Base):
     __tablename__ = "video_playlists"
 
@@ -67,6 +80,11 @@ class VideoView(Base):
     location = Column(String)  # country/city
     viewed_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Agregados por vídeo (total, distintos) resolvidos só pelo índice
+    __table_args__ = (
+        Index("ix_video_views_video_id_user_id", "video_id", "user_id"),
+    )
+
 class VideoLike(Base):
     __tablename__ = "video_likes"
 
@@ -76,6 +94,11 @@ class VideoLike(Base):
     is_like = Column(Boolean, nullable=False)  # True = like, False = dislike
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Like/dislike procura (video_id, user_id)
+    __table_args__ = (
+        Index("ix_video_likes_video_id_user_id", "video_id", "user_id"),
+    )
+
 class VideoComment(Base):
     __tablename__ = "video_comments"
 
@@ -0,0 +1,79 @@
+from sqlalchemy import Column, String, Float, Date, DateTime, Integer, Text, JSON, ForeignKey, Index
+from shared.config.database import Base
+from datetime import datetime
+
+class Voucher(Base):
+    """Voucher emitido por uma agência (serviço de vouchers)"""
+    __tablename__ = "vouchers"
+
+    id = Column(String(36), primary_key=True)
+    codigo = Column(String(50), nullable=False, unique=True)
+    cliente = Column(String(255), nullable=False)
+    tipo = Column(String(20), nullable=False)  # hotel, voo, pacote, atracao, transporte, servico
+    destino = Column(String(255), nullable=False)
+    data_inicio = Column(Date, nullable=False)
+    data_fim = Column(Date, nullable=False)
+    valor = Column(Float, nullable=False)
+    agencia = Column(String(255), nullable=False)
+    agente = Column(String(255), nullable=False)
+    observacoes = Column(Text, nullable=True)
+    beneficios = Column(JSON, default=list)
+    validade = Column(Date, nullable=False)
+    documentos = Column(JSON, default=list)
+    status = Column(String(20), default="ativo")  # ativo, usado, expirado, cancelado, pendente
+    qr_code = Column(Text, nullable=True)
+    criado_em = Column(DateTime, default=datetime.now)
+    usado_em = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Carga do índice em memória na ordem de criação e sincronização entre réplicas
+    __table_args__ = (
+        Index("ix_vouchers_criado_em_id", "criado_em", "id"),
+        Index("ix_vouchers_atualizado_em", "atualizado_em"),
+    )
+
+class VoucherDeletion(Base):
+    """Voucher removido: as outras réplicas tiram o id do índice em memória no sync"""
+    __tablename__ = "voucher_deletions"
+
+    voucher_id = Column(String(36), primary_key=True)
+    removido_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_voucher_deletions_removido_em", "removido_em"),
+    )
+
+class VoucherBatch(Base):
+    """Operação em lote sobre vouchers (alteração de status ou exportação), processada em blocos"""
+    __tablename__ = "voucher_batches"
+
+    id = Column(String(36), primary_key=True)
+    operacao = Column(String(20), nullable=False)  # status, export
+    parametros = Column(JSON, nullable=True)  # {"novo_status": ...} ou {"formato": ...}
+    voucher_ids = Column(JSON, nullable=False)  # itens pedidos, na ordem recebida
+    status = Column(String(20), default="queued")  # queued, running, completed, failed
+    total = Column(Integer, nullable=False)
+    processados = Column(Integer, default=0)  # itens de blocos já confirmados (commit)
+    contagem = Column(JSON, default=dict)  # resultado -> quantidade
+    arquivo = Column(String(500), nullable=True)  # exportação gerada
+    erro = Column(Text, nullable=True)
+    claimed_by = Column(String(100), nullable=True)  # réplica que está processando
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    iniciado_em = Column(DateTime, nullable=True)
+    concluido_em = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, default=datetime.utcnow)  # último bloco confirmado
+
+    # Lotes pendentes ou parados, retomados na inicialização do serviço
+    __table_args__ = (
+        Index("ix_voucher_batches_status_atualizado_em", "status", "atualizado_em"),
+    )
+
+class VoucherBatchItem(Base):
+    """Resultado de um item do lote, gravado na mesma transação do bloco"""
+    __tablename__ = "voucher_batch_items"
+
+    batch_id = Column(String(36), ForeignKey("voucher_batches.id", ondelete="CASCADE"), primary_key=True)
+    posicao = Column(Integer, primary_key=True)
+    voucher_id = Column(String(36), nullable=False)
+    resultado = Column(String(20), nullable=False)  # alterado, inalterado, exportado, nao_encontrado, duplicado
+    status_anterior = Column(String(20), nullable=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -506,6 +506,7 @@ class Photo(PhotoBase):
     share_count: int
     color_palette: Optional[str] = None
     upload_status: str
+    derivatives: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -643,17 +644,22 @@ class PhotoShareCreate(PhotoShareBase):
 
 class ReportBase(BaseModel):
     name: str
-    description: Optional[str] = None
-    report_type: str
-    parameters: Optional[str] = None
+    template_id: str
+    category: str
+    format: str = "json"
+    parameters: Optional[Dict[str, Any]] = None
 
 class ReportCreate(ReportBase):
     pass
 
 class ReportResponse(ReportBase):
     id: int
+    status: str
+    progress: Optional[int] = 0
+    error_message: Optional[str] = None
+    file_size: Optional[int] = None
     created_at: datetime
-    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
 
@@ -667,13 +673,38 @@ class ReportTemplateCreate(ReportTemplateBase):
     pass
 
 class ReportScheduleBase(BaseModel):
-    report_id: int
-    schedule_type: str
-    schedule_config: Optional[str] = None
+    template_id: str
+    name: str
+    frequency: str  # hourly, daily, weekly, monthly, custom
+    cron_expression: Optional[str] = None
+    format: str = "pdf"
+    parameters: Optional[Dict[str, Any]] = None
+    recipients: Optional[List[str]] = None
     is_active: bool = True
 
 class ReportScheduleCreate(ReportScheduleBase):
-    pass
+    next_run: Optional[datetime] = None  # padrão: próxima ocorrência da expressão cron
+
+class ReportScheduleResponse(ReportScheduleBase):
+    id: int
+    next_run: datetime
+    last_run: Optional[datetime] = None
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class ReportExecutionResponse(BaseModel):
+    id: int
+    schedule_id: Optional[int] = None
+    report_id: Optional[int] = None
+    attempt: int
+    worker_id: Optional[str] = None
+    status: str
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+    
+    model_config = ConfigDict(from_attributes=True)
 
 class ReportFilter(BaseModel):
     start_date: Optional[datetime] = None
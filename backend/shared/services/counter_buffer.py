@@ -0,0 +1,354 @@
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Hashable, List, Tuple
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+try:
+    import redis
+except ImportError:  # Sem Redis os contadores ficam no processo
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# (tabela, id da linha, coluna) -> incremento pendente
+CounterKey = Tuple[str, int, str]
+
+
+class LocalCounterStore:
+    """Incrementos pendentes em memória, particionados para reduzir contenção de lock"""
+
+    name = "local"
+
+    def __init__(self, shards: int = 16):
+        self.shards = [defaultdict(int) for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, key: CounterKey) -> int:
+        return zlib.crc32(f"{key[0]}:{key[1]}".encode()) % len(self.shards)
+
+    def incr(self, key: CounterKey, amount: int = 1):
+        index = self._shard(key)
+        with self.locks[index]:
+            self.shards[index][key] += amount
+
+    def get(self, key: CounterKey) -> int:
+        index = self._shard(key)
+        with self.locks[index]:
+            return self.shards[index].get(key, 0)
+
+    def drain(self) -> Dict[CounterKey, int]:
+        """Retira todos os incrementos pendentes (troca cada shard por um vazio)"""
+        drained: Dict[CounterKey, int] = {}
+        for index in range(len(self.shards)):
+            with self.locks[index]:
+                shard = self.shards[index]
+                self.shards[index] = defaultdict(int)
+            drained.update(shard)
+        return drained
+
+    def restore(self, counters: Dict[CounterKey, int]):
+        for key, amount in counters.items():
+            self.incr(key, amount)
+
+
+class RedisCounterStore:
+    """Incrementos pendentes em um hash Redis (compartilhado entre workers/réplicas)"""
+
+    name = "redis"
+
+    def __init__(self, redis_url: str, namespace: str = "counters"):
+        if redis is None:
+            raise RuntimeError("redis não instalado: use LocalCounterStore")
+        self.client = redis.from_url(redis_url, decode_responses=True)
+        self.pending_key = f"onion360:{namespace}:pending"
+        self.namespace = namespace
+
+    @staticmethod
+    def _field(key: CounterKey) -> str:
+        return f"{key[0]}|{key[1]}|{key[2]}"
+
+    def incr(self, key: CounterKey, amount: int = 1):
+        self.client.hincrby(self.pending_key, self._field(key), amount)
+
+    def get(self, key: CounterKey) -> int:
+        return int(self.client.hget(self.pending_key, self._field(key)) or 0)
+
+    def drain(self) -> Dict[CounterKey, int]:
+        # RENAME é atômico: incrementos seguintes vão para um hash novo
+        flushing_key = f"onion360:{self.namespace}:flushing:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(self.pending_key, flushing_key)
+        except redis.ResponseError:
+            return {}  # Nada pendente
+
+        values = self.client.hgetall(flushing_key)
+        self.client.delete(flushing_key)
+
+        drained = {}
+        for field, amount in values.items():
+            table, row_id, column = field.split("|")
+            drained[(table, int(row_id), column)] = int(amount)
+        return drained
+
+    def restore(self, counters: Dict[CounterKey, int]):
+        pipeline = self.client.pipeline()
+        for key, amount in counters.items():
+            pipeline.hincrby(self.pending_key, self._field(key), amount)
+        pipeline.execute()
+
+
+def create_counter_store(namespace: str = "counters"):
+    """Redis se COUNTER_REDIS_URL estiver definido, senão contadores no processo
+
+    Cada serviço precisa do seu namespace: o flush drena o hash inteiro, e um
+    hash compartilhado entregaria a um serviço os contadores de tabelas do outro.
+    """
+    redis_url = os.getenv("COUNTER_REDIS_URL")
+    if redis_url and redis is not None:
+        return RedisCounterStore(redis_url, namespace)
+    return LocalCounterStore()
+
+
+class CounterBuffer:
+    """Contadores write-behind e eventos em lote, persistidos periodicamente
+
+    Incrementos (view_count, like_count...) são acumulados e aplicados com um UPDATE
+    em lote por coluna; linhas de evento (visualizações, downloads) entram com INSERT
+    em lote. Remove a disputa pela linha quente em tráfego viral.
+
+    Se o lote falhar por causa de uma linha (violação de constraint, valor inválido),
+    cada item é reaplicado isoladamente: os válidos são persistidos e os que falham
+    voltam para a fila, sendo descartados após max_attempts tentativas.
+    """
+
+    def __init__(
+        self,
+        engine,
+        models: List[Any],
+        store=None,
+        namespace: str = "counters",
+        flush_interval: float = 2.0,
+        max_pending_events: int = 5000,
+        max_attempts: int = 5
+    ):
+        self.engine = engine
+        self.tables = {model.__tablename__: model.__table__ for model in models}
+        self.store = store or create_counter_store(namespace)
+        self.flush_interval = flush_interval
+        self.max_pending_events = max_pending_events
+        self.max_attempts = max_attempts
+        # Tentativas com falha por item: chave do contador ou (tabela, id do evento)
+        self._attempts: Dict[Hashable, int] = {}
+
+        self._events: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._events_lock = threading.Lock()
+        self._pending_events = 0
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self.running = False
+        self.thread = None
+
+        self.stats = {
+            "increments": 0,
+            "events": 0,
+            "flushes": 0,
+            "rows_updated": 0,
+            "events_inserted": 0,
+            "flush_errors": 0,
+            "dropped": 0,
+            "last_flush_seconds": 0.0
+        }
+
+    def incr(self, model, row_id: int, column: str, amount: int = 1):
+        """Agenda um incremento de contador"""
+        self.store.incr((model.__tablename__, row_id, column), amount)
+        self.stats["increments"] += 1
+
+    def add_event(self, model, values: Dict[str, Any]):
+        """Agenda a inserção de uma linha de evento"""
+        with self._events_lock:
+            self._events[model.__tablename__].append(values)
+            self._pending_events += 1
+            pending = self._pending_events
+        self.stats["events"] += 1
+        if pending >= self.max_pending_events:
+            self._wakeup.set()
+
+    def pending(self, model, row_id: int, column: str) -> int:
+        """Incremento ainda não persistido (para somar ao valor lido do banco)"""
+        return self.store.get((model.__tablename__, row_id, column))
+
+    def flush(self) -> Dict[str, int]:
+        """Persiste contadores e eventos pendentes"""
+        with self._flush_lock:
+            start = time.perf_counter()
+
+            with self._events_lock:
+                events = self._events
+                self._events = defaultdict(list)
+                self._pending_events = 0
+            counters = self.store.drain()
+            foreign = {key: amount for key, amount in counters.items() if key[0] not in self.tables}
+            if foreign:
+                # Store compartilhado com outro buffer: devolve o que não é nosso, sem descartar
+                self.store.restore(foreign)
+                counters = {key: amount for key, amount in counters.items() if key not in foreign}
+                logger.warning(
+                    f"{len(foreign)} contadores de tabelas desconhecidas devolvidos ao store "
+                    f"({', '.join(sorted({key[0] for key in foreign}))}): verifique o namespace"
+                )
+
+            if not counters and not events:
+                return {"rows_updated": 0, "events_inserted": 0}
+
+            # Agrupa por (tabela, coluna): um executemany de UPDATE para cada grupo
+            grouped: Dict[Tuple[str, str], List[Dict[str, int]]] = defaultdict(list)
+            for (table_name, row_id, column), amount in counters.items():
+                if amount:
+                    grouped[(table_name, column)].append({"row_id": row_id, "delta": amount})
+
+            try:
+                with self.engine.begin() as conn:
+                    for table_name, rows in events.items():
+                        conn.execute(insert(self.tables[table_name]), rows)
+                    for (table_name, column), rows in grouped.items():
+                        self._update_counters(conn, table_name, column, rows)
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                if self._is_transient(e):
+                    # Banco indisponível: devolve os pendentes para a próxima tentativa
+                    self._restore(counters, events)
+                    logger.error(f"Erro ao persistir contadores: {e}")
+                    raise
+                logger.error(f"Erro ao persistir contadores em lote, isolando as linhas com falha: {e}")
+                rows_updated, events_inserted = self._flush_isolated(counters, events)
+            else:
+                rows_updated = sum(len(rows) for rows in grouped.values())
+                events_inserted = sum(len(rows) for rows in events.values())
+                if self._attempts:
+                    self._attempts.clear()
+
+            self.stats["flushes"] += 1
+            self.stats["rows_updated"] += rows_updated
+            self.stats["events_inserted"] += events_inserted
+            self.stats["last_flush_seconds"] = time.perf_counter() - start
+            return {"rows_updated": rows_updated, "events_inserted": events_inserted}
+
+    def _update_counters(self, conn, table_name: str, column: str, rows: List[Dict[str, int]]):
+        table = self.tables[table_name]
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values({column: table.c[column] + bindparam("delta")}),
+            rows
+        )
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Falha de conexão/banco indisponível, e não de uma linha específica"""
+        return isinstance(error, (OperationalError, InterfaceError)) or getattr(
+            error, "connection_invalidated", False
+        )
+
+    def _restore(self, counters: Dict[CounterKey, int], events: Dict[str, List[Dict[str, Any]]]):
+        self.store.restore(counters)
+        with self._events_lock:
+            for table_name, rows in events.items():
+                self._events[table_name][:0] = rows
+                self._pending_events += len(rows)
+
+    def _give_up(self, key: Hashable, error: Exception) -> bool:
+        """Conta a falha do item; True quando ele deve ser descartado"""
+        if self._is_transient(error):
+            return False
+        attempts = self._attempts.get(key, 0) + 1
+        if attempts < self.max_attempts:
+            self._attempts[key] = attempts
+            return False
+        self._attempts.pop(key, None)
+        self.stats["dropped"] += 1
+        logger.error(f"Descartando {key} após {attempts} tentativas: {error}")
+        return True
+
+    def _flush_isolated(
+        self, counters: Dict[CounterKey, int], events: Dict[str, List[Dict[str, Any]]]
+    ) -> Tuple[int, int]:
+        """Reaplica cada evento e contador em sua própria transação"""
+        failed_counters: Dict[CounterKey, int] = {}
+        failed_events: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        rows_updated = events_inserted = 0
+
+        for table_name, rows in events.items():
+            for row in rows:
+                # O dicionário do evento continua vivo na fila: id() identifica a linha
+                key = (table_name, id(row))
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(insert(self.tables[table_name]), [row])
+                except Exception as e:
+                    if not self._give_up(key, e):
+                        failed_events[table_name].append(row)
+                    continue
+                self._attempts.pop(key, None)
+                events_inserted += 1
+
+        for key, amount in counters.items():
+            if not amount:
+                continue
+            table_name, row_id, column = key
+            try:
+                with self.engine.begin() as conn:
+                    self._update_counters(conn, table_name, column, [{"row_id": row_id, "delta": amount}])
+            except Exception as e:
+                if not self._give_up(key, e):
+                    failed_counters[key] = amount
+                continue
+            self._attempts.pop(key, None)
+            rows_updated += 1
+
+        self._restore(failed_counters, failed_events)
+        return rows_updated, events_inserted
+
+    def start(self):
+        """Inicia o flush periódico em background"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        logger.info(f"Flush de contadores iniciado ({self.store.name}, a cada {self.flush_interval}s)")
+
+    def stop(self):
+        """Para o flush periódico e persiste o que estiver pendente"""
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # Já registrado; os pendentes voltam para a próxima rodada
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "backend": self.store.name,
+            "pending_events": self._pending_events,
+            "failing_items": len(self._attempts),
+            "flush_interval": self.flush_interval
+        }
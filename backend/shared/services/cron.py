@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+# Atalhos aceitos no lugar dos cinco campos
+CRON_MACROS = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+
+# (mínimo, máximo) de cada campo: minuto, hora, dia do mês, mês, dia da semana
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# Sem ocorrência em 5 anos (ex.: "0 0 31 2 *") a expressão é considerada inválida
+_MAX_YEARS = 5
+
+
+class CronExpression:
+    """Expressão cron de cinco campos (minuto hora dia mês dia-da-semana)
+
+    Aceita "*", listas "1,15", intervalos "1-5", passos "*/15" e "10-50/10" e os
+    atalhos de CRON_MACROS. Dia da semana vai de 0 (domingo) a 6; 7 também é
+    domingo. Como no cron, se dia do mês e dia da semana forem ambos restritos,
+    basta um dos dois coincidir.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = CRON_MACROS.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: {expression!r}")
+        parsed = [_parse_field(field, *bounds) for field, bounds in zip(fields, _FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_month = moment.day in self.days
+        # isoweekday: segunda=1 ... domingo=7 -> domingo=0
+        in_week = moment.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes and moment.hour in self.hours
+            and moment.month in self.months and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Primeira ocorrência estritamente depois de moment (precisão de minuto)"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * _MAX_YEARS)
+        # Avança pelo campo mais grosso que não coincide, sem testar minuto a minuto
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Expressão cron sem ocorrência: {self.expression!r}")
+
+    def __repr__(self) -> str:
+        return f"CronExpression({self.expression!r})"
+
+
+def _parse_field(field: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Passo inválido em {field!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"Valor fora do intervalo {low}-{high} em {field!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def upcoming(expression: str, after: datetime, count: int = 5) -> List[datetime]:
+    """Próximas ocorrências, para pré-visualizar um agendamento"""
+    cron = CronExpression(expression)
+    moments = []
+    for _ in range(count):
+        after = cron.next_after(after)
+        moments.append(after)
+    return moments
@@ -0,0 +1,86 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Sem orjson as respostas usam o json da stdlib
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Tipos que o orjson não serializa nativamente (datetime/date já são nativos)"""
+    if isinstance(value, Decimal):
+        # Mesma representação do pydantic: string, sem perder precisão
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+
+    def fallback(value: Any) -> Any:
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return _default(value)
+
+    return json.dumps(content, default=fallback, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson (datetime, date e Decimal sem conversão prévia)
+
+    Usada como default_response_class dos serviços; sem orjson instalado cai no
+    json da stdlib com o mesmo formato de saída.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    """Mapeador pré-compilado de linhas ORM para dicts, sem validação pydantic
+
+    As colunas vêm dos campos do schema de resposta (ex.: shared.schemas.Photo),
+    então a saída tem o mesmo formato do response_model. Os getters são montados
+    uma vez: atributos já carregados são lidos direto do __dict__ da instância
+    (um itemgetter em C), e só linhas com atributos expirados/adiados passam
+    pelos descritores do ORM.
+    """
+
+    def __init__(self, schema, exclude: Sequence[str] = ()):
+        fields = [name for name in schema.model_fields if name not in exclude]
+        if not fields:
+            raise ValueError(f"{schema.__name__} não tem campos para serializar")
+        self.schema = schema
+        self.fields = tuple(fields)
+        # Com um único nome os getters devolvem o valor, não uma tupla
+        self._from_state = itemgetter(*fields) if len(fields) > 1 else (lambda state: (state[fields[0]],))
+        self._from_attributes = attrgetter(*fields) if len(fields) > 1 else (lambda row: (getattr(row, fields[0]),))
+
+    def _values(self, row: Any) -> tuple:
+        try:
+            return self._from_state(row.__dict__)
+        except (KeyError, AttributeError):
+            return self._from_attributes(row)
+
+    def one(self, row: Any) -> Dict[str, Any]:
+        return dict(zip(self.fields, self._values(row)))
+
+    def many(self, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+        fields, values = self.fields, self._values
+        return [dict(zip(fields, values(row))) for row in rows]
+
+    def response(self, rows: Iterable[Any], status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None) -> FastJSONResponse:
+        """Resposta pronta; o FastAPI não revalida conteúdo devolvido como Response"""
+        return FastJSONResponse(self.many(rows), status_code=status_code, headers=headers)
@@ -0,0 +1,215 @@
+import logging
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Bloco lido por vez quando o servidor não oferece envio zero-copy
+STREAM_CHUNK_SIZE = 256 * 1024
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+def parse_range(header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Interpreta 'bytes=a-b,c-,-n' em intervalos [início, fim] inclusivos
+
+    Retorna None se o header for inválido (deve ser ignorado) e [] se nenhum intervalo
+    puder ser satisfeito (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # Sufixo: últimos N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                start, end = max(file_size - length, 0), file_size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+                if last and end < start:
+                    return None
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+        if start < file_size:
+            ranges.append((start, end))
+
+    # Intervalos sobrepostos ou adjacentes viram um só
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RangeFileResponse(Response):
+    """Resposta de arquivo com Range/If-Range, ETag/Last-Modified e envio zero-copy
+
+    A decisão (200/206/304/416) é tomada na chamada ASGI, a partir dos headers da requisição.
+    A memória usada é constante: no máximo um bloco por vez, ou nenhum com zerocopysend.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        etag: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        content_disposition_type: str = "inline"
+    ):
+        self.path = path
+        self.media_type = media_type or mimetypes.guess_type(filename or path)[0] or "application/octet-stream"
+        self.filename = filename
+        self.etag = etag
+        self.extra_headers = dict(headers or {})
+        self.content_disposition_type = content_disposition_type
+        self.status_code = 200
+        self.background = None
+        self.body = b""
+        self.raw_headers = []
+
+    def _base_headers(self, file_stat: os.stat_result, etag: str) -> dict:
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(file_stat.st_mtime, usegmt=True),
+            **{key.lower(): value for key, value in self.extra_headers.items()}
+        }
+        if self.filename:
+            headers["content-disposition"] = (
+                f"{self.content_disposition_type}; filename*=utf-8''{quote(self.filename)}"
+            )
+        return headers
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, file_stat: os.stat_result) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(file_stat.st_mtime) <= since
+        return False
+
+    @staticmethod
+    def _range_applies(request_headers: Headers, etag: str, last_modified: str) -> bool:
+        """If-Range: só envia parcial se o arquivo não mudou desde a cópia do cliente"""
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if if_range.startswith('"'):
+            return if_range == etag
+        return if_range == last_modified
+
+    async def __call__(self, scope, receive, send):
+        request_headers = Headers(scope=scope)
+        method = scope.get("method", "GET")
+
+        try:
+            file_stat = await run_in_threadpool(os.stat, self.path)
+        except FileNotFoundError:
+            await Response("Arquivo não encontrado", status_code=404)(scope, receive, send)
+            return
+        if not stat.S_ISREG(file_stat.st_mode):
+            await Response("Arquivo não encontrado", status_code=404)(scope, receive, send)
+            return
+
+        file_size = file_stat.st_size
+        etag = f'"{self.etag}"' if self.etag else f'"{file_stat.st_mtime_ns:x}-{file_size:x}"'
+        headers = self._base_headers(file_stat, etag)
+
+        if self._not_modified(request_headers, etag, file_stat):
+            await self._send_headers(send, 304, headers)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        start, end = 0, file_size - 1
+        status_code = 200
+        range_header = request_headers.get("range")
+        if range_header and self._range_applies(request_headers, etag, headers["last-modified"]):
+            ranges = parse_range(range_header, file_size)
+            if ranges == []:
+                headers["content-range"] = f"bytes */{file_size}"
+                headers["content-length"] = "0"
+                await self._send_headers(send, 416, headers)
+                await send({"type": "http.response.body", "body": b""})
+                return
+            # Múltiplos intervalos disjuntos: resposta completa (permitido pela RFC 9110)
+            if ranges is not None and len(ranges) == 1:
+                start, end = ranges[0]
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+
+        length = end - start + 1 if file_size else 0
+        headers["content-type"] = self.media_type
+        headers["content-length"] = str(length)
+        await self._send_headers(send, status_code, headers)
+
+        if method == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            # O servidor transfere do descritor para o socket com sendfile(2)
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": f,
+                    "offset": start,
+                    "count": length
+                })
+            return
+
+        await self._send_chunks(send, start, length)
+
+    async def _send_headers(self, send, status_code: int, headers: dict):
+        self.status_code = status_code
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()]
+        })
+
+    async def _send_chunks(self, send, start: int, length: int):
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        try:
+            offset = start
+            remaining = length
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, fd, min(STREAM_CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Arquivo truncado durante o envio
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401  - registra o encoder AVIF em Pillow < 11.2
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Derivados gerados para cada foto: nome -> (lado máximo, qualidade, diretório)
+DERIVATIVE_SIZES = {
+    "thumbnail": (150, 85, "thumbnails"),
+    "medium": (800, 90, "medium"),
+    "large": (1920, 95, "large")
+}
+
+# Formatos modernos gerados além do formato base, em ordem de preferência
+Image.init()
+MODERN_FORMATS = [fmt for fmt in ("avif", "webp") if fmt.upper() in Image.SAVE]
+MODERN_QUALITY = {"avif": 60, "webp": 80}
+
+MIME_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png"
+}
+
+EXTENSIONS = {
+    "avif": "avif",
+    "webp": "webp",
+    "jpeg": "jpg",
+    "png": "png"
+}
+
+
+def read_image_info(file_path: str) -> Tuple[int, int, str]:
+    """Lê dimensões e formato apenas do cabeçalho da imagem"""
+    with Image.open(file_path) as img:
+        width, height = img.size
+        return width, height, img.format.lower()
+
+
+def base_format(original_format: Optional[str]) -> str:
+    """Formato base dos derivados: JPEG para fotos, PNG para formatos sem perdas"""
+    return "jpeg" if (original_format or "").lower() in ("jpeg", "jpg", "mpo") else "png"
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+    if fmt == "jpeg":
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        # JPEG progressivo: primeira passada visível rápido em conexões móveis
+        img.save(buffer, "JPEG", quality=quality, progressive=True, optimize=True)
+    elif fmt == "png":
+        img.save(buffer, "PNG", optimize=True)
+    else:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        img.save(buffer, fmt.upper(), quality=MODERN_QUALITY[fmt])
+
+    return buffer.getvalue()
+
+
+def _write_content_addressed(directory: str, stem: str, fmt: str, data: bytes) -> str:
+    """Grava com o hash do conteúdo no nome (URLs imutáveis, cacheáveis para sempre)"""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    path = f"{directory}/{stem}.{digest}.{EXTENSIONS[fmt]}"
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
+
+
+def generate_derivatives(file_path: str, filename: str) -> Dict[str, Dict[str, str]]:
+    """Gera todos os tamanhos e formatos a partir de uma única decodificação (executa em worker)
+
+    Retorna {tamanho: {formato: caminho}}.
+    """
+    largest = max(size for size, _, _ in DERIVATIVE_SIZES.values())
+    stem = os.path.splitext(filename)[0]
+    manifest: Dict[str, Dict[str, str]] = {}
+
+    with Image.open(file_path) as img:
+        fmt_base = base_format(img.format)
+
+        # JPEG: decodifica já reduzido por DCT (1/2, 1/4, 1/8), mantendo >= maior derivado
+        if img.format == "JPEG":
+            img.draft(None, (largest, largest))
+        img.load()
+
+        # Do maior para o menor: cada derivado parte do anterior, já reduzido
+        source = img
+        for name, (size, quality, directory) in sorted(
+            DERIVATIVE_SIZES.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            derivative = source.copy()
+            # reducing_gap usa Image.reduce (box filter inteiro) antes do resample final
+            derivative.thumbnail((size, size), reducing_gap=3.0)
+
+            variants = {}
+            for fmt in [fmt_base] + MODERN_FORMATS:
+                data = _encode(derivative, fmt, quality)
+                variants[fmt] = _write_content_addressed(directory, stem, fmt, data)
+            manifest[name] = variants
+            source = derivative
+
+    return manifest
+
+
+def negotiate_format(accept: Optional[str], available: List[str]) -> str:
+    """Escolhe o melhor formato disponível segundo o header Accept"""
+    fallback = next((fmt for fmt in available if fmt not in MODERN_FORMATS), available[0])
+    if not accept:
+        return fallback
+
+    accepted = {}
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[media_type.strip().lower()] = q
+
+    # Formatos modernos só quando anunciados explicitamente (image/* não garante suporte)
+    candidates = [
+        (accepted[MIME_TYPES[fmt]], -index, fmt)
+        for index, fmt in enumerate(MODERN_FORMATS)
+        if fmt in available and accepted.get(MIME_TYPES[fmt], 0) > 0
+    ]
+    if candidates:
+        return max(candidates)[2]
+    return fallback
+
+
+class DerivativeWorkerPool:
+    """Fila de geração de derivados em pool de processos"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "total_seconds": 0.0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    async def generate(self, file_path: str, filename: str) -> Dict[str, Dict[str, str]]:
+        """Agenda a geração e aguarda sem bloquear o event loop"""
+        loop = asyncio.get_running_loop()
+        self.stats["submitted"] += 1
+        self.stats["in_flight"] += 1
+        start = time.perf_counter()
+
+        try:
+            paths = await loop.run_in_executor(
+                self._get_executor(), generate_derivatives, file_path, filename
+            )
+            self.stats["completed"] += 1
+            return paths
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            self.stats["total_seconds"] += time.perf_counter() - start
+
+    def get_stats(self) -> Dict[str, Any]:
+        finished = self.stats["completed"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "max_workers": self.max_workers,
+            "avg_seconds": self.stats["total_seconds"] / finished if finished else 0.0
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,410 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Optional
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Integer, MetaData, String, Table,
+    delete, func, insert, select, update
+)
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # Backend S3 é opcional
+    boto3 = None
+    ClientError = None
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos blocos lidos do upload (hash e gravação em um único passe)
+CHUNK_SIZE = 1024 * 1024
+
+metadata = MetaData()
+
+# Um registro por conteúdo distinto; ref_count = registros de domínio que apontam para o blob
+media_blobs = Table(
+    "media_blobs",
+    metadata,
+    Column("sha256", String(64), primary_key=True),
+    Column("storage_key", String(200), nullable=False),
+    Column("size", BigInteger, nullable=False),
+    Column("content_type", String(200)),
+    Column("ref_count", Integer, nullable=False, default=1),
+    Column("created_at", DateTime, nullable=False),
+    Column("released_at", DateTime)
+)
+
+
+def blob_key(digest: str) -> str:
+    """Chave do blob particionada pelo prefixo do hash (ab/cd/abcd...)"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def blob_digest(file_path: Optional[str]) -> Optional[str]:
+    """SHA-256 de um caminho/URI gravado pelo store; None para arquivos de fora dele"""
+    name = os.path.basename(file_path or "")
+    if len(name) == 64 and all(char in "0123456789abcdef" for char in name):
+        return name
+    return None
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    storage_key: str
+    file_path: str
+    size: int
+    content_type: Optional[str]
+    deduplicated: bool
+
+
+class LocalStorageBackend:
+    """Blobs em disco local, sob um diretório raiz"""
+
+    name = "local"
+
+    def __init__(self, root: str = "media"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key: str, source_path: str, content_type: Optional[str] = None):
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Mesmo sistema de arquivos do diretório temporário: rename atômico
+        os.replace(source_path, destination)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def uri(self, key: str) -> str:
+        return self.path(key)
+
+    def local_path(self, key: str) -> str:
+        return self.path(key)
+
+
+class S3StorageBackend:
+    """Blobs em bucket S3 compatível (AWS, MinIO)"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        prefix: str = "media",
+        cache_dir: str = "media_cache"
+    ):
+        if boto3 is None:
+            raise RuntimeError("boto3 não instalado: backend S3 indisponível")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = cache_dir
+        # Credenciais via variáveis AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, key: str, source_path: str, content_type: Optional[str] = None):
+        extra_args = {"ContentType": content_type} if content_type else None
+        # upload_file faz multipart automaticamente para arquivos grandes
+        self.client.upload_file(source_path, self.bucket, self._object_key(key), ExtraArgs=extra_args)
+        os.remove(source_path)
+
+    def open(self, key: str) -> BinaryIO:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["Body"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        try:
+            os.remove(os.path.join(self.cache_dir, key))
+        except FileNotFoundError:
+            pass
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def local_path(self, key: str) -> str:
+        """Cópia local (cache) para processamento: imagens, transcodificação"""
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            self.client.download_file(self.bucket, self._object_key(key), tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+
+def create_storage_backend():
+    """Backend configurado por MEDIA_STORAGE_BACKEND (local | s3)"""
+    backend = os.getenv("MEDIA_STORAGE_BACKEND", "local")
+    if backend == "s3":
+        return S3StorageBackend(
+            bucket=os.getenv("MEDIA_S3_BUCKET", "rsv-media"),
+            endpoint_url=os.getenv("MEDIA_S3_ENDPOINT_URL"),  # ex.: http://localhost:9000 (MinIO)
+            prefix=os.getenv("MEDIA_S3_PREFIX", "media"),
+            cache_dir=os.getenv("MEDIA_CACHE_DIR", "media_cache")
+        )
+    return LocalStorageBackend(os.getenv("MEDIA_ROOT", "media"))
+
+
+class MediaStore:
+    """Armazenamento endereçado por conteúdo com deduplicação e contagem de referências"""
+
+    def __init__(self, engine, backend=None, temp_dir: Optional[str] = None):
+        self.engine = engine
+        self.backend = backend or create_storage_backend()
+        # Temporários no mesmo volume da raiz local para permitir rename atômico
+        self.temp_dir = temp_dir or os.path.join(getattr(self.backend, "root", "media"), ".incoming")
+        os.makedirs(self.temp_dir, exist_ok=True)
+        metadata.create_all(bind=engine, tables=[media_blobs])
+
+        self.stats = {
+            "uploads": 0,
+            "deduplicated": 0,
+            "bytes_written": 0,
+            "bytes_deduplicated": 0,
+            "released": 0,
+            "collected": 0
+        }
+
+        self._collector = None
+        self._collector_stop = threading.Event()
+
+    def _new_temp_file(self) -> BinaryIO:
+        return tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False)
+
+    @staticmethod
+    def _write_chunk(buffer: BinaryIO, digest, chunk: bytes):
+        digest.update(chunk)
+        buffer.write(chunk)
+
+    async def save_upload(self, file, content_type: Optional[str] = None) -> StoredBlob:
+        """Grava um UploadFile em blocos calculando o SHA-256 no mesmo passe
+
+        Conteúdo idêntico é gravado uma única vez e ganha uma referência a mais.
+        Quem chama é dono dessa referência: deve chamar release se o registro de
+        domínio não for gravado (falha no commit) e quando ele for apagado.
+        """
+        loop = asyncio.get_running_loop()
+        digest = hashlib.sha256()
+        size = 0
+
+        buffer = await loop.run_in_executor(None, self._new_temp_file)
+        try:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await loop.run_in_executor(None, self._write_chunk, buffer, digest, chunk)
+                size += len(chunk)
+        finally:
+            await loop.run_in_executor(None, buffer.close)
+
+        return await loop.run_in_executor(
+            None, self._commit, buffer.name, digest.hexdigest(), size,
+            content_type or getattr(file, "content_type", None)
+        )
+
+    def save_file(self, source: BinaryIO, content_type: Optional[str] = None) -> StoredBlob:
+        """Versão síncrona para arquivos já abertos (scripts, jobs)"""
+        digest = hashlib.sha256()
+        size = 0
+        with self._new_temp_file() as buffer:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                self._write_chunk(buffer, digest, chunk)
+                size += len(chunk)
+        return self._commit(buffer.name, digest.hexdigest(), size, content_type)
+
+    def _acquire(self, digest: str, key: str, size: int, content_type: Optional[str]) -> bool:
+        """Incrementa a referência (ou cria o registro); retorna True se o blob já existia"""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(media_blobs)
+                .where(media_blobs.c.sha256 == digest)
+                .values(ref_count=media_blobs.c.ref_count + 1, released_at=None)
+            )
+            if result.rowcount:
+                return True
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(media_blobs).values(
+                        sha256=digest,
+                        storage_key=key,
+                        size=size,
+                        content_type=content_type,
+                        ref_count=1,
+                        created_at=datetime.utcnow()
+                    ))
+                return False
+            except IntegrityError:
+                # Upload concorrente do mesmo conteúdo criou o registro primeiro
+                conn.execute(
+                    update(media_blobs)
+                    .where(media_blobs.c.sha256 == digest)
+                    .values(ref_count=media_blobs.c.ref_count + 1, released_at=None)
+                )
+                return True
+
+    def _commit(self, temp_path: str, digest: str, size: int, content_type: Optional[str]) -> StoredBlob:
+        key = blob_key(digest)
+        try:
+            deduplicated = self._acquire(digest, key, size, content_type)
+            # Registro antes do blob: o GC nunca remove um blob recém-referenciado
+            if self.backend.exists(key):
+                os.remove(temp_path)
+            else:
+                self.backend.put_file(key, temp_path, content_type)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.stats["uploads"] += 1
+        if deduplicated:
+            self.stats["deduplicated"] += 1
+            self.stats["bytes_deduplicated"] += size
+        else:
+            self.stats["bytes_written"] += size
+
+        return StoredBlob(
+            sha256=digest,
+            storage_key=key,
+            file_path=self.backend.uri(key),
+            size=size,
+            content_type=content_type,
+            deduplicated=deduplicated
+        )
+
+    def release(self, digest: str) -> Optional[int]:
+        """Remove uma referência; blobs sem referências são apagados pelo collect_garbage"""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(media_blobs)
+                .where(media_blobs.c.sha256 == digest, media_blobs.c.ref_count > 0)
+                .values(ref_count=media_blobs.c.ref_count - 1)
+            )
+            remaining = conn.execute(
+                select(media_blobs.c.ref_count).where(media_blobs.c.sha256 == digest)
+            ).scalar()
+            if remaining == 0:
+                conn.execute(
+                    update(media_blobs)
+                    .where(media_blobs.c.sha256 == digest)
+                    .values(released_at=datetime.utcnow())
+                )
+
+        self.stats["released"] += 1
+        return remaining
+
+    def release_path(self, file_path: Optional[str]) -> Optional[int]:
+        """release pelo caminho gravado no registro; ignora arquivos de fora do store"""
+        digest = blob_digest(file_path)
+        return self.release(digest) if digest else None
+
+    def collect_garbage(self, grace_seconds: int = 3600) -> int:
+        """Apaga blobs sem referências há mais de grace_seconds"""
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        with self.engine.connect() as conn:
+            candidates = conn.execute(
+                select(media_blobs.c.sha256, media_blobs.c.storage_key)
+                .where(media_blobs.c.ref_count == 0, media_blobs.c.released_at < cutoff)
+            ).all()
+
+        collected = 0
+        for digest, key in candidates:
+            with self.engine.begin() as conn:
+                # Só remove se continuar sem referências (um upload pode ter reaproveitado)
+                result = conn.execute(
+                    delete(media_blobs)
+                    .where(media_blobs.c.sha256 == digest, media_blobs.c.ref_count == 0)
+                )
+                # Blob apagado com a linha ainda bloqueada: um _acquire concorrente espera
+                # o commit, recria o registro e grava o blob de novo
+                if result.rowcount:
+                    self.backend.delete(key)
+                    collected += 1
+
+        self.stats["collected"] += collected
+        if collected:
+            logger.info(f"Media store: {collected} blobs sem referência removidos")
+        return collected
+
+    def start_collector(self, interval: float = 3600, grace_seconds: int = 3600):
+        """Executa o collect_garbage periodicamente em background"""
+        if self._collector is not None or interval <= 0:
+            return
+        self._collector_stop.clear()
+        self._collector = threading.Thread(
+            target=self._collect_loop, args=(interval, grace_seconds), daemon=True
+        )
+        self._collector.start()
+        logger.info(f"Coleta de blobs sem referência iniciada (a cada {interval}s)")
+
+    def stop_collector(self):
+        self._collector_stop.set()
+        if self._collector is not None:
+            self._collector.join()
+            self._collector = None
+
+    def _collect_loop(self, interval: float, grace_seconds: int):
+        while not self._collector_stop.wait(interval):
+            try:
+                self.collect_garbage(grace_seconds)
+            except Exception as e:
+                logger.error(f"Erro na coleta de blobs: {e}")
+
+    def local_path(self, file_path: str) -> str:
+        """Caminho local de um blob a partir do file_path gravado no registro"""
+        if file_path.startswith("s3://"):
+            # s3://bucket/prefixo/ab/cd/<sha256> -> ab/cd/<sha256>
+            return self.backend.local_path("/".join(file_path.split("/")[-3:]))
+        return file_path
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.engine.connect() as conn:
+            blobs, stored_bytes, references = conn.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(media_blobs.c.size), 0),
+                    func.coalesce(func.sum(media_blobs.c.ref_count), 0)
+                )
+            ).one()
+        return {
+            **self.stats,
+            "backend": self.backend.name,
+            "blobs": blobs,
+            "stored_bytes": stored_bytes,
+            "references": references
+        }
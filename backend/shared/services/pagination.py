@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, literal, or_
+
+# Header com o cursor da próxima página nos endpoints que retornam listas
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(column, value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Cursor opaco (base64 url-safe) com os valores da chave de ordenação"""
+    payload = json.dumps([_to_json(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """Valores da chave de ordenação; HTTP 400 se o cursor for inválido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("tamanho da chave")
+        return [_from_json(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+def _stored_form(value: Any, dialect_name: str) -> Any:
+    """Valor do cursor no formato em que a coluna está gravada
+
+    O SQLite guarda DATETIME como texto e compara como texto. CURRENT_TIMESTAMP
+    (server_default=func.now()) grava "2026-10-19 13:27:36", sem fração; o bind
+    padrão do SQLAlchemy seria "2026-10-19 13:27:36.000000", que fica depois da
+    própria linha na comparação e a devolve na página seguinte. Valores com
+    microssegundos vêm de gravações pelo ORM, que usam ".%f".
+    """
+    if dialect_name == "sqlite" and isinstance(value, datetime):
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        if value.microsecond:
+            text += f".{value.microsecond:06d}"
+        return literal(text, String())
+    return value
+
+
+def _after(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+    """(c1, c2, ...) < (v1, v2, ...) expandido em OR/AND (portável e usa o índice composto)"""
+    clauses = []
+    for index, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(index)]
+        beyond = column < values[index] if descending else column > values[index]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def paginate(
+    query,
+    columns: Sequence[Any],
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    skip: int = 0,
+    descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """Paginação por cursor (keyset) com fallback para offset
+
+    columns é a chave de ordenação e deve terminar em uma coluna única (ex.:
+    created_at, id) para a ordem ser estável. Com cursor, a consulta continua
+    logo após a última linha entregue, sem o custo de pular `skip` linhas; sem
+    cursor, usa offset como antes. Retorna os itens e o cursor da próxima
+    página (None na última).
+    """
+    if cursor:
+        dialect_name = query.session.get_bind().dialect.name
+        values = [_stored_form(value, dialect_name) for value in decode_cursor(cursor, columns)]
+        query = query.filter(_after(columns, values, descending))
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*ordering)
+    if not cursor and skip:
+        query = query.offset(skip)
+
+    # Uma linha a mais indica se existe próxima página
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
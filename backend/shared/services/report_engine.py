@@ -0,0 +1,603 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+from shared.config.database import SQLALCHEMY_DATABASE_URL
+from shared.models.booking import Booking
+from shared.models.loyalty import LoyaltyTransaction
+from shared.models.payment import Payment
+from shared.models.property import Property
+from shared.models.reports import Report
+from shared.models.user import User
+
+logger = logging.getLogger(__name__)
+
+payments = Payment.__table__
+bookings = Booking.__table__
+users = User.__table__
+loyalty_transactions = LoyaltyTransaction.__table__
+properties = Property.__table__
+reports = Report.__table__
+
+# Linhas por bloco lido do cursor do banco e convertido em arrays
+CHUNK_ROWS = int(os.getenv("REPORT_CHUNK_ROWS", "50000"))
+
+# O motor reporta progresso de 0 a ENGINE_PROGRESS; o restante fica para a exportação
+ENGINE_PROGRESS = 90
+PROGRESS_STEP = 5
+
+TOP_PROPERTIES = 10
+CANCELLED = "cancelled"
+
+# Parâmetros que mudam só a apresentação, não os dados agregados
+PRESENTATION_PARAMETERS = {"format", "include_charts"}
+
+
+def _parse_date(value: Any, end: bool = False) -> Optional[datetime]:
+    """Data ISO dos parâmetros; end_date só com o dia inclui o dia inteiro"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(str(value))
+    if end and len(str(value)) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def _period(table, params: Dict[str, Any], since: bool = True) -> list:
+    """Condições de created_at para start_date (inclusivo) e end_date (inclusivo por dia)"""
+    conditions = []
+    start = _parse_date(params.get("start_date"))
+    end = _parse_date(params.get("end_date"), end=True)
+    if since and start:
+        conditions.append(table.c.created_at >= start)
+    if end:
+        conditions.append(table.c.created_at < end)
+    return conditions
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _column(values: Sequence[Any], kind: str) -> np.ndarray:
+    """Converte a coluna de um bloco em array NumPy (NULL vira NaN, 0, "" ou NaT)"""
+    count = len(values)
+    if kind == "float":
+        return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=count)
+    if kind == "int":
+        return np.fromiter((0 if v is None else v for v in values), dtype=np.int64, count=count)
+    if kind == "bool":
+        return np.fromiter((bool(v) for v in values), dtype=bool, count=count)
+    if kind == "time":
+        return np.array([_naive_utc(v) for v in values], dtype="datetime64[s]")
+    return np.array(["" if v is None else str(v) for v in values], dtype=np.str_)
+
+
+def iter_column_chunks(conn, table, kinds: Dict[str, str], conditions: list,
+                       chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+    """Linhas da tabela em blocos colunares de até chunk_rows, paginados pelo id
+
+    kinds mapeia as colunas lidas para o tipo do array. Cada bloco é uma consulta
+    curta (id > último id lido), então a memória fica limitada a um bloco e nenhum
+    cursor fica aberto entre blocos: no SQLite, um cursor aberto impediria a
+    gravação do progresso até o fim da leitura.
+    """
+    names = list(kinds)
+    columns = [table.c[name] for name in names] + [table.c.id]
+    last_id = None
+    while True:
+        statement = select(*columns).where(*conditions)
+        if last_id is not None:
+            statement = statement.where(table.c.id > last_id)
+        rows = conn.execute(statement.order_by(table.c.id).limit(chunk_rows)).all()
+        if not rows:
+            return
+        last_id = rows[-1][-1]
+        values = list(zip(*rows))
+        yield {name: _column(values[index], kinds[name]) for index, name in enumerate(names)}
+        if len(rows) < chunk_rows:
+            return
+
+
+class GroupedTotals:
+    """Contagem e soma por chave acumuladas bloco a bloco (np.unique + np.bincount)"""
+
+    def __init__(self):
+        self.counts: Dict[Any, int] = {}
+        self.sums: Dict[Any, float] = {}
+
+    def add(self, keys: np.ndarray, weights: Optional[np.ndarray] = None):
+        if keys.dtype.kind == "M":
+            valid = ~np.isnat(keys)
+            keys = keys[valid]
+            weights = weights[valid] if weights is not None else None
+        if not len(keys):
+            return
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique))
+        sums = np.bincount(inverse, weights=weights, minlength=len(unique)) if weights is not None else None
+        labels = np.datetime_as_string(unique, unit="M").tolist() if unique.dtype.kind == "M" else unique.tolist()
+        for index, label in enumerate(labels):
+            self.counts[label] = self.counts.get(label, 0) + int(counts[index])
+            if sums is not None:
+                self.sums[label] = self.sums.get(label, 0.0) + float(sums[index])
+
+    def series(self, value_key: str, count_key: str) -> List[Dict[str, Any]]:
+        """Lista ordenada pela chave (ex.: meses "2024-06")"""
+        return [
+            {"month": key, value_key: round(self.sums.get(key, 0.0), 2), count_key: self.counts[key]}
+            for key in sorted(self.counts)
+        ]
+
+    def top(self, limit: int) -> List[Tuple[Any, float, int]]:
+        ranked = sorted(self.sums.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(key, total, self.counts[key]) for key, total in ranked]
+
+    def shares(self) -> Dict[Any, float]:
+        """Percentual de cada chave no total de ocorrências"""
+        total = sum(self.counts.values())
+        return {key: round(count * 100 / total, 2) for key, count in self.counts.items()} if total else {}
+
+    def merge(self, other: "GroupedTotals") -> "GroupedTotals":
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for key, total in other.sums.items():
+            self.sums[key] = self.sums.get(key, 0.0) + total
+        return self
+
+    def dump(self) -> List[List[Any]]:
+        """[chave, contagem, soma] por chave; a lista preserva chaves inteiras no JSON"""
+        return [[key, count, self.sums.get(key)] for key, count in self.counts.items()]
+
+    @classmethod
+    def load(cls, rows: List[List[Any]]) -> "GroupedTotals":
+        totals = cls()
+        for key, count, total in rows:
+            totals.counts[key] = count
+            if total is not None:
+                totals.sums[key] = total
+        return totals
+
+
+class _Progress:
+    """Lê as fontes do relatório e atualiza Report.progress conforme as linhas processadas
+
+    A atualização é feita no máximo a cada PROGRESS_STEP pontos e é descartável:
+    se o banco estiver ocupado, a geração segue sem ela.
+    """
+
+    def __init__(self, engine, report_id: Optional[int]):
+        self.engine = engine
+        self.report_id = report_id
+        self.total = 0
+        self.done = 0
+        self.reported = 0
+
+    def plan(self, conn, scans: Sequence[Tuple[Any, list]]):
+        if self.report_id is None:
+            return
+        self.total = sum(
+            conn.execute(select(func.count()).select_from(table).where(*conditions)).scalar() or 0
+            for table, conditions in scans
+        )
+
+    def scan(self, conn, table, kinds: Dict[str, str], conditions: list) -> Iterator[Dict[str, np.ndarray]]:
+        for chunk in iter_column_chunks(conn, table, kinds, conditions):
+            yield chunk
+            self._advance(len(next(iter(chunk.values()))))
+
+    def _advance(self, rows: int):
+        self.done += rows
+        if self.report_id is None or not self.total:
+            return
+        value = min(ENGINE_PROGRESS, self.done * ENGINE_PROGRESS // self.total)
+        if value - self.reported < PROGRESS_STEP:
+            return
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(update(reports).where(reports.c.id == self.report_id).values(progress=value))
+            self.reported = value
+        except OperationalError as e:
+            logger.debug("Progresso do relatório %s não atualizado: %s", self.report_id, e)
+
+
+def _growth(series: List[Dict[str, Any]], key: str) -> float:
+    """Variação percentual do último mês sobre o anterior"""
+    if len(series) < 2 or not series[-2][key]:
+        return 0.0
+    return round((series[-1][key] - series[-2][key]) * 100 / series[-2][key], 2)
+
+
+def _window(table, params: Dict[str, Any], bounds: Dict[str, Tuple[Optional[int], Optional[int]]],
+            since: bool = True) -> list:
+    """Condições do período restritas à faixa de ids (anterior, atual] da tabela"""
+    conditions = _period(table, params, since)
+    low, high = bounds[table.name]
+    if low is not None:
+        conditions.append(table.c.id > low)
+    conditions.append(table.c.id <= (high or 0))
+    return conditions
+
+
+def _scan_bookings(conn, progress: _Progress, conditions: list) -> Dict[str, Any]:
+    """Totais de reservas: receita (exceto canceladas), status, meses e imóveis"""
+    partial = {
+        "bookings": 0, "orders": 0, "revenue": 0.0,
+        "by_status": GroupedTotals(), "by_month": GroupedTotals(), "by_property": GroupedTotals()
+    }
+    kinds = {"property_id": "int", "total_price": "float", "status": "str", "created_at": "time"}
+    for chunk in progress.scan(conn, bookings, kinds, conditions):
+        sold = chunk["status"] != CANCELLED
+        price = np.nan_to_num(chunk["total_price"])[sold]
+        partial["bookings"] += len(sold)
+        partial["orders"] += int(sold.sum())
+        partial["revenue"] += float(price.sum())
+        partial["by_status"].add(chunk["status"])
+        partial["by_month"].add(chunk["created_at"][sold].astype("datetime64[M]"), price)
+        partial["by_property"].add(chunk["property_id"][sold], price)
+    return partial
+
+
+def _top_properties(conn, by_property: GroupedTotals) -> List[Dict[str, Any]]:
+    top = by_property.top(TOP_PROPERTIES)
+    ids = [key for key, _, _ in top if key]
+    names = {}
+    if ids:
+        names = dict(conn.execute(select(properties.c.id, properties.c.name).where(properties.c.id.in_(ids))).all())
+    return [
+        {"name": names.get(key, f"Imóvel {key}"), "revenue": round(total, 2), "quantity": count}
+        for key, total, count in top
+    ]
+
+
+def _financial_partial(conn, params: Dict[str, Any], progress: _Progress, bounds) -> Dict[str, Any]:
+    payment_conditions = _window(payments, params, bounds)
+    booking_conditions = _window(bookings, params, bounds)
+    progress.plan(conn, [(payments, payment_conditions), (bookings, booking_conditions)])
+
+    partial = {
+        "gross": 0.0, "fees": 0.0, "net": 0.0, "refunds": 0.0, "transactions": 0,
+        "methods": GroupedTotals(), "by_month": GroupedTotals()
+    }
+    kinds = {
+        "amount": "float", "fee_amount": "float", "net_amount": "float",
+        "method": "str", "status": "str", "type": "str", "created_at": "time"
+    }
+    for chunk in progress.scan(conn, payments, kinds, payment_conditions):
+        completed = chunk["status"] == "completed"
+        paid = completed & (chunk["type"] == "payment")
+        refunded = completed & (chunk["type"] == "refund")
+        amount = np.nan_to_num(chunk["amount"])
+        partial["gross"] += float(amount[paid].sum())
+        partial["fees"] += float(np.nan_to_num(chunk["fee_amount"])[paid].sum())
+        partial["net"] += float(np.nan_to_num(chunk["net_amount"])[paid].sum())
+        partial["refunds"] += float(np.abs(amount[refunded]).sum())
+        partial["transactions"] += int(paid.sum())
+        partial["methods"].add(chunk["method"][paid])
+        partial["by_month"].add(chunk["created_at"][paid].astype("datetime64[M]"), amount[paid])
+
+    return {"payments": partial, "bookings": _scan_bookings(conn, progress, booking_conditions)}
+
+
+def _financial(conn, params: Dict[str, Any], partial: Dict[str, Any]) -> Dict[str, Any]:
+    paid = partial["payments"]
+    gross, transactions = paid["gross"], paid["transactions"]
+    revenue_by_month = paid["by_month"].series("revenue", "transactions")
+    return {
+        "total_revenue": round(gross, 2),
+        "net_revenue": round(paid["net"] - paid["refunds"], 2),
+        "fees": round(paid["fees"], 2),
+        "refunds": round(paid["refunds"], 2),
+        "monthly_revenue": revenue_by_month[-1]["revenue"] if revenue_by_month else 0.0,
+        "growth_rate": _growth(revenue_by_month, "revenue"),
+        "transactions": transactions,
+        "average_ticket": round(gross / transactions, 2) if transactions else 0.0,
+        "payment_methods": paid["methods"].shares(),
+        "top_products": _top_properties(conn, partial["bookings"]["by_property"]),
+        "revenue_by_month": revenue_by_month
+    }
+
+
+def _sales_partial(conn, params: Dict[str, Any], progress: _Progress, bounds) -> Dict[str, Any]:
+    conditions = _window(bookings, params, bounds)
+    progress.plan(conn, [(bookings, conditions)])
+    return {"bookings": _scan_bookings(conn, progress, conditions)}
+
+
+def _sales(conn, params: Dict[str, Any], partial: Dict[str, Any]) -> Dict[str, Any]:
+    sold = partial["bookings"]
+    sales_by_month = sold["by_month"].series("sales", "orders")
+    return {
+        "total_sales": round(sold["revenue"], 2),
+        "monthly_sales": sales_by_month[-1]["sales"] if sales_by_month else 0.0,
+        "growth": _growth(sales_by_month, "sales"),
+        "orders": sold["orders"],
+        "average_order": round(sold["revenue"] / sold["orders"], 2) if sold["orders"] else 0.0,
+        "conversion_rate": round(sold["orders"] * 100 / sold["bookings"], 2) if sold["bookings"] else 0.0,
+        "bookings_by_status": sold["by_status"].counts,
+        "top_products": _top_properties(conn, sold["by_property"]),
+        "sales_by_month": sales_by_month
+    }
+
+
+def _analytics_partial(conn, params: Dict[str, Any], progress: _Progress, bounds) -> Dict[str, Any]:
+    # Base de usuários até end_date; "novos" são os cadastrados a partir de start_date
+    user_conditions = _window(users, params, bounds, since=False)
+    loyalty_conditions = _window(loyalty_transactions, params, bounds)
+    progress.plan(conn, [(users, user_conditions), (loyalty_transactions, loyalty_conditions)])
+
+    start = _parse_date(params.get("start_date"))
+    since = np.datetime64(_naive_utc(start), "s") if start else None
+    signups = {"total": 0, "active": 0, "new": 0, "by_month": GroupedTotals()}
+    for chunk in progress.scan(conn, users, {"is_active": "bool", "created_at": "time"}, user_conditions):
+        created = chunk["created_at"]
+        signups["total"] += len(created)
+        signups["active"] += int(chunk["is_active"].sum())
+        signups["new"] += int((created >= since).sum()) if since is not None else len(created)
+        signups["by_month"].add(created.astype("datetime64[M]"))
+
+    loyalty = {"points": GroupedTotals(), "members": np.empty(0, dtype=np.int64)}
+    kinds = {"user_id": "int", "transaction_type": "str", "points": "float"}
+    for chunk in progress.scan(conn, loyalty_transactions, kinds, loyalty_conditions):
+        loyalty["points"].add(chunk["transaction_type"], np.nan_to_num(chunk["points"]))
+        loyalty["members"] = np.union1d(loyalty["members"], chunk["user_id"])
+    return {"users": signups, "loyalty": loyalty}
+
+
+def _analytics(conn, params: Dict[str, Any], partial: Dict[str, Any]) -> Dict[str, Any]:
+    signups, loyalty = partial["users"], partial["loyalty"]
+    users_by_month = [
+        {"month": month, "new_users": count} for month, count in sorted(signups["by_month"].counts.items())
+    ]
+    return {
+        "total_users": signups["total"],
+        "active_users": signups["active"],
+        "new_users": signups["new"],
+        "user_growth": _growth(users_by_month, "new_users"),
+        "users_by_month": users_by_month,
+        "loyalty": {
+            "members": int(len(loyalty["members"])),
+            "transactions_by_type": loyalty["points"].counts,
+            "points_by_type": {key: int(value) for key, value in loyalty["points"].sums.items()}
+        }
+    }
+
+
+# template_id -> (agregados parciais de uma faixa de ids, dados a partir dos parciais, tabelas de origem)
+ENGINE_TEMPLATES: Dict[str, Tuple[Callable[..., Dict[str, Any]], Callable[..., Dict[str, Any]], Tuple[Any, ...]]] = {
+    "financial-summary": (_financial_partial, _financial, (payments, bookings)),
+    "sales-performance": (_sales_partial, _sales, (bookings,)),
+    "user-analytics": (_analytics_partial, _analytics, (users, loyalty_transactions)),
+}
+
+# Datas entram no hash pelo limite efetivo: end_date "2024-01-31" inclui o dia inteiro
+DATE_PARAMETERS = {"start_date": False, "end_date": True}
+
+
+def normalize_parameters(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Parâmetros que afetam os dados, sem valores vazios e com as datas em ISO completo"""
+    normalized = {}
+    for key, value in (params or {}).items():
+        if key in PRESENTATION_PARAMETERS or value in (None, "", [], {}):
+            continue
+        if key in DATE_PARAMETERS:
+            try:
+                value = _parse_date(value, end=DATE_PARAMETERS[key]).isoformat()
+            except (TypeError, ValueError):
+                pass  # data inválida: a geração falha com a mensagem do parser
+        normalized[key] = value
+    return normalized
+
+
+def parameters_hash(params: Optional[Dict[str, Any]]) -> str:
+    """Hash estável dos parâmetros normalizados"""
+    encoded = json.dumps(normalize_parameters(params), sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def dump_partials(partial: Dict[str, Any]) -> Dict[str, Any]:
+    """Parciais em JSON: GroupedTotals e conjuntos de ids viram listas marcadas"""
+    dumped = {}
+    for key, value in partial.items():
+        if isinstance(value, GroupedTotals):
+            dumped[key] = {"__grouped__": value.dump()}
+        elif isinstance(value, np.ndarray):
+            dumped[key] = {"__ids__": value.tolist()}
+        elif isinstance(value, dict):
+            dumped[key] = dump_partials(value)
+        else:
+            dumped[key] = value
+    return dumped
+
+
+def load_partials(dumped: Dict[str, Any]) -> Dict[str, Any]:
+    partial = {}
+    for key, value in dumped.items():
+        if isinstance(value, dict) and "__grouped__" in value:
+            partial[key] = GroupedTotals.load(value["__grouped__"])
+        elif isinstance(value, dict) and "__ids__" in value:
+            partial[key] = np.array(value["__ids__"], dtype=np.int64)
+        elif isinstance(value, dict):
+            partial[key] = load_partials(value)
+        else:
+            partial[key] = value
+    return partial
+
+
+def merge_partials(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Soma os parciais do delta aos anteriores (mesma estrutura; conjuntos de ids são unidos)"""
+    merged = {}
+    for key, value in base.items():
+        other = delta[key]
+        if isinstance(value, GroupedTotals):
+            merged[key] = value.merge(other)
+        elif isinstance(value, np.ndarray):
+            merged[key] = np.union1d(value, other)
+        elif isinstance(value, dict):
+            merged[key] = merge_partials(value, other)
+        else:
+            merged[key] = value + other
+    return merged
+
+
+def source_watermark(conn, template_id: str) -> List[Dict[str, Any]]:
+    """Marca d'água das tabelas de origem: linhas, maior id e último updated_at de cada uma
+
+    Inserções e remoções mudam linhas/maior id; alterações só são percebidas
+    em tabelas com updated_at (pagamentos, reservas e usuários).
+    """
+    _, _, sources = ENGINE_TEMPLATES[template_id]
+    watermark = []
+    for table in sources:
+        columns = [func.count(), func.max(table.c.id)]
+        if "updated_at" in table.c:
+            columns.append(func.max(table.c.updated_at))
+        row = conn.execute(select(*columns).select_from(table)).one()
+        last_change = row[2] if len(row) > 2 else None
+        watermark.append({
+            "table": table.name, "rows": row[0], "max_id": row[1],
+            "updated_at": str(last_change) if last_change is not None else None
+        })
+    return watermark
+
+
+def _unchanged_below(conn, table, mark: Dict[str, Any]) -> bool:
+    """Linhas até o maior id da marca seguem iguais: nenhuma removida, alterada ou gravada fora de ordem"""
+    below = table.c.id <= (mark["max_id"] or 0)
+    if conn.execute(select(func.count()).select_from(table).where(below)).scalar() != mark["rows"]:
+        return False
+    if "updated_at" not in table.c:
+        return True
+    if mark["updated_at"] is None:
+        changed = table.c.updated_at.isnot(None)
+    else:
+        changed = table.c.updated_at > datetime.fromisoformat(mark["updated_at"])
+    return conn.execute(select(table.c.id).where(below, changed).limit(1)).first() is None
+
+
+_worker_engines: Dict[str, Any] = {}
+
+
+def _worker_engine(database_url: str):
+    # Um engine por processo do pool; NullPool evita conexões ociosas entre relatórios
+    if database_url not in _worker_engines:
+        _worker_engines[database_url] = create_engine(database_url, poolclass=NullPool)
+    return _worker_engines[database_url]
+
+
+def run_report(template_id: str, params: Optional[Dict[str, Any]], report_id: Optional[int] = None,
+               database_url: str = SQLALCHEMY_DATABASE_URL,
+               base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Calcula os dados de um template (executado nos processos do pool)
+
+    base traz a marca d'água e os parciais de uma execução anterior. Se as
+    linhas já agregadas não mudaram, só as de id maior são lidas e somadas aos
+    parciais. Devolve os dados, os parciais e a marca d'água novos e o modo:
+    "unchanged", "incremental" ou "full".
+    """
+    accumulate, finalize, sources = ENGINE_TEMPLATES[template_id]
+    params = params or {}
+    engine = _worker_engine(database_url)
+    progress = _Progress(engine, report_id)
+    with engine.connect() as conn:
+        # Lida antes das linhas: o que mudar durante a leitura aparece na próxima comparação
+        watermark = source_watermark(conn, template_id)
+        previous = {mark["table"]: mark for mark in base["watermark"]} if base else {}
+        if base and watermark == base["watermark"]:
+            partial, mode = load_partials(base["partials"]), "unchanged"
+        else:
+            incremental = bool(base) and all(
+                table.name in previous and _unchanged_below(conn, table, previous[table.name]) for table in sources
+            )
+            bounds = {
+                mark["table"]: (previous[mark["table"]]["max_id"] if incremental else None, mark["max_id"])
+                for mark in watermark
+            }
+            partial = accumulate(conn, params, progress, bounds)
+            if incremental:
+                partial, mode = merge_partials(load_partials(base["partials"]), partial), "incremental"
+            else:
+                mode = "full"
+        data = finalize(conn, params, partial)
+    return {"data": data, "partials": dump_partials(partial), "watermark": watermark, "mode": mode}
+
+
+class ReportEngine:
+    """Geração de relatórios em pool de processos; com os parciais anteriores, recalcula só o delta"""
+
+    def __init__(self, max_workers: Optional[int] = None, database_url: str = SQLALCHEMY_DATABASE_URL):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.database_url = database_url
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "full": 0,
+            "incremental": 0,
+            "unchanged": 0,
+            "total_seconds": 0.0
+        }
+
+    @staticmethod
+    def supports(template_id: str) -> bool:
+        return template_id in ENGINE_TEMPLATES
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn: o filho não herda threads/conexões do processo pai (API ou worker)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.executor
+
+    async def generate(self, template_id: str, params: Optional[Dict[str, Any]], report_id: Optional[int] = None,
+                       base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Agenda a agregação e aguarda sem bloquear o event loop (retorno de run_report)"""
+        loop = asyncio.get_running_loop()
+        self.stats["submitted"] += 1
+        self.stats["in_flight"] += 1
+        start = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), run_report, template_id, params, report_id, self.database_url, base
+            )
+            self.stats["completed"] += 1
+            self.stats[result["mode"]] += 1
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            self.stats["total_seconds"] += time.perf_counter() - start
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        finished = self.stats["completed"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "max_workers": self.max_workers,
+            "avg_seconds": self.stats["total_seconds"] / finished if finished else 0.0
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,464 @@
+"""
+Escritores XLSX e PDF em streaming para relatórios
+
+Os dois recebem seções (pares chave/valor e tabelas) e devolvem um iterador de
+blocos de bytes. As linhas das tabelas podem ser geradores (ex.: um cursor do
+banco): são consumidas uma vez, em ordem, e só o bloco corrente fica em memória.
+
+- XLSX: o pacote zip é escrito em fluxo (sem seek) e cada planilha usa strings
+  inline, sem a tabela de strings compartilhadas que exigiria guardar todos os
+  textos até o fim.
+- PDF: cada página é comprimida e escrita assim que fica cheia; só os offsets
+  dos objetos são guardados para a tabela xref do final.
+"""
+
+import re
+import zipfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+# Seções: ("pairs", título, [(chave, valor), ...]) ou ("table", título, colunas, linhas)
+Section = Tuple[Any, ...]
+
+# Linhas escritas entre cada esvaziamento do buffer de saída
+FLUSH_ROWS = 1000
+
+
+def sections_from_data(data: Dict[str, Any]) -> List[Section]:
+    """Converte o dict de um relatório em seções: escalares no resumo, dicts em pares, listas em tabelas"""
+    summary, sections = [], []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            sections.append(("pairs", key, list(value.items())))
+        elif isinstance(value, (list, tuple)):
+            if value and isinstance(value[0], dict):
+                columns = list(value[0].keys())
+                sections.append(("table", key, columns, ([item.get(column) for column in columns] for item in value)))
+            else:
+                sections.append(("table", key, ["valor"], ([item] for item in value)))
+        else:
+            summary.append((key, value))
+    if summary:
+        sections.insert(0, ("pairs", "resumo", summary))
+    return sections
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+# ----------------------------------------------------------------------------
+# XLSX
+# ----------------------------------------------------------------------------
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Caracteres de controle não são válidos em XML 1.0
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_SHEET_NAME_INVALID = re.compile(r"[\[\]:*?/\\]")
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Índices de cellXfs em styles.xml
+_STYLE_BOLD, _STYLE_DATETIME, _STYLE_DATE, _STYLE_NUMBER = 1, 2, 3, 4
+
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+class _ChunkSink:
+    """Destino do zip sem seek: acumula o que foi escrito até ser drenado"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _xlsx_cell(value: Any, bold: bool = False) -> str:
+    value = _plain(value)
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            return "<c/>"
+        return f'<c s="{_STYLE_NUMBER}"><v>{value!r}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="{_STYLE_DATETIME}"><v>{serial!r}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="{_STYLE_DATE}"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(_XML_INVALID.sub("", str(value)))[:32767]
+    style = f' s="{_STYLE_BOLD}"' if bold else ""
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number: int, values: Sequence[Any], bold: bool = False) -> str:
+    return f'<row r="{number}">' + "".join(_xlsx_cell(value, bold) for value in values) + "</row>"
+
+
+def _sheet_name(title: str, used: set) -> str:
+    base = _SHEET_NAME_INVALID.sub(" ", str(title)).strip()[:31] or "Planilha"
+    name, suffix = base, 2
+    while name.lower() in used:
+        name = f"{base[:28]}_{suffix}"
+        suffix += 1
+    used.add(name.lower())
+    return name
+
+
+def _sheet_rows(group: List[Section]) -> Iterator[Tuple[Sequence[Any], bool]]:
+    """(valores, negrito) de cada linha de uma planilha"""
+    for index, section in enumerate(group):
+        kind, title = section[0], section[1]
+        if index:
+            yield [], False
+        if kind == "pairs":
+            if len(group) > 1:
+                yield [str(title).upper()], True
+            for key, value in section[2]:
+                yield [key, value], False
+        else:
+            yield section[2], True
+            for row in section[3]:
+                yield row, False
+
+
+def iter_xlsx(sections: Sequence[Section]) -> Iterator[bytes]:
+    """Pasta de trabalho XLSX: seções de pares na planilha "Resumo", uma planilha por tabela"""
+    pairs = [section for section in sections if section[0] == "pairs"]
+    sheets: List[Tuple[str, List[Section]]] = []
+    used: set = set()
+    if pairs:
+        sheets.append((_sheet_name("Resumo", used), pairs))
+    for section in sections:
+        if section[0] == "table":
+            sheets.append((_sheet_name(section[1], used), [section]))
+    if not sheets:
+        sheets.append((_sheet_name("Resumo", used), []))
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as package:
+        for number, (_, group) in enumerate(sheets, start=1):
+            with package.open(f"xl/worksheets/sheet{number}.xml", "w", force_zip64=True) as sheet:
+                sheet.write(_SHEET_HEADER.encode("utf-8"))
+                buffer = []
+                for row_number, (values, bold) in enumerate(_sheet_rows(group), start=1):
+                    buffer.append(_xlsx_row(row_number, values, bold))
+                    if len(buffer) >= FLUSH_ROWS:
+                        sheet.write("".join(buffer).encode("utf-8"))
+                        buffer = []
+                        yield sink.drain()
+                sheet.write(("".join(buffer) + _SHEET_FOOTER).encode("utf-8"))
+            yield sink.drain()
+
+        # Partes fixas do pacote; dependem só da lista de planilhas
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for number in range(1, len(sheets) + 1)
+        )
+        package.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{overrides}</Types>'
+        ))
+        package.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ))
+        package.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(
+                f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{number}" r:id="rId{number}"/>'
+                for number, (name, _) in enumerate(sheets, start=1)
+            )
+            + '</sheets></workbook>'
+        ))
+        package.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{number}" Target="worksheets/sheet{number}.xml" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                for number in range(1, len(sheets) + 1)
+            )
+            + f'<Relationship Id="rId{len(sheets) + 1}" Target="styles.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+            '</Relationships>'
+        ))
+        package.writestr("xl/styles.xml", _STYLES_XML)
+    yield sink.drain()
+
+
+# ----------------------------------------------------------------------------
+# PDF
+# ----------------------------------------------------------------------------
+
+PDF_MEDIA_TYPE = "application/pdf"
+
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 em pontos
+MARGIN = 40
+TITLE_SIZE, HEADING_SIZE, TEXT_SIZE, TABLE_SIZE = 14, 11, 9, 8
+LINE_HEIGHT = 12
+ROW_HEIGHT = 11
+COURIER_WIDTH = 0.6  # largura de cada caractere do Courier, em fração do corpo
+
+# Linhas de uma tabela usadas para estimar a largura das colunas
+WIDTH_SAMPLE_ROWS = 50
+MAX_COLUMN_CHARS = 40
+
+# Objetos fixos: 1 catálogo, 2 árvore de páginas (escrita no fim), 3-5 fontes
+_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+_FIRST_PAGE_OBJECT = 3 + len(_FONTS)
+
+
+def _pdf_text(value: str) -> bytes:
+    """String literal PDF em WinAnsi (acentos do português incluídos)"""
+    encoded = value.encode("cp1252", errors="replace")
+    return b"(" + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _pdf_format(value: Any) -> str:
+    value = _plain(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "sim" if value else "não"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, datetime):
+        return value.strftime("%d/%m/%Y %H:%M")
+    if isinstance(value, date):
+        return value.strftime("%d/%m/%Y")
+    return " ".join(str(value).split())
+
+
+def _fit(text: str, chars: int) -> str:
+    return text if len(text) <= chars else text[:max(chars - 1, 0)] + "~"
+
+
+class _PdfPager:
+    """Motor de paginação: acumula os operadores da página corrente e a escreve quando enche"""
+
+    def __init__(self, title: str):
+        self.title = title
+        self.output: List[bytes] = []
+        self.offset = 0
+        self.offsets: Dict[int, int] = {}
+        self.pages: List[int] = []
+        self.next_object = _FIRST_PAGE_OBJECT
+        self.operations: List[bytes] = []
+        self.y = 0.0
+        self.repeat_header: Optional[Tuple[List[str], List[int]]] = None
+
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        for number, (_, font) in enumerate(_FONTS.items(), start=3):
+            self._object(number, f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} "
+                                 "/Encoding /WinAnsiEncoding >>".encode("ascii"))
+        self._start_page()
+
+    def _emit(self, data: bytes):
+        self.output.append(data)
+        self.offset += len(data)
+
+    def _object(self, number: int, body: bytes):
+        self.offsets[number] = self.offset
+        self._emit(f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def drain(self) -> bytes:
+        data = b"".join(self.output)
+        self.output = []
+        return data
+
+    # -- páginas ------------------------------------------------------------
+
+    def _start_page(self):
+        self.operations = []
+        self.y = PAGE_HEIGHT - MARGIN
+        self._text(MARGIN, self.y - TEXT_SIZE, "F2", TEXT_SIZE, _fit(self.title, 90))
+        self.y -= LINE_HEIGHT + 6
+        if self.repeat_header:
+            self._table_header(*self.repeat_header)
+
+    def _finish_page(self):
+        number = len(self.pages) + 1
+        self._text(PAGE_WIDTH - MARGIN - 60, MARGIN - 20, "F1", TEXT_SIZE - 1, f"Página {number}")
+        content = zlib.compress(b"\n".join(self.operations))
+        content_object, page_object = self.next_object, self.next_object + 1
+        self.next_object += 2
+        self._object(content_object, f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode("ascii")
+                     + content + b"\nendstream")
+        fonts = " ".join(f"/{name} {number} 0 R" for number, name in enumerate(_FONTS, start=3))
+        self._object(page_object, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << {fonts} >> >> /Contents {content_object} 0 R >>"
+        ).encode("ascii"))
+        self.pages.append(page_object)
+
+    def ensure(self, height: float):
+        """Quebra a página se o próximo elemento não couber"""
+        if self.y - height < MARGIN:
+            self._finish_page()
+            self._start_page()
+
+    # -- desenho ------------------------------------------------------------
+
+    def _text(self, x: float, y: float, font: str, size: float, text: str):
+        self.operations.append(
+            f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ".encode("ascii") + _pdf_text(text) + b" Tj ET"
+        )
+
+    def heading(self, text: str):
+        self.ensure(HEADING_SIZE + LINE_HEIGHT * 2)
+        self.y -= 6
+        self._text(MARGIN, self.y - HEADING_SIZE, "F2", HEADING_SIZE, _fit(text, 70))
+        self.y -= HEADING_SIZE + 6
+
+    def pair(self, key: str, value: str):
+        self.ensure(LINE_HEIGHT)
+        self._text(MARGIN, self.y - TEXT_SIZE, "F1", TEXT_SIZE, _fit(key, 45))
+        self._text(MARGIN + 230, self.y - TEXT_SIZE, "F1", TEXT_SIZE, _fit(value, 50))
+        self.y -= LINE_HEIGHT
+
+    def _table_header(self, columns: List[str], widths: List[int]):
+        self.operations.append(f"0.85 g {MARGIN} {self.y - ROW_HEIGHT - 1:.2f} "
+                               f"{PAGE_WIDTH - 2 * MARGIN:.2f} {ROW_HEIGHT + 1} re f 0 g".encode("ascii"))
+        self._row(columns, widths)
+
+    def _row(self, cells: Sequence[str], widths: List[int]):
+        # Courier tem largura fixa: as colunas se alinham preenchendo com espaços
+        line = " ".join(_fit(cell, width).ljust(width) for cell, width in zip(cells, widths))
+        self._text(MARGIN + 2, self.y - TABLE_SIZE - 1, "F3", TABLE_SIZE, line.rstrip())
+        self.y -= ROW_HEIGHT
+
+    def table(self, columns: List[str], rows: Iterable[Sequence[Any]]) -> Iterator[None]:
+        """Tabela com cabeçalho repetido a cada página; cede a cada FLUSH_ROWS linhas"""
+        rows = iter(rows)
+        sample = [[_pdf_format(value) for value in row] for row in islice(rows, WIDTH_SAMPLE_ROWS)]
+        available = int((PAGE_WIDTH - 2 * MARGIN - 4) / (TABLE_SIZE * COURIER_WIDTH)) - (len(columns) - 1)
+        wanted = [
+            max([len(str(column))] + [len(row[index]) for row in sample if index < len(row)])
+            for index, column in enumerate(columns)
+        ]
+        widths = _column_widths(wanted, available)
+        header = [str(column) for column in columns]
+
+        self.ensure(ROW_HEIGHT * 2)
+        self._table_header(header, widths)
+        self.repeat_header = (header, widths)
+        count = 0
+        for cells in chain(sample, ([_pdf_format(value) for value in row] for row in rows)):
+            self.ensure(ROW_HEIGHT)
+            self._row(cells, widths)
+            count += 1
+            if count % FLUSH_ROWS == 0:
+                yield
+        self.repeat_header = None
+        self.y -= 4
+
+    def close(self):
+        self._finish_page()
+        kids = " ".join(f"{number} 0 R" for number in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode("ascii"))
+        xref_offset = self.offset
+        total = self.next_object
+        lines = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[number]:010d} 00000 n \n" for number in range(1, total)]
+        self._emit("".join(lines).encode("ascii"))
+        self._emit(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+
+def _column_widths(wanted: List[int], available: int) -> List[int]:
+    """Distribui os caracteres da linha entre as colunas
+
+    As larguras vêm só da amostra inicial: se sobrar espaço, cada coluna ganha
+    folga (até MAX_COLUMN_CHARS) para valores maiores que apareçam depois; se
+    faltar, as mais largas encolhem.
+    """
+    widths = [max(width, 3) for width in wanted]
+    while sum(widths) > available and max(widths) > 3:
+        widest = widths.index(max(widths))
+        widths[widest] -= 1
+    spare = available - sum(widths)
+    while spare > 0:
+        growable = [index for index, width in enumerate(widths) if width < MAX_COLUMN_CHARS]
+        if not growable:
+            break
+        for index in growable[:spare]:
+            widths[index] += 1
+        spare -= min(len(growable), spare)
+    return widths
+
+
+def iter_pdf(title: str, sections: Sequence[Section]) -> Iterator[bytes]:
+    """Documento PDF paginado (A4), escrito página a página"""
+    pager = _PdfPager(title)
+    for section in sections:
+        pager.heading(str(section[1]).replace("_", " ").upper())
+        if section[0] == "pairs":
+            for key, value in section[2]:
+                pager.pair(str(key), _pdf_format(value))
+        else:
+            for _ in pager.table(list(section[2]), section[3]):
+                yield pager.drain()
+        yield pager.drain()
+    pager.close()
+    yield pager.drain()
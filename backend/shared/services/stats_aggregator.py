@@ -0,0 +1,162 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, MetaData, String, Table, Text,
+    case, func, insert, select, update
+)
+
+logger = logging.getLogger(__name__)
+
+
+def count_where(condition):
+    """COUNT condicional portátil (SUM(CASE WHEN ...) funciona em SQLite, PostgreSQL e MySQL)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def sum_where(column, condition):
+    """SUM condicional de uma coluna"""
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def aggregate(db, model, **metrics) -> Dict[str, Any]:
+    """Calcula várias métricas de uma tabela em uma única consulta
+
+    Ex.: aggregate(db, Video, total=func.count(), completed=count_where(Video.upload_status == "completed"))
+    """
+    labeled = [expression.label(name) for name, expression in metrics.items()]
+    row = db.execute(select(*labeled).select_from(model.__table__)).one()
+    return dict(row._mapping)
+
+
+class StatsCache:
+    """Cache TTL em processo para estatísticas; uma única consulta por chave expirada"""
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._entries: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[1]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Requisições simultâneas aguardam a primeira em vez de repetir a consulta
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[1]
+
+            self.stats["misses"] += 1
+            value = compute()
+            self._entries[key] = (time.monotonic() + ttl, value)
+            return value
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+metadata = MetaData()
+
+# Valores acumulados por rollup e até qual id já foram agregados
+stats_rollups = Table(
+    "stats_rollups",
+    metadata,
+    Column("name", String(100), primary_key=True),
+    Column("watermark", BigInteger, nullable=False, default=0),
+    Column("payload", Text, nullable=False),
+    Column("refreshed_at", DateTime, nullable=False)
+)
+
+
+class IncrementalRollup:
+    """Rollup materializado de uma tabela de eventos (somente inserção)
+
+    Cada refresh agrega apenas as linhas com id acima da marca d'água e soma ao
+    acumulado, então o custo é proporcional às linhas novas e não ao tamanho da tabela.
+    As métricas devem ser aditivas (contagens e somas). Ids confirmados fora de ordem
+    por transações concorrentes podem ficar de fora; use com inserções em lote
+    (ex.: CounterBuffer) ou recrie o rollup com reset().
+    """
+
+    def __init__(self, engine, name: str, model, min_refresh_interval: float = 5.0, **metrics):
+        self.engine = engine
+        self.name = name
+        self.table = model.__table__
+        self.metrics = metrics or {"total": func.count()}
+        self.min_refresh_interval = min_refresh_interval
+        self._last_refresh = 0.0
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        metadata.create_all(bind=engine, tables=[stats_rollups])
+
+    def refresh(self) -> Dict[str, Any]:
+        """Agrega as linhas novas desde o último refresh"""
+        id_column = self.table.c.id
+
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(stats_rollups.c.watermark, stats_rollups.c.payload)
+                .where(stats_rollups.c.name == self.name)
+                .with_for_update()
+            ).first()
+            watermark = row.watermark if row else 0
+            values = json.loads(row.payload) if row else {name: 0 for name in self.metrics}
+
+            labeled = [expression.label(name) for name, expression in self.metrics.items()]
+            delta = conn.execute(
+                select(func.max(id_column).label("_max_id"), *labeled)
+                .where(id_column > watermark)
+            ).one()._mapping
+
+            if delta["_max_id"] is not None:
+                for name in self.metrics:
+                    values[name] = (values.get(name) or 0) + (delta[name] or 0)
+                payload = json.dumps(values)
+                now = datetime.utcnow()
+                if row:
+                    conn.execute(
+                        update(stats_rollups)
+                        .where(stats_rollups.c.name == self.name)
+                        .values(watermark=delta["_max_id"], payload=payload, refreshed_at=now)
+                    )
+                else:
+                    conn.execute(insert(stats_rollups).values(
+                        name=self.name, watermark=delta["_max_id"], payload=payload, refreshed_at=now
+                    ))
+
+        self._values = values
+        self._last_refresh = time.monotonic()
+        return values
+
+    def reset(self):
+        """Descarta o acumulado; o próximo refresh reagrega a tabela inteira"""
+        with self.engine.begin() as conn:
+            conn.execute(stats_rollups.delete().where(stats_rollups.c.name == self.name))
+        self._values = {}
+        self._last_refresh = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        """Valores do rollup, atualizados no máximo a cada min_refresh_interval"""
+        if time.monotonic() - self._last_refresh < self.min_refresh_interval:
+            return self._values
+        with self._lock:
+            if time.monotonic() - self._last_refresh >= self.min_refresh_interval:
+                self.refresh()
+        return self._values
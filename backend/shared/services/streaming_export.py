@@ -0,0 +1,114 @@
+import csv
+import io
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from shared.services.fast_json import dumps
+
+# Formatos aceitos pelos endpoints de exportação
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Linhas por bloco enviado ao cliente (e por lote lido do cursor do banco)
+DEFAULT_CHUNK_ROWS = 1000
+
+
+def _batched(rows: Iterable[Any], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Um objeto JSON por linha; cada bloco junta chunk_rows linhas"""
+    for batch in _batched(rows, chunk_rows):
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode("utf-8")
+    return value
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], fields: Sequence[str],
+             chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """CSV com cabeçalho; o buffer é esvaziado a cada bloco, então a memória não cresce"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in _batched(rows, chunk_rows):
+        for row in batch:
+            writer.writerow([_csv_value(row.get(field)) for field in fields])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Só o cabeçalho (exportação vazia)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_json_document(head: Dict[str, Any], items_key: str, items: Iterable[Dict[str, Any]],
+                       tail: Optional[Callable[[int], Dict[str, Any]]] = None,
+                       chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Documento JSON único ({...head, items_key: [...], ...tail}) gerado por partes
+
+    tail recebe o número de itens emitidos, para totais que só são conhecidos no fim.
+    """
+    prefix = dumps(head)[:-1]
+    yield prefix + (b"," if head else b"") + dumps(items_key) + b":["
+    count = 0
+    for batch in _batched(items, chunk_rows):
+        encoded = b",".join(dumps(item) for item in batch)
+        yield (b"," if count else b"") + encoded
+        count += len(batch)
+    closing = dumps(tail(count))[1:] if tail else b"}"
+    yield b"]" + (b"," if closing != b"}" else b"") + closing
+
+
+def stream_query(session_factory, statement, yield_per: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Linhas de uma consulta como dicts, lidas por cursor no servidor em lotes de yield_per
+
+    Abre a própria sessão: dependências com yield (get_db) são encerradas antes
+    de o corpo de um StreamingResponse ser enviado.
+    """
+    with session_factory() as db:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=yield_per))
+        for row in result.mappings():
+            yield dict(row)
+
+
+def export_response(rows: Iterable[Dict[str, Any]], formato: str, filename: str,
+                    fields: Optional[Sequence[str]] = None) -> StreamingResponse:
+    """StreamingResponse NDJSON ou CSV para um iterável de dicts"""
+    if formato not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato inválido; use {', '.join(EXPORT_MEDIA_TYPES)}"
+        )
+    if formato == "csv":
+        if not fields:
+            raise ValueError("Exportação CSV exige a lista de colunas")
+        body = iter_csv(rows, fields)
+    else:
+        body = iter_ndjson(rows)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{formato}"'}
+    )
@@ -0,0 +1,114 @@
+from array import array
+from typing import Dict, List, Set
+
+# Tamanho dos n-gramas; buscas mais curtas percorrem o dicionário de termos
+NGRAM = 3
+
+
+def ngrams(text: str, n: int = NGRAM) -> Set[str]:
+    return {text[index:index + n] for index in range(len(text) - n + 1)}
+
+
+class NGramIndex:
+    """Índice invertido de n-gramas para busca por substring, sem diferenciar maiúsculas
+
+    Os valores são codificados em dicionário: cada valor distinto vira um termo
+    e os n-gramas apontam para termos, não para documentos. Campos repetitivos
+    (agência, destino) custam uma entrada por valor distinto, e cada documento
+    guarda só o id do seu termo. A busca pega a lista do n-grama mais raro do
+    texto buscado, confirma a substring nesses termos e devolve os documentos
+    deles.
+
+    Documentos são inteiros densos (posições atribuídas por quem usa o índice).
+    Termos sem documentos ficam no dicionário até o índice ser reconstruído.
+    """
+
+    def __init__(self, n: int = NGRAM):
+        self.n = n
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        # n-grama -> ids de termo em ordem crescente (termos só são acrescentados)
+        self.grams: Dict[str, array] = {}
+        # termo -> documento (>= 0), nenhum (-1) ou vários (-2, em shared): valores únicos, como
+        # códigos, custam 4 bytes em vez de um set
+        self.term_docs = array("i")
+        self.shared: Dict[int, Set[int]] = {}
+        # documento -> termo (-1 sem valor)
+        self.doc_terms = array("i")
+
+    def _term(self, value: str) -> int:
+        term_id = self.term_ids.get(value)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.terms.append(value)
+            self.term_ids[value] = term_id
+            self.term_docs.append(-1)
+            for gram in ngrams(value, self.n):
+                posting = self.grams.get(gram)
+                if posting is None:
+                    posting = self.grams[gram] = array("I")
+                posting.append(term_id)
+        return term_id
+
+    def add(self, doc: int, value: str):
+        term_id = self._term(value.lower())
+        if doc >= len(self.doc_terms):
+            self.doc_terms.extend([-1] * (doc + 1 - len(self.doc_terms)))
+        self.doc_terms[doc] = term_id
+        current = self.term_docs[term_id]
+        if current == -1:
+            self.term_docs[term_id] = doc
+        elif current == -2:
+            self.shared[term_id].add(doc)
+        elif current != doc:
+            self.term_docs[term_id] = -2
+            self.shared[term_id] = {current, doc}
+
+    def remove(self, doc: int):
+        if doc >= len(self.doc_terms) or self.doc_terms[doc] < 0:
+            return
+        term_id = self.doc_terms[doc]
+        self.doc_terms[doc] = -1
+        current = self.term_docs[term_id]
+        if current == -2:
+            docs = self.shared[term_id]
+            docs.discard(doc)
+            if len(docs) == 1:
+                self.term_docs[term_id] = docs.pop()
+                del self.shared[term_id]
+        elif current == doc:
+            self.term_docs[term_id] = -1
+
+    def contains(self, doc: int, needle: str) -> bool:
+        """needle (já em minúsculas) é substring do valor do documento"""
+        term_id = self.doc_terms[doc] if doc < len(self.doc_terms) else -1
+        return term_id >= 0 and needle in self.terms[term_id]
+
+    def cost(self, needle: str) -> int:
+        """Termos que a busca precisa conferir: a lista do n-grama mais raro"""
+        if len(needle) < self.n:
+            return len(self.terms)
+        return min((len(self.grams.get(gram, ())) for gram in ngrams(needle, self.n)), default=0)
+
+    def matching_terms(self, needle: str) -> List[int]:
+        if len(needle) < self.n:
+            candidates = range(len(self.terms))
+        else:
+            lists = [self.grams.get(gram) for gram in ngrams(needle, self.n)]
+            if not all(lists):
+                return []
+            candidates = min(lists, key=len)
+        terms = self.terms
+        return [term_id for term_id in candidates if needle in terms[term_id]]
+
+    def search(self, needle: str) -> Set[int]:
+        """Documentos cujo valor contém needle (já em minúsculas)"""
+        found: Set[int] = set()
+        term_docs = self.term_docs
+        for term_id in self.matching_terms(needle):
+            doc = term_docs[term_id]
+            if doc >= 0:
+                found.add(doc)
+            elif doc == -2:
+                found |= self.shared[term_id]
+        return found
@@ -0,0 +1,74 @@
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import redis
+except ImportError:  # Estimativa HLL é opcional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLogCounter:
+    """Contagem aproximada de distintos com HyperLogLog do Redis (PFADD/PFCOUNT)
+
+    Usa no máximo ~12 KB por chave, independentemente do número de elementos,
+    com erro padrão de 0,81%.
+    """
+
+    def __init__(self, redis_url: str, namespace: str):
+        if redis is None:
+            raise RuntimeError("redis não instalado: HyperLogLog indisponível")
+        self.client = redis.from_url(redis_url, decode_responses=True)
+        self.namespace = namespace
+        self.stats = {"adds": 0, "counts": 0, "errors": 0}
+
+    def _key(self, entity_id: Any) -> str:
+        return f"onion360:hll:{self.namespace}:{entity_id}"
+
+    def add(self, entity_id: Any, *members: Any) -> bool:
+        """Registra membros (ex.: ids de visitantes); falhas não interrompem a requisição"""
+        try:
+            self.client.pfadd(self._key(entity_id), *[str(member) for member in members])
+            self.stats["adds"] += 1
+            return True
+        except redis.RedisError as e:
+            self.stats["errors"] += 1
+            logger.error(f"Erro no PFADD de {self.namespace}: {e}")
+            return False
+
+    def add_many(self, entity_id: Any, members: Iterable[Any], batch_size: int = 10000):
+        """Carga em lote (backfill a partir do banco)"""
+        batch = []
+        for member in members:
+            batch.append(str(member))
+            if len(batch) >= batch_size:
+                self.client.pfadd(self._key(entity_id), *batch)
+                batch = []
+        if batch:
+            self.client.pfadd(self._key(entity_id), *batch)
+
+    def count(self, *entity_ids: Any) -> Optional[int]:
+        """Estimativa de distintos (união, se vários ids); None se o Redis falhar"""
+        try:
+            self.stats["counts"] += 1
+            return self.client.pfcount(*[self._key(entity_id) for entity_id in entity_ids])
+        except redis.RedisError as e:
+            self.stats["errors"] += 1
+            logger.error(f"Erro no PFCOUNT de {self.namespace}: {e}")
+            return None
+
+    def reset(self, entity_id: Any):
+        self.client.delete(self._key(entity_id))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "namespace": self.namespace}
+
+
+def create_hll_counter(namespace: str) -> Optional[HyperLogLogCounter]:
+    """HLL se UNIQUE_COUNTER_REDIS_URL estiver definido e o redis instalado"""
+    redis_url = os.getenv("UNIQUE_COUNTER_REDIS_URL")
+    if not redis_url or redis is None:
+        return None
+    return HyperLogLogCounter(redis_url, namespace)
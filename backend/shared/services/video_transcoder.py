@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from core.metrics import record_video_transcode, set_video_transcode_queue_depth
+except ImportError:  # Métricas Prometheus são opcionais fora dos serviços
+    record_video_transcode = None
+    set_video_transcode_queue_depth = None
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE = os.getenv("FFPROBE_BIN", "ffprobe")
+
+# Escada HLS: altura, bitrate de vídeo, bitrate máximo, bitrate de áudio
+HLS_LADDER = [
+    {"name": "1080p", "height": 1080, "video_bitrate": "5000k", "maxrate": "5350k", "audio_bitrate": "192k"},
+    {"name": "720p", "height": 720, "video_bitrate": "2800k", "maxrate": "2996k", "audio_bitrate": "128k"},
+    {"name": "480p", "height": 480, "video_bitrate": "1400k", "maxrate": "1498k", "audio_bitrate": "128k"},
+    {"name": "360p", "height": 360, "video_bitrate": "800k", "maxrate": "856k", "audio_bitrate": "96k"}
+]
+
+HLS_SEGMENT_SECONDS = 6
+
+# Pôsteres extraídos em frações da duração
+POSTER_POSITIONS = [0.1, 0.5, 0.9]
+POSTER_WIDTH = 1280
+
+
+class TranscodeError(Exception):
+    pass
+
+
+async def _run(args: List[str], niceness: int = 0) -> bytes:
+    """Executa um binário do ffmpeg e retorna stdout"""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        preexec_fn=(lambda: os.nice(niceness)) if niceness else None
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise TranscodeError(stderr.decode(errors="replace")[-2000:])
+    return stdout
+
+
+async def probe_video(file_path: str) -> Dict[str, Any]:
+    """Duração, resolução e codecs via ffprobe"""
+    output = await _run([
+        FFPROBE, "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        file_path
+    ])
+    data = json.loads(output)
+
+    video_stream = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
+    if video_stream is None:
+        raise TranscodeError("Arquivo não contém stream de vídeo")
+    has_audio = any(s.get("codec_type") == "audio" for s in data.get("streams", []))
+
+    duration = float(data.get("format", {}).get("duration") or video_stream.get("duration") or 0)
+    return {
+        "duration": duration,
+        "width": int(video_stream["width"]),
+        "height": int(video_stream["height"]),
+        "video_codec": video_stream.get("codec_name"),
+        "has_audio": has_audio
+    }
+
+
+def select_renditions(source_height: int) -> List[Dict[str, Any]]:
+    """Degraus da escada que não ampliam a fonte (sempre ao menos o menor)"""
+    renditions = [rung for rung in HLS_LADDER if rung["height"] <= source_height]
+    return renditions or [HLS_LADDER[-1]]
+
+
+def resolution_label(height: int) -> str:
+    if height >= 2160:
+        return "4K"
+    return f"{height}p"
+
+
+def build_hls_command(
+    file_path: str,
+    output_dir: str,
+    renditions: List[Dict[str, Any]],
+    has_audio: bool,
+    threads: int
+) -> List[str]:
+    """Um único ffmpeg: decodifica uma vez e codifica todos os degraus (filter split)"""
+    count = len(renditions)
+    split_outputs = "".join(f"[v{i}]" for i in range(count))
+    filters = [f"[0:v]split={count}{split_outputs}"]
+    for i, rung in enumerate(renditions):
+        filters.append(f"[v{i}]scale=-2:{rung['height']}[v{i}out]")
+
+    args = [
+        FFMPEG, "-hide_banner", "-y",
+        "-i", file_path,
+        "-filter_complex", ";".join(filters),
+        "-threads", str(threads),
+        "-progress", "pipe:1", "-nostats"
+    ]
+
+    stream_map = []
+    for i, rung in enumerate(renditions):
+        args += [
+            "-map", f"[v{i}out]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", rung["video_bitrate"],
+            f"-maxrate:v:{i}", rung["maxrate"],
+            f"-bufsize:v:{i}", rung["maxrate"],
+        ]
+        if has_audio:
+            args += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", rung["audio_bitrate"]]
+            stream_map.append(f"v:{i},a:{i},name:{rung['name']}")
+        else:
+            stream_map.append(f"v:{i},name:{rung['name']}")
+
+    args += [
+        "-preset", "veryfast",
+        "-profile:v", "main",
+        # GOP alinhado aos segmentos para troca de qualidade sem artefatos
+        "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%05d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_dir, "%v", "playlist.m3u8")
+    ]
+    return args
+
+
+async def extract_posters(file_path: str, output_dir: str, duration: float, niceness: int = 0) -> List[str]:
+    """Extrai pôsteres em posições fixas do vídeo"""
+    posters = []
+    for index, position in enumerate(POSTER_POSITIONS, start=1):
+        poster_path = os.path.join(output_dir, f"poster_{index}.jpg")
+        await _run([
+            FFMPEG, "-hide_banner", "-y",
+            "-ss", f"{duration * position:.3f}",
+            "-i", file_path,
+            "-frames:v", "1",
+            "-vf", f"scale='min({POSTER_WIDTH},iw)':-2",
+            "-q:v", "3",
+            poster_path
+        ], niceness)
+        posters.append(poster_path)
+    return posters
+
+
+class TranscodeQueue:
+    """Fila de transcodificação HLS com concorrência limitada"""
+
+    def __init__(
+        self,
+        output_root: str = "hls",
+        max_concurrent: int = 1,
+        threads_per_job: int = 0,
+        niceness: int = 10
+    ):
+        self.output_root = output_root
+        self.max_concurrent = max_concurrent
+        # 0 = ffmpeg decide; limite explícito protege a CPU do serving
+        self.threads_per_job = threads_per_job or max(1, (os.cpu_count() or 2) // max_concurrent)
+        self.niceness = niceness
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.jobs_by_video: Dict[int, str] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "queued": 0,
+            "running": 0,
+            "media_seconds": 0.0,
+            "wall_seconds": 0.0
+        }
+
+        os.makedirs(output_root, exist_ok=True)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Criado no event loop do serviço
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def _publish_depth(self):
+        if set_video_transcode_queue_depth is not None:
+            set_video_transcode_queue_depth(self.stats["queued"], self.stats["running"])
+
+    def output_dir(self, video_id: int) -> str:
+        return os.path.join(self.output_root, str(video_id))
+
+    def submit(self, video_id: int, file_path: str) -> str:
+        """Registra o job; a execução acontece em run() (background task)"""
+        job_id = uuid.uuid4().hex[:12]
+        self.jobs[job_id] = {
+            "job_id": job_id,
+            "video_id": video_id,
+            "file_path": file_path,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "submitted_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "duration": None,
+            "realtime_factor": None,
+            "result": None,
+            "error": None
+        }
+        self.jobs_by_video[video_id] = job_id
+        self.stats["submitted"] += 1
+        self.stats["queued"] += 1
+        self._publish_depth()
+        return job_id
+
+    async def run(self, job_id: str, on_finished: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """Aguarda vaga na fila e transcodifica"""
+        job = self.jobs[job_id]
+        async with self._get_semaphore():
+            self.stats["queued"] -= 1
+            self.stats["running"] += 1
+            self._publish_depth()
+            job["status"] = "running"
+            job["started_at"] = datetime.utcnow().isoformat()
+            start = time.perf_counter()
+
+            try:
+                job["result"] = await self._transcode(job)
+                job["status"] = "completed"
+                self.stats["completed"] += 1
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                self.stats["failed"] += 1
+                logger.error(f"Transcodificação do vídeo {job['video_id']} falhou: {e}")
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stats["running"] -= 1
+                self._publish_depth()
+                job["finished_at"] = datetime.utcnow().isoformat()
+
+        if job["status"] == "completed" and job["duration"]:
+            job["realtime_factor"] = round(job["duration"] / elapsed, 3) if elapsed else None
+            self.stats["media_seconds"] += job["duration"]
+            self.stats["wall_seconds"] += elapsed
+        if record_video_transcode is not None:
+            record_video_transcode(job["status"], job["realtime_factor"])
+
+        if on_finished is not None:
+            await asyncio.get_running_loop().run_in_executor(None, on_finished, job)
+
+    async def _transcode(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        file_path = job["file_path"]
+        output_dir = self.output_dir(job["video_id"])
+        # Saída parcial de uma tentativa anterior é descartada
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir, exist_ok=True)
+
+        job["stage"] = "probe"
+        info = await probe_video(file_path)
+        job["duration"] = info["duration"]
+
+        renditions = select_renditions(info["height"])
+        for rung in renditions:
+            os.makedirs(os.path.join(output_dir, rung["name"]), exist_ok=True)
+
+        job["stage"] = "transcode"
+        command = build_hls_command(
+            file_path, output_dir, renditions, info["has_audio"], self.threads_per_job
+        )
+        await self._run_with_progress(job, command)
+
+        job["stage"] = "posters"
+        posters = await extract_posters(file_path, output_dir, info["duration"], self.niceness)
+        job["progress"] = 1.0
+
+        return {
+            "duration": info["duration"],
+            "width": info["width"],
+            "height": info["height"],
+            "resolution": resolution_label(info["height"]),
+            "renditions": [rung["name"] for rung in renditions],
+            "master_playlist": os.path.join(output_dir, "master.m3u8"),
+            "posters": posters
+        }
+
+    async def _run_with_progress(self, job: Dict[str, Any], command: List[str]):
+        """Executa o ffmpeg lendo o progresso (-progress pipe:1)"""
+        niceness = self.niceness
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            preexec_fn=(lambda: os.nice(niceness)) if niceness else None
+        )
+        self._processes[job["job_id"]] = process
+        # stderr drenado em paralelo para o ffmpeg não bloquear com o pipe cheio
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+
+        try:
+            async for line in process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                if key == "out_time_us" and job["duration"] and value.isdigit():
+                    job["progress"] = round(min(int(value) / 1e6 / job["duration"], 1.0), 3)
+            returncode = await process.wait()
+            stderr = await stderr_task
+        finally:
+            self._processes.pop(job["job_id"], None)
+
+        if returncode != 0:
+            raise TranscodeError(stderr.decode(errors="replace")[-2000:])
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def get_job_for_video(self, video_id: int) -> Optional[Dict[str, Any]]:
+        job_id = self.jobs_by_video.get(video_id)
+        return self.get_job(job_id) if job_id else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "max_concurrent": self.max_concurrent,
+            "threads_per_job": self.threads_per_job,
+            "realtime_factor": (
+                self.stats["media_seconds"] / self.stats["wall_seconds"]
+                if self.stats["wall_seconds"] else None
+            )
+        }
+
+    def shutdown(self):
+        """Interrompe transcodificações em andamento"""
+        for process in list(self._processes.values()):
+            if process.returncode is None:
+                process.terminate()
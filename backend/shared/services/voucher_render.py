@@ -0,0 +1,870 @@
+"""
+Renderização de vouchers para impressão (PNG/PDF) a partir dos templates do editor
+
+Um template é uma lista de elementos posicionados (texto, logo, qr-code,
+código de barras, carimbo, marca d'água) em unidades do editor (px a 96 dpi).
+O conteúdo de um elemento pode ter campos do voucher: "{{code}}",
+"{{clientName}}" etc.
+
+- Compilação: cada versão do template (hash do conteúdo) é validada e medida
+  uma vez (fontes resolvidas, texto estático ajustado à caixa, ordem de
+  desenho) num CompiledTemplate imutável, usado pela validação, pela prévia e
+  pela renderização.
+- Camadas estáticas: fundo, borda e os elementos sem campos que ficam abaixo
+  do primeiro elemento com campos viram uma imagem só, rasterizada uma vez por
+  template (versão = hash do conteúdo) em cada processo. Os estáticos acima
+  dele ficam prontos como recortes; por voucher só se desenha o que tem campos.
+- Cache: cada saída é gravada com o hash de (versão do template, dados,
+  formato, escala) no nome; o mesmo voucher com o mesmo template não é
+  renderizado de novo.
+- Lotes (impressão de milhares de vouchers) são divididos em blocos
+  renderizados em um pool de processos e escritos no arquivo final em ordem,
+  com poucos blocos em memória: PDF de várias páginas ou zip de PNGs.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import qrcode
+from PIL import Image, ImageColor, ImageDraw, ImageFont, UnidentifiedImageError
+
+try:
+    import reportlab
+except ImportError:  # só o código de barras depende do reportlab
+    reportlab = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("png", "pdf")
+MEDIA_TYPES = {"png": "image/png", "pdf": "application/pdf", "zip": "application/zip"}
+
+# Imagens (logos) são URLs de upload, resolvidas dentro de assets_dir (o diretório de uploads)
+ASSETS_URL_PREFIX = "/uploads/"
+
+# Tamanho mínimo do voucher no editor; cresce se algum elemento passar disso
+VOUCHER_WIDTH = 600
+VOUCHER_HEIGHT = 400
+CANVAS_MARGIN = 20
+# Pixels por unidade do editor (2 = 192 dpi, suficiente para QR e código de barras)
+DEFAULT_SCALE = 2
+BORDER_WIDTH = 2
+
+# Vouchers por tarefa do pool e tarefas em andamento por processo (limita a memória do lote)
+BATCH_CHUNK = 100
+CHUNKS_IN_FLIGHT = 2
+# Texto maior que a caixa diminui até essa fração do tamanho antes de ser cortado
+MIN_FONT_RATIO = 0.6
+# zlib 3: metade do tempo do nível 6 com tamanho parecido nas áreas lisas do voucher
+COMPRESS_LEVEL = 3
+# Templates preparados (e compilados) mantidos por processo
+PREPARED_CACHE_SIZE = 32
+COMPILED_CACHE_SIZE = 256
+
+ELEMENT_TYPES = ("text", "image", "logo", "qr-code", "barcode", "stamp", "watermark")
+TEXT_TYPES = ("text", "stamp", "watermark")
+STAMP_PADDING = 4
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+WATERMARK_OPACITY = 0.3
+
+FONT_DIRS = [
+    directory for directory in os.getenv("VOUCHER_FONT_DIRS", "").split(os.pathsep) if directory
+] + ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts")]
+if reportlab is not None:
+    # Bitstream Vera vem com o reportlab: há sempre uma fonte TrueType disponível
+    FONT_DIRS.append(os.path.join(os.path.dirname(reportlab.__file__), "fonts"))
+
+GENERIC_FONTS = {
+    "sans-serif": ["dejavusans", "liberationsans", "arial", "helvetica", "vera"],
+    "serif": ["dejavuserif", "liberationserif", "timesnewroman", "times", "vera"],
+    "monospace": ["dejavusansmono", "liberationmono", "couriernew", "veramono", "vera"],
+}
+
+
+# -- fontes e cores ------------------------------------------------------------
+
+def _font_key(name: str) -> str:
+    key = re.sub(r"[\s_\-'\"]", "", name.lower())
+    return key[:-len("regular")] if key.endswith("regular") else key
+
+
+@lru_cache(maxsize=1)
+def _font_files() -> Dict[str, str]:
+    """Nome normalizado -> arquivo TrueType/OpenType, varrendo os diretórios uma vez"""
+    files: Dict[str, str] = {}
+    for directory in FONT_DIRS:
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                stem, extension = os.path.splitext(name)
+                if extension.lower() in (".ttf", ".otf"):
+                    files.setdefault(_font_key(stem), os.path.join(root, name))
+    return files
+
+
+@lru_cache(maxsize=64)
+def resolve_font_file(family: Optional[str]) -> Optional[str]:
+    """Primeira fonte da lista CSS (ex.: "Inter, sans-serif") disponível no servidor"""
+    files = _font_files()
+    names = [name.strip() for name in (family or "").split(",") if name.strip()] + ["sans-serif"]
+    for name in names:
+        for key in GENERIC_FONTS.get(name.lower(), [_font_key(name)]):
+            if key in files:
+                return files[key]
+    return None
+
+
+@lru_cache(maxsize=256)
+def load_font(family: Optional[str], size: int) -> ImageFont.ImageFont:
+    path = resolve_font_file(family)
+    if path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+
+def parse_color(value: Optional[str], fallback: str = "#000000") -> Tuple[int, int, int]:
+    for candidate in (value, fallback):
+        if candidate:
+            try:
+                return ImageColor.getrgb(candidate)[:3]
+            except ValueError:
+                continue
+    return (0, 0, 0)
+
+
+def _font_size(value: Any, default: int = 14) -> int:
+    """fontSize do elemento (int) ou do template ("14px")"""
+    if isinstance(value, (int, float)):
+        return int(value) or default
+    match = re.match(r"\s*(\d+)", str(value or ""))
+    return int(match.group(1)) if match else default
+
+
+# -- versões e chaves de cache -------------------------------------------------
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def template_version(template: Dict[str, Any]) -> str:
+    """Hash do conteúdo do template: muda a cada alteração que afeta o desenho"""
+    return hashlib.sha256(_canonical(template)).hexdigest()[:20]
+
+
+def render_key(version: str, data: Any, fmt: str, scale: int) -> str:
+    digest = hashlib.sha256(f"{version}:{fmt}:{scale}:".encode())
+    digest.update(_canonical(data))
+    return digest.hexdigest()[:32]
+
+
+def bind(content: str, data: Dict[str, Any]) -> str:
+    """Substitui os campos {{nome}}; campos ausentes ficam vazios"""
+    def value(match: "re.Match") -> str:
+        found = data.get(match.group(1))
+        return "" if found is None else str(found)
+    return PLACEHOLDER.sub(value, content or "")
+
+
+def canvas_size(template: Dict[str, Any]) -> Tuple[int, int]:
+    """Tamanho do voucher em unidades do editor"""
+    elements = template.get("elements") or []
+    width = max([VOUCHER_WIDTH] + [e["x"] + e["width"] + CANVAS_MARGIN for e in elements])
+    height = max([VOUCHER_HEIGHT] + [e["y"] + e["height"] + CANVAS_MARGIN for e in elements])
+    return width, height
+
+
+# -- elementos -----------------------------------------------------------------
+
+def _fit_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if draw.textlength(text[:middle] + "…", font=font) <= width:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + "…"
+
+
+def text_font(element: Dict[str, Any], template: Dict[str, Any]) -> Tuple[Optional[str], int]:
+    """Família CSS e tamanho (unidades do editor) de um elemento de texto"""
+    size = _font_size(element.get("fontSize"), _font_size(template.get("fontSize")))
+    return element.get("fontFamily") or template.get("fontFamily"), size
+
+
+def fit_font(family: Optional[str], size: int, text: str,
+             available: int) -> Tuple[ImageFont.ImageFont, int, float]:
+    """Fonte em que text cabe em available px (até MIN_FONT_RATIO do tamanho): (fonte, tamanho, largura)"""
+    font = load_font(family, size)
+    smallest = max(int(size * MIN_FONT_RATIO), 1)
+    # Mesma medida de ImageDraw.textlength num recorte RGBA
+    length = font.getlength(text, mode="L")
+    # A largura não é proporcional ao tamanho (hinting): ajusta até caber ou chegar ao mínimo
+    while length > available and size > smallest:
+        size = max(min(int(size * available / length), size - 1), smallest)
+        font = load_font(family, size)
+        length = font.getlength(text, mode="L")
+    return font, size, length
+
+
+def _text_tile(element: Dict[str, Any], text: str, template: Dict[str, Any], scale: int) -> Image.Image:
+    width, height = element["width"] * scale, element["height"] * scale
+    family, size = text_font(element, template)
+    color = parse_color(element.get("fontColor"), template.get("textColor") or "#000000")
+    tile = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(tile)
+
+    centered = element["type"] != "text"
+    padding = 0
+    if element["type"] == "stamp":
+        padding = STAMP_PADDING * scale
+        draw.rounded_rectangle((0, 0, width - 1, height - 1), radius=6 * scale, outline=color, width=2 * scale)
+    font, _, _ = fit_font(family, size * scale, text, width - 2 * padding)
+    text = _fit_text(draw, text, font, width - 2 * padding)
+    left, _, right, _ = draw.textbbox((0, 0), text, font=font)
+    x = (width - (right - left)) // 2 - left if centered else -left
+    # Centraliza pela altura da fonte, não do texto: rótulo e valor lado a lado ficam na mesma linha de base
+    ascent, descent = font.getmetrics()
+    y = (height - (ascent + descent)) // 2
+    draw.text((x, y), text, font=font, fill=color)
+    return tile
+
+
+@lru_cache(maxsize=256)
+def _qr_modules(data: str) -> Image.Image:
+    """QR code com um pixel por módulo (borda de 2 módulos); ampliado por quem usa"""
+    code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
+    code.add_data(data)
+    code.make(fit=True)
+    matrix = code.get_matrix()
+    pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+    return Image.frombytes("L", (len(matrix), len(matrix)), pixels)
+
+
+def qr_image(data: str, size: int) -> Image.Image:
+    """QR code em tons de cinza, com módulos inteiros (bordas nítidas) centralizado em size x size"""
+    modules = _qr_modules(data)
+    module = max(1, size // modules.width)
+    scaled = modules.resize((modules.width * module,) * 2, Image.NEAREST)
+    tile = Image.new("L", (size, size), 255)
+    offset = (size - scaled.width) // 2
+    tile.paste(scaled, (offset, offset))
+    return tile
+
+
+def qr_png(data: str, size: int = 256) -> bytes:
+    buffer = io.BytesIO()
+    qr_image(data, size).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _barcode_bars(data: str) -> List[Tuple[bool, int]]:
+    """Code 128 como (barra?, largura em módulos), com zona de silêncio de 10 módulos"""
+    if reportlab is None:
+        raise RuntimeError("Código de barras requer o pacote reportlab")
+    from reportlab.graphics.barcode.code128 import Code128
+
+    code = Code128(data)
+    code.validate()
+    code.encode()
+    code.decompose()
+    # decomposed: maiúsculas são barras, minúsculas espaços; a letra é a largura (A = 1)
+    return [(False, 10)] + [
+        (symbol.isupper(), ord(symbol.upper()) - ord("A") + 1) for symbol in code.decomposed
+    ] + [(False, 10)]
+
+
+def _barcode_tile(element: Dict[str, Any], data: str, template: Dict[str, Any], scale: int) -> Image.Image:
+    width, height = element["width"] * scale, element["height"] * scale
+    tile = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+    if not data:
+        return tile
+    draw = ImageDraw.Draw(tile)
+    bars = _barcode_bars(data)
+    module = width / sum(size for _, size in bars)
+    # Texto legível embaixo quando há altura para ele
+    text_height = 12 * scale if height >= 40 * scale else 0
+    color = parse_color(element.get("fontColor"), "#000000")
+    position = 0.0
+    for bar, size in bars:
+        if bar:
+            draw.rectangle((round(position), 0, max(round(position), round(position + size * module) - 1),
+                            height - text_height - 1), fill=color)
+        position += size * module
+    if text_height:
+        font = load_font(element.get("fontFamily") or template.get("fontFamily"), 10 * scale)
+        text = _fit_text(draw, data, font, width)
+        draw.text((width // 2, height - text_height // 2), text, font=font, fill=color, anchor="mm")
+    return tile
+
+
+def _image_tile(element: Dict[str, Any], source: str, assets_dir: Optional[str], scale: int) -> Optional[Image.Image]:
+    if not source or assets_dir is None or not source.startswith(ASSETS_URL_PREFIX):
+        return None
+    root = os.path.abspath(assets_dir)
+    path = os.path.abspath(os.path.join(root, source[len(ASSETS_URL_PREFIX):]))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        logger.debug("Imagem %s não encontrada em %s", source, assets_dir)
+        return None
+    width, height = element["width"] * scale, element["height"] * scale
+    try:
+        with Image.open(path) as img:
+            img = img.convert("RGBA")
+            img.thumbnail((width, height))
+    except (UnidentifiedImageError, OSError) as e:
+        # Arquivo que não é imagem (ou corrompido): tratado como imagem ausente
+        logger.warning("Imagem %s ilegível: %s", source, e)
+        return None
+    tile = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    tile.paste(img, ((width - img.width) // 2, (height - img.height) // 2))
+    return tile
+
+
+def render_element(element: Dict[str, Any], data: Dict[str, Any], template: Dict[str, Any], scale: int,
+                   assets_dir: Optional[str] = None) -> Optional[Tuple[Image.Image, Tuple[int, int]]]:
+    """Recorte de um elemento (RGBA, ou opaco) e a posição dele no voucher (None se não há o que desenhar)"""
+    content = bind(element.get("content") or "", data)
+    kind = element["type"]
+    if kind == "qr-code":
+        if not content:
+            return None
+        size = min(element["width"], element["height"]) * scale
+        tile = qr_image(content, size)
+    elif kind == "barcode":
+        tile = _barcode_tile(element, content, template, scale)
+    elif kind in ("logo", "image"):
+        tile = _image_tile(element, content, assets_dir, scale)
+    else:
+        tile = _text_tile(element, content, template, scale) if content else None
+    if tile is None:
+        return None
+
+    opacity = element.get("opacity")
+    if opacity is None and kind == "watermark":
+        opacity = WATERMARK_OPACITY
+    if (opacity is not None and opacity < 1 or element.get("rotation")) and tile.mode != "RGBA":
+        tile = tile.convert("RGBA")
+    if opacity is not None and opacity < 1:
+        tile.putalpha(tile.getchannel("A").point(lambda alpha: int(alpha * max(opacity, 0))))
+
+    # A rotação do editor (CSS) é no sentido horário, em torno do centro do elemento
+    center_x = (element["x"] + element["width"] / 2) * scale
+    center_y = (element["y"] + element["height"] / 2) * scale
+    if element.get("rotation"):
+        tile = tile.rotate(-element["rotation"], expand=True, resample=Image.BICUBIC)
+    return tile, (round(center_x - tile.width / 2), round(center_y - tile.height / 2))
+
+
+def _composite(base: Image.Image, tile: Image.Image, position: Tuple[int, int]):
+    """Sobrepõe o recorte à base RGB (opaca): o alfa do recorte serve de máscara
+
+    paste recorta o que passa da borda (ex.: após rotação) e evita converter o
+    voucher inteiro de/para RGBA a cada renderização.
+    """
+    base.paste(tile, position, tile if tile.mode == "RGBA" else None)
+
+
+# -- templates compilados ------------------------------------------------------
+
+def font_installed(family: Optional[str]) -> bool:
+    """A primeira fonte da lista CSS existe no servidor (as genéricas sempre existem)"""
+    name = (family or "").split(",")[0].strip()
+    return not name or name.lower() in GENERIC_FONTS or _font_key(name) in _font_files()
+
+
+@dataclass(frozen=True)
+class ElementLayout:
+    """Elemento resolvido na compilação (unidades do editor)"""
+    id: str
+    type: str
+    z: int  # ordem de desenho: o maior fica por cima
+    box: Tuple[int, int, int, int]  # x, y, largura, altura
+    fields: Tuple[str, ...]  # campos {{nome}} do conteúdo; vazio = estático
+    font_file: Optional[str] = None  # elementos de texto
+    font_size: Optional[int] = None
+    # Texto estático, medido na escala padrão: tamanho após o ajuste à caixa e largura ocupada
+    fitted_size: Optional[float] = None
+    text_width: Optional[float] = None
+    truncated: bool = False
+
+    @property
+    def dynamic(self) -> bool:
+        return bool(self.fields)
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Uma versão do template validada e medida, compartilhada por validação, prévia e renderização
+
+    template é o dict de origem, também compartilhado: não deve ser alterado
+    (a versão é o hash dele).
+    """
+    version: str
+    template: Dict[str, Any]
+    size: Tuple[int, int]
+    elements: Tuple[ElementLayout, ...]  # em ordem de desenho
+    fields: FrozenSet[str]
+    errors: Tuple[str, ...]
+    warnings: Tuple[str, ...]
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def missing_fields(self, data: Dict[str, Any]) -> List[str]:
+        """Campos usados pelo template sem valor em data (sairiam em branco)"""
+        return sorted(field for field in self.fields if data.get(field) in (None, ""))
+
+    def layout(self) -> Dict[str, Any]:
+        """Descrição serializável do layout (prévia no editor)"""
+        return {
+            "version": self.version,
+            "width": self.size[0],
+            "height": self.size[1],
+            "fields": sorted(self.fields),
+            "errors": list(self.errors),
+            "warnings": list(self.warnings),
+            "elements": [
+                {
+                    "id": element.id, "type": element.type, "z": element.z, "box": list(element.box),
+                    "fields": list(element.fields),
+                    "font": os.path.basename(element.font_file) if element.font_file else None,
+                    "font_size": element.font_size, "fitted_size": element.fitted_size,
+                    "text_width": element.text_width, "truncated": element.truncated
+                }
+                for element in self.elements
+            ]
+        }
+
+
+def _compile(template: Dict[str, Any], version: str) -> CompiledTemplate:
+    errors: List[str] = []
+    warnings: List[str] = []
+    if not template.get("name"):
+        errors.append("Nome do template é obrigatório")
+    elements = template.get("elements") or []
+    if not elements:
+        errors.append("Template deve ter pelo menos um elemento")
+
+    layouts: List[ElementLayout] = []
+    seen_ids = set()
+    missing_fonts: Dict[str, List[str]] = {}
+    for z, element in enumerate(elements):
+        element_id, kind = element["id"], element["type"]
+        box = (element["x"], element["y"], element["width"], element["height"])
+        if box[0] < 0 or box[1] < 0:
+            errors.append(f"Elemento {element_id}: posição deve ser positiva")
+        sized = box[2] > 0 and box[3] > 0
+        if not sized:
+            errors.append(f"Elemento {element_id}: dimensões devem ser positivas")
+        if element_id in seen_ids:
+            warnings.append(f"Elemento {element_id}: id repetido")
+        seen_ids.add(element_id)
+        if kind not in ELEMENT_TYPES:
+            warnings.append(f"Elemento {element_id}: tipo '{kind}' desconhecido, desenhado como texto")
+
+        content = element.get("content") or ""
+        layout: Dict[str, Any] = {
+            "id": element_id, "type": kind, "z": z, "box": box,
+            "fields": tuple(dict.fromkeys(PLACEHOLDER.findall(content)))
+        }
+        if kind in TEXT_TYPES or kind not in ELEMENT_TYPES:
+            family, size = text_font(element, template)
+            layout.update(font_file=resolve_font_file(family), font_size=size)
+            if not font_installed(family):
+                missing_fonts.setdefault(family, []).append(element_id)
+            if content and not layout["fields"] and sized:
+                # O mesmo ajuste da renderização (mesma escala, mesmas fontes)
+                padding = STAMP_PADDING if kind == "stamp" else 0
+                available = (box[2] - 2 * padding) * DEFAULT_SCALE
+                _, fitted, length = fit_font(family, size * DEFAULT_SCALE, content, available)
+                layout.update(
+                    fitted_size=fitted / DEFAULT_SCALE, text_width=round(length / DEFAULT_SCALE, 1),
+                    truncated=length > available
+                )
+                if length > available:
+                    warnings.append(f"Elemento {element_id}: texto não cabe na caixa e será cortado")
+        layouts.append(ElementLayout(**layout))
+    for family, element_ids in missing_fonts.items():
+        warnings.append(
+            f"Fonte '{family}' não instalada no servidor, usando "
+            f"{os.path.basename(resolve_font_file(family) or 'a padrão')} ({len(element_ids)} elementos)"
+        )
+
+    return CompiledTemplate(
+        version=version, template=template, size=canvas_size(template), elements=tuple(layouts),
+        fields=frozenset(field for layout in layouts for field in layout.fields),
+        errors=tuple(errors), warnings=tuple(warnings)
+    )
+
+
+_compiled: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+
+
+def compile_template(template: Dict[str, Any], version: Optional[str] = None) -> CompiledTemplate:
+    """CompiledTemplate do processo corrente (LRU por versão): só versões novas são compiladas
+
+    version: template_version(template), quando quem chama já a tem.
+    """
+    version = version or template_version(template)
+    compiled = _compiled.get(version)
+    if compiled is None:
+        compiled = _compiled[version] = _compile(template, version)
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(version)
+    return compiled
+
+
+def discard(version: str):
+    """Esquece a versão no processo corrente (template alterado ou excluído)
+
+    Os processos do pool a descartam pelo LRU: a versão nova tem outra chave.
+    """
+    _compiled.pop(version, None)
+    for key in [key for key in _prepared if key[0] == version]:
+        del _prepared[key]
+
+
+# -- templates preparados ------------------------------------------------------
+
+class PreparedTemplate:
+    """Template com as camadas estáticas já rasterizadas, pronto para receber dados"""
+
+    def __init__(self, template: Dict[str, Any], scale: int = DEFAULT_SCALE, assets_dir: Optional[str] = None,
+                 version: Optional[str] = None):
+        self.compiled = compile_template(template, version)
+        self.template = template
+        self.version = self.compiled.version
+        self.scale = scale
+        self.assets_dir = assets_dir
+        self.size = self.compiled.size
+        self.pixel_size = (self.size[0] * scale, self.size[1] * scale)
+
+        background = parse_color(template.get("backgroundColor"), "#ffffff")
+        self.underlay = Image.new("RGB", self.pixel_size, background)
+        if template.get("borderColor"):
+            ImageDraw.Draw(self.underlay).rectangle(
+                (0, 0, self.pixel_size[0] - 1, self.pixel_size[1] - 1),
+                outline=parse_color(template["borderColor"]), width=BORDER_WIDTH * scale
+            )
+        # Acima do primeiro elemento com campos a ordem importa: estáticos viram recortes prontos
+        self.layers: List[Tuple[Dict[str, Any], Optional[Tuple[Image.Image, Tuple[int, int]]]]] = []
+        for element, layout in zip(template.get("elements") or [], self.compiled.elements):
+            if layout.box[2] <= 0 or layout.box[3] <= 0:
+                continue
+            dynamic = layout.dynamic
+            rendered = None if dynamic else render_element(element, {}, template, scale, assets_dir)
+            if not dynamic and not self.layers:
+                if rendered is not None:
+                    _composite(self.underlay, *rendered)
+            elif dynamic or rendered is not None:
+                self.layers.append((element, rendered))
+
+    def render(self, data: Dict[str, Any]) -> Image.Image:
+        image = self.underlay.copy()
+        for element, rendered in self.layers:
+            if rendered is None:
+                rendered = render_element(element, data, self.template, self.scale, self.assets_dir)
+            if rendered is not None:
+                _composite(image, *rendered)
+        return image
+
+
+_prepared: "OrderedDict[Tuple[str, int, Optional[str]], PreparedTemplate]" = OrderedDict()
+
+
+def prepare(template: Dict[str, Any], scale: int = DEFAULT_SCALE, assets_dir: Optional[str] = None,
+            version: Optional[str] = None) -> PreparedTemplate:
+    """PreparedTemplate do processo corrente (LRU por versão do template)"""
+    version = version or template_version(template)
+    key = (version, scale, assets_dir)
+    prepared = _prepared.get(key)
+    if prepared is None:
+        prepared = _prepared[key] = PreparedTemplate(template, scale, assets_dir, version)
+        while len(_prepared) > PREPARED_CACHE_SIZE:
+            _prepared.popitem(last=False)
+    else:
+        _prepared.move_to_end(key)
+    return prepared
+
+
+# -- saída ---------------------------------------------------------------------
+
+def encode_png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+def encode_page(image: Image.Image) -> bytes:
+    """Página de PDF: RGB cru comprimido (FlateDecode), sem perdas para QR e código de barras"""
+    return zlib.compress(image.tobytes(), COMPRESS_LEVEL)
+
+
+class _ImagePdf:
+    """PDF com uma imagem por página, escrito em fluxo; só os offsets ficam em memória"""
+
+    def __init__(self, pixel_size: Tuple[int, int], page_size: Tuple[float, float]):
+        self.pixel_size = pixel_size
+        self.page_size = page_size
+        self.output: List[bytes] = []
+        self.offset = 0
+        self.offsets: Dict[int, int] = {}
+        self.pages: List[int] = []
+        self.next_object = 3  # 1 catálogo, 2 árvore de páginas (escrita no fim)
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    def _emit(self, data: bytes):
+        self.output.append(data)
+        self.offset += len(data)
+
+    def _object(self, number: int, body: bytes):
+        self.offsets[number] = self.offset
+        self._emit(f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def _stream(self, number: int, header: str, data: bytes):
+        self._object(number, f"<< {header} /Length {len(data)} >>\nstream\n".encode("ascii") + data + b"\nendstream")
+
+    def drain(self) -> bytes:
+        data = b"".join(self.output)
+        self.output = []
+        return data
+
+    def page(self, compressed_rgb: bytes):
+        image, content, page = self.next_object, self.next_object + 1, self.next_object + 2
+        self.next_object += 3
+        width, height = self.pixel_size
+        page_width, page_height = self.page_size
+        self._stream(image, f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                            "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode", compressed_rgb)
+        self._stream(content, "", f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode("ascii"))
+        self._object(page, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>"
+        ).encode("ascii"))
+        self.pages.append(page)
+
+    def close(self):
+        kids = " ".join(f"{number} 0 R" for number in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode("ascii"))
+        xref_offset = self.offset
+        total = self.next_object
+        lines = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[number]:010d} 00000 n \n" for number in range(1, total)]
+        self._emit("".join(lines).encode("ascii"))
+        self._emit(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+
+
+def _page_size(size: Tuple[int, int]) -> Tuple[float, float]:
+    """Unidades do editor (px a 96 dpi) em pontos"""
+    return size[0] * 0.75, size[1] * 0.75
+
+
+def iter_pdf(pages: Iterable[bytes], pixel_size: Tuple[int, int], size: Tuple[int, int]) -> Iterator[bytes]:
+    """PDF a partir de páginas de encode_page; size em unidades do editor"""
+    writer = _ImagePdf(pixel_size, _page_size(size))
+    yield writer.drain()
+    for page in pages:
+        writer.page(page)
+        yield writer.drain()
+    writer.close()
+    yield writer.drain()
+
+
+def render_chunk(template: Dict[str, Any], rows: Sequence[Dict[str, Any]], fmt: str,
+                 scale: int = DEFAULT_SCALE, assets_dir: Optional[str] = None,
+                 version: Optional[str] = None) -> List[bytes]:
+    """Renderiza um bloco de vouchers (executa no pool): PNGs ou páginas de PDF"""
+    prepared = prepare(template, scale, assets_dir, version)
+    encode = encode_png if fmt == "png" else encode_page
+    return [encode(prepared.render(row)) for row in rows]
+
+
+def render_voucher(template: Dict[str, Any], data: Dict[str, Any], fmt: str = "png",
+                   scale: int = DEFAULT_SCALE, assets_dir: Optional[str] = None,
+                   version: Optional[str] = None) -> bytes:
+    prepared = prepare(template, scale, assets_dir, version)
+    image = prepared.render(data)
+    if fmt == "png":
+        return encode_png(image)
+    return b"".join(iter_pdf([encode_page(image)], prepared.pixel_size, prepared.size))
+
+
+# -- serviço -------------------------------------------------------------------
+
+def _write_atomic(path: Path, chunks: Iterable[bytes]):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as output:
+        for chunk in chunks:
+            output.write(chunk)
+    os.replace(tmp_path, path)
+
+
+class VoucherRenderer:
+    """Renderização com cache em disco e pool de processos para lotes
+
+    Os arquivos ficam em cache_dir com a chave de render_key no nome; como o
+    nome depende do conteúdo, podem ser servidos com cache HTTP longo.
+    """
+
+    def __init__(self, cache_dir: str, assets_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                 scale: int = DEFAULT_SCALE):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.assets_dir = os.path.abspath(assets_dir) if assets_dir else None
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.scale = scale
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {
+            "hits": 0,
+            "rendered": 0,
+            "batches": 0,
+            "batch_vouchers": 0,
+            "total_seconds": 0.0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn: o processo pai tem threads (servidor, executor padrão) e fork herdaria locks
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.executor
+
+    def path_for(self, key: str, extension: str) -> Path:
+        return self.cache_dir / f"{key}.{extension}"
+
+    def cached(self, filename: str) -> Optional[Path]:
+        """Arquivo já renderizado (nome devolvido por render/render_batch)"""
+        if not re.fullmatch(r"[0-9a-f]{32}\.(png|pdf|zip)", filename):
+            return None
+        path = self.cache_dir / filename
+        return path if path.is_file() else None
+
+    def render(self, template: Dict[str, Any], data: Dict[str, Any], fmt: str = "png",
+               version: Optional[str] = None) -> Tuple[Path, bool]:
+        """Renderiza um voucher (ou reaproveita o cache); devolve (arquivo, veio do cache)
+
+        version: template_version(template) já conhecida (ex.: CompiledTemplate.version).
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato '{fmt}' não suportado (use {', '.join(FORMATS)})")
+        version = version or template_version(template)
+        path = self.path_for(render_key(version, data, fmt, self.scale), fmt)
+        if path.exists():
+            self.stats["hits"] += 1
+            return path, True
+        start = time.perf_counter()
+        _write_atomic(path, [render_voucher(template, data, fmt, self.scale, self.assets_dir, version)])
+        self.stats["rendered"] += 1
+        self.stats["total_seconds"] += time.perf_counter() - start
+        return path, False
+
+    async def render_batch(self, template: Dict[str, Any], rows: Sequence[Dict[str, Any]], fmt: str = "pdf",
+                           names: Optional[Sequence[str]] = None,
+                           version: Optional[str] = None) -> Tuple[Path, bool]:
+        """Lote de vouchers num arquivo só: PDF com uma página por voucher ou zip de PNGs
+
+        names dá o nome de cada PNG no zip (padrão: a posição no lote).
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato '{fmt}' não suportado (use {', '.join(FORMATS)})")
+        extension = "pdf" if fmt == "pdf" else "zip"
+        version = version or template_version(template)
+        path = self.path_for(render_key(version, [list(rows), names], fmt, self.scale), extension)
+        if path.exists():
+            self.stats["hits"] += 1
+            return path, True
+
+        start = time.perf_counter()
+        prepared = prepare(template, self.scale, self.assets_dir, version)
+        outputs = self._render_chunks(template, rows, fmt, version)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as output:
+                if fmt == "pdf":
+                    writer = _ImagePdf(prepared.pixel_size, _page_size(prepared.size))
+                    async for page in outputs:
+                        writer.page(page)
+                        output.write(writer.drain())
+                    writer.close()
+                    output.write(writer.drain())
+                else:
+                    names = list(names) if names is not None else [str(index + 1) for index in range(len(rows))]
+                    # PNG já é comprimido: o zip só armazena
+                    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+                        index = 0
+                        async for png in outputs:
+                            archive.writestr(f"{names[index]}.png", png)
+                            index += 1
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        self.stats["batches"] += 1
+        self.stats["batch_vouchers"] += len(rows)
+        self.stats["total_seconds"] += time.perf_counter() - start
+        return path, False
+
+    async def _render_chunks(self, template: Dict[str, Any], rows: Sequence[Dict[str, Any]],
+                             fmt: str, version: str) -> AsyncIterator[bytes]:
+        """Blocos renderizados em ordem, com no máximo CHUNKS_IN_FLIGHT por processo pendentes"""
+        loop = asyncio.get_running_loop()
+        chunks = [rows[start:start + BATCH_CHUNK] for start in range(0, len(rows), BATCH_CHUNK)]
+        if len(chunks) <= 1:
+            # Lote pequeno: o processo corrente já tem o template preparado
+            for chunk in chunks:
+                for output in await asyncio.to_thread(
+                    render_chunk, template, chunk, fmt, self.scale, self.assets_dir, version
+                ):
+                    yield output
+            return
+        executor = self._get_executor()
+        limit = self.max_workers * CHUNKS_IN_FLIGHT
+        pending: List[asyncio.Future] = []
+        next_chunk = 0
+        try:
+            while next_chunk < len(chunks) or pending:
+                while next_chunk < len(chunks) and len(pending) < limit:
+                    pending.append(loop.run_in_executor(
+                        executor, render_chunk, template, chunks[next_chunk], fmt, self.scale, self.assets_dir,
+                        version
+                    ))
+                    next_chunk += 1
+                for output in await pending.pop(0):
+                    yield output
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats, "max_workers": self.max_workers, "prepared_templates": len(_prepared),
+            "compiled_templates": len(_compiled)
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,66 @@
+"""
+Paginação por cursor: percorrer todas as páginas devolve cada linha exatamente uma vez
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine, func, insert
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from shared.services.pagination import paginate
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def walk(session, limit, descending=True):
+    seen, cursor = [], None
+    for _ in range(1000):
+        rows, cursor = paginate(
+            session.query(Item), [Item.created_at, Item.id], cursor, limit, descending=descending
+        )
+        seen.extend(row.id for row in rows)
+        if not cursor:
+            return seen
+    pytest.fail("paginação não terminou")
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_server_default_timestamps(session, descending):
+    # CURRENT_TIMESTAMP grava sem fração e as linhas empatam no mesmo segundo
+    session.execute(insert(Item), [{} for _ in range(25)])
+    session.commit()
+
+    seen = walk(session, limit=7, descending=descending)
+
+    assert len(seen) == len(set(seen)) == 25
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_orm_timestamps(session, descending):
+    start = datetime(2026, 10, 19, 13, 27, 36, 120000)
+    session.add_all(Item(created_at=start + timedelta(milliseconds=index % 4)) for index in range(25))
+    session.commit()
+
+    seen = walk(session, limit=4, descending=descending)
+
+    assert len(seen) == len(set(seen)) == 25
@@ -0,0 +1,238 @@
+import json
+import logging
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Feriados nacionais de data fixa (mês, dia) - válidos para qualquer ano
+NATIONAL_HOLIDAYS = [
+    (1, 1), (4, 21), (5, 1), (9, 7),
+    (10, 12), (11, 2), (11, 15), (12, 25)
+]
+
+# Tabela [mês, dia] -> 1 se feriado; consulta vetorizada por indexação
+HOLIDAY_TABLE = np.zeros((13, 32), dtype=np.int8)
+for _month, _day in NATIONAL_HOLIDAYS:
+    HOLIDAY_TABLE[_month, _day] = 1
+
+# Faixas de preço por noite: (0, 100], (100, 200], (200, 500], (500, inf)
+PRICE_BIN_EDGES = [100, 200, 500]
+PRICE_CATEGORIES = ['low', 'medium', 'high', 'luxury']
+
+# Coluna de origem necessária para cada feature derivada
+FEATURE_SOURCES = {
+    'day_of_week': 'date',
+    'month': 'date',
+    'quarter': 'date',
+    'is_weekend': 'date',
+    'is_holiday': 'date',
+    'weather_encoded': 'weather',
+    'location_encoded': 'location',
+    'has_events': 'events',
+    'event_count': 'events',
+    'price_per_night': 'price',
+    'price_category_encoded': 'price',
+    'nights': 'nights',
+    'guests': 'guests'
+}
+
+# Features categóricas -> coluna de origem
+CATEGORICAL_FEATURES = {
+    'weather_encoded': 'weather',
+    'location_encoded': 'location'
+}
+
+
+def holiday_flags(months: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Indica feriados para arrays de mês/dia (qualquer ano)"""
+    return HOLIDAY_TABLE[months, days]
+
+
+def price_category_index(price_per_night: float) -> int:
+    """Índice da faixa de preço; valores não positivos caem no bucket desconhecido"""
+    if price_per_night is None or not price_per_night > 0:
+        return len(PRICE_CATEGORIES)
+    return bisect_left(PRICE_BIN_EDGES, price_per_night)
+
+
+def _parse_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+class FeaturePipeline:
+    """Pipeline de features compartilhado entre treino e inferência"""
+
+    def __init__(self, candidate_columns: List[str]):
+        self.candidate_columns = list(candidate_columns)
+        # Ordem fixa das colunas do modelo, definida no fit
+        self.feature_columns: List[str] = []
+        # feature categórica -> {categoria: índice}; o índice len(dict) é o bucket desconhecido
+        self.categories: Dict[str, Dict[str, int]] = {}
+        self.mean: List[float] = []
+        self.scale: List[float] = []
+        self.fitted = False
+
+    def fit(self, df: pd.DataFrame) -> "FeaturePipeline":
+        """Define colunas e dicionários de categorias a partir dos dados de treino"""
+        self.feature_columns = [
+            column for column in self.candidate_columns
+            if FEATURE_SOURCES.get(column) in df.columns
+            and (FEATURE_SOURCES[column] != 'price' or 'nights' in df.columns)
+        ]
+
+        self.categories = {}
+        for feature, source in CATEGORICAL_FEATURES.items():
+            if feature in self.feature_columns:
+                values = sorted(df[source].dropna().astype(str).unique())
+                self.categories[feature] = {value: index for index, value in enumerate(values)}
+
+        self.fitted = True
+        return self
+
+    def fit_scaling(self, X: np.ndarray) -> "FeaturePipeline":
+        """Calcula média/desvio (mesma convenção do StandardScaler)"""
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1.0
+        self.mean = mean.tolist()
+        self.scale = scale.tolist()
+        return self
+
+    def scale_matrix(self, X: np.ndarray) -> np.ndarray:
+        return (X - np.asarray(self.mean)) / np.asarray(self.scale)
+
+    def _encode_series(self, feature: str, series: pd.Series) -> np.ndarray:
+        mapping = self.categories[feature]
+        unknown = len(mapping)
+        return series.astype(str).map(mapping).fillna(unknown).to_numpy(dtype=float)
+
+    def transform_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Transforma um DataFrame na matriz (não normalizada) de features"""
+        columns: Dict[str, np.ndarray] = {}
+        n_rows = len(df)
+
+        if 'date' in df.columns:
+            dates = pd.to_datetime(df['date'])
+            day_of_week = dates.dt.dayofweek.to_numpy()
+            months = dates.dt.month.to_numpy()
+            columns['day_of_week'] = day_of_week
+            columns['month'] = months
+            columns['quarter'] = (months - 1) // 3 + 1
+            columns['is_weekend'] = (day_of_week >= 5).astype(int)
+            columns['is_holiday'] = holiday_flags(months, dates.dt.day.to_numpy())
+
+        for feature, source in CATEGORICAL_FEATURES.items():
+            if feature in self.categories and source in df.columns:
+                columns[feature] = self._encode_series(feature, df[source])
+
+        if 'events' in df.columns:
+            columns['has_events'] = df['events'].notna().astype(int).to_numpy()
+            columns['event_count'] = df['events'].str.count(',').fillna(0).to_numpy()
+
+        if 'price' in df.columns and 'nights' in df.columns:
+            price_per_night = (df['price'] / df['nights']).to_numpy(dtype=float)
+            columns['price_per_night'] = price_per_night
+            bins = np.searchsorted(PRICE_BIN_EDGES, price_per_night, side='left')
+            bins[~(price_per_night > 0)] = len(PRICE_CATEGORIES)
+            columns['price_category_encoded'] = bins
+
+        for column in ('nights', 'guests'):
+            if column in df.columns:
+                columns[column] = df[column].to_numpy()
+
+        matrix = np.zeros((n_rows, len(self.feature_columns)), dtype=float)
+        for index, column in enumerate(self.feature_columns):
+            if column in columns:
+                matrix[:, index] = columns[column]
+            elif self.mean:
+                matrix[:, index] = self.mean[index]
+        return np.nan_to_num(matrix)
+
+    def transform_one(self, features: Dict[str, Any]) -> Tuple[List[float], List[str]]:
+        """Transforma uma única linha (sem pandas) já normalizada
+
+        Retorna o vetor e a lista de features ausentes, preenchidas com a média do treino.
+        """
+        values: Dict[str, float] = {}
+
+        if features.get('date') is not None:
+            day = _parse_date(features['date'])
+            day_of_week = day.weekday()
+            values['day_of_week'] = day_of_week
+            values['month'] = day.month
+            values['quarter'] = (day.month - 1) // 3 + 1
+            values['is_weekend'] = 1 if day_of_week >= 5 else 0
+            values['is_holiday'] = int(HOLIDAY_TABLE[day.month, day.day])
+
+        for feature, source in CATEGORICAL_FEATURES.items():
+            if feature in self.categories and features.get(source) is not None:
+                mapping = self.categories[feature]
+                values[feature] = mapping.get(str(features[source]), len(mapping))
+
+        if 'events' in features:
+            events = features['events']
+            values['has_events'] = 0 if events is None else 1
+            values['event_count'] = str(events).count(',') if events else 0
+        if 'has_events' in features:
+            values['has_events'] = features['has_events']
+        if 'event_count' in features:
+            values['event_count'] = features['event_count']
+
+        price_per_night = features.get('price_per_night')
+        if price_per_night is None and features.get('price') is not None and features.get('nights'):
+            price_per_night = features['price'] / features['nights']
+        if price_per_night is not None:
+            values['price_per_night'] = price_per_night
+            values['price_category_encoded'] = price_category_index(price_per_night)
+
+        for column in ('nights', 'guests'):
+            if features.get(column) is not None:
+                values[column] = features[column]
+
+        vector = []
+        missing = []
+        for column, mean, scale in zip(self.feature_columns, self.mean, self.scale):
+            value = values.get(column)
+            if value is None:
+                missing.append(column)
+                vector.append(0.0)
+            else:
+                vector.append((float(value) - mean) / scale)
+        return vector, missing
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'candidate_columns': self.candidate_columns,
+            'feature_columns': self.feature_columns,
+            'categories': self.categories,
+            'mean': self.mean,
+            'scale': self.scale
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeaturePipeline":
+        pipeline = cls(data['candidate_columns'])
+        pipeline.feature_columns = data['feature_columns']
+        pipeline.categories = data['categories']
+        pipeline.mean = data['mean']
+        pipeline.scale = data['scale']
+        pipeline.fitted = True
+        return pipeline
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "FeaturePipeline":
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
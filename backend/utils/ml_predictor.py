@@ -1,32 +1,119 @@
 import pandas as pd
 import numpy as np
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import joblib
+from joblib import Parallel, delayed
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
 import json
 import os
+import shutil
+import time
+
+from utils.feature_pipeline import FeaturePipeline, FEATURE_SOURCES, holiday_flags
+from utils.model_registry import ModelRegistry
+from utils.prediction_cache import PredictionCache, canonicalize_features
 
 logger = logging.getLogger(__name__)
 
+# Features e variável alvo de cada tipo de modelo
+FEATURE_COLUMNS = {
+    'demand_forecast': [
+        'day_of_week', 'month', 'quarter', 'is_weekend', 'is_holiday',
+        'weather_encoded', 'location_encoded', 'has_events', 'event_count',
+        'price_per_night', 'price_category_encoded'
+    ],
+    'price_prediction': [
+        'day_of_week', 'month', 'quarter', 'is_weekend', 'is_holiday',
+        'weather_encoded', 'location_encoded', 'has_events', 'event_count',
+        'nights', 'guests'
+    ]
+}
+
+TARGET_COLUMNS = {
+    'demand_forecast': 'bookings',
+    'price_prediction': 'price'
+}
+
+def fit_candidate(
+    name: str,
+    model: Any,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    feature_names: List[str],
+    cv_folds: int = 5
+) -> Dict[str, Any]:
+    """Treina e avalia um modelo candidato (executável em worker separado)"""
+    start = time.perf_counter()
+    
+    # Validação cruzada no conjunto de treino para seleção do modelo
+    cv_r2 = None
+    cv_r2_std = None
+    if cv_folds and cv_folds > 1 and len(X_train) >= cv_folds:
+        scores = cross_val_score(clone(model), X_train, y_train, cv=cv_folds, scoring='r2')
+        cv_r2 = float(np.mean(scores))
+        cv_r2_std = float(np.std(scores))
+    
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    
+    # Feature importance (se disponível)
+    importance = None
+    if hasattr(model, 'feature_importances_'):
+        importance = dict(zip(feature_names, model.feature_importances_.tolist()))
+    
+    return {
+        'name': name,
+        'model': model,
+        'mse': mean_squared_error(y_test, y_pred),
+        'mae': mean_absolute_error(y_test, y_pred),
+        'r2': r2_score(y_test, y_pred),
+        'cv_r2': cv_r2,
+        'cv_r2_std': cv_r2_std,
+        'feature_importance': importance,
+        'fit_seconds': time.perf_counter() - start
+    }
+
 class MLPredictor:
     """Sistema de Machine Learning para previsões avançadas"""
     
-    def __init__(self, models_dir: str = "models"):
+    def __init__(
+        self,
+        models_dir: str = "models",
+        keep_versions: int = 2,
+        cache_size: int = 10000,
+        cluster_cache: Optional[Any] = None
+    ):
         self.models_dir = models_dir
+        self.keep_versions = keep_versions
         self.models = {}
-        self.scalers = {}
-        self.label_encoders = {}
+        self.pipelines = {}
         self.feature_importance = {}
         
+        # Matrizes de features preparadas, reaproveitadas entre treinos do mesmo dataset
+        self._matrix_cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._matrix_cache_size = 4
+        
         # Criar diretório de modelos se não existir
         os.makedirs(models_dir, exist_ok=True)
         
+        # Modelos treinados ficam residentes; novas versões são trocadas sem restart
+        self.registry = ModelRegistry(models_dir)
+        
+        # Previsões repetidas (mesma busca) são servidas do cache; a chave inclui a versão
+        # do modelo e o cache local é limpo quando uma nova versão é promovida
+        self.prediction_cache = PredictionCache(cache_size, cluster_cache=cluster_cache)
+        self.registry.add_listener(lambda model_type, _: self.prediction_cache.invalidate(model_type))
+        
         # Inicializar modelos
         self._initialize_models()
     
@@ -73,284 +160,185 @@ class MLPredictor:
                 n_jobs=-1
             )
         }
-        
-        # Inicializar scalers e encoders
-        for model_type in self.models.keys():
-            self.scalers[model_type] = StandardScaler()
-            self.label_encoders[model_type] = {}
     
     def prepare_features(self, data: pd.DataFrame, model_type: str) -> pd.DataFrame:
         """Prepara features para treinamento"""
-        
-        df = data.copy()
-        
-        # Features temporais
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            df['day_of_week'] = df['date'].dt.dayofweek
-            df['month'] = df['date'].dt.month
-            df['quarter'] = df['date'].dt.quarter
-            df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-            df['is_holiday'] = self._is_holiday(df['date'])
-        
-        # Features climáticas
-        if 'weather' in df.columns:
-            weather_encoder = LabelEncoder()
-            df['weather_encoded'] = weather_encoder.fit_transform(df['weather'])
-            self.label_encoders[model_type]['weather'] = weather_encoder
-        
-        # Features de localização
-        if 'location' in df.columns:
-            location_encoder = LabelEncoder()
-            df['location_encoded'] = location_encoder.fit_transform(df['location'])
-            self.label_encoders[model_type]['location'] = location_encoder
-        
-        # Features de eventos
-        if 'events' in df.columns:
-            df['has_events'] = df['events'].notna().astype(int)
-            df['event_count'] = df['events'].str.count(',').fillna(0)
-        
-        # Features de preços
-        if 'price' in df.columns:
-            df['price_per_night'] = df['price'] / df['nights']
-            df['price_category'] = pd.cut(
-                df['price_per_night'], 
-                bins=[0, 100, 200, 500, float('inf')], 
-                labels=['low', 'medium', 'high', 'luxury']
-            )
-            price_encoder = LabelEncoder()
-            df['price_category_encoded'] = price_encoder.fit_transform(df['price_category'])
-            self.label_encoders[model_type]['price_category'] = price_encoder
-        
-        return df
+        pipeline = self._new_pipeline(model_type).fit(data)
+        return pd.DataFrame(
+            pipeline.transform_frame(data),
+            columns=pipeline.feature_columns,
+            index=data.index
+        )
+    
+    def _new_pipeline(self, model_type: str) -> FeaturePipeline:
+        """Cria pipeline de features com as colunas candidatas do tipo de modelo"""
+        return FeaturePipeline(FEATURE_COLUMNS.get(model_type, list(FEATURE_SOURCES.keys())))
     
     def _is_holiday(self, dates: pd.Series) -> pd.Series:
-        """Verifica se as datas são feriados (simplificado)"""
-        # Feriados brasileiros principais (simplificado)
-        holidays = [
-            '2024-01-01', '2024-04-21', '2024-05-01', '2024-09-07',
-            '2024-10-12', '2024-11-02', '2024-11-15', '2024-12-25'
-        ]
-        holiday_dates = pd.to_datetime(holidays)
-        return dates.isin(holiday_dates).astype(int)
+        """Verifica se as datas são feriados nacionais (qualquer ano)"""
+        dates = pd.to_datetime(dates)
+        flags = holiday_flags(dates.dt.month.to_numpy(), dates.dt.day.to_numpy())
+        return pd.Series(flags.astype(int), index=dates.index)
     
-    def train_demand_model(self, data: pd.DataFrame) -> Dict[str, Any]:
+    def train_demand_model(self, data: pd.DataFrame, **kwargs) -> Dict[str, Any]:
         """Treina modelo de previsão de demanda"""
-        
-        logger.info("Iniciando treinamento do modelo de demanda")
-        
-        # Preparar features
-        df = self.prepare_features(data, 'demand_forecast')
-        
-        # Features para demanda
-        feature_columns = [
-            'day_of_week', 'month', 'quarter', 'is_weekend', 'is_holiday',
-            'weather_encoded', 'location_encoded', 'has_events', 'event_count',
-            'price_per_night', 'price_category_encoded'
-        ]
-        
-        # Remover colunas que não existem
-        available_features = [col for col in feature_columns if col in df.columns]
-        
-        X = df[available_features].fillna(0)
-        y = df['bookings']  # Assumindo que 'bookings' é a variável alvo
+        return self.train_model('demand_forecast', data, **kwargs)
+    
+    def train_price_model(self, data: pd.DataFrame, **kwargs) -> Dict[str, Any]:
+        """Treina modelo de previsão de preços"""
+        return self.train_model('price_prediction', data, **kwargs)
+    
+    def build_training_matrix(self, data: pd.DataFrame, model_type: str) -> Dict[str, Any]:
+        """Prepara, divide e normaliza os dados de treino (com cache por dataset)"""
+        cache_key = (model_type, self._fingerprint(data))
+        cached = self._matrix_cache.get(cache_key)
+        if cached is not None:
+            self._matrix_cache.move_to_end(cache_key)
+            logger.info(f"Reutilizando matriz de features em cache para {model_type}")
+            return cached
+        
+        # Pipeline local: encoders ajustados uma única vez e compartilhados com a inferência
+        pipeline = self._new_pipeline(model_type).fit(data)
+        X = pipeline.transform_frame(data)
+        y = data[TARGET_COLUMNS[model_type]].to_numpy()
         
         # Dividir dados
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
         
-        # Normalizar features
-        X_train_scaled = self.scalers['demand_forecast'].fit_transform(X_train)
-        X_test_scaled = self.scalers['demand_forecast'].transform(X_test)
-        
-        results = {}
-        
-        # Treinar cada modelo
-        for name, model in self.models['demand_forecast'].items():
-            logger.info(f"Treinando modelo {name} para demanda")
-            
-            model.fit(X_train_scaled, y_train)
-            y_pred = model.predict(X_test_scaled)
-            
-            # Métricas
-            mse = mean_squared_error(y_test, y_pred)
-            mae = mean_absolute_error(y_test, y_pred)
-            r2 = r2_score(y_test, y_pred)
-            
-            # Feature importance (se disponível)
-            importance = None
-            if hasattr(model, 'feature_importances_'):
-                importance = dict(zip(available_features, model.feature_importances_))
-            
-            results[name] = {
-                'model': model,
-                'mse': mse,
-                'mae': mae,
-                'r2': r2,
-                'feature_importance': importance
-            }
-            
-            logger.info(f"Modelo {name} - MSE: {mse:.4f}, MAE: {mae:.4f}, R²: {r2:.4f}")
+        # Normalizar features (estatísticas apenas do treino)
+        pipeline.fit_scaling(X_train)
+        matrix = {
+            'X_train': pipeline.scale_matrix(X_train),
+            'X_test': pipeline.scale_matrix(X_test),
+            'y_train': y_train,
+            'y_test': y_test,
+            'feature_columns': pipeline.feature_columns,
+            'pipeline': pipeline
+        }
         
-        # Salvar melhor modelo
-        best_model_name = max(results.keys(), key=lambda k: results[k]['r2'])
-        self._save_model('demand_forecast', best_model_name, results[best_model_name])
+        self._matrix_cache[cache_key] = matrix
+        while len(self._matrix_cache) > self._matrix_cache_size:
+            self._matrix_cache.popitem(last=False)
         
-        return results
+        return matrix
     
-    def train_price_model(self, data: pd.DataFrame) -> Dict[str, Any]:
-        """Treina modelo de previsão de preços"""
-        
-        logger.info("Iniciando treinamento do modelo de preços")
-        
-        # Preparar features
-        df = self.prepare_features(data, 'price_prediction')
-        
-        # Features para preços
-        feature_columns = [
-            'day_of_week', 'month', 'quarter', 'is_weekend', 'is_holiday',
-            'weather_encoded', 'location_encoded', 'has_events', 'event_count',
-            'nights', 'guests'
-        ]
-        
-        # Remover colunas que não existem
-        available_features = [col for col in feature_columns if col in df.columns]
-        
-        X = df[available_features].fillna(0)
-        y = df['price']
-        
-        # Dividir dados
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
+    def _fingerprint(self, data: pd.DataFrame) -> str:
+        """Hash estável do conteúdo do DataFrame"""
+        row_hashes = pd.util.hash_pandas_object(data, index=True).to_numpy()
+        digest = hashlib.sha1(row_hashes.tobytes())
+        digest.update(','.join(map(str, data.columns)).encode())
+        return digest.hexdigest()
+    
+    def train_model(
+        self,
+        model_type: str,
+        data: pd.DataFrame,
+        n_jobs: int = 1,
+        cv_folds: int = 5,
+        progress: Optional[Callable[[str, float], None]] = None
+    ) -> Dict[str, Any]:
+        """Treina os candidatos de um tipo de modelo e promove o melhor"""
+        
+        def report(stage: str, fraction: float):
+            if progress:
+                progress(stage, fraction)
+        
+        logger.info(f"Iniciando treinamento do modelo {model_type}")
+        report('preparing', 0.0)
+        
+        matrix = self.build_training_matrix(data, model_type)
+        candidates = self.models[model_type]
+        
+        report('fitting', 0.1)
+        
+        # Candidatos treinados em paralelo (loky); arrays grandes são compartilhados via memmap
+        jobs = Parallel(n_jobs=n_jobs, backend='loky', return_as='generator')(
+            delayed(fit_candidate)(
+                name, clone(model),
+                matrix['X_train'], matrix['y_train'],
+                matrix['X_test'], matrix['y_test'],
+                matrix['feature_columns'], cv_folds
+            )
+            for name, model in candidates.items()
         )
         
-        # Normalizar features
-        X_train_scaled = self.scalers['price_prediction'].fit_transform(X_train)
-        X_test_scaled = self.scalers['price_prediction'].transform(X_test)
-        
         results = {}
+        for result in jobs:
+            name = result.pop('name')
+            results[name] = result
+            logger.info(
+                f"Modelo {name} para {model_type} - MSE: {result['mse']:.4f}, "
+                f"MAE: {result['mae']:.4f}, R²: {result['r2']:.4f}, "
+                f"CV R²: {result['cv_r2']}, {result['fit_seconds']:.2f}s"
+            )
+            report('fitting', 0.1 + 0.8 * len(results) / len(candidates))
         
-        # Treinar cada modelo
-        for name, model in self.models['price_prediction'].items():
-            logger.info(f"Treinando modelo {name} para preços")
-            
-            model.fit(X_train_scaled, y_train)
-            y_pred = model.predict(X_test_scaled)
-            
-            # Métricas
-            mse = mean_squared_error(y_test, y_pred)
-            mae = mean_absolute_error(y_test, y_pred)
-            r2 = r2_score(y_test, y_pred)
-            
-            # Feature importance
-            importance = dict(zip(available_features, model.feature_importances_))
-            
-            results[name] = {
-                'model': model,
-                'mse': mse,
-                'mae': mae,
-                'r2': r2,
-                'feature_importance': importance
-            }
-            
-            logger.info(f"Modelo {name} - MSE: {mse:.4f}, MAE: {mae:.4f}, R²: {r2:.4f}")
+        # Seleção pelo R² da validação cruzada (R² de teste quando não houver CV)
+        def selection_score(name: str) -> float:
+            cv_r2 = results[name]['cv_r2']
+            return cv_r2 if cv_r2 is not None else results[name]['r2']
         
-        # Salvar melhor modelo
-        best_model_name = max(results.keys(), key=lambda k: results[k]['r2'])
-        self._save_model('price_prediction', best_model_name, results[best_model_name])
+        best_model_name = max(results.keys(), key=selection_score)
         
+        report('saving', 0.9)
+        self._save_model(model_type, best_model_name, results[best_model_name], matrix['pipeline'])
+        
+        # Troca de referência (não mutação) do estado de treino exposto
+        self.pipelines[model_type] = matrix['pipeline']
+        
+        report('done', 1.0)
         return results
     
     def predict_demand(self, features: Dict[str, Any]) -> Dict[str, Any]:
         """Faz previsão de demanda"""
-        
-        # Carregar modelo se necessário
-        model_info = self._load_model('demand_forecast')
-        if not model_info:
-            return {"error": "Modelo não treinado"}
-        
-        # Preparar features
-        feature_vector = self._prepare_prediction_features(features, 'demand_forecast')
-        
-        # Fazer previsão
-        prediction = model_info['model'].predict([feature_vector])[0]
-        
-        return {
-            "predicted_demand": int(prediction),
-            "confidence": self._calculate_confidence(model_info),
-            "model_used": model_info['name'],
-            "features_used": list(features.keys())
-        }
+        return self._predict('demand_forecast', features, 'predicted_demand', int)
     
     def predict_price(self, features: Dict[str, Any]) -> Dict[str, Any]:
         """Faz previsão de preços"""
+        return self._predict('price_prediction', features, 'predicted_price', float)
+    
+    def _predict(
+        self,
+        model_type: str,
+        features: Dict[str, Any],
+        output_key: str,
+        cast: Callable[[Any], Any]
+    ) -> Dict[str, Any]:
+        """Previsão memoizada por features canônicas e versão do modelo"""
         
         # Carregar modelo se necessário
-        model_info = self._load_model('price_prediction')
+        model_info = self._load_model(model_type)
         if not model_info:
             return {"error": "Modelo não treinado"}
         
-        # Preparar features
-        feature_vector = self._prepare_prediction_features(features, 'price_prediction')
+        if model_info['pipeline'] is None:
+            return {"error": "Modelo sem pipeline de features; é necessário re-treinar"}
+        
+        # A previsão usa as features quantizadas, então o valor em cache é idêntico
+        canonical = canonicalize_features(features)
+        cache_key = self.prediction_cache.make_key(model_type, model_info['version'], canonical)
+        cached = self.prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Preparar features (mesmo pipeline do treino)
+        feature_vector, missing = model_info['pipeline'].transform_one(canonical)
         
         # Fazer previsão
-        prediction = model_info['model'].predict([feature_vector])[0]
+        prediction = model_info['model'].predict(np.array([feature_vector]))[0]
         
-        return {
-            "predicted_price": float(prediction),
+        result = {
+            output_key: cast(prediction),
             "confidence": self._calculate_confidence(model_info),
             "model_used": model_info['name'],
-            "features_used": list(features.keys())
+            "features_used": list(features.keys()),
+            "features_missing": missing
         }
-    
-    def _prepare_prediction_features(self, features: Dict[str, Any], model_type: str) -> List[float]:
-        """Prepara features para previsão"""
-        
-        # Converter features para formato numérico
-        feature_vector = []
-        
-        # Features temporais
-        if 'date' in features:
-            date = pd.to_datetime(features['date'])
-            feature_vector.extend([
-                date.dayofweek,
-                date.month,
-                date.quarter,
-                1 if date.dayofweek in [5, 6] else 0,
-                1 if self._is_holiday(pd.Series([date])).iloc[0] else 0
-            ])
-        
-        # Features climáticas
-        if 'weather' in features and 'weather' in self.label_encoders[model_type]:
-            weather_encoded = self.label_encoders[model_type]['weather'].transform([features['weather']])[0]
-            feature_vector.append(weather_encoded)
-        
-        # Features de localização
-        if 'location' in features and 'location' in self.label_encoders[model_type]:
-            location_encoded = self.label_encoders[model_type]['location'].transform([features['location']])[0]
-            feature_vector.append(location_encoded)
-        
-        # Features de eventos
-        feature_vector.extend([
-            features.get('has_events', 0),
-            features.get('event_count', 0)
-        ])
-        
-        # Features de preços
-        if 'price_per_night' in features:
-            feature_vector.append(features['price_per_night'])
-        
-        # Features de reserva
-        feature_vector.extend([
-            features.get('nights', 1),
-            features.get('guests', 1)
-        ])
-        
-        # Normalizar features
-        feature_vector = self.scalers[model_type].transform([feature_vector])[0]
-        
-        return feature_vector.tolist()
+        
+        self.prediction_cache.set(cache_key, result)
+        return result
     
     def _calculate_confidence(self, model_info: Dict[str, Any]) -> float:
         """Calcula nível de confiança da previsão"""
@@ -358,80 +346,86 @@ class MLPredictor:
         r2 = model_info.get('r2', 0.5)
         return min(max(r2, 0.1), 0.95)  # Entre 10% e 95%
     
-    def _save_model(self, model_type: str, model_name: str, model_info: Dict[str, Any]):
+    def _save_model(
+        self,
+        model_type: str,
+        model_name: str,
+        model_info: Dict[str, Any],
+        pipeline: FeaturePipeline
+    ):
         """Salva modelo treinado"""
-        model_path = os.path.join(self.models_dir, f"{model_type}_{model_name}.joblib")
-        scaler_path = os.path.join(self.models_dir, f"{model_type}_scaler.joblib")
-        encoder_path = os.path.join(self.models_dir, f"{model_type}_encoders.json")
-        
-        # Salvar modelo
-        joblib.dump(model_info['model'], model_path)
+        # Artefatos versionados: workers que ainda mapeiam a versão anterior não são afetados
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        model_file = f"{model_type}_{model_name}_v{version}.joblib"
+        pipeline_file = f"{model_type}_pipeline_v{version}.json"
         
-        # Salvar scaler
-        joblib.dump(self.scalers[model_type], scaler_path)
+        # Tudo é escrito primeiro em staging (mesmo filesystem) e depois promovido
+        staging_dir = os.path.join(self.models_dir, 'staging', f"{model_type}_v{version}")
+        os.makedirs(staging_dir, exist_ok=True)
         
-        # Salvar encoders
-        encoders_data = {}
-        for name, encoder in self.label_encoders[model_type].items():
-            encoders_data[name] = {
-                'classes': encoder.classes_.tolist()
-            }
-        
-        with open(encoder_path, 'w') as f:
-            json.dump(encoders_data, f)
-        
-        # Salvar metadados
-        metadata = {
-            'model_name': model_name,
-            'model_type': model_type,
-            'r2': model_info['r2'],
-            'mse': model_info['mse'],
-            'mae': model_info['mae'],
-            'feature_importance': model_info.get('feature_importance', {}),
-            'created_at': datetime.now().isoformat()
-        }
-        
-        metadata_path = os.path.join(self.models_dir, f"{model_type}_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        logger.info(f"Modelo {model_type}_{model_name} salvo com sucesso")
-    
-    def _load_model(self, model_type: str) -> Optional[Dict[str, Any]]:
-        """Carrega modelo treinado"""
         try:
-            # Procurar por modelos disponíveis
-            model_files = [f for f in os.listdir(self.models_dir) if f.startswith(model_type)]
+            # Salvar modelo (sem compressão, para permitir joblib.load com mmap_mode)
+            joblib.dump(model_info['model'], os.path.join(staging_dir, model_file))
             
-            if not model_files:
-                return None
+            # Salvar pipeline de features (categorias, ordem das colunas e normalização)
+            pipeline.save(os.path.join(staging_dir, pipeline_file))
             
-            # Carregar metadados para encontrar melhor modelo
-            metadata_path = os.path.join(self.models_dir, f"{model_type}_metadata.json")
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                
-                model_name = metadata['model_name']
-                model_path = os.path.join(self.models_dir, f"{model_type}_{model_name}.joblib")
-                scaler_path = os.path.join(self.models_dir, f"{model_type}_scaler.joblib")
-                
-                # Carregar modelo e scaler
-                model = joblib.load(model_path)
-                scaler = joblib.load(scaler_path)
-                
-                return {
-                    'model': model,
-                    'scaler': scaler,
-                    'name': model_name,
-                    'r2': metadata['r2'],
-                    'mse': metadata['mse'],
-                    'mae': metadata['mae']
-                }
-        
-        except Exception as e:
-            logger.error(f"Erro ao carregar modelo {model_type}: {str(e)}")
-            return None
+            # Salvar metadados
+            metadata = {
+                'model_name': model_name,
+                'model_type': model_type,
+                'version': version,
+                'model_file': model_file,
+                'pipeline_file': pipeline_file,
+                'feature_columns': pipeline.feature_columns,
+                'r2': model_info['r2'],
+                'mse': model_info['mse'],
+                'mae': model_info['mae'],
+                'cv_r2': model_info.get('cv_r2'),
+                'feature_importance': model_info.get('feature_importance', {}),
+                'created_at': datetime.now().isoformat()
+            }
+            
+            metadata_file = f"{model_type}_metadata.json"
+            with open(os.path.join(staging_dir, metadata_file), 'w') as f:
+                json.dump(metadata, f, indent=2)
+            
+            # Promover: os.replace é atômico; o metadata por último publica a nova versão
+            for filename in (model_file, pipeline_file, metadata_file):
+                os.replace(
+                    os.path.join(staging_dir, filename),
+                    os.path.join(self.models_dir, filename)
+                )
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        
+        # Publicar imediatamente neste processo; os demais detectam pelo metadata
+        self.registry.reload(model_type)
+        self._prune_versions(model_type)
+        
+        logger.info(f"Modelo {model_type}_{model_name} (versão {version}) salvo com sucesso")
+    
+    def _prune_versions(self, model_type: str):
+        """Remove artefatos antigos mantendo as últimas keep_versions versões"""
+        versioned = {}
+        for filename in os.listdir(self.models_dir):
+            if not filename.startswith(f"{model_type}_") or '_v' not in filename:
+                continue
+            stem = os.path.splitext(filename)[0]
+            version = stem.rsplit('_v', 1)[1]
+            if version.isdigit():
+                versioned.setdefault(version, []).append(filename)
+        
+        for version in sorted(versioned)[:-self.keep_versions]:
+            for filename in versioned[version]:
+                try:
+                    os.remove(os.path.join(self.models_dir, filename))
+                except OSError as e:
+                    logger.warning(f"Não foi possível remover {filename}: {str(e)}")
+    
+    def _load_model(self, model_type: str) -> Optional[Dict[str, Any]]:
+        """Obtém o modelo treinado residente no registro"""
+        return self.registry.get(model_type)
     
     def get_model_status(self) -> Dict[str, Any]:
         """Retorna status dos modelos"""
@@ -443,18 +437,27 @@ class MLPredictor:
                 status[model_type] = {
                     'status': 'trained',
                     'model_name': model_info['name'],
+                    'version': model_info['version'],
                     'r2_score': model_info['r2'],
-                    'last_updated': 'recent'
+                    'last_updated': model_info['created_at']
                 }
             else:
                 status[model_type] = {
                     'status': 'not_trained',
                     'model_name': None,
+                    'version': None,
                     'r2_score': None,
                     'last_updated': None
                 }
         
         return status
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache de previsões e do registro de modelos"""
+        return {
+            'prediction_cache': self.prediction_cache.get_stats(),
+            'model_registry': self.registry.get_stats()
+        }
 
 # Instância global do predictor
 ml_predictor = MLPredictor() 
\ No newline at end of file
@@ -0,0 +1,221 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from joblib.externals.loky import get_reusable_executor
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIRNAME = "jobs"
+
+
+def _lower_priority(niceness: int):
+    """Initializer do processo de treino: cede CPU ao serving"""
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+def _write_progress(progress_path: str, payload: Dict[str, Any]):
+    """Grava progresso do job atomicamente (lido pelo processo de serving)"""
+    tmp_path = f"{progress_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, progress_path)
+
+
+def _run_training_job(
+    models_dir: str,
+    job_id: str,
+    model_type: str,
+    data: pd.DataFrame,
+    n_jobs: int,
+    cv_folds: int
+) -> Dict[str, Any]:
+    """Executa um job de treino no processo filho"""
+    from utils.ml_predictor import MLPredictor
+
+    progress_path = os.path.join(models_dir, JOBS_DIRNAME, f"{job_id}.json")
+    started = time.time()
+
+    def progress(stage: str, fraction: float):
+        _write_progress(progress_path, {
+            'stage': stage,
+            'progress': round(fraction, 3),
+            'elapsed_seconds': round(time.time() - started, 3)
+        })
+
+    predictor = MLPredictor(models_dir)
+    try:
+        results = predictor.train_model(
+            model_type, data, n_jobs=n_jobs, cv_folds=cv_folds, progress=progress
+        )
+    finally:
+        # Libera os workers loky para que o processo de treino possa encerrar
+        get_reusable_executor().shutdown(wait=True)
+
+    # Modelos não voltam ao processo pai: ele carrega a versão promovida do disco
+    return {
+        name: {key: value for key, value in info.items() if key != 'model'}
+        for name, info in results.items()
+    }
+
+
+class TrainingJobRunner:
+    """Executa treinamentos de modelos fora do processo de serving"""
+
+    def __init__(
+        self,
+        models_dir: str = "models",
+        n_jobs: int = -1,
+        cv_folds: int = 5,
+        max_concurrent_jobs: int = 1,
+        niceness: int = 10,
+        predictor: Optional[Any] = None
+    ):
+        self.models_dir = models_dir
+        self.n_jobs = n_jobs
+        self.cv_folds = cv_folds
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.niceness = niceness
+        # Predictor de serving a ser notificado quando uma nova versão for promovida
+        self.predictor = predictor
+
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.metrics = {
+            'jobs_submitted': 0,
+            'jobs_completed': 0,
+            'jobs_failed': 0,
+            'last_duration_seconds': {},
+            'total_duration_seconds': 0.0
+        }
+
+        os.makedirs(os.path.join(models_dir, JOBS_DIRNAME), exist_ok=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn: o filho não herda threads/conexões do servidor web
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_concurrent_jobs,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_lower_priority,
+                initargs=(self.niceness,)
+            )
+        return self.executor
+
+    def submit(self, model_type: str, data: pd.DataFrame) -> str:
+        """Agenda o treino de um tipo de modelo e retorna o id do job"""
+        job_id = f"{model_type}_{uuid.uuid4().hex[:12]}"
+
+        with self._lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'model_type': model_type,
+                'status': 'queued',
+                'rows': len(data),
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'duration_seconds': None,
+                'results': None,
+                'error': None
+            }
+            self.metrics['jobs_submitted'] += 1
+
+        future = self._get_executor().submit(
+            _run_training_job,
+            self.models_dir, job_id, model_type, data, self.n_jobs, self.cv_folds
+        )
+        self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+
+        logger.info(f"Job de treino {job_id} agendado ({len(data)} linhas)")
+        return job_id
+
+    def _on_done(self, job_id: str, future: Future):
+        """Consolida o resultado do job (executa em thread do executor)"""
+        job = self.jobs[job_id]
+        progress = self._read_progress(job_id) or {}
+        duration = progress.get('elapsed_seconds')
+
+        with self._lock:
+            job['finished_at'] = datetime.now().isoformat()
+            job['duration_seconds'] = duration
+            try:
+                job['results'] = future.result()
+                job['status'] = 'completed'
+                self.metrics['jobs_completed'] += 1
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                self.metrics['jobs_failed'] += 1
+                logger.error(f"Job de treino {job_id} falhou: {str(e)}")
+
+            if duration is not None:
+                self.metrics['last_duration_seconds'][job['model_type']] = duration
+                self.metrics['total_duration_seconds'] += duration
+
+        self._futures.pop(job_id, None)
+
+        if job['status'] == 'completed':
+            logger.info(f"Job de treino {job_id} concluído em {duration}s")
+            if self.predictor is not None:
+                self.predictor.registry.reload(job['model_type'])
+
+    def _read_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        progress_path = os.path.join(self.models_dir, JOBS_DIRNAME, f"{job_id}.json")
+        try:
+            with open(progress_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna status e progresso de um job"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        job = dict(job)
+        progress = self._read_progress(job_id)
+        if progress:
+            job['stage'] = progress['stage']
+            job['progress'] = progress['progress']
+            job['elapsed_seconds'] = progress['elapsed_seconds']
+            if job['status'] == 'queued':
+                job['status'] = 'running'
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Lista todos os jobs conhecidos"""
+        return [self.get_job(job_id) for job_id in list(self.jobs.keys())]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Métricas do executor de treinos"""
+        pending = sum(1 for future in self._futures.values() if not future.done())
+        return {
+            'jobs_submitted': self.metrics['jobs_submitted'],
+            'jobs_completed': self.metrics['jobs_completed'],
+            'jobs_failed': self.metrics['jobs_failed'],
+            'jobs_pending': pending,
+            'last_duration_seconds': dict(self.metrics['last_duration_seconds']),
+            'total_duration_seconds': self.metrics['total_duration_seconds']
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Encerra o processo de treino"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
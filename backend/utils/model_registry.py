@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+
+from utils.feature_pipeline import FeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+METADATA_SUFFIX = "_metadata.json"
+
+
+class ModelRegistry:
+    """Registro de modelos residentes em memória com hot reload"""
+
+    def __init__(
+        self,
+        models_dir: str = "models",
+        mmap_mode: Optional[str] = "r",
+        poll_interval: float = 5.0
+    ):
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.poll_interval = poll_interval
+
+        # model_type -> model_info (substituído atomicamente, nunca alterado in-place)
+        self._models: Dict[str, Dict[str, Any]] = {}
+        # model_type -> mtime do metadata carregado
+        self._versions: Dict[str, float] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+        self.running = False
+        self.thread = None
+
+        self.stats = {
+            'loads': 0,
+            'reloads': 0,
+            'load_errors': 0,
+            'last_load_seconds': {}
+        }
+
+    def _metadata_path(self, model_type: str) -> str:
+        return os.path.join(self.models_dir, f"{model_type}{METADATA_SUFFIX}")
+
+    def _metadata_mtime(self, model_type: str) -> Optional[float]:
+        try:
+            return os.stat(self._metadata_path(model_type)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def get(self, model_type: str) -> Optional[Dict[str, Any]]:
+        """Retorna o modelo residente, carregando na primeira chamada"""
+        # Verificação barata (os.stat) limitada a uma por poll_interval; funciona
+        # também em workers criados por fork, onde a thread de observação não existe
+        now = time.monotonic()
+        if now - self._last_check >= self.poll_interval:
+            self._last_check = now
+            self.check_for_updates()
+
+        model_info = self._models.get(model_type)
+        if model_info is not None:
+            return model_info
+
+        with self._lock:
+            # Outra thread pode ter carregado enquanto aguardávamos o lock
+            model_info = self._models.get(model_type)
+            if model_info is None:
+                model_info = self._load(model_type)
+        return model_info
+
+    def reload(self, model_type: str) -> Optional[Dict[str, Any]]:
+        """Força o recarregamento de um tipo de modelo"""
+        with self._lock:
+            return self._load(model_type)
+
+    def invalidate(self, model_type: Optional[str] = None):
+        """Remove modelos residentes (todos se model_type for None)"""
+        with self._lock:
+            if model_type is None:
+                self._models = {}
+                self._versions = {}
+            else:
+                models = dict(self._models)
+                models.pop(model_type, None)
+                self._models = models
+                self._versions.pop(model_type, None)
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """Registra callback chamado sempre que uma nova versão é promovida"""
+        self._listeners.append(callback)
+
+    def loaded_types(self) -> List[str]:
+        """Tipos de modelo atualmente residentes"""
+        return list(self._models.keys())
+
+    def _load(self, model_type: str) -> Optional[Dict[str, Any]]:
+        """Carrega artefatos do disco e publica no registro (chamar com lock)"""
+        mtime = self._metadata_mtime(model_type)
+        if mtime is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            with open(self._metadata_path(model_type), 'r') as f:
+                metadata = json.load(f)
+
+            model_name = metadata['model_name']
+            # Metadados antigos não registram caminhos versionados
+            model_file = metadata.get('model_file', f"{model_type}_{model_name}.joblib")
+            pipeline_file = metadata.get('pipeline_file')
+
+            # mmap_mode='r' mantém os arrays do modelo em páginas compartilhadas entre workers
+            model = joblib.load(os.path.join(self.models_dir, model_file), mmap_mode=self.mmap_mode)
+            # Previsões são de linha única: o pool de threads do ensemble só adiciona latência
+            if hasattr(model, 'n_jobs'):
+                model.n_jobs = 1
+            pipeline = None
+            if pipeline_file:
+                pipeline = FeaturePipeline.load(os.path.join(self.models_dir, pipeline_file))
+
+        except Exception as e:
+            self.stats['load_errors'] += 1
+            logger.error(f"Erro ao carregar modelo {model_type}: {str(e)}")
+            return None
+
+        model_info = {
+            'model': model,
+            'pipeline': pipeline,
+            'name': model_name,
+            'version': metadata.get('version', metadata.get('created_at')),
+            'feature_columns': metadata.get('feature_columns'),
+            'r2': metadata['r2'],
+            'mse': metadata['mse'],
+            'mae': metadata['mae'],
+            'created_at': metadata.get('created_at')
+        }
+
+        is_reload = model_type in self._models
+
+        # Publicação atômica: leitores veem o dict antigo ou o novo, nunca um estado parcial
+        models = dict(self._models)
+        models[model_type] = model_info
+        self._models = models
+        self._versions[model_type] = mtime
+
+        elapsed = time.perf_counter() - start
+        self.stats['loads'] += 1
+        self.stats['last_load_seconds'][model_type] = elapsed
+        if is_reload:
+            self.stats['reloads'] += 1
+
+        logger.info(
+            f"Modelo {model_type} ({model_name}, versão {model_info['version']}) "
+            f"carregado em {elapsed:.3f}s"
+        )
+
+        if is_reload:
+            for callback in self._listeners:
+                try:
+                    callback(model_type, model_info)
+                except Exception as e:
+                    logger.error(f"Erro no listener de recarga de {model_type}: {str(e)}")
+
+        return model_info
+
+    def check_for_updates(self) -> List[str]:
+        """Recarrega modelos cujo *_metadata.json mudou desde o último carregamento"""
+        reloaded = []
+
+        for model_type in list(self._models.keys()):
+            mtime = self._metadata_mtime(model_type)
+            if mtime is None or mtime == self._versions.get(model_type):
+                continue
+
+            with self._lock:
+                # Revalidar dentro do lock para não recarregar duas vezes
+                if mtime == self._versions.get(model_type):
+                    continue
+                if self._load(model_type) is not None:
+                    reloaded.append(model_type)
+
+        return reloaded
+
+    def start_watching(self):
+        """Inicia thread que observa novas versões de modelos"""
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._watch, daemon=True)
+            self.thread.start()
+            logger.info("🔁 Observador de modelos iniciado")
+
+    def stop_watching(self):
+        """Para a thread de observação"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+            logger.info("🔁 Observador de modelos parado")
+
+    def _watch(self):
+        """Loop de observação dos metadados"""
+        while self.running:
+            try:
+                reloaded = self.check_for_updates()
+                if reloaded:
+                    logger.info(f"Modelos recarregados: {', '.join(reloaded)}")
+            except Exception as e:
+                logger.error(f"Erro ao observar modelos: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do registro"""
+        return {
+            'loaded_models': {
+                model_type: {
+                    'model_name': info['name'],
+                    'version': info['version']
+                }
+                for model_type, info in self._models.items()
+            },
+            'loads': self.stats['loads'],
+            'reloads': self.stats['reloads'],
+            'load_errors': self.stats['load_errors'],
+            'last_load_seconds': dict(self.stats['last_load_seconds']),
+            'watching': self.running
+        }
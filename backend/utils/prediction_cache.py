@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+try:
+    from core.metrics import record_cache_operation
+except ImportError:  # Métricas Prometheus são opcionais fora dos serviços
+    record_cache_operation = None
+
+logger = logging.getLogger(__name__)
+
+# Passo de quantização por feature numérica (valores próximos compartilham a entrada)
+QUANTIZATION = {
+    'price': 10.0,
+    'price_per_night': 5.0
+}
+
+DEFAULT_FLOAT_DIGITS = 2
+
+
+def _quantize(name: str, value: Any) -> Any:
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        step = QUANTIZATION.get(name)
+        if step:
+            return round(round(value / step) * step, DEFAULT_FLOAT_DIGITS)
+        if value.is_integer():
+            return int(value)
+        return round(value, DEFAULT_FLOAT_DIGITS)
+    if isinstance(value, int):
+        step = QUANTIZATION.get(name)
+        return int(round(value / step) * step) if step else value
+    if isinstance(value, str) and name == 'date':
+        # '2024-12-25' e '2024-12-25T00:00:00' são a mesma data de busca
+        try:
+            return datetime.fromisoformat(value).date().isoformat()
+        except ValueError:
+            return value
+    return value
+
+
+def canonicalize_features(features: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza e quantiza as features (a previsão é feita sobre este dict)"""
+    return {name: _quantize(name, features[name]) for name in sorted(features)}
+
+
+class PredictionCache:
+    """Cache LRU de previsões com segundo nível opcional no cluster Redis"""
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        cluster_cache: Optional[Any] = None,
+        ttl_type: str = 'ml_predictions'
+    ):
+        self.max_size = max_size
+        self.cluster_cache = cluster_cache
+        self.ttl_type = ttl_type
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'hits': 0,
+            'cluster_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def make_key(self, model_type: str, version: Any, features: Dict[str, Any]) -> str:
+        """Chave canônica; a versão do modelo invalida entradas antigas automaticamente"""
+        payload = json.dumps(features, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        return f"{model_type}:{version}:{digest}"
+
+    def _record(self, hit: bool):
+        if record_cache_operation is not None:
+            record_cache_operation('ml_predictions', hit)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Busca no LRU local e, se configurado, no cluster"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+        if entry is not None:
+            self._record(True)
+            return dict(entry)
+
+        if self.cluster_cache is not None:
+            entry = self.cluster_cache.get(f"ml_prediction:{key}")
+            if entry is not None:
+                self.stats['cluster_hits'] += 1
+                self._store_local(key, entry)
+                self._record(True)
+                return dict(entry)
+
+        self.stats['misses'] += 1
+        self._record(False)
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Armazena previsão no LRU local e no cluster"""
+        self._store_local(key, value)
+
+        if self.cluster_cache is not None:
+            # data_type define a desserialização; o TTL vem da classe ml_predictions
+            self.cluster_cache.set(
+                f"ml_prediction:{key}",
+                value,
+                ttl=self.cluster_cache.ttl_config.get(self.ttl_type),
+                data_type='json'
+            )
+
+    def _store_local(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, model_type: Optional[str] = None):
+        """Remove entradas de um tipo de modelo (ou todas)"""
+        with self._lock:
+            if model_type is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                prefix = f"{model_type}:"
+                stale = [key for key in self._entries if key.startswith(prefix)]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            self.stats['invalidations'] += removed
+
+        # Entradas no cluster expiram pelo TTL e deixam de ser lidas (a chave contém a versão)
+        logger.info(f"Cache de previsões invalidado ({model_type or 'todos'}): {removed} entradas")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas e taxa de acerto"""
+        hits = self.stats['hits'] + self.stats['cluster_hits']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hit_rate': hits / total if total else 0.0
+        }
@@ -1,24 +1,76 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
+from itertools import groupby
 import json
+import logging
 import os
-import shutil
 
-from shared.config.database import get_db, init_db
-from shared.models.videos import (
-    Video, VideoPlaylist, VideoPlaylistItem, VideoView, 
-    VideoLike, VideoComment, VideoShare
-)
+from shared.config.database import get_db, init_db, engine, SessionLocal
 from shared.schemas import (
     VideoCreate, Video, VideoPlaylistCreate, VideoPlaylist,
-    VideoPlaylistItemCreate, VideoPlaylistItem, VideoViewCreate, VideoView,
-    VideoLikeCreate, VideoLike, VideoCommentCreate, VideoComment,
+    VideoViewCreate, VideoCommentCreate, VideoComment,
     VideoShareCreate, VideoShare
 )
+from shared.models.videos import (
+    Video as VideoModel, VideoView as VideoViewModel, VideoLike as VideoLikeModel,
+    VideoPlaylist as VideoPlaylistModel, VideoPlaylistItem as VideoPlaylistItemModel,
+    VideoComment as VideoCommentModel, VideoShare as VideoShareModel
+)
+from shared.services.media_store import MediaStore
+from shared.services.file_streaming import RangeFileResponse
+from shared.services.video_transcoder import TranscodeQueue
+from shared.services.counter_buffer import CounterBuffer
+from shared.services.stats_aggregator import IncrementalRollup, StatsCache, aggregate, count_where
+from shared.services.unique_counter import create_hll_counter
+from shared.services.pagination import NEXT_CURSOR_HEADER, paginate
+from shared.services.fast_json import FastJSONResponse, RowSerializer
+from shared.services.streaming_export import stream_query
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Videos Service", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Originais endereçados por conteúdo (deduplicados entre serviços)
+media_store = MediaStore(engine)
+
+# Transcodificação HLS com concorrência limitada (ffmpeg é CPU-bound)
+transcode_queue = TranscodeQueue(
+    output_root=os.getenv("VIDEO_HLS_DIR", "hls"),
+    max_concurrent=int(os.getenv("VIDEO_TRANSCODE_CONCURRENCY", "1")),
+    threads_per_job=int(os.getenv("VIDEO_TRANSCODE_THREADS", "0"))
+)
+
+# Visualizações/likes/compartilhamentos: contadores write-behind, eventos em lote
+counter_buffer = CounterBuffer(
+    engine,
+    models=[VideoModel, VideoViewModel],
+    namespace="videos:counters",
+    flush_interval=float(os.getenv("COUNTER_FLUSH_INTERVAL", "2.0"))
+)
+
+# Estatísticas: cache curto e rollups incrementais das tabelas de eventos
+stats_cache = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "30")))
+views_rollup = IncrementalRollup(engine, "video_views", VideoViewModel)
+shares_rollup = IncrementalRollup(engine, "video_shares", VideoShareModel)
+
+# Espectadores distintos por vídeo (HyperLogLog no Redis, opcional)
+unique_viewers = create_hll_counter("video_viewers")
+
+# Visualização considerada completa a partir deste percentual assistido
+COMPLETION_THRESHOLD = 90.0
+
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".jpg": "image/jpeg"
+}
 
-app = FastAPI(title="Videos Service", version="1.0.0")
+# Listagens serializadas direto das linhas ORM, sem revalidar pelo response_model
+video_serializer = RowSerializer(Video)
 
 # Inicializar banco de dados
 init_db()
@@ -29,20 +81,57 @@ async def startup_event():
     # Criar diretório de uploads se não existir
     os.makedirs("uploads", exist_ok=True)
     os.makedirs("thumbnails", exist_ok=True)
+    counter_buffer.start()
+    media_store.start_collector(
+        interval=float(os.getenv("MEDIA_GC_INTERVAL", "3600")),
+        grace_seconds=int(os.getenv("MEDIA_GC_GRACE_SECONDS", "3600"))
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    transcode_queue.shutdown()
+    counter_buffer.stop()
+    media_store.stop_collector()
+
+def _video_exists(db: Session, video_id: int) -> bool:
+    return db.query(VideoModel.id).filter(VideoModel.id == video_id).first() is not None
+
+def hls_url(video_id: int) -> str:
+    return f"/videos/{video_id}/hls/master.m3u8"
+
+def _apply_transcode_result(job: dict):
+    """Atualiza o vídeo com o resultado da transcodificação"""
+    db = SessionLocal()
+    try:
+        video = db.query(VideoModel).filter(VideoModel.id == job["video_id"]).first()
+        if video is None or video.upload_status == "deleted":
+            return
+        if job["status"] == "completed":
+            result = job["result"]
+            video.upload_status = "completed"
+            video.duration_seconds = int(round(result["duration"]))
+            video.resolution = result["resolution"]
+            # Pôster do meio do vídeo como thumbnail principal
+            poster = os.path.basename(result["posters"][len(result["posters"]) // 2])
+            video.thumbnail_url = f"/videos/{video.id}/hls/{poster}"
+        else:
+            video.upload_status = "failed"
+        db.commit()
+    finally:
+        db.close()
 
 # Endpoints para Vídeos
 @app.post("/videos/upload/")
 async def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Query(...),
     description: Optional[str] = Query(None),
-    video_type: str = Query(...),
     category: Optional[str] = Query(None),
     tags: Optional[str] = Query(None),
     is_public: bool = Query(True),
     uploaded_by: int = Query(...),
-    related_location_id: Optional[int] = Query(None),
-    related_booking_id: Optional[int] = Query(None),
+    language: str = Query("pt"),
     db: Session = Depends(get_db)
 ):
     # Validar tipo de arquivo
@@ -51,90 +140,148 @@ async def upload_video(
     if file_extension not in allowed_formats:
         raise HTTPException(status_code=400, detail="Formato de arquivo não suportado")
     
-    # Salvar arquivo
-    file_path = f"uploads/{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Obter tamanho do arquivo
-    file_size = os.path.getsize(file_path)
+    # Salvar arquivo (em blocos, endereçado pelo SHA-256)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
     
-    # Criar registro no banco
+    # Criar registro no banco; video_url guarda a chave do original no media store
     video_data = {
         "title": title,
         "description": description,
-        "file_name": file.filename,
-        "file_path": file_path,
-        "file_size": file_size,
+        "video_url": file_path,
+        "file_size_mb": round(blob.size / (1024 * 1024), 3),
         "format": file_extension[1:],
-        "video_type": video_type,
         "category": category,
         "tags": tags,
         "is_public": is_public,
-        "uploaded_by": uploaded_by,
-        "related_location_id": related_location_id,
-        "related_booking_id": related_booking_id,
-        "status": "processing"
+        "user_id": uploaded_by,
+        "language": language,
+        "upload_status": "processing"
     }
     
-    db_video = Video(**video_data)
+    db_video = VideoModel(**video_data)
     db.add(db_video)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        await run_in_threadpool(media_store.release, blob.sha256)
+        raise
     db.refresh(db_video)
     
+    # Probe, escada HLS e pôsteres após a resposta, na fila de transcodificação
+    job_id = transcode_queue.submit(db_video.id, media_store.local_path(file_path))
+    background_tasks.add_task(transcode_queue.run, job_id, _apply_transcode_result)
+    
     return {
         "id": db_video.id,
         "title": db_video.title,
-        "file_path": db_video.file_path,
-        "status": db_video.status,
+        "video_url": db_video.video_url,
+        "hls_url": hls_url(db_video.id),
+        "sha256": blob.sha256,
+        "deduplicated": blob.deduplicated,
+        "status": db_video.upload_status,
+        "transcode_job_id": job_id,
         "message": "Vídeo enviado com sucesso. Processamento em andamento."
     }
 
 @app.get("/videos/", response_model=List[Video])
 def get_videos(
-    video_type: Optional[str] = None,
     category: Optional[str] = None,
     is_public: Optional[bool] = None,
-    is_featured: Optional[bool] = None,
     uploaded_by: Optional[int] = None,
-    related_location_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Video).filter(Video.status == "active")
+    """Lista vídeos; use o cursor do header X-Next-Cursor para a próxima página"""
+    query = db.query(VideoModel).filter(VideoModel.upload_status.notin_(("failed", "deleted")))
     
-    if video_type:
-        query = query.filter(Video.video_type == video_type)
     if category:
-        query = query.filter(Video.category == category)
+        query = query.filter(VideoModel.category == category)
     if is_public is not None:
-        query = query.filter(Video.is_public == is_public)
-    if is_featured is not None:
-        query = query.filter(Video.is_featured == is_featured)
+        query = query.filter(VideoModel.is_public == is_public)
     if uploaded_by:
-        query = query.filter(Video.uploaded_by == uploaded_by)
-    if related_location_id:
-        query = query.filter(Video.related_location_id == related_location_id)
+        query = query.filter(VideoModel.user_id == uploaded_by)
     
-    videos = query.order_by(Video.created_at.desc()).offset(skip).limit(limit).all()
-    return videos
+    videos, next_cursor = paginate(
+        query, [VideoModel.created_at, VideoModel.id], cursor=cursor, limit=limit, skip=skip
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return video_serializer.response(videos, headers=headers)
 
 @app.get("/videos/{video_id}", response_model=Video)
 def get_video(video_id: int, db: Session = Depends(get_db)):
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
     if video is None:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     return video
 
+@app.get("/videos/{video_id}/stream")
+def stream_video(video_id: int, db: Session = Depends(get_db)):
+    """Reprodução do vídeo com suporte a Range (seek) e cache condicional"""
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
+    if video is None or video.upload_status == "deleted":
+        raise HTTPException(status_code=404, detail="Vídeo não encontrado")
+    
+    # Originais endereçados por conteúdo: o SHA-256 é o nome do blob e serve de ETag
+    # video_url guarda a chave do original no media store
+    blob_name = os.path.basename(video.video_url)
+    return RangeFileResponse(
+        media_store.local_path(video.video_url),
+        filename=f"video-{video.id}.{video.format or 'mp4'}",
+        etag=blob_name if len(blob_name) == 64 else None
+    )
+
+@app.get("/videos/{video_id}/transcode")
+def get_transcode_status(video_id: int):
+    """Status e progresso da transcodificação do vídeo"""
+    job = transcode_queue.get_job_for_video(video_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Nenhum job de transcodificação para este vídeo")
+    job.pop("file_path", None)
+    if job["status"] == "completed":
+        job["hls_url"] = hls_url(video_id)
+    return job
+
+@app.get("/videos/{video_id}/hls/{file_path:path}")
+def get_hls_file(video_id: int, file_path: str):
+    """Playlists, segmentos e pôsteres HLS"""
+    output_dir = os.path.realpath(transcode_queue.output_dir(video_id))
+    full_path = os.path.realpath(os.path.join(output_dir, file_path))
+    if not full_path.startswith(output_dir + os.sep):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    
+    extension = os.path.splitext(full_path)[1]
+    # Playlists podem ser regeneradas; segmentos e pôsteres não mudam
+    cache_control = "public, max-age=60" if extension == ".m3u8" else "public, max-age=86400"
+    return RangeFileResponse(
+        full_path,
+        media_type=HLS_MEDIA_TYPES.get(extension),
+        headers={"Cache-Control": cache_control}
+    )
+
+@app.get("/counters/stats")
+def get_counter_stats():
+    """Estatísticas do flush de contadores write-behind"""
+    return counter_buffer.get_stats()
+
+@app.get("/transcode/stats")
+def get_transcode_stats():
+    """Profundidade da fila e velocidade de transcodificação (fator de tempo real)"""
+    return transcode_queue.get_stats()
+
 @app.put("/videos/{video_id}", response_model=Video)
 def update_video(video_id: int, video: VideoCreate, db: Session = Depends(get_db)):
-    db_video = db.query(Video).filter(Video.id == video_id).first()
+    db_video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
     if db_video is None:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
+    # Não permitir alterar arquivo nem os dados da transcodificação
+    file_fields = ["video_url", "thumbnail_url", "file_size_mb", "format", "duration_seconds", "resolution"]
     for key, value in video.dict().items():
-        if key not in ["file_name", "file_path", "file_size"]:  # Não permitir alterar arquivo
+        if key not in file_fields:
             setattr(db_video, key, value)
     
     db_video.updated_at = datetime.utcnow()
@@ -144,20 +291,21 @@ def update_video(video_id: int, video: VideoCreate, db: Session = Depends(get_db
 
 @app.delete("/videos/{video_id}")
 def delete_video(video_id: int, db: Session = Depends(get_db)):
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if video is None:
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
+    if video is None or video.upload_status == "deleted":
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
-    # Marcar como deletado
-    video.status = "deleted"
+    # Marcar como deletado e liberar a referência ao original
+    video.upload_status = "deleted"
     video.updated_at = datetime.utcnow()
     db.commit()
+    media_store.release_path(video.video_url)
     
     return {"message": "Vídeo deletado com sucesso"}
 
 @app.put("/videos/{video_id}/feature")
 def toggle_featured(video_id: int, db: Session = Depends(get_db)):
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
     if video is None:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
@@ -170,7 +318,7 @@ def toggle_featured(video_id: int, db: Session = Depends(get_db)):
 # Endpoints para Playlists
 @app.post("/playlists/", response_model=VideoPlaylist)
 def create_playlist(playlist: VideoPlaylistCreate, db: Session = Depends(get_db)):
-    db_playlist = VideoPlaylist(**playlist.dict())
+    db_playlist = VideoPlaylistModel(**playlist.dict())
     db.add(db_playlist)
     db.commit()
     db.refresh(db_playlist)
@@ -178,31 +326,25 @@ def create_playlist(playlist: VideoPlaylistCreate, db: Session = Depends(get_db)
 
 @app.get("/playlists/", response_model=List[VideoPlaylist])
 def get_playlists(
-    playlist_type: Optional[str] = None,
     is_public: Optional[bool] = None,
-    is_featured: Optional[bool] = None,
     created_by: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    query = db.query(VideoPlaylist)
+    query = db.query(VideoPlaylistModel)
     
-    if playlist_type:
-        query = query.filter(VideoPlaylist.playlist_type == playlist_type)
     if is_public is not None:
-        query = query.filter(VideoPlaylist.is_public == is_public)
-    if is_featured is not None:
-        query = query.filter(VideoPlaylist.is_featured == is_featured)
+        query = query.filter(VideoPlaylistModel.is_public == is_public)
     if created_by:
-        query = query.filter(VideoPlaylist.created_by == created_by)
+        query = query.filter(VideoPlaylistModel.user_id == created_by)
     
-    playlists = query.order_by(VideoPlaylist.created_at.desc()).offset(skip).limit(limit).all()
+    playlists = query.order_by(VideoPlaylistModel.created_at.desc()).offset(skip).limit(limit).all()
     return playlists
 
 @app.get("/playlists/{playlist_id}", response_model=VideoPlaylist)
 def get_playlist(playlist_id: int, db: Session = Depends(get_db)):
-    playlist = db.query(VideoPlaylist).filter(VideoPlaylist.id == playlist_id).first()
+    playlist = db.query(VideoPlaylistModel).filter(VideoPlaylistModel.id == playlist_id).first()
     if playlist is None:
         raise HTTPException(status_code=404, detail="Playlist não encontrada")
     return playlist
@@ -212,40 +354,38 @@ def add_video_to_playlist(
     playlist_id: int,
     video_id: int,
     position: Optional[int] = None,
-    added_by: int = Query(...),
     db: Session = Depends(get_db)
 ):
     # Verificar se playlist existe
-    playlist = db.query(VideoPlaylist).filter(VideoPlaylist.id == playlist_id).first()
+    playlist = db.query(VideoPlaylistModel).filter(VideoPlaylistModel.id == playlist_id).first()
     if playlist is None:
         raise HTTPException(status_code=404, detail="Playlist não encontrada")
     
     # Verificar se vídeo existe
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
     if video is None:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
     # Se posição não especificada, adicionar no final
     if position is None:
-        last_item = db.query(VideoPlaylistItem).filter(
-            VideoPlaylistItem.playlist_id == playlist_id
-        ).order_by(VideoPlaylistItem.position.desc()).first()
+        last_item = db.query(VideoPlaylistItemModel).filter(
+            VideoPlaylistItemModel.playlist_id == playlist_id
+        ).order_by(VideoPlaylistItemModel.position.desc()).first()
         position = (last_item.position + 1) if last_item else 1
     
     # Verificar se vídeo já está na playlist
-    existing_item = db.query(VideoPlaylistItem).filter(
-        VideoPlaylistItem.playlist_id == playlist_id,
-        VideoPlaylistItem.video_id == video_id
+    existing_item = db.query(VideoPlaylistItemModel).filter(
+        VideoPlaylistItemModel.playlist_id == playlist_id,
+        VideoPlaylistItemModel.video_id == video_id
     ).first()
     
     if existing_item:
         raise HTTPException(status_code=400, detail="Vídeo já está na playlist")
     
-    playlist_item = VideoPlaylistItem(
+    playlist_item = VideoPlaylistItemModel(
         playlist_id=playlist_id,
         video_id=video_id,
-        position=position,
-        added_by=added_by
+        position=position
     )
     db.add(playlist_item)
     db.commit()
@@ -254,23 +394,23 @@ def add_video_to_playlist(
 
 @app.get("/playlists/{playlist_id}/videos")
 def get_playlist_videos(playlist_id: int, db: Session = Depends(get_db)):
-    playlist = db.query(VideoPlaylist).filter(VideoPlaylist.id == playlist_id).first()
+    playlist = db.query(VideoPlaylistModel).filter(VideoPlaylistModel.id == playlist_id).first()
     if playlist is None:
         raise HTTPException(status_code=404, detail="Playlist não encontrada")
     
-    playlist_items = db.query(VideoPlaylistItem).filter(
-        VideoPlaylistItem.playlist_id == playlist_id
-    ).order_by(VideoPlaylistItem.position).all()
+    playlist_items = db.query(VideoPlaylistItemModel).filter(
+        VideoPlaylistItemModel.playlist_id == playlist_id
+    ).order_by(VideoPlaylistItemModel.position).all()
     
     videos = []
     for item in playlist_items:
-        video = db.query(Video).filter(Video.id == item.video_id).first()
-        if video and video.status == "active":
+        video = db.query(VideoModel).filter(VideoModel.id == item.video_id).first()
+        if video and video.upload_status == "completed":
             videos.append({
                 "id": video.id,
                 "title": video.title,
                 "description": video.description,
-                "thumbnail_path": video.thumbnail_path,
+                "thumbnail_url": video.thumbnail_url,
                 "duration_seconds": video.duration_seconds,
                 "view_count": video.view_count,
                 "position": item.position
@@ -290,41 +430,78 @@ def record_video_view(
     view: VideoViewCreate,
     db: Session = Depends(get_db)
 ):
-    # Verificar se vídeo existe
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if video is None:
+    # Verificar se vídeo existe (somente a chave primária, sem bloquear a linha)
+    if not _video_exists(db, video_id):
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
-    # Criar registro de visualização
+    # Registro de visualização e contador são persistidos em lote pelo flush
     view_data = view.dict()
     view_data["video_id"] = video_id
+    view_data["viewed_at"] = datetime.utcnow()
     
-    db_view = VideoView(**view_data)
-    db.add(db_view)
+    counter_buffer.add_event(VideoViewModel, view_data)
+    counter_buffer.incr(VideoModel, video_id, "view_count")
     
-    # Incrementar contador de visualizações
-    video.view_count += 1
-    
-    db.commit()
+    # Mesma semântica do COUNT(DISTINCT user_id): só visualizações autenticadas
+    if unique_viewers is not None and view_data.get("user_id"):
+        unique_viewers.add(video_id, view_data["user_id"])
     
     return {"message": "Visualização registrada com sucesso"}
 
 @app.get("/videos/{video_id}/views")
-def get_video_views(video_id: int, db: Session = Depends(get_db)):
-    views = db.query(VideoView).filter(VideoView.video_id == video_id).all()
+def get_video_views(video_id: int, exact: bool = False, db: Session = Depends(get_db)):
+    # Distintos aproximados pelo HyperLogLog (memória constante), salvo se exact=true
+    estimate = unique_viewers.count(video_id) if unique_viewers is not None and not exact else None
+    
+    metrics = {
+        "total_views": func.count(),
+        "completed_views": count_where(VideoViewModel.completion_percentage >= COMPLETION_THRESHOLD)
+    }
+    if estimate is None:
+        metrics["unique_viewers"] = func.count(func.distinct(VideoViewModel.user_id))
+    
+    # Uma única consulta de agregação, sem carregar as linhas de visualização
+    views = db.execute(
+        select(*[expression.label(name) for name, expression in metrics.items()])
+        .where(VideoViewModel.video_id == video_id)
+    ).one()._mapping
     
-    total_views = len(views)
-    completed_views = len([v for v in views if v.is_completed])
-    unique_viewers = len(set(v.user_id for v in views if v.user_id))
+    total_views = views["total_views"]
+    completed_views = views["completed_views"]
     
     return {
         "video_id": video_id,
         "total_views": total_views,
         "completed_views": completed_views,
-        "unique_viewers": unique_viewers,
+        "unique_viewers": estimate if estimate is not None else views["unique_viewers"],
+        "unique_viewers_estimated": estimate is not None,
         "completion_rate": (completed_views / total_views * 100) if total_views > 0 else 0
     }
 
+def backfill_unique_viewers(video_id: Optional[int] = None) -> int:
+    """Carrega no HLL os espectadores já gravados em video_views (PFADD é idempotente)"""
+    statement = select(VideoViewModel.video_id, VideoViewModel.user_id).where(
+        VideoViewModel.user_id.isnot(None)
+    ).order_by(VideoViewModel.video_id)
+    if video_id is not None:
+        statement = statement.where(VideoViewModel.video_id == video_id)
+    
+    videos = 0
+    rows = stream_query(SessionLocal, statement)
+    for current, group in groupby(rows, key=lambda row: row["video_id"]):
+        unique_viewers.add_many(current, (row["user_id"] for row in group))
+        videos += 1
+    logger.info(f"Backfill do HLL de espectadores: {videos} vídeos")
+    return videos
+
+@app.post("/unique-viewers/backfill")
+def start_unique_viewers_backfill(background_tasks: BackgroundTasks, video_id: Optional[int] = None):
+    """Backfill das visualizações registradas antes de o HyperLogLog ser habilitado"""
+    if unique_viewers is None:
+        raise HTTPException(status_code=400, detail="HyperLogLog não configurado (UNIQUE_COUNTER_REDIS_URL)")
+    background_tasks.add_task(backfill_unique_viewers, video_id)
+    return {"message": "Backfill de espectadores distintos iniciado", "video_id": video_id}
+
 # Endpoints para Likes/Dislikes
 @app.post("/videos/{video_id}/like")
 def like_video(
@@ -334,48 +511,48 @@ def like_video(
     db: Session = Depends(get_db)
 ):
     # Verificar se vídeo existe
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if video is None:
+    if not _video_exists(db, video_id):
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
     # Verificar se já existe like/dislike do usuário
-    existing_like = db.query(VideoLike).filter(
-        VideoLike.video_id == video_id,
-        VideoLike.user_id == user_id
+    existing_like = db.query(VideoLikeModel).filter(
+        VideoLikeModel.video_id == video_id,
+        VideoLikeModel.user_id == user_id
     ).first()
     
+    # Deltas dos contadores; a linha do vídeo só é atualizada no flush em lote
+    deltas = {"like_count": 0, "dislike_count": 0}
+    column = "like_count" if like_type == "like" else "dislike_count"
+    
+    is_like = like_type == "like"
+    
     if existing_like:
-        if existing_like.like_type == like_type:
+        if existing_like.is_like == is_like:
             # Remover like/dislike se for o mesmo tipo
             db.delete(existing_like)
-            if like_type == "like":
-                video.like_count -= 1
-            else:
-                video.dislike_count -= 1
+            deltas[column] -= 1
         else:
             # Alterar tipo de like/dislike
-            if existing_like.like_type == "like":
-                video.like_count -= 1
-                video.dislike_count += 1
-            else:
-                video.like_count += 1
-                video.dislike_count -= 1
-            existing_like.like_type = like_type
+            previous = "like_count" if existing_like.is_like else "dislike_count"
+            deltas[previous] -= 1
+            deltas[column] += 1
+            existing_like.is_like = is_like
     else:
         # Criar novo like/dislike
-        new_like = VideoLike(
+        new_like = VideoLikeModel(
             video_id=video_id,
             user_id=user_id,
-            like_type=like_type
+            is_like=is_like
         )
         db.add(new_like)
-        if like_type == "like":
-            video.like_count += 1
-        else:
-            video.dislike_count += 1
+        deltas[column] += 1
     
     db.commit()
     
+    for name, delta in deltas.items():
+        if delta:
+            counter_buffer.incr(VideoModel, video_id, name, delta)
+    
     return {"message": f"{like_type.capitalize()} registrado com sucesso"}
 
 # Endpoints para Comentários
@@ -386,14 +563,14 @@ def create_comment(
     db: Session = Depends(get_db)
 ):
     # Verificar se vídeo existe
-    video = db.query(Video).filter(Video.id == video_id).first()
+    video = db.query(VideoModel).filter(VideoModel.id == video_id).first()
     if video is None:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
     comment_data = comment.dict()
     comment_data["video_id"] = video_id
     
-    db_comment = VideoComment(**comment_data)
+    db_comment = VideoCommentModel(**comment_data)
     db.add(db_comment)
     db.commit()
     db.refresh(db_comment)
@@ -406,11 +583,10 @@ def get_video_comments(
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    comments = db.query(VideoComment).filter(
-        VideoComment.video_id == video_id,
-        VideoComment.is_approved == True,
-        VideoComment.parent_comment_id == None  # Apenas comentários principais
-    ).order_by(VideoComment.created_at.desc()).offset(skip).limit(limit).all()
+    comments = db.query(VideoCommentModel).filter(
+        VideoCommentModel.video_id == video_id,
+        VideoCommentModel.parent_comment_id == None  # Apenas comentários principais
+    ).order_by(VideoCommentModel.created_at.desc()).offset(skip).limit(limit).all()
     return comments
 
 @app.get("/comments/{comment_id}/replies", response_model=List[VideoComment])
@@ -418,10 +594,9 @@ def get_comment_replies(
     comment_id: int,
     db: Session = Depends(get_db)
 ):
-    replies = db.query(VideoComment).filter(
-        VideoComment.parent_comment_id == comment_id,
-        VideoComment.is_approved == True
-    ).order_by(VideoComment.created_at.asc()).all()
+    replies = db.query(VideoCommentModel).filter(
+        VideoCommentModel.parent_comment_id == comment_id
+    ).order_by(VideoCommentModel.created_at.asc()).all()
     return replies
 
 # Endpoints para Compartilhamentos
@@ -432,41 +607,56 @@ def share_video(
     db: Session = Depends(get_db)
 ):
     # Verificar se vídeo existe
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if video is None:
+    if not _video_exists(db, video_id):
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
     share_data = share.dict()
     share_data["video_id"] = video_id
     
-    db_share = VideoShare(**share_data)
+    db_share = VideoShareModel(**share_data)
     db.add(db_share)
     db.commit()
     db.refresh(db_share)
+    
+    counter_buffer.incr(VideoModel, video_id, "share_count")
     return db_share
 
 # Endpoints de Estatísticas
 @app.get("/stats/")
 def get_stats(db: Session = Depends(get_db)):
-    total_videos = db.query(Video).filter(Video.status == "active").count()
-    total_playlists = db.query(VideoPlaylist).count()
-    total_views = db.query(VideoView).count()
-    total_likes = db.query(VideoLike).filter(VideoLike.like_type == "like").count()
-    total_comments = db.query(VideoComment).filter(VideoComment.is_approved == True).count()
-    total_shares = db.query(VideoShare).count()
+    return stats_cache.get_or_compute("stats", lambda: _compute_stats(db))
+
+def _compute_stats(db: Session) -> dict:
+    # Uma consulta de agregação condicional por tabela; eventos via rollup incremental
+    videos = aggregate(
+        db, VideoModel,
+        total_videos=func.count(),
+        completed_videos=count_where(VideoModel.upload_status == "completed"),
+        processing_videos=count_where(VideoModel.upload_status == "processing"),
+        failed_videos=count_where(VideoModel.upload_status == "failed")
+    )
+    likes = aggregate(
+        db, VideoLikeModel,
+        total_likes=count_where(VideoLikeModel.is_like == True),
+        total_dislikes=count_where(VideoLikeModel.is_like == False)
+    )
+    total_playlists = db.query(func.count(VideoPlaylistModel.id)).scalar()
+    total_comments = db.query(func.count(VideoCommentModel.id)).scalar()
     
     # Vídeos mais populares
-    popular_videos = db.query(Video).filter(
-        Video.status == "active"
-    ).order_by(Video.view_count.desc()).limit(5).all()
+    popular_videos = db.query(
+        VideoModel.id, VideoModel.title, VideoModel.view_count, VideoModel.like_count
+    ).filter(
+        VideoModel.upload_status == "completed"
+    ).order_by(VideoModel.view_count.desc()).limit(5).all()
     
     return {
-        "total_videos": total_videos,
+        **videos,
         "total_playlists": total_playlists,
-        "total_views": total_views,
-        "total_likes": total_likes,
+        "total_views": views_rollup.get().get("total", 0),
+        **likes,
         "total_comments": total_comments,
-        "total_shares": total_shares,
+        "total_shares": shares_rollup.get().get("total", 0),
         "popular_videos": [
             {
                 "id": video.id,
@@ -1,22 +1,19 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-import os
-import shutil
 from datetime import datetime, date
-import uuid
 import random
 import string
 
-from shared.config.database import get_db
+from shared.config.database import get_db, engine
 from shared.models.visa import VisaType as VisaTypeModel, VisaApplication as VisaApplicationModel, VisaDocument as VisaDocumentModel, VisaPayment as VisaPaymentModel, VisaStatus as VisaStatusModel
 from shared.schemas import VisaTypeCreate, VisaType, VisaApplicationCreate, VisaApplication, VisaDocumentCreate, VisaDocument, VisaPaymentCreate, VisaPayment, VisaStatusCreate, VisaStatus
+from shared.services.media_store import MediaStore
 
 app = FastAPI(title="Visa Service", version="1.0.0")
 
-# Create upload directory if it doesn't exist
-UPLOAD_DIR = "visa_documents"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are stored in the shared content-addressed media store
+media_store = MediaStore(engine)
 
 def generate_application_number():
     """Generate a unique application number"""
@@ -247,17 +244,10 @@ async def upload_visa_document(
     if not application:
         raise HTTPException(status_code=404, detail="Visa application not found")
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    blob = await media_store.save_upload(file)
+    file_path = blob.file_path
+    file_size = blob.size
     
     document_data = {
         "application_id": application_id,
@@ -270,7 +260,12 @@ async def upload_visa_document(
     
     db_document = VisaDocumentModel(**document_data)
     db.add(db_document)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        media_store.release(blob.sha256)
+        raise
     db.refresh(db_document)
     return db_document
 
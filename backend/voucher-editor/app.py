@@ -1,12 +1,22 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import json
+import asyncio
 import os
+import shutil
+import sys
 from datetime import datetime
+from pathlib import Path
 import uuid
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.services.voucher_render import MEDIA_TYPES, CompiledTemplate, VoucherRenderer, compile_template
+
+from templates import TemplateEntry, TemplateStore
+
 app = FastAPI(title="Voucher Editor API", version="1.0.0")
 
 # Configurar CORS
@@ -60,8 +70,23 @@ class VoucherData(BaseModel):
     observations: str
     template: VoucherTemplate
 
-# Armazenamento em memória (em produção, usar banco de dados)
-templates_db: Dict[str, VoucherTemplate] = {}
+class BatchExportRequest(BaseModel):
+    voucher_ids: List[str]
+    format: str = "pdf"  # pdf (uma página por voucher) ou png (zip)
+    template_id: Optional[str] = None  # padrão: o template de cada voucher
+
+BASE_DIR = Path(__file__).resolve().parent
+UPLOAD_DIR = BASE_DIR / "uploads"
+
+# Vouchers renderizados (nome = hash do template e dos dados); logos (/uploads/...) resolvidos em UPLOAD_DIR
+renderer = VoucherRenderer(
+    cache_dir=os.getenv("VOUCHER_EXPORT_DIR", str(BASE_DIR / "exports" / "vouchers")),
+    assets_dir=os.getenv("VOUCHER_ASSETS_DIR", str(UPLOAD_DIR)),
+    max_workers=int(os.getenv("VOUCHER_RENDER_WORKERS", "0")) or None
+)
+
+# Armazenamento em memória (em produção, usar banco de dados); templates já compilados (templates.py)
+template_store = TemplateStore()
 vouchers_db: Dict[str, VoucherData] = {}
 
 # Templates padrão
@@ -146,10 +171,58 @@ default_templates = [
                 "fontColor": "#374151",
                 "fontFamily": "Arial, sans-serif"
             },
+            {
+                "id": "code-value-001",
+                "type": "text",
+                "content": "{{code}}",
+                "x": 160,
+                "y": 120,
+                "width": 220,
+                "height": 20,
+                "fontSize": 14,
+                "fontColor": "#111827",
+                "fontFamily": "Arial, sans-serif"
+            },
+            {
+                "id": "client-value-001",
+                "type": "text",
+                "content": "{{clientName}}",
+                "x": 160,
+                "y": 150,
+                "width": 220,
+                "height": 20,
+                "fontSize": 14,
+                "fontColor": "#111827",
+                "fontFamily": "Arial, sans-serif"
+            },
+            {
+                "id": "destination-value-001",
+                "type": "text",
+                "content": "{{destination}}",
+                "x": 160,
+                "y": 180,
+                "width": 220,
+                "height": 20,
+                "fontSize": 14,
+                "fontColor": "#111827",
+                "fontFamily": "Arial, sans-serif"
+            },
+            {
+                "id": "value-value-001",
+                "type": "text",
+                "content": "{{value}}",
+                "x": 160,
+                "y": 210,
+                "width": 220,
+                "height": 20,
+                "fontSize": 14,
+                "fontColor": "#111827",
+                "fontFamily": "Arial, sans-serif"
+            },
             {
                 "id": "qr-001",
                 "type": "qr-code",
-                "content": "VCH-2025-001",
+                "content": "{{code}}",
                 "x": 400,
                 "y": 120,
                 "width": 80,
@@ -249,10 +322,58 @@ default_templates = [
                 "fontColor": "#64748b",
                 "fontFamily": "Inter, sans-serif"
             },
+            {
+                "id": "code-value-002",
+                "type": "text",
+                "content": "{{code}}",
+                "x": 130,
+                "y": 130,
+                "width": 230,
+                "height": 20,
+                "fontSize": 12,
+                "fontColor": "#1e293b",
+                "fontFamily": "Inter, sans-serif"
+            },
+            {
+                "id": "client-value-002",
+                "type": "text",
+                "content": "{{clientName}}",
+                "x": 130,
+                "y": 160,
+                "width": 230,
+                "height": 20,
+                "fontSize": 12,
+                "fontColor": "#1e293b",
+                "fontFamily": "Inter, sans-serif"
+            },
+            {
+                "id": "destination-value-002",
+                "type": "text",
+                "content": "{{destination}}",
+                "x": 130,
+                "y": 190,
+                "width": 230,
+                "height": 20,
+                "fontSize": 12,
+                "fontColor": "#1e293b",
+                "fontFamily": "Inter, sans-serif"
+            },
+            {
+                "id": "value-value-002",
+                "type": "text",
+                "content": "{{value}}",
+                "x": 130,
+                "y": 220,
+                "width": 230,
+                "height": 20,
+                "fontSize": 12,
+                "fontColor": "#1e293b",
+                "fontFamily": "Inter, sans-serif"
+            },
             {
                 "id": "qr-002",
                 "type": "qr-code",
-                "content": "VCH-2025-001",
+                "content": "{{code}}",
                 "x": 380,
                 "y": 130,
                 "width": 90,
@@ -353,10 +474,58 @@ default_templates = [
                 "fontColor": "#cbd5e1",
                 "fontFamily": "Playfair Display, serif"
             },
+            {
+                "id": "code-value-003",
+                "type": "text",
+                "content": "{{code}}",
+                "x": 170,
+                "y": 150,
+                "width": 220,
+                "height": 25,
+                "fontSize": 16,
+                "fontColor": "#f8fafc",
+                "fontFamily": "Playfair Display, serif"
+            },
+            {
+                "id": "client-value-003",
+                "type": "text",
+                "content": "{{clientName}}",
+                "x": 170,
+                "y": 185,
+                "width": 220,
+                "height": 25,
+                "fontSize": 16,
+                "fontColor": "#f8fafc",
+                "fontFamily": "Playfair Display, serif"
+            },
+            {
+                "id": "destination-value-003",
+                "type": "text",
+                "content": "{{destination}}",
+                "x": 170,
+                "y": 220,
+                "width": 220,
+                "height": 25,
+                "fontSize": 16,
+                "fontColor": "#f8fafc",
+                "fontFamily": "Playfair Display, serif"
+            },
+            {
+                "id": "value-value-003",
+                "type": "text",
+                "content": "{{value}}",
+                "x": 170,
+                "y": 255,
+                "width": 220,
+                "height": 25,
+                "fontSize": 16,
+                "fontColor": "#f8fafc",
+                "fontFamily": "Playfair Display, serif"
+            },
             {
                 "id": "qr-003",
                 "type": "qr-code",
-                "content": "VCH-2025-001",
+                "content": "{{code}}",
                 "x": 400,
                 "y": 150,
                 "width": 100,
@@ -380,8 +549,54 @@ default_templates = [
 
 # Inicializar templates padrão
 for template_data in default_templates:
-    template = VoucherTemplate(**template_data)
-    templates_db[template.id] = template
+    template_store.put(VoucherTemplate(**template_data))
+
+# Dados de exemplo da prévia dos templates
+PREVIEW_FIELDS = {
+    "id": "preview", "code": "VCH-2025-000123", "clientName": "Maria Silva", "destination": "Resort Gramado",
+    "startDate": "2025-07-01", "endDate": "2025-07-05", "value": "R$ 2.850,00", "agency": "Reservei Viagens",
+    "agent": "João Santos", "benefits": "Café da manhã, Transfer aeroporto", "validity": "2025-12-31",
+    "observations": ""
+}
+
+def voucher_fields(voucher: VoucherData) -> Dict[str, Any]:
+    """Valores dos campos {{nome}} dos templates, já formatados para impressão"""
+    fields = voucher.model_dump(exclude={"template"})
+    fields["value"] = "R$ " + f"{voucher.value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    fields["benefits"] = ", ".join(voucher.benefits)
+    return fields
+
+def voucher_template(voucher: VoucherData) -> CompiledTemplate:
+    """Template do voucher compilado (LRU por versão: só versões novas são compiladas)"""
+    compiled = compile_template(voucher.template.model_dump())
+    if not compiled.valid:
+        raise HTTPException(status_code=400, detail=f"Template inválido: {'; '.join(compiled.errors)}")
+    return compiled
+
+def get_template_or_404(template_id: str) -> TemplateEntry:
+    entry = template_store.get(template_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Template não encontrado")
+    return entry
+
+def json_body(request: Request, body: bytes, etag: str) -> Response:
+    """JSON já serializado, com ETag (304 se o cliente já tem a versão)"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def export_info(path: Path, cached: bool, **extra) -> Dict[str, Any]:
+    return {
+        **extra,
+        "download_url": f"/exports/vouchers/{path.name}",
+        "size": path.stat().st_size,
+        "cached": cached,
+        "generated_at": datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+    }
+
+@app.on_event("shutdown")
+def shutdown_renderer():
+    renderer.shutdown()
 
 @app.get("/")
 async def root():
@@ -393,43 +608,60 @@ async def health_check():
 
 # Endpoints para Templates
 @app.get("/templates", response_model=List[VoucherTemplate])
-async def get_templates():
+async def get_templates(request: Request):
     """Listar todos os templates disponíveis"""
-    return list(templates_db.values())
+    return json_body(request, template_store.list_body(), template_store.list_etag())
 
 @app.get("/templates/{template_id}", response_model=VoucherTemplate)
-async def get_template(template_id: str):
+async def get_template(template_id: str, request: Request):
     """Obter um template específico"""
-    if template_id not in templates_db:
-        raise HTTPException(status_code=404, detail="Template não encontrado")
-    return templates_db[template_id]
+    entry = get_template_or_404(template_id)
+    return json_body(request, entry.body, entry.etag)
+
+@app.get("/templates/{template_id}/layout")
+async def get_template_layout(template_id: str, request: Request):
+    """Layout compilado do template: ordem de desenho, fontes resolvidas e caixas de texto medidas"""
+    entry = get_template_or_404(template_id)
+    return json_body(request, entry.layout_body(), entry.etag)
+
+@app.get("/templates/{template_id}/preview")
+async def preview_template(template_id: str, request: Request):
+    """Prévia do template em PNG, com dados de exemplo"""
+    entry = get_template_or_404(template_id)
+    compiled = entry.compiled
+    if not compiled.valid:
+        raise HTTPException(status_code=400, detail=f"Template inválido: {'; '.join(compiled.errors)}")
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    path, _ = await asyncio.to_thread(
+        renderer.render, compiled.template, PREVIEW_FIELDS, "png", compiled.version
+    )
+    return FileResponse(path, media_type=MEDIA_TYPES["png"], headers={"ETag": entry.etag})
 
 @app.post("/templates", response_model=VoucherTemplate)
 async def create_template(template: VoucherTemplate):
     """Criar um novo template"""
-    if template.id in templates_db:
+    if template.id in template_store:
         raise HTTPException(status_code=400, detail="Template já existe")
     
-    templates_db[template.id] = template
+    template_store.put(template)
     return template
 
 @app.put("/templates/{template_id}", response_model=VoucherTemplate)
 async def update_template(template_id: str, template: VoucherTemplate):
-    """Atualizar um template existente"""
-    if template_id not in templates_db:
-        raise HTTPException(status_code=404, detail="Template não encontrado")
+    """Atualizar um template existente (a versão anterior sai dos caches)"""
+    get_template_or_404(template_id)
     
     template.id = template_id
-    templates_db[template_id] = template
+    template_store.put(template)
     return template
 
 @app.delete("/templates/{template_id}")
 async def delete_template(template_id: str):
     """Excluir um template"""
-    if template_id not in templates_db:
+    if not template_store.delete(template_id):
         raise HTTPException(status_code=404, detail="Template não encontrado")
     
-    del templates_db[template_id]
     return {"message": "Template excluído com sucesso"}
 
 # Endpoints para Vouchers
@@ -480,10 +712,13 @@ async def upload_logo(file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Arquivo deve ser uma imagem")
     
-    # Em produção, salvar o arquivo em um sistema de arquivos ou cloud storage
-    # Por enquanto, retornar uma URL simulada
+    # Gravado em UPLOAD_DIR: a renderização encontra o logo pela própria URL
     file_id = str(uuid.uuid4())
-    logo_url = f"/uploads/logos/{file_id}_{file.filename}"
+    filename = f"{file_id}_{os.path.basename(file.filename or 'logo')}"
+    (UPLOAD_DIR / "logos").mkdir(parents=True, exist_ok=True)
+    with open(UPLOAD_DIR / "logos" / filename, "wb") as output:
+        shutil.copyfileobj(file.file, output)
+    logo_url = f"/uploads/logos/{filename}"
     
     return {
         "message": "Logo enviado com sucesso",
@@ -499,24 +734,73 @@ async def export_voucher(voucher_id: str, format: str = "pdf"):
         raise HTTPException(status_code=404, detail="Voucher não encontrado")
     
     voucher = vouchers_db[voucher_id]
+    compiled = voucher_template(voucher)
     
-    # Em produção, gerar o arquivo real
-    export_data = {
-        "voucher_id": voucher_id,
-        "format": format,
-        "download_url": f"/exports/vouchers/{voucher_id}.{format}",
-        "generated_at": datetime.now().isoformat()
-    }
+    try:
+        path, cached = await asyncio.to_thread(
+            renderer.render, compiled.template, voucher_fields(voucher), format, compiled.version
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return export_data
+    return export_info(path, cached, voucher_id=voucher_id, format=format)
+
+@app.post("/export/vouchers/batch")
+async def export_vouchers_batch(request: BatchExportRequest):
+    """Exportar vários vouchers para impressão: um arquivo por template (PDF ou zip de PNGs)"""
+    missing = [voucher_id for voucher_id in request.voucher_ids if voucher_id not in vouchers_db]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Vouchers não encontrados: {', '.join(missing[:20])}")
+    template = None
+    if request.template_id:
+        template = get_template_or_404(request.template_id).compiled
+        if not template.valid:
+            raise HTTPException(status_code=400, detail=f"Template inválido: {'; '.join(template.errors)}")
+    
+    # Agrupa por versão do template, mantendo a ordem pedida dentro de cada grupo
+    groups: Dict[str, Dict[str, Any]] = {}
+    for voucher_id in request.voucher_ids:
+        voucher = vouchers_db[voucher_id]
+        compiled = template or voucher_template(voucher)
+        group = groups.setdefault(compiled.version, {"template": compiled, "rows": [], "names": []})
+        group["rows"].append(voucher_fields(voucher))
+        group["names"].append(voucher.code or voucher.id)
+    
+    files = []
+    for group in groups.values():
+        try:
+            path, cached = await renderer.render_batch(
+                group["template"].template, group["rows"], request.format, group["names"],
+                group["template"].version
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        files.append(export_info(
+            path, cached, template_id=group["template"].template["id"], vouchers=len(group["rows"])
+        ))
+    
+    return {"format": request.format, "total": len(request.voucher_ids), "files": files}
+
+@app.get("/exports/vouchers/{filename}")
+async def download_voucher_export(filename: str):
+    """Baixar um voucher (ou lote) renderizado; o nome muda quando template ou dados mudam"""
+    path = renderer.cached(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    return FileResponse(
+        path, media_type=MEDIA_TYPES[path.suffix[1:]],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@app.get("/export/stats")
+async def export_stats():
+    """Estatísticas da renderização (cache, lotes, pool de processos)"""
+    return renderer.get_stats()
 
 @app.post("/export/template/{template_id}")
 async def export_template(template_id: str, format: str = "json"):
     """Exportar template em diferentes formatos"""
-    if template_id not in templates_db:
-        raise HTTPException(status_code=404, detail="Template não encontrado")
-    
-    template = templates_db[template_id]
+    get_template_or_404(template_id)
     
     export_data = {
         "template_id": template_id,
@@ -551,33 +835,35 @@ async def validate_voucher(voucher_data: VoucherData):
     if voucher_data.value <= 0:
         errors.append("Valor deve ser maior que zero")
     
+    # Template: validado uma vez por versão, na compilação
+    compiled = compile_template(voucher_data.template.model_dump())
+    errors.extend(f"Template: {error}" for error in compiled.errors)
+    fields = voucher_fields(voucher_data)
+    warnings = list(compiled.warnings)
+    for field in sorted(compiled.fields):
+        if field not in fields:
+            errors.append(f"Template usa o campo {{{{{field}}}}}, que não existe no voucher")
+        elif fields[field] in (None, ""):
+            warnings.append(f"Campo {{{{{field}}}}} vazio: sairá em branco no voucher")
+    
     if errors:
-        return {"valid": False, "errors": errors}
+        return {"valid": False, "errors": errors, "warnings": warnings, "template_version": compiled.version}
     
-    return {"valid": True, "message": "Voucher válido"}
+    return {"valid": True, "message": "Voucher válido", "warnings": warnings, "template_version": compiled.version}
 
 @app.post("/validate/template")
 async def validate_template(template: VoucherTemplate):
-    """Validar template do voucher"""
-    errors = []
+    """Validar template do voucher (compilado uma vez por versão)"""
+    compiled = compile_template(template.model_dump())
+    warnings = list(compiled.warnings)
     
-    if not template.name:
-        errors.append("Nome do template é obrigatório")
-    
-    if not template.elements:
-        errors.append("Template deve ter pelo menos um elemento")
-    
-    for element in template.elements:
-        if element.x < 0 or element.y < 0:
-            errors.append(f"Elemento {element.id}: posição deve ser positiva")
-        
-        if element.width <= 0 or element.height <= 0:
-            errors.append(f"Elemento {element.id}: dimensões devem ser positivas")
-    
-    if errors:
-        return {"valid": False, "errors": errors}
+    if not compiled.valid:
+        return {
+            "valid": False, "errors": list(compiled.errors), "warnings": warnings,
+            "template_version": compiled.version
+        }
     
-    return {"valid": True, "message": "Template válido"}
+    return {"valid": True, "message": "Template válido", "warnings": warnings, "template_version": compiled.version}
 
 if __name__ == "__main__":
     import uvicorn
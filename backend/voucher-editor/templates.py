@@ -0,0 +1,87 @@
+"""
+Templates do editor guardados com a forma compilada e o JSON prontos
+
+Cada template tem, junto do modelo, o CompiledTemplate da versão atual
+(validação, fontes e caixas de texto medidas uma vez) e a resposta já
+serializada: GETs devolvem bytes prontos, com a versão como ETag. Gravar
+uma versão nova ou excluir o template descarta a anterior.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from shared.services.fast_json import dumps
+from shared.services.voucher_render import CompiledTemplate, compile_template, discard
+
+
+@dataclass(frozen=True)
+class TemplateEntry:
+    model: Any  # VoucherTemplate
+    compiled: CompiledTemplate
+    body: bytes  # JSON de GET /templates/{id}
+    _layout: List[bytes] = field(default_factory=list, repr=False)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.compiled.version}"'
+
+    def layout_body(self) -> bytes:
+        """JSON do layout compilado, serializado no primeiro pedido"""
+        if not self._layout:
+            self._layout.append(dumps({"template_id": self.model.id, **self.compiled.layout()}))
+        return self._layout[0]
+
+
+class TemplateStore:
+    """Templates em memória por id (em produção, usar banco de dados)"""
+
+    def __init__(self):
+        self.entries: Dict[str, TemplateEntry] = {}
+        self._list_body: Optional[bytes] = None
+        self._list_etag: Optional[str] = None
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self.entries
+
+    def get(self, template_id: str) -> Optional[TemplateEntry]:
+        return self.entries.get(template_id)
+
+    def put(self, template) -> TemplateEntry:
+        """Grava o template (novo ou alterado) compilando a versão dele"""
+        data = template.model_dump()
+        entry = TemplateEntry(template, compile_template(data), dumps(data))
+        previous = self.entries.get(template.id)
+        self.entries[template.id] = entry
+        self._list_body = self._list_etag = None
+        if previous is not None:
+            self._forget(previous)
+        return entry
+
+    def delete(self, template_id: str) -> bool:
+        entry = self.entries.pop(template_id, None)
+        if entry is None:
+            return False
+        self._list_body = self._list_etag = None
+        self._forget(entry)
+        return True
+
+    def _forget(self, entry: TemplateEntry):
+        # Outro id pode ter o mesmo conteúdo (cópia de um template): a versão continua em uso
+        version = entry.compiled.version
+        if all(other.compiled.version != version for other in self.entries.values()):
+            discard(version)
+
+    def list_body(self) -> bytes:
+        """JSON de GET /templates, refeito só depois de uma alteração"""
+        if self._list_body is None:
+            self._list_body = b"[" + b",".join(entry.body for entry in self.entries.values()) + b"]"
+        return self._list_body
+
+    def list_etag(self) -> str:
+        if self._list_etag is None:
+            digest = hashlib.sha256()
+            for template_id, entry in self.entries.items():
+                digest.update(f"{template_id}:{entry.compiled.version};".encode())
+            self._list_etag = f'"{digest.hexdigest()[:20]}"'
+        return self._list_etag
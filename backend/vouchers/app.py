@@ -1,14 +1,30 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 from datetime import datetime, date
 from enum import Enum
+import asyncio
+import base64
 import uuid
 import json
 import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.config.database import Base, SessionLocal, engine
+from shared.models.voucher import Voucher, VoucherBatch, VoucherBatchItem, VoucherDeletion
+from shared.services.fast_json import RowSerializer, dumps
+from shared.services.streaming_export import EXPORT_MEDIA_TYPES, export_response, iter_json_document
+from shared.services.voucher_render import qr_png
+
+import batch
+from store import VoucherRepository
+
 app = FastAPI(
     title="Vouchers Service",
     description="Serviço de gestão de vouchers e reservas",
@@ -112,10 +128,22 @@ class VoucherSearch(BaseModel):
     agencia: Optional[str] = None
     agente: Optional[str] = None
 
-# Armazenamento em memória (em produção seria um banco de dados)
-vouchers_db: Dict[str, VoucherResponse] = {}
+# Vouchers no banco; busca, filtros e estatísticas pelo índice em memória (store.py)
+repository = VoucherRepository(sync_interval=float(os.getenv("VOUCHER_INDEX_SYNC", "5")))
+
+# Respostas e exportações: linhas do ORM viram dicts sem revalidação
+voucher_serializer = RowSerializer(VoucherResponse)
+EXPORT_FIELDS = list(voucher_serializer.fields)
 
-# Dados iniciais para demonstração
+# Lotes de status e exportação (batch.py): transações por bloco, os grandes em segundo plano
+batch_runner = batch.BatchRunner(
+    repository, voucher_serializer.one, EXPORT_FIELDS,
+    max_workers=int(os.getenv("VOUCHER_BATCH_WORKERS", "2"))
+)
+# Intervalo entre leituras do lote no endpoint de progresso
+BATCH_PROGRESS_INTERVAL = float(os.getenv("VOUCHER_BATCH_PROGRESS_INTERVAL", "0.5"))
+
+# Dados iniciais para demonstração (só em banco vazio)
 def carregar_dados_iniciais():
     dados_iniciais = [
         {
@@ -212,38 +240,49 @@ def carregar_dados_iniciais():
     ]
     
     for voucher_data in dados_iniciais:
-        vouchers_db[voucher_data["id"]] = VoucherResponse(**voucher_data)
+        repository.create(voucher_data)
 
-# Carregar dados iniciais
-carregar_dados_iniciais()
+@app.on_event("startup")
+def startup_event():
+    Base.metadata.create_all(
+        bind=engine, tables=[
+            Voucher.__table__, VoucherDeletion.__table__, VoucherBatch.__table__, VoucherBatchItem.__table__
+        ]
+    )
+    if repository.count() == 0:
+        carregar_dados_iniciais()
+    repository.load()
+    batch_runner.resume()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    batch_runner.shutdown()
 
 # Funções auxiliares
 def gerar_codigo_voucher() -> str:
     """Gera um código único para o voucher"""
     return f"VCH-{datetime.now().year}-{str(uuid.uuid4())[:8].upper()}"
 
+def iterar_vouchers(
+    status: Optional[StatusVoucher] = None,
+    tipo: Optional[TipoVoucher] = None
+) -> Iterator[Dict[str, Any]]:
+    """Vouchers exportáveis, lidos do banco em blocos e serializados sob demanda"""
+    for voucher in repository.iter_fetch(repository.search(status=status, tipo=tipo)):
+        yield voucher_serializer.one(voucher)
+
 def calcular_estatisticas() -> VoucherStats:
-    """Calcula estatísticas dos vouchers"""
-    total = len(vouchers_db)
-    ativos = len([v for v in vouchers_db.values() if v.status == StatusVoucher.ATIVO])
-    usados = len([v for v in vouchers_db.values() if v.status == StatusVoucher.USADO])
-    expirados = len([v for v in vouchers_db.values() if v.status == StatusVoucher.EXPIRADO])
-    cancelados = len([v for v in vouchers_db.values() if v.status == StatusVoucher.CANCELADO])
-    
-    valor_total = sum(v.valor for v in vouchers_db.values())
-    valor_medio = valor_total / total if total > 0 else 0
-    taxa_utilizacao = (usados / total * 100) if total > 0 else 0
-    
-    return VoucherStats(
-        total=total,
-        ativos=ativos,
-        usados=usados,
-        expirados=expirados,
-        cancelados=cancelados,
-        valor_total=valor_total,
-        valor_medio=valor_medio,
-        taxa_utilizacao=taxa_utilizacao
-    )
+    """Estatísticas mantidas pelo índice a cada escrita (sem percorrer os vouchers)"""
+    return VoucherStats(**repository.stats())
+
+def obter_ou_404(voucher_id: str) -> Voucher:
+    voucher = repository.get(voucher_id)
+    if voucher is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Voucher não encontrado"
+        )
+    return voucher
 
 # Rotas da API
 @app.get("/")
@@ -272,138 +311,91 @@ async def health_check():
     }
 
 @app.get("/vouchers", response_model=List[VoucherResponse])
-async def listar_vouchers(
+def listar_vouchers(
     skip: int = 0,
     limit: int = 100,
     status: Optional[StatusVoucher] = None,
     tipo: Optional[TipoVoucher] = None
 ):
     """Lista todos os vouchers com filtros opcionais"""
-    vouchers = list(vouchers_db.values())
-    
-    if status:
-        vouchers = [v for v in vouchers if v.status == status]
-    
-    if tipo:
-        vouchers = [v for v in vouchers if v.tipo == tipo]
-    
-    return vouchers[skip:skip + limit]
+    ids = repository.search(status=status, tipo=tipo)
+    return voucher_serializer.response(repository.fetch(ids[skip:skip + limit]))
+
+@app.get("/vouchers/export")
+def exportar_todos_vouchers(
+    formato: str = Query("ndjson", description="ndjson ou csv"),
+    status: Optional[StatusVoucher] = None,
+    tipo: Optional[TipoVoucher] = None
+):
+    """Exporta todos os vouchers (com filtros opcionais) em streaming"""
+    return export_response(
+        iterar_vouchers(status=status, tipo=tipo), formato, "vouchers", fields=EXPORT_FIELDS
+    )
+
+@app.get("/vouchers/stats", response_model=VoucherStats)
+def obter_estatisticas():
+    """Obtém estatísticas dos vouchers (declarada antes de /vouchers/{voucher_id})"""
+    return calcular_estatisticas()
 
 @app.get("/vouchers/{voucher_id}", response_model=VoucherResponse)
-async def obter_voucher(voucher_id: str):
+def obter_voucher(voucher_id: str):
     """Obtém um voucher específico por ID"""
-    if voucher_id not in vouchers_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Voucher não encontrado"
-        )
-    return vouchers_db[voucher_id]
+    return obter_ou_404(voucher_id)
 
 @app.post("/vouchers", response_model=VoucherResponse, status_code=status.HTTP_201_CREATED)
-async def criar_voucher(voucher: VoucherCreate):
+def criar_voucher(voucher: VoucherCreate):
     """Cria um novo voucher"""
-    voucher_id = str(uuid.uuid4())
-    
-    # Verificar se o código já existe
-    codigo_existe = any(v.codigo == voucher.codigo for v in vouchers_db.values())
-    if codigo_existe:
+    try:
+        return repository.create({
+            "id": str(uuid.uuid4()),
+            **voucher.dict(),
+            "status": StatusVoucher.ATIVO,
+            "criado_em": datetime.now()
+        })
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Código do voucher já existe"
+            detail=str(e)
         )
-    
-    novo_voucher = VoucherResponse(
-        id=voucher_id,
-        **voucher.dict(),
-        status=StatusVoucher.ATIVO,
-        criado_em=datetime.now()
-    )
-    
-    vouchers_db[voucher_id] = novo_voucher
-    return novo_voucher
 
 @app.put("/vouchers/{voucher_id}", response_model=VoucherResponse)
-async def atualizar_voucher(voucher_id: str, voucher_update: VoucherUpdate):
+def atualizar_voucher(voucher_id: str, voucher_update: VoucherUpdate):
     """Atualiza um voucher existente"""
-    if voucher_id not in vouchers_db:
+    # Atualizar apenas os campos fornecidos
+    try:
+        voucher = repository.update(voucher_id, voucher_update.dict(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if voucher is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Voucher não encontrado"
         )
-    
-    voucher_atual = vouchers_db[voucher_id]
-    dados_atualizados = voucher_update.dict(exclude_unset=True)
-    
-    # Atualizar apenas os campos fornecidos
-    for campo, valor in dados_atualizados.items():
-        setattr(voucher_atual, campo, valor)
-    
-    vouchers_db[voucher_id] = voucher_atual
-    return voucher_atual
+    return voucher
 
 @app.delete("/vouchers/{voucher_id}")
-async def excluir_voucher(voucher_id: str):
+def excluir_voucher(voucher_id: str):
     """Exclui um voucher"""
-    if voucher_id not in vouchers_db:
+    if not repository.delete(voucher_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Voucher não encontrado"
         )
-    
-    del vouchers_db[voucher_id]
     return {"message": "Voucher excluído com sucesso"}
 
-@app.get("/vouchers/stats", response_model=VoucherStats)
-async def obter_estatisticas():
-    """Obtém estatísticas dos vouchers"""
-    return calcular_estatisticas()
-
 @app.post("/vouchers/search", response_model=List[VoucherResponse])
-async def buscar_vouchers(search: VoucherSearch):
-    """Busca vouchers com critérios específicos"""
-    vouchers = list(vouchers_db.values())
-    
-    if search.termo:
-        termo_lower = search.termo.lower()
-        vouchers = [
-            v for v in vouchers
-            if (termo_lower in v.codigo.lower() or
-                termo_lower in v.cliente.lower() or
-                termo_lower in v.destino.lower() or
-                termo_lower in v.agencia.lower() or
-                termo_lower in v.agente.lower())
-        ]
-    
-    if search.status:
-        vouchers = [v for v in vouchers if v.status == search.status]
-    
-    if search.tipo:
-        vouchers = [v for v in vouchers if v.tipo == search.tipo]
-    
-    if search.data_inicio:
-        vouchers = [v for v in vouchers if v.data_inicio >= search.data_inicio]
-    
-    if search.data_fim:
-        vouchers = [v for v in vouchers if v.data_fim <= search.data_fim]
-    
-    if search.agencia:
-        vouchers = [v for v in vouchers if search.agencia.lower() in v.agencia.lower()]
-    
-    if search.agente:
-        vouchers = [v for v in vouchers if search.agente.lower() in v.agente.lower()]
-    
-    return vouchers
+def buscar_vouchers(search: VoucherSearch):
+    """Busca vouchers com critérios específicos (índices em memória, ver store.py)"""
+    ids = repository.search(**search.dict())
+    return voucher_serializer.response(repository.fetch(ids))
 
 @app.post("/vouchers/{voucher_id}/usar")
-async def usar_voucher(voucher_id: str):
+def usar_voucher(voucher_id: str):
     """Marca um voucher como usado"""
-    if voucher_id not in vouchers_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Voucher não encontrado"
-        )
-    
-    voucher = vouchers_db[voucher_id]
+    voucher = obter_ou_404(voucher_id)
     
     if voucher.status != StatusVoucher.ATIVO:
         raise HTTPException(
@@ -417,22 +409,14 @@ async def usar_voucher(voucher_id: str):
             detail="Voucher expirado"
         )
     
-    voucher.status = StatusVoucher.USADO
-    voucher.usado_em = datetime.now()
-    vouchers_db[voucher_id] = voucher
+    voucher = repository.update(voucher_id, {"status": StatusVoucher.USADO, "usado_em": datetime.now()})
     
-    return {"message": "Voucher usado com sucesso", "voucher": voucher}
+    return {"message": "Voucher usado com sucesso", "voucher": voucher_serializer.one(voucher)}
 
 @app.post("/vouchers/{voucher_id}/cancelar")
-async def cancelar_voucher(voucher_id: str):
+def cancelar_voucher(voucher_id: str):
     """Cancela um voucher"""
-    if voucher_id not in vouchers_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Voucher não encontrado"
-        )
-    
-    voucher = vouchers_db[voucher_id]
+    voucher = obter_ou_404(voucher_id)
     
     if voucher.status in [StatusVoucher.USADO, StatusVoucher.CANCELADO]:
         raise HTTPException(
@@ -440,23 +424,15 @@ async def cancelar_voucher(voucher_id: str):
             detail="Voucher não pode ser cancelado"
         )
     
-    voucher.status = StatusVoucher.CANCELADO
-    vouchers_db[voucher_id] = voucher
+    voucher = repository.update(voucher_id, {"status": StatusVoucher.CANCELADO})
     
-    return {"message": "Voucher cancelado com sucesso", "voucher": voucher}
+    return {"message": "Voucher cancelado com sucesso", "voucher": voucher_serializer.one(voucher)}
 
 @app.get("/vouchers/{voucher_id}/qr-code")
-async def gerar_qr_code(voucher_id: str):
+def gerar_qr_code(voucher_id: str, tamanho: int = Query(256, ge=64, le=1024, description="Lado em pixels")):
     """Gera QR code para um voucher"""
-    if voucher_id not in vouchers_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Voucher não encontrado"
-        )
-    
-    voucher = vouchers_db[voucher_id]
+    voucher = obter_ou_404(voucher_id)
     
-    # Simular geração de QR code
     qr_data = {
         "voucher_id": voucher.id,
         "codigo": voucher.codigo,
@@ -465,44 +441,159 @@ async def gerar_qr_code(voucher_id: str):
         "validade": voucher.validade.isoformat()
     }
     
+    # O QR carrega os mesmos dados devolvidos em qr_data (JSON compacto)
+    png = qr_png(json.dumps(qr_data, ensure_ascii=False, separators=(",", ":")), size=tamanho)
+    
     return {
-        "qr_code": f"data:image/png;base64,{uuid.uuid4().hex}",
+        "qr_code": f"data:image/png;base64,{base64.b64encode(png).decode('ascii')}",
         "qr_data": qr_data
     }
 
+def validar_lote(voucher_ids: List[str]):
+    if not voucher_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Lista de vouchers vazia")
+    if len(voucher_ids) > batch.MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {batch.MAX_ITEMS} vouchers por lote"
+        )
+
+def lote_aceito(lote_id: str) -> JSONResponse:
+    """202 para lotes processados em segundo plano, com os links de acompanhamento"""
+    batch_runner.submit(lote_id)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "lote_id": lote_id,
+            "status": "queued",
+            "links": {
+                "lote": f"/vouchers/batch/{lote_id}",
+                "progresso": f"/vouchers/batch/{lote_id}/progresso",
+                "resultados": f"/vouchers/batch/{lote_id}/resultados"
+            }
+        },
+        headers={"Location": f"/vouchers/batch/{lote_id}"}
+    )
+
+def obter_lote_ou_404(lote_id: str) -> Dict[str, Any]:
+    lote = batch.load_summary(lote_id)
+    if lote is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lote não encontrado")
+    return lote
+
 @app.post("/vouchers/batch/export")
-async def exportar_vouchers(voucher_ids: List[str]):
-    """Exporta vouchers selecionados"""
-    vouchers_export = []
-    
-    for voucher_id in voucher_ids:
-        if voucher_id in vouchers_db:
-            vouchers_export.append(vouchers_db[voucher_id])
-    
-    return {
-        "total_exportados": len(vouchers_export),
-        "vouchers": vouchers_export,
-        "formato": "json",
-        "data_exportacao": datetime.now().isoformat()
-    }
+def exportar_vouchers(
+    voucher_ids: List[str],
+    formato: str = Query("json", description="json, ndjson ou csv"),
+    assincrono: bool = Query(False, description="Gera o arquivo em segundo plano mesmo para lotes pequenos")
+):
+    """Exporta vouchers selecionados: em streaming até o limite síncrono, como arquivo gerado em lote acima dele"""
+    validar_lote(voucher_ids)
+    if formato not in batch.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato inválido; use {', '.join(batch.EXPORT_FORMATS)}"
+        )
+    if assincrono or len(voucher_ids) > batch.SYNC_LIMIT:
+        with SessionLocal() as db:
+            lote_id = batch.create_batch(db, "export", voucher_ids, {"formato": formato})
+        return lote_aceito(lote_id)
+
+    # Lotes pequenos: leitura direta pelos ids, na ordem pedida (ids inexistentes são ignorados)
+    vouchers_export = (voucher_serializer.one(voucher) for voucher in repository.iter_fetch(voucher_ids))
+    if formato != "json":
+        return export_response(vouchers_export, formato, "vouchers", fields=EXPORT_FIELDS)
+    
+    # Mesmo documento de antes; o total só é conhecido ao final do streaming
+    return StreamingResponse(
+        iter_json_document(
+            {"formato": "json", "data_exportacao": datetime.now().isoformat()},
+            "vouchers",
+            vouchers_export,
+            tail=lambda total: {"total_exportados": total}
+        ),
+        media_type="application/json"
+    )
 
 @app.post("/vouchers/batch/status")
-async def alterar_status_em_lote(voucher_ids: List[str], novo_status: StatusVoucher):
-    """Altera o status de múltiplos vouchers"""
-    vouchers_alterados = []
-    
-    for voucher_id in voucher_ids:
-        if voucher_id in vouchers_db:
-            voucher = vouchers_db[voucher_id]
-            voucher.status = novo_status
-            vouchers_db[voucher_id] = voucher
-            vouchers_alterados.append(voucher)
+def alterar_status_em_lote(
+    voucher_ids: List[str],
+    novo_status: StatusVoucher,
+    assincrono: bool = Query(False, description="Processa em segundo plano mesmo lotes pequenos")
+):
+    """Altera o status de múltiplos vouchers em transações por bloco, com o resultado de cada item"""
+    validar_lote(voucher_ids)
+    with SessionLocal() as db:
+        lote_id = batch.create_batch(db, "status", voucher_ids, {"novo_status": novo_status.value})
+    if assincrono or len(voucher_ids) > batch.SYNC_LIMIT:
+        return lote_aceito(lote_id)
+
+    batch_runner.run(lote_id)
+    lote = obter_lote_ou_404(lote_id)
+    if lote["status"] == "failed":
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=lote["erro"])
+    resultados = list(batch.iter_results(lote_id))
+    alterados = [item["voucher_id"] for item in resultados if item["resultado"] == "alterado"]
     
     return {
-        "message": f"Status alterado para {len(vouchers_alterados)} vouchers",
-        "vouchers_alterados": vouchers_alterados
+        "message": f"Status alterado para {len(alterados)} vouchers",
+        "vouchers_alterados": voucher_serializer.many(repository.fetch(alterados)),
+        "lote": lote,
+        "resultados": resultados
     }
 
+@app.get("/vouchers/batch/{lote_id}")
+def obter_lote(lote_id: str):
+    """Situação de um lote: status, progresso e contagem por resultado"""
+    return obter_lote_ou_404(lote_id)
+
+@app.get("/vouchers/batch/{lote_id}/progresso")
+async def progresso_lote(lote_id: str):
+    """Progresso do lote em Server-Sent Events: um evento a cada bloco confirmado, até o fim"""
+    lote = await run_in_threadpool(obter_lote_ou_404, lote_id)
+
+    async def eventos():
+        nonlocal lote
+        anterior = None
+        while True:
+            if lote != anterior:
+                evento = "fim" if lote["status"] in batch.FINISHED else "progresso"
+                yield b"event: " + evento.encode() + b"\ndata: " + dumps(lote) + b"\n\n"
+                anterior = lote
+            if lote["status"] in batch.FINISHED:
+                return
+            await asyncio.sleep(BATCH_PROGRESS_INTERVAL)
+            lote = await run_in_threadpool(batch.load_summary, lote_id)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/vouchers/batch/{lote_id}/resultados")
+def resultados_lote(lote_id: str, formato: str = Query("ndjson", description="ndjson ou csv")):
+    """Resultado de cada item do lote (alterado, inalterado, exportado, nao_encontrado, duplicado)"""
+    obter_lote_ou_404(lote_id)
+    return export_response(
+        batch.iter_results(lote_id), formato, f"lote-{lote_id}", fields=batch.RESULT_FIELDS
+    )
+
+@app.get("/vouchers/batch/{lote_id}/arquivo")
+def arquivo_lote(lote_id: str):
+    """Arquivo de uma exportação em lote concluída"""
+    lote = obter_lote_ou_404(lote_id)
+    path = batch.batch_file(lote_id)
+    if lote["operacao"] != "export" or path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não disponível")
+    formato = lote["parametros"]["formato"]
+    return FileResponse(
+        path,
+        # FileResponse acrescenta o charset aos tipos text/*
+        media_type=EXPORT_MEDIA_TYPES.get(formato, "application/json").split(";")[0],
+        filename=f"vouchers-{lote_id}.{formato}"
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5028) 
\ No newline at end of file
@@ -0,0 +1,389 @@
+"""
+Operações em lote sobre vouchers: alteração de status e exportação
+
+Cada lote é uma linha em voucher_batches com os ids pedidos, processada em
+blocos de CHUNK_SIZE itens. Um bloco é uma transação:
+  1. lê os vouchers do bloco com FOR UPDATE;
+  2. avança processados com UPDATE condicional ao valor lido e ao dono do
+     lote (duas réplicas nunca processam o mesmo bloco);
+  3. um único UPDATE ... WHERE id IN (...) para os vouchers que mudam;
+  4. grava o resultado de cada item em voucher_batch_items.
+Se o processo cair, os blocos confirmados ficam e o lote parado há mais de
+STALE_AFTER é retomado do primeiro bloco pendente. Exportações recomeçam do
+início (o arquivo é recriado).
+
+Lotes de até SYNC_LIMIT itens rodam na própria requisição; os maiores
+respondem 202 e rodam no BatchRunner (threads do serviço), com progresso
+consultável enquanto andam.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session, defer
+
+from shared.config.database import SessionLocal
+from shared.models.voucher import Voucher, VoucherBatch, VoucherBatchItem
+from shared.services.streaming_export import iter_csv, iter_json_document, iter_ndjson, stream_query
+
+logger = logging.getLogger("vouchers.batch")
+
+MAX_ITEMS = int(os.getenv("VOUCHER_BATCH_MAX_ITEMS", "100000"))
+SYNC_LIMIT = int(os.getenv("VOUCHER_BATCH_SYNC_LIMIT", "1000"))
+# Itens por transação; abaixo do limite de parâmetros do SQLite e do PostgreSQL
+CHUNK_SIZE = int(os.getenv("VOUCHER_BATCH_CHUNK", "1000"))
+# Lote em "running" sem bloco confirmado há mais tempo que isso foi abandonado
+STALE_AFTER = timedelta(seconds=float(os.getenv("VOUCHER_BATCH_TIMEOUT", "300")))
+BATCH_DIR = Path(os.getenv("VOUCHER_BATCH_DIR", str(Path(__file__).resolve().parent / "batches")))
+
+FINISHED = ("completed", "failed")
+EXPORT_FORMATS = ("json", "ndjson", "csv")
+RESULT_FIELDS = ["posicao", "voucher_id", "resultado", "status_anterior"]
+
+
+class BatchLost(Exception):
+    """Outra réplica assumiu o lote (este processo ficou parado além de STALE_AFTER)"""
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def create_batch(db: Session, operacao: str, voucher_ids: Sequence[str], parametros: Dict[str, Any]) -> str:
+    batch = VoucherBatch(
+        id=str(uuid.uuid4()), operacao=operacao, parametros=parametros, voucher_ids=list(voucher_ids),
+        status="queued", total=len(voucher_ids), processados=0, contagem={}
+    )
+    db.add(batch)
+    db.commit()
+    return batch.id
+
+
+def _claimable(now: datetime):
+    return or_(
+        VoucherBatch.status == "queued",
+        and_(VoucherBatch.status == "running", VoucherBatch.atualizado_em < now - STALE_AFTER)
+    )
+
+
+def claim_batch(db: Session, batch_id: str, worker: str, now: datetime) -> Optional[VoucherBatch]:
+    """Reivindica um lote na fila ou abandonado; None se outro processo o tem ou já terminou"""
+    claimed = db.execute(
+        update(VoucherBatch)
+        .where(VoucherBatch.id == batch_id, _claimable(now))
+        .values(status="running", claimed_by=worker, atualizado_em=now,
+                iniciado_em=func.coalesce(VoucherBatch.iniciado_em, now))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        return None
+    # Fora da sessão: os commits de cada bloco não expiram o lote (nem relêem a lista de ids)
+    batch = db.get(VoucherBatch, batch_id)
+    db.expunge(batch)
+    return batch
+
+
+def pending_batches(db: Session, now: datetime) -> List[str]:
+    return list(db.execute(
+        select(VoucherBatch.id).where(_claimable(now)).order_by(VoucherBatch.criado_em)
+    ).scalars())
+
+
+def _advance(db: Session, batch: VoucherBatch, start: int, size: int, counts: Counter, now: datetime) -> bool:
+    """UPDATE condicional: só o dono do lote, e uma vez por bloco, avança processados"""
+    return db.execute(
+        update(VoucherBatch)
+        .where(VoucherBatch.id == batch.id, VoucherBatch.processados == start,
+               VoucherBatch.claimed_by == batch.claimed_by)
+        .values(processados=start + size, contagem=dict(counts), atualizado_em=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _finish(db: Session, batch: VoucherBatch, status: str, **values):
+    db.execute(
+        update(VoucherBatch)
+        .where(VoucherBatch.id == batch.id, VoucherBatch.claimed_by == batch.claimed_by)
+        .values(status=status, concluido_em=datetime.utcnow(), claimed_by=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _release(db: Session, batch: VoucherBatch):
+    """Devolve o lote à fila (desligamento): qualquer réplica continua do bloco seguinte"""
+    db.execute(
+        update(VoucherBatch)
+        .where(VoucherBatch.id == batch.id, VoucherBatch.claimed_by == batch.claimed_by)
+        .values(status="queued", claimed_by=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _classify(chunk: Sequence[str], start: int, seen: Set[str], current: Dict[str, Any],
+              outcome: Callable[[str, Any], str]) -> List[Dict[str, Any]]:
+    """Resultado de cada item do bloco; ids repetidos no lote contam só na primeira vez"""
+    items = []
+    for offset, voucher_id in enumerate(chunk):
+        previous = None
+        if voucher_id in seen:
+            resultado = "duplicado"
+        elif voucher_id not in current:
+            resultado = "nao_encontrado"
+        else:
+            previous = current[voucher_id]
+            resultado = outcome(voucher_id, previous)
+        seen.add(voucher_id)
+        items.append({
+            "batch_id": None, "posicao": start + offset, "voucher_id": voucher_id,
+            "resultado": resultado, "status_anterior": previous
+        })
+    return items
+
+
+def _status_chunk(db: Session, batch: VoucherBatch, start: int, chunk: Sequence[str], seen: Set[str],
+                  counts: Counter) -> List[str]:
+    """Um bloco de alteração de status numa transação; devolve os ids alterados"""
+    novo_status = batch.parametros["novo_status"]
+    now = datetime.utcnow()
+    wanted = [voucher_id for voucher_id in dict.fromkeys(chunk) if voucher_id not in seen]
+    current = dict(db.execute(
+        select(Voucher.id, Voucher.status).where(Voucher.id.in_(wanted)).with_for_update()
+    ).all()) if wanted else {}
+    items = _classify(chunk, start, seen, current,
+                      lambda _, previous: "inalterado" if previous == novo_status else "alterado")
+    changed = [item["voucher_id"] for item in items if item["resultado"] == "alterado"]
+    counts.update(item["resultado"] for item in items)
+
+    if not _advance(db, batch, start, len(chunk), counts, now):
+        db.rollback()
+        raise BatchLost(batch.id)
+    if changed:
+        values = {"status": novo_status, "atualizado_em": now}
+        if novo_status == "usado":
+            values["usado_em"] = now
+        db.execute(
+            update(Voucher).where(Voucher.id.in_(changed)).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    for item in items:
+        item["batch_id"] = batch.id
+    db.execute(insert(VoucherBatchItem), items)
+    db.commit()
+    return changed
+
+
+def _run_status(db: Session, batch: VoucherBatch, repository, stop: threading.Event) -> bool:
+    ids = batch.voucher_ids
+    start = batch.processados or 0
+    seen = set(ids[:start])
+    counts = Counter(batch.contagem or {})
+    novo_status = batch.parametros["novo_status"]
+    for start in range(start, len(ids), CHUNK_SIZE):
+        if stop.is_set():
+            return False
+        changed = _status_chunk(db, batch, start, ids[start:start + CHUNK_SIZE], seen, counts)
+        repository.apply_status(changed, novo_status)
+    return True
+
+
+def _export_rows(db: Session, batch: VoucherBatch, serialize: Callable[[Voucher], Dict[str, Any]],
+                 stop: threading.Event) -> Iterator[Dict[str, Any]]:
+    """Vouchers exportados, bloco a bloco; progresso e resultados confirmados a cada bloco"""
+    ids = batch.voucher_ids
+    seen: Set[str] = set()
+    counts: Counter = Counter()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        if stop.is_set():
+            raise InterruptedError
+        chunk = ids[start:start + CHUNK_SIZE]
+        wanted = [voucher_id for voucher_id in dict.fromkeys(chunk) if voucher_id not in seen]
+        found = {voucher.id: voucher for voucher in db.query(Voucher).filter(Voucher.id.in_(wanted))} if wanted else {}
+        items = _classify(chunk, start, seen, {voucher_id: v.status for voucher_id, v in found.items()},
+                          lambda *_: "exportado")
+        counts.update(item["resultado"] for item in items)
+        rows = [serialize(found[item["voucher_id"]]) for item in items if item["resultado"] == "exportado"]
+        if not _advance(db, batch, start, len(chunk), counts, datetime.utcnow()):
+            db.rollback()
+            raise BatchLost(batch.id)
+        for item in items:
+            item["batch_id"] = batch.id
+        db.execute(insert(VoucherBatchItem), items)
+        db.commit()
+        db.expunge_all()
+        yield from rows
+
+
+def export_path(batch_id: str, formato: str) -> Path:
+    return BATCH_DIR / f"{batch_id}.{formato}"
+
+
+def _run_export(db: Session, batch: VoucherBatch, serialize: Callable[[Voucher], Dict[str, Any]],
+                fields: Sequence[str], stop: threading.Event) -> Optional[Path]:
+    formato = batch.parametros["formato"]
+    if batch.processados:
+        # Retomada: o arquivo parcial não é confiável, a exportação recomeça
+        db.execute(delete(VoucherBatchItem).where(VoucherBatchItem.batch_id == batch.id))
+        db.execute(
+            update(VoucherBatch).where(VoucherBatch.id == batch.id).values(processados=0, contagem={})
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        batch.processados = 0
+
+    rows = _export_rows(db, batch, serialize, stop)
+    if formato == "csv":
+        body = iter_csv(rows, fields)
+    elif formato == "ndjson":
+        body = iter_ndjson(rows)
+    else:
+        body = iter_json_document(
+            {"formato": "json", "lote_id": batch.id, "data_exportacao": datetime.now().isoformat()},
+            "vouchers", rows, tail=lambda total: {"total_exportados": total}
+        )
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    path = export_path(batch.id, formato)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        with open(tmp_path, "wb") as output:
+            for chunk in body:
+                output.write(chunk)
+    except InterruptedError:
+        tmp_path.unlink(missing_ok=True)
+        return None
+    os.replace(tmp_path, path)
+    return path
+
+
+def run_batch(batch_id: str, repository, serialize: Callable[[Voucher], Dict[str, Any]], fields: Sequence[str],
+              session_factory=SessionLocal, stop: Optional[threading.Event] = None) -> Optional[str]:
+    """Processa um lote até o fim; devolve o status final (None se não foi possível reivindicá-lo)"""
+    stop = stop or threading.Event()
+    with session_factory() as db:
+        batch = claim_batch(db, batch_id, worker_id(), datetime.utcnow())
+        if batch is None:
+            return None
+        try:
+            if batch.operacao == "status":
+                done = _run_status(db, batch, repository, stop)
+                path = None
+            else:
+                path = _run_export(db, batch, serialize, fields, stop)
+                done = path is not None
+            if not done:
+                _release(db, batch)
+                return "queued"
+            _finish(db, batch, "completed", arquivo=str(path) if path else None)
+            return "completed"
+        except BatchLost:
+            logger.warning("Lote %s assumido por outra réplica", batch_id)
+            return None
+        except Exception as e:
+            logger.exception("Lote %s falhou", batch_id)
+            db.rollback()
+            _finish(db, batch, "failed", erro=str(e))
+            return "failed"
+
+
+def load_summary(batch_id: str, session_factory=SessionLocal) -> Optional[Dict[str, Any]]:
+    """Situação do lote (sem a lista de ids, que pode ter 100 mil itens)"""
+    with session_factory() as db:
+        batch = db.query(VoucherBatch).options(defer(VoucherBatch.voucher_ids)).filter(
+            VoucherBatch.id == batch_id
+        ).first()
+        return summary(batch) if batch is not None else None
+
+
+def summary(batch: VoucherBatch) -> Dict[str, Any]:
+    total, processados = batch.total, batch.processados or 0
+    return {
+        "lote_id": batch.id,
+        "operacao": batch.operacao,
+        "parametros": batch.parametros,
+        "status": batch.status,
+        "total": total,
+        "processados": processados,
+        "progresso": round(processados / total * 100, 1) if total else 100.0,
+        "contagem": batch.contagem or {},
+        "erro": batch.erro,
+        "arquivo": f"/vouchers/batch/{batch.id}/arquivo" if batch.arquivo else None,
+        "criado_em": batch.criado_em,
+        "iniciado_em": batch.iniciado_em,
+        "concluido_em": batch.concluido_em,
+    }
+
+
+def iter_results(batch_id: str, session_factory=SessionLocal) -> Iterator[Dict[str, Any]]:
+    """Resultado de cada item, na ordem do pedido, lido por cursor"""
+    return stream_query(
+        session_factory,
+        select(VoucherBatchItem.posicao, VoucherBatchItem.voucher_id, VoucherBatchItem.resultado,
+               VoucherBatchItem.status_anterior)
+        .where(VoucherBatchItem.batch_id == batch_id).order_by(VoucherBatchItem.posicao)
+    )
+
+
+def batch_file(batch_id: str, session_factory=SessionLocal) -> Optional[Path]:
+    with session_factory() as db:
+        arquivo = db.query(VoucherBatch.arquivo).filter(VoucherBatch.id == batch_id).scalar()
+    return Path(arquivo) if arquivo and Path(arquivo).is_file() else None
+
+
+class BatchRunner:
+    """Processa os lotes grandes em threads do serviço, retomando os pendentes na inicialização"""
+
+    def __init__(self, repository, serialize: Callable[[Voucher], Dict[str, Any]], fields: Sequence[str],
+                 session_factory=SessionLocal, max_workers: int = 2):
+        self.repository = repository
+        self.serialize = serialize
+        self.fields = fields
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="voucher-batch")
+        self.stop_event = threading.Event()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "released": 0, "skipped": 0}
+
+    def submit(self, batch_id: str):
+        self.stats["submitted"] += 1
+        self.executor.submit(self._run, batch_id)
+
+    def run(self, batch_id: str) -> Optional[str]:
+        """Processa o lote na thread corrente (lotes pequenos, dentro da requisição)"""
+        return run_batch(batch_id, self.repository, self.serialize, self.fields, self.session_factory,
+                         self.stop_event)
+
+    def _run(self, batch_id: str):
+        try:
+            status = self.run(batch_id)
+        except Exception:
+            logger.exception("Falha ao processar o lote %s", batch_id)
+            return
+        key = {"completed": "completed", "failed": "failed", "queued": "released"}.get(status, "skipped")
+        self.stats[key] += 1
+
+    def resume(self) -> int:
+        """Enfileira lotes na fila ou abandonados (ex.: réplica reiniciada no meio de um lote)"""
+        with self.session_factory() as db:
+            batch_ids = pending_batches(db, datetime.utcnow())
+        for batch_id in batch_ids:
+            self.submit(batch_id)
+        return len(batch_ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "max_workers": self.max_workers}
+
+    def shutdown(self):
+        # Os lotes em andamento param no fim do bloco corrente e voltam para a fila
+        self.stop_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
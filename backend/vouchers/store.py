@@ -0,0 +1,470 @@
+"""
+Repositório de vouchers: tabela vouchers (SQLAlchemy) + índice em memória
+
+O banco é a fonte da verdade; o VoucherIndex guarda só o que busca, filtros e
+estatísticas precisam, em arrays por posição (um voucher = uma posição, na
+ordem de criação):
+  - status e tipo: conjunto de posições por valor;
+  - datas de início/fim: arrays ordenados, filtrados com bisect;
+  - código, cliente, destino, agência e agente: índice de n-gramas
+    (shared.services.text_index) para busca por substring;
+  - estatísticas: contadores atualizados a cada escrita.
+
+A busca começa pelo filtro mais seletivo; os demais são interseção de
+conjuntos (quando o conjunto já existe ou sai barato) ou conferência posição a
+posição nos candidatos que sobraram. Os vouchers completos vêm do banco, só para a página devolvida.
+
+Escritas desta réplica atualizam o índice na hora. Alterações de outras
+réplicas entram pelo atualizado_em (sync, no máximo a cada sync_interval
+segundos) e remoções pela tabela voucher_deletions. As duas marcas são datas
+da aplicação, gravadas antes do commit: cada sync relê uma janela de overlap
+antes da última marca, para não pular transações que confirmaram depois de
+outras mais novas. Se a contagem ainda não bater (remoção fora do
+repositório), o índice é recarregado.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from shared.config.database import SessionLocal
+from shared.models.voucher import Voucher, VoucherDeletion
+from shared.services.text_index import NGramIndex
+
+STATUSES = ("ativo", "usado", "expirado", "cancelado", "pendente")
+
+# Campos da busca por termo (substring, sem diferenciar maiúsculas)
+TEXT_FIELDS = ("codigo", "cliente", "destino", "agencia", "agente")
+
+# Colunas lidas para montar o índice (sem observações, benefícios e documentos)
+INDEX_COLUMNS = (
+    Voucher.id, Voucher.codigo, Voucher.cliente, Voucher.tipo, Voucher.destino, Voucher.data_inicio,
+    Voucher.data_fim, Voucher.valor, Voucher.agencia, Voucher.agente, Voucher.status, Voucher.atualizado_em
+)
+
+LOAD_CHUNK = 10000
+FETCH_CHUNK = 500
+# Remoções ficam registradas por esse tempo (réplica parada mais que isso recarrega pela contagem)
+DELETION_RETENTION = timedelta(days=1)
+
+
+def _plain(value: Any) -> Any:
+    """Enums dos schemas (str, Enum) viram o valor: o hash do Enum não é o da string"""
+    return value.value if isinstance(value, Enum) else value
+
+
+class SortedDates:
+    """Datas (ordinal) de todos os vouchers em ordem, com a posição de cada um ao lado"""
+
+    def __init__(self):
+        self.keys = array("i")
+        self.slots = array("I")
+
+    def build(self, pairs: List[Tuple[int, int]]):
+        pairs.sort()
+        self.keys = array("i", (key for key, _ in pairs))
+        self.slots = array("I", (slot for _, slot in pairs))
+
+    def _position(self, key: int, slot: int) -> int:
+        # Datas iguais ficam em ordem de posição, então a posição também é achada com bisect
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        return bisect_left(self.slots, slot, low, high)
+
+    def add(self, key: int, slot: int):
+        index = self._position(key, slot)
+        self.keys.insert(index, key)
+        self.slots.insert(index, slot)
+
+    def remove(self, key: int, slot: int):
+        index = self._position(key, slot)
+        if index < len(self.slots) and self.keys[index] == key and self.slots[index] == slot:
+            del self.keys[index]
+            del self.slots[index]
+
+    def count_from(self, key: int) -> int:
+        return len(self.keys) - bisect_left(self.keys, key)
+
+    def count_until(self, key: int) -> int:
+        return bisect_right(self.keys, key)
+
+    def slots_from(self, key: int) -> Set[int]:
+        return set(self.slots[bisect_left(self.keys, key):])
+
+    def slots_until(self, key: int) -> Set[int]:
+        return set(self.slots[:bisect_right(self.keys, key)])
+
+    def count_between(self, low: int, high: int) -> int:
+        return max(0, bisect_right(self.keys, high) - bisect_left(self.keys, low))
+
+    def slots_between(self, low: int, high: int) -> Set[int]:
+        return set(self.slots[bisect_left(self.keys, low):bisect_right(self.keys, high)])
+
+
+# (custo estimado, posições que atendem, teste de uma posição, conjunto já pronto)
+Predicate = Tuple[int, Callable[[], Set[int]], Callable[[int], bool], bool]
+
+# Conferir uma posição em Python custa por volta de dez vezes o que custa pôr
+# uma posição num conjunto: acima disso, materializar e intersectar compensa
+CHECK_COST = 10
+
+
+class VoucherIndex:
+    """Índices secundários, de texto e estatísticas dos vouchers, por posição"""
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []  # posição -> id (None após remoção)
+        self.slots: Dict[str, int] = {}
+        self.status_of: List[Optional[str]] = []
+        self.tipo_of: List[Optional[str]] = []
+        self.starts_of = array("i")
+        self.ends_of = array("i")
+        self.values_of = array("d")
+        self.by_status: Dict[str, Set[int]] = {status: set() for status in STATUSES}
+        self.by_tipo: Dict[str, Set[int]] = {}
+        self.starts = SortedDates()
+        self.ends = SortedDates()
+        self.text = {field: NGramIndex() for field in TEXT_FIELDS}
+        self.total = 0
+        self.valor_total = 0.0
+        self.inverted = 0  # vouchers com data_fim anterior à data_inicio
+        self._pending_dates: Optional[Tuple[list, list]] = None
+
+    @property
+    def size(self) -> int:
+        return self.total
+
+    def _index(self, slot: int, row: Any, dates: bool = True):
+        status, tipo = _plain(row.status), _plain(row.tipo)
+        start, end = row.data_inicio.toordinal(), row.data_fim.toordinal()
+        self.status_of[slot] = status
+        self.tipo_of[slot] = tipo
+        self.starts_of[slot] = start
+        self.ends_of[slot] = end
+        self.values_of[slot] = row.valor
+        self.by_status.setdefault(status, set()).add(slot)
+        self.by_tipo.setdefault(tipo, set()).add(slot)
+        if not dates:
+            pass
+        elif self._pending_dates is not None:
+            self._pending_dates[0].append((start, slot))
+            self._pending_dates[1].append((end, slot))
+        else:
+            self.starts.add(start, slot)
+            self.ends.add(end, slot)
+        for field in TEXT_FIELDS:
+            self.text[field].add(slot, getattr(row, field))
+        self.total += 1
+        self.valor_total += row.valor
+        self.inverted += end < start
+
+    def _unindex(self, slot: int, dates: bool = True):
+        self.by_status[self.status_of[slot]].discard(slot)
+        self.by_tipo[self.tipo_of[slot]].discard(slot)
+        if dates:
+            self.starts.remove(self.starts_of[slot], slot)
+            self.ends.remove(self.ends_of[slot], slot)
+        for text in self.text.values():
+            text.remove(slot)
+        self.total -= 1
+        self.valor_total -= self.values_of[slot]
+        self.inverted -= self.ends_of[slot] < self.starts_of[slot]
+
+    def upsert(self, voucher_id: str, row: Any):
+        slot = self.slots.get(voucher_id)
+        if slot is None:
+            slot = len(self.ids)
+            self.ids.append(voucher_id)
+            self.slots[voucher_id] = slot
+            self.status_of.append(None)
+            self.tipo_of.append(None)
+            self.starts_of.append(0)
+            self.ends_of.append(0)
+            self.values_of.append(0.0)
+            self._index(slot, row)
+            return
+        # Mudança de status e afins não mexe nos arrays ordenados (inserção neles é O(n))
+        dates = (self.starts_of[slot] != row.data_inicio.toordinal() or
+                 self.ends_of[slot] != row.data_fim.toordinal())
+        self._unindex(slot, dates)
+        self._index(slot, row, dates)
+
+    def set_status(self, voucher_id: str, status: Any):
+        """Só o status mudou (lote): move a posição entre os conjuntos, sem reindexar o resto"""
+        slot = self.slots.get(voucher_id)
+        if slot is None:
+            return
+        status = _plain(status)
+        self.by_status[self.status_of[slot]].discard(slot)
+        self.by_status.setdefault(status, set()).add(slot)
+        self.status_of[slot] = status
+
+    def remove(self, voucher_id: str):
+        slot = self.slots.pop(voucher_id, None)
+        if slot is not None:
+            self._unindex(slot)
+            self.ids[slot] = None
+
+    def bulk_load(self, rows: Iterator[Any]):
+        """Carga inicial: as datas são ordenadas uma vez no final, não inseridas uma a uma"""
+        self._pending_dates = ([], [])
+        try:
+            for row in rows:
+                self.upsert(row.id, row)
+            self.starts.build(self._pending_dates[0])
+            self.ends.build(self._pending_dates[1])
+        finally:
+            self._pending_dates = None
+
+    def _text_predicate(self, fields: Sequence[str], term: str) -> Predicate:
+        needle = term.lower()
+        indexes = [self.text[field] for field in fields]
+
+        def matches() -> Set[int]:
+            found: Set[int] = set()
+            for text in indexes:
+                found |= text.search(needle)
+            return found
+
+        return (
+            sum(text.cost(needle) for text in indexes), matches,
+            lambda slot: any(text.contains(slot, needle) for text in indexes), False
+        )
+
+    def search(self, termo: Optional[str] = None, status: Any = None, tipo: Any = None,
+               data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+               agencia: Optional[str] = None, agente: Optional[str] = None) -> List[int]:
+        """Posições que atendem a todos os filtros, na ordem de criação"""
+        predicates: List[Predicate] = []
+        if status:
+            status = _plain(status)
+            with_status = self.by_status.get(status, set())
+            predicates.append((
+                len(with_status), lambda: with_status, lambda slot: self.status_of[slot] == status, True
+            ))
+        if tipo:
+            tipo = _plain(tipo)
+            with_tipo = self.by_tipo.get(tipo, set())
+            predicates.append((len(with_tipo), lambda: with_tipo, lambda slot: self.tipo_of[slot] == tipo, True))
+        if data_inicio:
+            start = data_inicio.toordinal()
+            predicates.append((
+                self.starts.count_from(start), lambda: self.starts.slots_from(start),
+                lambda slot: self.starts_of[slot] >= start, False
+            ))
+        if data_fim:
+            end = data_fim.toordinal()
+            predicates.append((
+                self.ends.count_until(end), lambda: self.ends.slots_until(end),
+                lambda slot: self.ends_of[slot] <= end, False
+            ))
+        if data_inicio and data_fim and not self.inverted:
+            # Com início <= fim em todos os vouchers, o período inteiro cabe na janela:
+            # o início também é <= data_fim, o que estreita muito períodos curtos
+            predicates.append((
+                self.starts.count_between(start, end), lambda: self.starts.slots_between(start, end),
+                lambda slot: self.starts_of[slot] <= end, False
+            ))
+        if termo:
+            predicates.append(self._text_predicate(TEXT_FIELDS, termo))
+        if agencia:
+            predicates.append(self._text_predicate(("agencia",), agencia))
+        if agente:
+            predicates.append(self._text_predicate(("agente",), agente))
+
+        if not predicates:
+            return [slot for slot, voucher_id in enumerate(self.ids) if voucher_id is not None]
+        # O filtro mais seletivo gera os candidatos; cada um dos outros intersecta ou confere
+        predicates.sort(key=lambda predicate: predicate[0])
+        candidates = predicates[0][1]()
+        checks = []
+        for cost, materialize, check, ready in predicates[1:]:
+            if ready or cost < len(candidates) * CHECK_COST:
+                candidates = candidates & materialize()
+            else:
+                checks.append(check)
+        if checks:
+            candidates = [slot for slot in candidates if all(check(slot) for check in checks)]
+        return sorted(candidates)
+
+    def stats(self) -> Dict[str, Any]:
+        usados = len(self.by_status["usado"])
+        return {
+            "total": self.total,
+            "ativos": len(self.by_status["ativo"]),
+            "usados": usados,
+            "expirados": len(self.by_status["expirado"]),
+            "cancelados": len(self.by_status["cancelado"]),
+            "valor_total": self.valor_total,
+            "valor_medio": self.valor_total / self.total if self.total > 0 else 0,
+            "taxa_utilizacao": (usados / self.total * 100) if self.total > 0 else 0
+        }
+
+
+class VoucherRepository:
+    """Vouchers no banco, com busca, filtros e estatísticas servidos pelo VoucherIndex"""
+
+    def __init__(self, session_factory=SessionLocal, sync_interval: float = 5.0,
+                 sync_overlap: Optional[float] = None):
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        # Janela relida antes das marcas: cobre commits que chegam depois de escritas mais novas
+        self.sync_overlap = timedelta(seconds=sync_interval if sync_overlap is None else sync_overlap)
+        self.index = VoucherIndex()
+        self.lock = threading.RLock()
+        self._watermark: Optional[datetime] = None  # maior atualizado_em já indexado
+        self._deleted_watermark: Optional[datetime] = None  # maior removido_em já aplicado
+        self._synced_at = 0.0
+
+    def _advance(self, changed: Optional[datetime]):
+        if changed is not None and (self._watermark is None or changed > self._watermark):
+            self._watermark = changed
+
+    def _since(self, watermark: Optional[datetime]) -> Optional[datetime]:
+        return watermark - self.sync_overlap if watermark is not None else None
+
+    def load(self):
+        """(Re)constrói o índice a partir do banco, na ordem de criação"""
+        index = VoucherIndex()
+        watermark = None
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(*INDEX_COLUMNS).order_by(Voucher.criado_em, Voucher.id)
+                .execution_options(yield_per=LOAD_CHUNK)
+            )
+            index.bulk_load(rows)
+            watermark = db.query(func.max(Voucher.atualizado_em)).scalar()
+            deleted_watermark = db.query(func.max(VoucherDeletion.removido_em)).scalar()
+        with self.lock:
+            self.index = index
+            self._watermark = watermark
+            self._deleted_watermark = deleted_watermark
+            self._synced_at = time.monotonic()
+
+    def sync(self, force: bool = False):
+        """Aplica ao índice as alterações feitas por outras réplicas"""
+        if not force and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = time.monotonic()
+        with self.session_factory() as db:
+            # Releitura da janela de overlap é idempotente (upsert e remove)
+            query = select(*INDEX_COLUMNS)
+            since = self._since(self._watermark)
+            if since is not None:
+                query = query.where(Voucher.atualizado_em >= since)
+            rows = db.execute(query.order_by(Voucher.atualizado_em)).all()
+            deletions = select(VoucherDeletion.voucher_id, VoucherDeletion.removido_em)
+            since = self._since(self._deleted_watermark)
+            if since is not None:
+                deletions = deletions.where(VoucherDeletion.removido_em >= since)
+            deleted = db.execute(deletions).all()
+            total = db.query(func.count(Voucher.id)).scalar()
+        with self.lock:
+            for row in rows:
+                self.index.upsert(row.id, row)
+                self._advance(row.atualizado_em)
+            for voucher_id, removed_at in deleted:
+                self.index.remove(voucher_id)
+                if self._deleted_watermark is None or removed_at > self._deleted_watermark:
+                    self._deleted_watermark = removed_at
+            stale = self.index.size != total
+        if stale:
+            self.load()
+
+    def get(self, voucher_id: str) -> Optional[Voucher]:
+        with self.session_factory() as db:
+            return db.get(Voucher, voucher_id)
+
+    def iter_fetch(self, voucher_ids: Sequence[str]) -> Iterator[Voucher]:
+        """Vouchers na ordem dos ids, lidos em blocos (ids inexistentes são ignorados)"""
+        for start in range(0, len(voucher_ids), FETCH_CHUNK):
+            chunk = voucher_ids[start:start + FETCH_CHUNK]
+            with self.session_factory() as db:
+                found = {voucher.id: voucher for voucher in db.query(Voucher).filter(Voucher.id.in_(chunk))}
+            for voucher_id in chunk:
+                if voucher_id in found:
+                    yield found[voucher_id]
+
+    def fetch(self, voucher_ids: Sequence[str]) -> List[Voucher]:
+        return list(self.iter_fetch(voucher_ids))
+
+    def search(self, **criteria) -> List[str]:
+        """Ids dos vouchers que atendem aos filtros (ver VoucherIndex.search)"""
+        self.sync()
+        with self.lock:
+            index = self.index
+            return [index.ids[slot] for slot in index.search(**criteria)]
+
+    def stats(self) -> Dict[str, Any]:
+        self.sync()
+        with self.lock:
+            return self.index.stats()
+
+    def _indexed(self, voucher: Voucher) -> Voucher:
+        # A marca d'água não avança aqui: escritas de outras réplicas com atualizado_em
+        # anterior a esta ainda não sincronizadas seriam puladas; o sync relê esta (idempotente)
+        with self.lock:
+            self.index.upsert(voucher.id, voucher)
+        return voucher
+
+    def apply_status(self, voucher_ids: Sequence[str], status: Any):
+        """Reflete no índice um UPDATE de status em lote já confirmado no banco"""
+        with self.lock:
+            for voucher_id in voucher_ids:
+                self.index.set_status(voucher_id, status)
+
+    def create(self, values: Dict[str, Any]) -> Voucher:
+        """Grava um voucher novo; ValueError se o código já existir"""
+        values = {field: _plain(value) for field, value in values.items()}
+        with self.session_factory() as db:
+            if db.query(Voucher.id).filter(Voucher.codigo == values["codigo"]).first():
+                raise ValueError("Código do voucher já existe")
+            voucher = Voucher(**values)
+            db.add(voucher)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise ValueError("Código do voucher já existe")
+            db.refresh(voucher)
+        return self._indexed(voucher)
+
+    def update(self, voucher_id: str, changes: Dict[str, Any]) -> Optional[Voucher]:
+        """Altera os campos informados; None se o voucher não existir"""
+        with self.session_factory() as db:
+            voucher = db.get(Voucher, voucher_id)
+            if voucher is None:
+                return None
+            for field, value in changes.items():
+                setattr(voucher, field, _plain(value))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise ValueError("Código do voucher já existe")
+            db.refresh(voucher)
+        return self._indexed(voucher)
+
+    def delete(self, voucher_id: str) -> bool:
+        """Remove o voucher e registra a remoção (na mesma transação) para as outras réplicas"""
+        with self.session_factory() as db:
+            deleted = db.query(Voucher).filter(Voucher.id == voucher_id).delete(synchronize_session=False)
+            if deleted:
+                now = datetime.utcnow()
+                db.merge(VoucherDeletion(voucher_id=voucher_id, removido_em=now))
+                db.execute(delete(VoucherDeletion).where(VoucherDeletion.removido_em < now - DELETION_RETENTION))
+            db.commit()
+        if deleted:
+            with self.lock:
+                self.index.remove(voucher_id)
+        return bool(deleted)
+
+    def count(self) -> int:
+        with self.session_factory() as db:
+            return db.query(func.count(Voucher.id)).scalar()